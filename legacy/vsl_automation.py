@@ -0,0 +1,404 @@
+"""
+VSL-DSP Automation Module
+Reproducción de automatización por líneas de tiempo (breakpoints).
+
+Cada carril (lane) automatiza un parámetro con una lista de puntos
+(tiempo, valor de usuario, curva del segmento siguiente). En cada tick
+de control se evalúan todos los carriles a la vez con NumPy: una única
+búsqueda binaria vectorizada localiza el segmento activo de cada carril,
+se interpola, se codifica con la ruta batch de vsl_core y solo se envían
+los valores cuyo entero codificado cambió.
+
+Formato de archivo (JSON):
+    {"lanes": [
+        {"param_id": "0x1A01",
+         "points": [[0.0, 0.0, "linear"], [2.0, 0.8, "exp"], [4.0, 0.2]]}
+    ]}
+
+Requiere NumPy.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Mapping, NamedTuple, Optional, Sequence, TextIO
+
+import numpy as np
+
+from vsl_config import VSLParameter
+from vsl_core import vsl_encode_user_values_batch, vsl_param_arrays
+from vsl_ramp import VSLControlClock, DEFAULT_CONTROL_RATE_HZ, JITTER_SAMPLES
+from vsl_transport import VSLPacket
+
+
+CURVE_LINEAR = "linear"
+CURVE_EXP = "exp"       # Interpolación geométrica (requiere valores > 0)
+CURVES = (CURVE_LINEAR, CURVE_EXP)
+
+
+class VSLBreakpoint(NamedTuple):
+    """Punto de automatización. `curve` define el segmento que empieza aquí."""
+    time_s: float
+    value: float
+    curve: str = CURVE_LINEAR
+
+
+class VSLLane(NamedTuple):
+    """Carril de automatización de un parámetro."""
+    param: VSLParameter
+    points: Sequence[VSLBreakpoint]
+
+
+# ============================================================================
+# CARGA DE CARRILES
+# ============================================================================
+
+def load_lanes(path: str, params: Mapping[int, VSLParameter]) -> List[VSLLane]:
+    """
+    Carga carriles desde un archivo JSON.
+
+    Args:
+        path: Archivo de automatización
+        params: Parámetros disponibles indexados por dsp_param_id
+
+    Raises:
+        ValueError: Si un carril referencia un parámetro desconocido o sus
+            puntos no son válidos
+    """
+    with open(path, "r") as f:
+        document = json.load(f)
+
+    lanes = []
+    for entry in document.get("lanes", []):
+        raw_id = entry["param_id"]
+        param_id = int(raw_id, 0) if isinstance(raw_id, str) else int(raw_id)
+        param = params.get(param_id)
+        if param is None:
+            raise ValueError(f"Parámetro desconocido en automatización: 0x{param_id:04X}")
+        points = [VSLBreakpoint(float(p[0]), float(p[1]),
+                                p[2] if len(p) > 2 else CURVE_LINEAR)
+                  for p in entry["points"]]
+        lanes.append(VSLLane(param, points))
+    return lanes
+
+
+# ============================================================================
+# EVALUACIÓN VECTORIZADA
+# ============================================================================
+
+class VSLAutomationTimeline:
+    """
+    Todos los carriles aplanados en arrays para evaluarlos en bloque.
+
+    Los tiempos de cada carril se desplazan por lane_index * span, de modo
+    que un solo np.searchsorted sobre el array global encuentra a la vez
+    el segmento activo de todos los carriles.
+    """
+
+    def __init__(self, lanes: Sequence[VSLLane]):
+        """
+        Raises:
+            ValueError: Si no hay carriles, un carril está vacío, sus tiempos
+                no son crecientes, la curva es desconocida o un parámetro se
+                repite
+        """
+        if not lanes:
+            raise ValueError("Se requiere al menos un carril")
+
+        ids = [lane.param.dsp_param_id for lane in lanes]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Cada parámetro solo puede tener un carril")
+
+        times: List[float] = []
+        values: List[float] = []
+        exp_curve: List[bool] = []
+        starts: List[int] = []
+        for lane in lanes:
+            if not lane.points:
+                raise ValueError(f"Carril vacío para 0x{lane.param.dsp_param_id:04X}")
+            lane_times = [p.time_s for p in lane.points]
+            if any(b <= a for a, b in zip(lane_times, lane_times[1:])):
+                raise ValueError(f"Tiempos no crecientes en 0x{lane.param.dsp_param_id:04X}")
+            starts.append(len(times))
+            for point in lane.points:
+                if point.curve not in CURVES:
+                    raise ValueError(f"Curva desconocida: {point.curve}")
+                times.append(point.time_s)
+                values.append(point.value)
+                exp_curve.append(point.curve == CURVE_EXP)
+
+        self.lanes = list(lanes)
+        self.params = np.empty(len(lanes), dtype=object)
+        self.params[:] = [lane.param for lane in lanes]
+        self.param_ids = np.array(ids, dtype=np.int64)
+        self.coeffs = vsl_param_arrays(self.params)
+
+        self._times = np.array(times, dtype=np.float64)
+        self._values = np.array(values, dtype=np.float64)
+        self._exp = np.array(exp_curve, dtype=bool)
+        self._first = np.array(starts, dtype=np.int64)
+        self._last = np.append(self._first[1:], len(times)) - 1
+
+        self.start_s = float(self._times.min())
+        self.duration_s = float(self._times.max())
+        self._span = self.duration_s - min(self.start_s, 0.0) + 1.0
+        lane_of_point = np.repeat(np.arange(len(lanes)), np.diff(np.append(self._first, len(times))))
+        self._keys = self._times + lane_of_point * self._span
+        self._lane_offsets = np.arange(len(lanes)) * self._span
+
+    def __len__(self) -> int:
+        return len(self.lanes)
+
+    def evaluate(self, t: float) -> np.ndarray:
+        """Valor de usuario de cada carril en el instante t (segundos)."""
+        idx = np.searchsorted(self._keys, self._lane_offsets + t, side="right") - 1
+        idx = np.clip(idx, self._first, self._last)
+        nxt = np.minimum(idx + 1, self._last)
+
+        t0 = self._times[idx]
+        t1 = self._times[nxt]
+        v0 = self._values[idx]
+        v1 = self._values[nxt]
+
+        span = t1 - t0
+        in_segment = (nxt > idx) & (t > t0)
+        frac = np.where(in_segment, np.clip((t - t0) / np.where(span > 0.0, span, 1.0), 0.0, 1.0), 0.0)
+
+        # Antes del primer punto el carril mantiene su primer valor
+        frac = np.where(t < t0, 0.0, frac)
+
+        linear = v0 + (v1 - v0) * frac
+        geometric_ok = self._exp[idx] & (v0 > 0.0) & (v1 > 0.0)
+        ratio = np.where(geometric_ok, v1 / np.where(geometric_ok, v0, 1.0), 1.0)
+        return np.where(geometric_ok, v0 * np.power(ratio, frac), linear)
+
+    def encode(self, t: float) -> np.ndarray:
+        """Entero codificado de cada carril en el instante t."""
+        return vsl_encode_user_values_batch(self.evaluate(t), self.params, self.coeffs)
+
+
+# ============================================================================
+# MOTOR DE REPRODUCCIÓN
+# ============================================================================
+
+class VSLReportFileSink:
+    """
+    Destino de dry-run: escribe el flujo de reportes a un archivo de texto.
+
+    Una línea por reporte: "<tiempo_s> <64 bytes en hexadecimal>".
+    """
+
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+        self.time_s = 0.0
+        self.reports = 0
+
+    def __call__(self, packets: List[VSLPacket]):
+        for packet in packets:
+            self._stream.write(f"{self.time_s:.6f} {packet.buffer.hex()}\n")
+        self.reports += len(packets)
+
+
+class VSLAutomationEngine:
+    """
+    Reproduce una línea de tiempo a tasa de control fija.
+
+    play() arranca un hilo que en cada tick evalúa todos los carriles,
+    codifica en bloque y envía solo los valores que cambiaron. render()
+    recorre la misma línea de tiempo sin esperar (dry-run offline).
+    """
+
+    def __init__(self, timeline: VSLAutomationTimeline,
+                 sender: Callable[[List[VSLPacket]], object],
+                 control_rate_hz: float = DEFAULT_CONTROL_RATE_HZ,
+                 report_id: Optional[int] = None):
+        """
+        Args:
+            timeline: Carriles a reproducir
+            sender: Función que envía un lote de paquetes (ej: send_packets)
+            control_rate_hz: Frecuencia del tick de control
+            report_id: Report ID de los paquetes (None usa VSL_REPORT_ID)
+        """
+        self._timeline = timeline
+        self._sender = sender
+        self._report_id = report_id
+        self.clock = VSLControlClock(control_rate_hz)
+
+        self._last_sent = np.full(len(timeline), -1, dtype=np.int64)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._finished = threading.Event()
+
+        self.packets_sent = 0
+        self.ticks = 0
+        self.max_tick_s = 0.0
+        self._tick_s: Deque[float] = deque(maxlen=JITTER_SAMPLES)
+
+    def step(self, t: float, sender: Optional[Callable[[List[VSLPacket]], object]] = None) -> int:
+        """
+        Evalúa la línea de tiempo en t y envía los enteros que cambiaron.
+
+        Returns:
+            Número de paquetes enviados
+        """
+        t_compute = time.perf_counter()
+        encoded = self._timeline.encode(t)
+        changed = np.flatnonzero(encoded != self._last_sent)
+        self._last_sent = encoded
+
+        packets = [VSLPacket(int(pid), int(value), report_id=self._report_id)
+                   for pid, value in zip(self._timeline.param_ids[changed], encoded[changed])]
+        if packets:
+            (sender or self._sender)(packets)
+            self.packets_sent += len(packets)
+
+        elapsed = time.perf_counter() - t_compute
+        self.ticks += 1
+        self.max_tick_s = max(self.max_tick_s, elapsed)
+        self._tick_s.append(elapsed)
+        return len(packets)
+
+    def play(self, start_s: float = 0.0):
+        """Arranca la reproducción en tiempo real desde start_s."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._finished.clear()
+        self._last_sent[:] = -1
+        self._tick_s.clear()
+        self.clock.reset()
+        self._thread = threading.Thread(
+            target=self._play_loop, args=(start_s,), name="vsl-automation", daemon=True
+        )
+        self._thread.start()
+
+    def _play_loop(self, start_s: float):
+        origin = time.monotonic() - start_s
+        self.step(start_s)
+        while not self._stop.is_set():
+            _, deadline = self.clock.wait_next(self._stop)
+            if self._stop.is_set():
+                break
+            t = deadline - origin
+            self.step(t)
+            if t >= self._timeline.duration_s:
+                break
+        self._finished.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que la reproducción llegue al final."""
+        return self._finished.wait(timeout)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def render(self, path: str, start_s: float = 0.0,
+               end_s: Optional[float] = None) -> int:
+        """
+        Dry-run: recorre la línea de tiempo sin dispositivo ni esperas y
+        escribe el flujo de reportes producido en `path`.
+
+        Returns:
+            Número de reportes escritos
+        """
+        end_s = self._timeline.duration_s if end_s is None else end_s
+        self._last_sent[:] = -1
+        period = self.clock.period
+        n_ticks = int(round((end_s - start_s) / period))
+
+        with open(path, "w") as f:
+            sink = VSLReportFileSink(f)
+            for tick in range(n_ticks + 1):
+                sink.time_s = start_s + tick * period
+                self.step(sink.time_s, sink)
+        return sink.reports
+
+    def get_stats(self) -> Dict[str, float]:
+        stats = self.clock.get_jitter_stats()
+        samples = sorted(self._tick_s)
+        n = len(samples)
+        tick_p50_s = samples[n // 2] if samples else 0.0
+        tick_p99_s = samples[min(n - 1, int(n * 0.99))] if samples else 0.0
+        stats.update({"lanes": len(self._timeline),
+                      "steps": self.ticks,
+                      "packets_sent": self.packets_sent,
+                      "tick_p50_us": tick_p50_s * 1e6,
+                      "tick_p99_us": tick_p99_s * 1e6,
+                      "max_tick_us": self.max_tick_s * 1e6,
+                      "budget_us": self.clock.period * 1e6})
+        return stats
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    from vsl_config import GAIN_CH1, FREQ_HPF_CH1
+
+    print("=== Tests de vsl_automation.py ===\n")
+
+    # Test 1: Evaluación de segmentos lineales y exponenciales
+    print("Test 1: Interpolación de segmentos")
+    lane_gain = VSLLane(GAIN_CH1, [VSLBreakpoint(0.0, 0.0), VSLBreakpoint(1.0, 1.0)])
+    lane_hpf = VSLLane(FREQ_HPF_CH1, [VSLBreakpoint(1.0, 20.0, CURVE_EXP),
+                                      VSLBreakpoint(3.0, 2000.0)])
+    timeline = VSLAutomationTimeline([lane_gain, lane_hpf])
+    for t, expected in ((-1.0, (0.0, 20.0)), (0.5, (0.5, 20.0)),
+                        (2.0, (1.0, 200.0)), (5.0, (1.0, 2000.0))):
+        got = timeline.evaluate(t)
+        print(f"  t={t:4.1f}s → gain={got[0]:.3f} hpf={got[1]:8.2f} Hz")
+        assert np.allclose(got, expected), f"❌ Esperado {expected}"
+    print("  ✅ Lineal y exponencial correctos\n")
+
+    # Test 2: Cientos de carriles en tiempo real
+    print("Test 2: 400 carriles a 100 Hz durante 1 s")
+    rng = np.random.default_rng(42)
+    lanes = []
+    for i in range(360):
+        pts = np.sort(rng.uniform(0.0, 1.0, 6))
+        lanes.append(VSLLane(GAIN_CH1._replace(dsp_param_id=0x1A00 + i),
+                             [VSLBreakpoint(float(t), float(v)) for t, v in
+                              zip(np.concatenate([[0.0], pts, [1.0]]), rng.uniform(0, 1, 8))]))
+    for i in range(40):
+        lanes.append(VSLLane(FREQ_HPF_CH1._replace(dsp_param_id=0x2B00 + i),
+                             [VSLBreakpoint(0.0, 20.0, CURVE_EXP), VSLBreakpoint(1.0, 400.0)]))
+    big = VSLAutomationTimeline(lanes)
+
+    received = []
+    engine = VSLAutomationEngine(big, received.extend, report_id=0x01)
+    engine.play()
+    assert engine.wait(timeout=5.0), "❌ La reproducción no terminó"
+    engine.stop()
+    stats = engine.get_stats()
+    print(f"  Ticks: {stats['ticks']}  Overruns: {stats['overruns']}  "
+          f"Paquetes: {stats['packets_sent']}")
+    print(f"  Tick p50: {stats['tick_p50_us']:.0f} µs  p99: {stats['tick_p99_us']:.0f} µs  "
+          f"máx: {stats['max_tick_us']:.0f} µs de {stats['budget_us']:.0f} µs")
+    print(f"  Jitter p99: {stats['jitter_p99_us']:.0f} µs")
+    # Un tick lento suelto (el SO nos quitó la CPU) no es un fallo: se
+    # exige que el tick típico deje margen y que casi ninguno se pierda
+    assert stats["tick_p50_us"] < stats["budget_us"] / 2, "❌ El cálculo no deja margen en el periodo"
+    assert stats["overruns"] <= stats["ticks"] // 100, f"❌ {stats['overruns']} ticks perdidos"
+    print("  ✅ Cálculo dentro del periodo, sin ticks perdidos\n")
+
+    # Test 3: Dry-run a archivo
+    print("Test 3: Dry-run del flujo de reportes")
+    with tempfile.TemporaryDirectory() as tmp:
+        lanes_path = os.path.join(tmp, "show.json")
+        with open(lanes_path, "w") as f:
+            json.dump({"lanes": [{"param_id": "0x1A01",
+                                  "points": [[0.0, 0.0], [0.5, 1.0, "linear"]]}]}, f)
+        show = VSLAutomationTimeline(load_lanes(lanes_path, {GAIN_CH1.dsp_param_id: GAIN_CH1}))
+        dry = VSLAutomationEngine(show, lambda pkts: None, report_id=0x01)
+        out_path = os.path.join(tmp, "show.reports")
+        written = dry.render(out_path)
+        with open(out_path) as f:
+            lines = f.read().splitlines()
+    print(f"  {written} reportes escritos, primero: {lines[0][:30]}...")
+    # 51 ticks, pero solo se envían los ticks en que el entero cambió
+    assert written == len(lines) and 1 < written <= 51, "❌ Número de reportes incorrecto"
+    assert lines[-1].split()[1].startswith("01011affff"), "❌ Último reporte incorrecto"
+    print("  ✅ Dry-run correcto")
@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+"""
+VSL-DSP Benchmark Suite
+Mediciones repetibles de los caminos calientes de la PoC.
+
+Cada caso prepara sus datos con un generador de semilla fija, se
+calienta `warmup` veces y se cronometra `repeat` veces; el resultado es
+el tiempo por operación (mediana, mínimo, máximo, desviación). Los
+resultados se guardan en JSON para compararlos entre ejecuciones; una
+comparación con una línea base falla si el mínimo de algún caso empeora
+más que el umbral. Los casos con presupuesto absoluto (budget_ms) fallan
+además si su mínimo lo supera. Los casos startup.* solo registran el
+tiempo de arranque de la CLI; el tope lo comprueba vsl_startup.py.
+
+Uso:
+    python3 vsl_bench.py --output actual.json
+    python3 vsl_bench.py --baseline base.json --threshold 0.15
+    python3 vsl_bench.py --filter core. --repeat 20
+    python3 vsl_bench.py --filter startup.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from vsl_config import GAIN_CH1, FREQ_HPF_CH1, VSL_PACKET_SIZE
+from vsl_core import (
+    NUMPY_AVAILABLE,
+    vsl_encode_gain,
+    vsl_map_frequency,
+    vsl_final_encode_to_int,
+    vsl_encode_user_value,
+    vsl_decode_user_value,
+    vsl_encode_gain_batch,
+    vsl_map_frequency_batch,
+    vsl_final_encode_to_int_batch,
+    vsl_param_arrays,
+    vsl_encode_user_values_batch,
+    vsl_decode_user_values_batch,
+)
+from vsl_transport import VSLPacket
+
+
+RESULTS_VERSION = 1
+DEFAULT_SEED = 0x5EED
+DEFAULT_WARMUP = 3
+DEFAULT_REPEAT = 10
+DEFAULT_THRESHOLD = 0.15   # +15% sobre la línea base
+
+# El mínimo de las repeticiones es lo más estable entre ejecuciones: el
+# ruido del sistema (planificador, frecuencia de CPU) solo suma tiempo
+COMPARE_STAT = "min_ns"
+
+BENCH_REPORT_ID = 0x01
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_CAPTURES = ("vsl_capture.pcap", "vsl_official_capture.pcap",
+                    "vsl_official_complete.pcap")
+
+# Cuerpo cronometrado y limpieza opcional devueltos por el setup de un caso
+TimedBody = Callable[[], Any]
+SetupResult = Any   # TimedBody o (TimedBody, cleanup)
+
+
+class BenchCase(NamedTuple):
+    name: str
+    setup: Callable[[random.Random], SetupResult]
+    ops: int                                  # Operaciones por llamada al cuerpo
+    requires: Optional[Callable[[], bool]]    # None = siempre disponible
+    reason: str                               # Motivo si no está disponible
+    budget_ns: Optional[float]                # Tope absoluto por operación (None = sin tope)
+
+
+_CASES: Dict[str, BenchCase] = {}
+
+
+def bench_case(name: str, ops: int = 1,
+               requires: Optional[Callable[[], bool]] = None,
+               reason: str = "",
+               budget_ms: Optional[float] = None):
+    """
+    Registra un caso de benchmark (decorador sobre su función de setup).
+
+    Con budget_ms el caso falla si el mínimo por operación lo supera.
+    """
+    budget_ns = budget_ms * 1e6 if budget_ms is not None else None
+
+    def decorator(setup: Callable[[random.Random], SetupResult]):
+        if name in _CASES:
+            raise ValueError(f"Caso duplicado: {name}")
+        _CASES[name] = BenchCase(name, setup, ops, requires, reason, budget_ns)
+        return setup
+    return decorator
+
+
+def list_cases() -> List[str]:
+    return sorted(_CASES)
+
+
+# ============================================================================
+# CASOS: vsl_core
+# ============================================================================
+
+_SCALAR_N = 1000
+_BATCH_N = 4096
+
+
+def _has_numpy() -> bool:
+    return NUMPY_AVAILABLE
+
+
+def _has_scapy() -> bool:
+    return importlib.util.find_spec("scapy") is not None
+
+
+@bench_case("core.encode_gain", ops=_SCALAR_N)
+def _bench_encode_gain(rng: random.Random) -> TimedBody:
+    values = [rng.random() for _ in range(_SCALAR_N)]
+
+    def body():
+        for v in values:
+            vsl_final_encode_to_int(vsl_encode_gain(v, GAIN_CH1), GAIN_CH1)
+    return body
+
+
+@bench_case("core.map_frequency", ops=_SCALAR_N)
+def _bench_map_frequency(rng: random.Random) -> TimedBody:
+    values = [rng.random() for _ in range(_SCALAR_N)]
+
+    def body():
+        for v in values:
+            vsl_map_frequency(v, FREQ_HPF_CH1)
+    return body
+
+
+@bench_case("core.encode_user_value", ops=_SCALAR_N)
+def _bench_encode_user_value(rng: random.Random) -> TimedBody:
+    values = [(rng.uniform(20.0, 20000.0), FREQ_HPF_CH1) if rng.random() < 0.5
+              else (rng.random(), GAIN_CH1) for _ in range(_SCALAR_N)]
+
+    def body():
+        for v, param in values:
+            vsl_encode_user_value(v, param)
+    return body
+
+
+@bench_case("core.decode_user_value", ops=_SCALAR_N)
+def _bench_decode_user_value(rng: random.Random) -> TimedBody:
+    values = [(rng.randrange(65536), rng.choice((GAIN_CH1, FREQ_HPF_CH1)))
+              for _ in range(_SCALAR_N)]
+
+    def body():
+        for v, param in values:
+            vsl_decode_user_value(v, param)
+    return body
+
+
+@bench_case("core.encode_gain_batch", ops=_BATCH_N,
+            requires=_has_numpy, reason="NumPy no disponible")
+def _bench_encode_gain_batch(rng: random.Random) -> TimedBody:
+    import numpy as np
+    values = np.array([rng.random() for _ in range(_BATCH_N)])
+
+    def body():
+        vsl_final_encode_to_int_batch(vsl_encode_gain_batch(values, GAIN_CH1), GAIN_CH1)
+    return body
+
+
+@bench_case("core.map_frequency_batch", ops=_BATCH_N,
+            requires=_has_numpy, reason="NumPy no disponible")
+def _bench_map_frequency_batch(rng: random.Random) -> TimedBody:
+    import numpy as np
+    values = np.array([rng.random() for _ in range(_BATCH_N)])
+
+    def body():
+        vsl_map_frequency_batch(values, FREQ_HPF_CH1)
+    return body
+
+
+@bench_case("core.user_values_batch", ops=_BATCH_N,
+            requires=_has_numpy, reason="NumPy no disponible")
+def _bench_user_values_batch(rng: random.Random) -> TimedBody:
+    params = [rng.choice((GAIN_CH1, FREQ_HPF_CH1)) for _ in range(_BATCH_N)]
+    coeffs = vsl_param_arrays(params)
+    ints = [rng.randrange(65536) for _ in range(_BATCH_N)]
+
+    def body():
+        user = vsl_decode_user_values_batch(ints, params, coeffs)
+        vsl_encode_user_values_batch(user, params, coeffs)
+    return body
+
+
+# ============================================================================
+# CASOS: vsl_transport y analizador
+# ============================================================================
+
+@bench_case("transport.packet_build", ops=_SCALAR_N)
+def _bench_packet_build(rng: random.Random) -> TimedBody:
+    pairs = [(rng.randrange(65536), rng.randrange(65536)) for _ in range(_SCALAR_N)]
+
+    def body():
+        for param_id, value in pairs:
+            VSLPacket(param_id, value, report_id=BENCH_REPORT_ID)
+    return body
+
+
+@bench_case("transport.packet_validate", ops=_SCALAR_N)
+def _bench_packet_validate(rng: random.Random) -> TimedBody:
+    packets = [VSLPacket(rng.randrange(65536), rng.randrange(65536),
+                         report_id=BENCH_REPORT_ID) for _ in range(_SCALAR_N)]
+
+    def body():
+        for packet in packets:
+            packet.validate()
+    return body
+
+
+@bench_case("analyzer.decode_vsl_packet", ops=_SCALAR_N)
+def _bench_decode_vsl_packet(rng: random.Random) -> TimedBody:
+    from vsl_protocol_analyzer import decode_vsl_packet
+    param_ids = (0x1A01, 0x2B05, 0x0000)
+    payloads = [VSLPacket(rng.choice(param_ids), rng.randrange(65536),
+                          report_id=BENCH_REPORT_ID).buffer
+                for _ in range(_SCALAR_N)]
+
+    def body():
+        for data in payloads:
+            decode_vsl_packet(data)
+    return body
+
+
+def _registry_sample(rng: random.Random) -> Tuple[List[int], List[int]]:
+    from vsl_param_registry import get_param_registry
+    registry = get_param_registry()
+    known = [i for i in range(0x10000) if registry.get(i) is not None]
+    ids = [rng.choice(known) for _ in range(_BATCH_N)]
+    return ids, [rng.randrange(65536) for _ in ids]
+
+
+@bench_case("registry.decode", ops=_BATCH_N)
+def _bench_registry_decode(rng: random.Random) -> TimedBody:
+    from vsl_param_registry import get_param_registry
+    decode = get_param_registry().decode
+    pairs = list(zip(*_registry_sample(rng)))
+
+    def body():
+        for param_id, value in pairs:
+            decode(param_id, value)
+    return body
+
+
+@bench_case("registry.decode_batch", ops=_BATCH_N,
+            requires=_has_numpy, reason="NumPy no disponible")
+def _bench_registry_decode_batch(rng: random.Random) -> TimedBody:
+    import numpy as np
+    from vsl_param_registry import get_param_registry
+    registry = get_param_registry()
+    ids, values = (np.array(column) for column in _registry_sample(rng))
+    registry.decode_batch(ids[:1], values[:1])      # Construye las tablas fuera del cronómetro
+    return lambda: registry.decode_batch(ids, values)
+
+
+def _strip_updates(rng: random.Random):
+    import numpy as np
+    from vsl_channel_strip import VSLChannelStrip
+    strip = VSLChannelStrip(0x0103, lambda packets: None, report_id=BENCH_REPORT_ID)
+    gains = np.array([rng.random() for _ in range(strip.channels)])
+    return strip, gains
+
+
+@bench_case("strip.apply[18ch]", ops=1,
+            requires=_has_numpy, reason="NumPy no disponible")
+def _bench_strip_apply_all(rng: random.Random) -> TimedBody:
+    strip, gains = _strip_updates(rng)
+    return lambda: strip.apply({"gain": gains, "hpf": 80.0})
+
+
+@bench_case("strip.apply[1ch]", ops=1,
+            requires=_has_numpy, reason="NumPy no disponible")
+def _bench_strip_apply_one(rng: random.Random) -> TimedBody:
+    strip, gains = _strip_updates(rng)
+    return lambda: strip.apply({"gain": gains[:1], "hpf": 80.0}, channels=[1])
+
+
+def _register_capture_case(capture: str):
+    path = os.path.join(BENCH_DIR, capture)
+
+    @bench_case(f"analyzer.analyze_pcap[{capture}]", ops=1,
+                requires=lambda: _has_scapy() and os.path.exists(path),
+                reason="scapy no disponible o captura ausente")
+    def _bench_analyze_pcap(rng: random.Random) -> TimedBody:
+        from vsl_protocol_analyzer import analyze_pcap
+        return lambda: analyze_pcap(path)
+
+
+for _capture in BUNDLED_CAPTURES:
+    _register_capture_case(_capture)
+
+
+# ============================================================================
+# CASOS: envío contra el dispositivo simulado
+# ============================================================================
+
+_SEND_N = 2000
+
+
+@bench_case("send.queue_fake_device", ops=_SEND_N)
+def _bench_send_queue(rng: random.Random) -> Tuple[TimedBody, Callable[[], None]]:
+    from vsl_fake_device import FakeVSLHandle
+    from vsl_send_queue import VSLSendQueue, VSLPriority
+
+    # drop_rate=1.0: sin ecos, este caso no tiene lector
+    handle = FakeVSLHandle(latency_s=0.0, drop_rate=1.0)
+    queue = VSLSendQueue(lambda p: handle.write(p.buffer) == VSL_PACKET_SIZE)
+    queue.start()
+    packets = [VSLPacket(0x1A01, rng.randrange(65536), report_id=BENCH_REPORT_ID)
+               for _ in range(_SEND_N)]
+
+    def body():
+        queue.submit_batch(packets, VSLPriority.BULK)
+        queue.flush()
+
+    return body, lambda: queue.stop(drain=False)
+
+
+@bench_case("send.pipeline_fake_device", ops=_SEND_N)
+def _bench_send_pipeline(rng: random.Random) -> Tuple[TimedBody, Callable[[], None]]:
+    from vsl_fake_device import FakeVSLHandle
+    from vsl_pipeline import VSLPipeline
+
+    handle = FakeVSLHandle(latency_s=0.0, seed=rng.randrange(2**32))
+    pipeline = VSLPipeline(handle, window=8)
+    pipeline.start()
+    # Claves distintas dentro de la ventana para no serializar por clave
+    packets = [VSLPacket(0x1A00 + (i % 64), rng.randrange(65536),
+                         report_id=BENCH_REPORT_ID) for i in range(_SEND_N)]
+
+    def body():
+        for packet in packets:
+            pipeline.submit(packet)
+        pipeline.flush()
+
+    return body, pipeline.stop
+
+
+@bench_case("send.device_send_packet", ops=_SEND_N)
+def _bench_device_send_packet(rng: random.Random) -> Tuple[TimedBody, Callable[[], None]]:
+    from vsl_fake_device import FakeVSLHandle
+    from vsl_hid_io import VSLDevice
+
+    VSLDevice.release()
+    device = VSLDevice(handle_factory=lambda: FakeVSLHandle(latency_s=0.0, drop_rate=1.0))
+    device.open()
+    packets = [VSLPacket(0x1A01, rng.randrange(65536), report_id=BENCH_REPORT_ID)
+               for _ in range(_SEND_N)]
+
+    def body():
+        device.send_packets(packets)
+
+    return body, VSLDevice.release
+
+
+# ============================================================================
+# CASOS: métricas
+# ============================================================================
+
+@bench_case("metrics.record_write", ops=_SCALAR_N)
+def _bench_metrics_record_write(rng: random.Random) -> TimedBody:
+    from vsl_metrics import VSLMetrics
+    metrics = VSLMetrics()
+    samples = [(0x1A00 + rng.randrange(16), rng.uniform(0.0001, 0.002))
+               for _ in range(_SCALAR_N)]
+
+    def body():
+        for param_id, latency in samples:
+            metrics.record_write(param_id, VSL_PACKET_SIZE, latency)
+    return body
+
+
+# ============================================================================
+# CASOS: base de datos de parámetros
+# ============================================================================
+
+@bench_case("param_db.load_cached", ops=1)
+def _bench_param_db_load(rng: random.Random) -> SetupResult:
+    from vsl_param_db import DEFAULT_DB_PATH, load_param_db
+    tmp = tempfile.TemporaryDirectory()
+    cache_path = os.path.join(tmp.name, "vsl_params.vslpdb")
+    load_param_db(DEFAULT_DB_PATH, cache_path).close()
+
+    def body():
+        load_param_db(DEFAULT_DB_PATH, cache_path).close()
+    return body, tmp.cleanup
+
+
+@bench_case("param_db.compile", ops=1)
+def _bench_param_db_compile(rng: random.Random) -> TimedBody:
+    from vsl_param_db import DEFAULT_DB_PATH, compile_param_db
+    with open(DEFAULT_DB_PATH, encoding="utf-8") as f:
+        source = json.load(f)
+    return lambda: compile_param_db(source)
+
+
+# ============================================================================
+# CASOS: arranque de la CLI
+# ============================================================================
+
+# Proceso completo, intérprete incluido: sirven para detectar regresiones
+# contra una línea base. El tope de lo que añade la CLI sobre
+# startup.interpreter es un test aparte (vsl_startup.py)
+CLI_PATH = os.path.join(BENCH_DIR, "vsl_cli.py")
+
+
+def _register_startup_case(name: str, argv: List[str]):
+    @bench_case(name, ops=1)
+    def _bench_cli_help(rng: random.Random) -> TimedBody:
+        # Se mide con la caché de bytecode activa (como en una instalación
+        # normal); el calentamiento genera los .pyc si faltan
+        env = dict(os.environ)
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+        def body():
+            subprocess.run(argv, stdout=subprocess.DEVNULL, env=env, check=True)
+        return body
+
+
+_register_startup_case("startup.interpreter", [sys.executable, "-c", "pass"])
+# bench queda fuera: importa todos los módulos que mide y no es un wrapper
+for _subcommand in (None, "analyze", "config", "enumerate", "poc"):
+    _register_startup_case(
+        f"startup.cli_help[{_subcommand}]" if _subcommand else "startup.cli_help",
+        [sys.executable, CLI_PATH] + ([_subcommand] if _subcommand else []) + ["--help"])
+
+
+# ============================================================================
+# EJECUCIÓN
+# ============================================================================
+
+def run_case(case: BenchCase, seed: int = DEFAULT_SEED,
+             warmup: int = DEFAULT_WARMUP,
+             repeat: int = DEFAULT_REPEAT) -> Dict[str, Any]:
+    """
+    Ejecuta un caso y retorna sus estadísticas en nanosegundos por operación.
+
+    Si el caso no está disponible retorna {"skipped": motivo}.
+    """
+    if repeat < 1:
+        raise ValueError("repeat debe ser >= 1")
+    if case.requires is not None and not case.requires():
+        return {"skipped": case.reason}
+
+    setup = case.setup(random.Random(f"{seed}:{case.name}"))
+    body, cleanup = setup if isinstance(setup, tuple) else (setup, None)
+    try:
+        for _ in range(warmup):
+            body()
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter_ns()
+            body()
+            samples.append((time.perf_counter_ns() - t0) / case.ops)
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+    median = statistics.median(samples)
+    result = {
+        "ops": case.ops,
+        "repeat": repeat,
+        "median_ns": median,
+        "min_ns": min(samples),
+        "max_ns": max(samples),
+        "stdev_ns": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "ops_per_s": 1e9 / median if median > 0 else 0.0,
+    }
+    if case.budget_ns is not None:
+        result["budget_ns"] = case.budget_ns
+        result["over_budget"] = result["min_ns"] > case.budget_ns
+    return result
+
+
+def run_benchmarks(names: Optional[Sequence[str]] = None,
+                   pattern: Optional[str] = None,
+                   seed: int = DEFAULT_SEED,
+                   warmup: int = DEFAULT_WARMUP,
+                   repeat: int = DEFAULT_REPEAT,
+                   verbose: bool = False) -> Dict[str, Any]:
+    """
+    Ejecuta los casos seleccionados.
+
+    Args:
+        names: Casos a ejecutar (None = todos)
+        pattern: Subcadena que deben contener los nombres
+        verbose: Imprimir cada resultado al terminarlo
+
+    Returns:
+        Documento de resultados (ver save_results)
+
+    Raises:
+        ValueError: Si algún nombre no corresponde a un caso registrado
+    """
+    selected = list(names) if names is not None else list_cases()
+    unknown = [n for n in selected if n not in _CASES]
+    if unknown:
+        raise ValueError(f"Casos desconocidos: {', '.join(unknown)}")
+    if pattern:
+        selected = [n for n in selected if pattern in n]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in selected:
+        results[name] = run_case(_CASES[name], seed, warmup, repeat)
+        if verbose:
+            print(format_result(name, results[name]))
+
+    return {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": NUMPY_AVAILABLE,
+        "seed": seed,
+        "warmup": warmup,
+        "results": results,
+    }
+
+
+def format_result(name: str, result: Dict[str, Any]) -> str:
+    if "skipped" in result:
+        return f"  {name:<50} ⏭️  {result['skipped']}"
+    line = (f"  {name:<50} {result['median_ns']:>12,.1f} ns/op "
+            f"(mín {result['min_ns']:,.1f})  {result['ops_per_s']:>14,.0f} op/s")
+    if "budget_ns" in result:
+        mark = "❌" if result["over_budget"] else "✅"
+        line += f"  {mark} tope {result['budget_ns'] / 1e6:,.0f} ms"
+    return line
+
+
+def over_budget(doc: Dict[str, Any]) -> List[str]:
+    """Casos cuyo mínimo superó su presupuesto absoluto."""
+    return [name for name, result in doc["results"].items()
+            if result.get("over_budget")]
+
+
+def save_results(doc: Dict[str, Any], path: str):
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    """
+    Raises:
+        ValueError: Si el archivo no es un documento de resultados soportado
+    """
+    with open(path) as f:
+        doc = json.load(f)
+    if doc.get("version") != RESULTS_VERSION or "results" not in doc:
+        raise ValueError(f"Resultados no soportados: {path}")
+    return doc
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any],
+                    threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[str, float, float, float]]:
+    """
+    Compara dos documentos de resultados por COMPARE_STAT.
+
+    Solo se comparan los casos medidos en ambos.
+
+    Returns:
+        Lista de regresiones (nombre, base_ns, actual_ns, cambio relativo)
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or "skipped" in base or "skipped" in result:
+            continue
+        change = result[COMPARE_STAT] / base[COMPARE_STAT] - 1.0
+        if change > threshold:
+            regressions.append((name, base[COMPARE_STAT], result[COMPARE_STAT], change))
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de la PoC VSL-DSP")
+    parser.add_argument("--filter", dest="pattern", help="Subcadena del nombre del caso")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--output", help="Guardar resultados en este JSON")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Empeoramiento relativo tolerado (0.15 = 15%%)")
+    parser.add_argument("--list", action="store_true", help="Listar los casos")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in list_cases():
+            print(name)
+        return 0
+
+    baseline = load_results(args.baseline) if args.baseline else None
+
+    print(f"🏁 Benchmarks VSL-DSP (seed={args.seed}, warmup={args.warmup}, "
+          f"repeat={args.repeat})")
+    doc = run_benchmarks(pattern=args.pattern, seed=args.seed, warmup=args.warmup,
+                         repeat=args.repeat, verbose=True)
+
+    if args.output:
+        save_results(doc, args.output)
+        print(f"\n✅ Resultados guardados en: {args.output}")
+
+    status = 0
+    exceeded = over_budget(doc)
+    if exceeded:
+        print(f"\n❌ {len(exceeded)} caso(s) por encima de su presupuesto: "
+              f"{', '.join(exceeded)}")
+        status = 1
+
+    if baseline is not None:
+        regressions = compare_results(baseline, doc, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regresión(es) sobre {args.baseline}:")
+            for name, base_ns, cur_ns, change in regressions:
+                print(f"  {name}: {base_ns:,.1f} → {cur_ns:,.1f} ns/op ({change:+.0%})")
+            return 1
+        print(f"\n✅ Sin regresiones por encima de {args.threshold:.0%}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""
+VSL-DSP Channel Strip Module
+Operaciones por tira de canal sobre todas las entradas de un modelo.
+
+Los param_id de cada control (gain, hpf...) y canal se resuelven una vez
+desde la tabla del modelo en la base de datos de parámetros, junto con un
+codificador precalculado por curva (vsl_user_value_encoder) y sus
+coeficientes para la ruta NumPy. Una operación recibe valores de usuario
+(uno por canal, o un escalar para todos) y entrega todos los paquetes
+resultantes al `sender` en un único lote, en lugar de una codificación y
+un envío por parámetro.
+
+Con los tamaños de una tira (18 canales x unos pocos controles) el coste
+fijo de cada operación NumPy domina, así que los lotes pequeños se
+codifican con los codificadores escalares; a partir de VECTOR_MIN_PARAMS
+se usa vsl_encode_user_values_batch. El coste de una operación es el de
+un envío más un par de µs por parámetro.
+
+Requiere NumPy.
+"""
+
+import functools
+import operator
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vsl_core import vsl_encode_user_values_batch, vsl_user_value_encoder
+from vsl_param_db import KIND_GAIN, KIND_FREQUENCY, VSLParamDB, get_param_db
+from vsl_param_registry import VSLParamRegistry, get_param_registry
+from vsl_transport import VSLPacket, build_packets
+
+# Valores de usuario por control: escalar (todos los canales) o uno por canal
+StripValues = Mapping[str, object]
+
+# Tipos que codifica vsl_core; el resto pasa por el registro
+_CURVE_KINDS = (KIND_GAIN, KIND_FREQUENCY)
+
+# Parámetros por operación a partir de los que compensa la ruta NumPy
+VECTOR_MIN_PARAMS = 256
+
+_SCALAR_TYPES = (int, float, np.number)
+
+
+class _ControlPlan(NamedTuple):
+    """Resolución precalculada de un control."""
+    ids: np.ndarray           # param_id por canal (-1 = sin el control)
+    coeffs: np.ndarray        # Coeficientes por canal, forma (8, canales + 1)
+    present: np.ndarray       # param_id de los canales que tienen el control
+    present_coeffs: np.ndarray
+    curve: bool               # Todos los canales usan gain/frequency
+    id_list: List[int]        # Lo mismo que ids/present, como listas de Python
+    present_list: List[int]
+    encoders: List[Optional[Callable[[float], int]]]   # Por canal
+    present_encoders: List[Callable[[float], int]]
+    shared_encoder: Optional[Callable[[float], int]]   # Si todos comparten curva
+
+
+class VSLChannelStrip:
+    """
+    Controles por canal de un modelo.
+
+    El envío se delega en `sender`, que recibe la lista de paquetes del
+    lote. Ejemplos:
+        VSLChannelStrip(unit.model.pid, unit.submit_batch)
+        VSLChannelStrip(0x0103, device.send_packets, report_id=0x01)
+    """
+
+    def __init__(self, model_pid: int,
+                 sender: Callable[[List[VSLPacket]], object],
+                 report_id: Optional[int] = None,
+                 db: Optional[VSLParamDB] = None,
+                 registry: Optional[VSLParamRegistry] = None):
+        """
+        Args:
+            model_pid: Product ID del modelo (tabla de vsl_params.json)
+            sender: Función que envía un lote de paquetes
+            report_id: Report ID de los paquetes (None usa VSL_REPORT_ID)
+            db: Base de datos de parámetros (None = la compartida)
+            registry: Registro por param_id (None = el compartido)
+
+        Raises:
+            KeyError: Si el modelo no tiene tabla de parámetros
+        """
+        db = db or get_param_db()
+        self._registry = registry or get_param_registry()
+        self._sender = sender
+        self._report_id = report_id
+        self.model_pid = model_pid
+
+        by_control: Dict[str, List[Tuple[int, int]]] = {}
+        for spec in db.table(model_pid):
+            if not spec.control or spec.channel == 0:
+                continue                  # Parámetros globales, no de tira
+            # Idempotente si el registro ya viene de la misma base de datos
+            self._registry.register(spec.param, spec.name, spec.kind)
+            by_control.setdefault(spec.control, []).append((spec.channel, spec.param.dsp_param_id))
+
+        self.channels = max((ch for rows in by_control.values() for ch, _ in rows), default=0)
+        # Por control: param_id indexado por canal, codificadores y coeficientes,
+        # resueltos una sola vez para no repetirlos en cada operación
+        self._plans: Dict[str, _ControlPlan] = {}
+        shared: Dict[tuple, Callable[[float], int]] = {}
+        for control, rows in by_control.items():
+            ids = np.full(self.channels + 1, -1, dtype=np.intp)
+            encoders: List[Optional[Callable[[float], int]]] = [None] * (self.channels + 1)
+            for channel, param_id in rows:
+                ids[channel] = param_id
+                entry = self._registry.get(param_id)
+                if entry.kind in _CURVE_KINDS:
+                    # Canales con la misma curva comparten codificador
+                    key = (entry.kind,) + tuple(entry.param[1:])
+                    if key not in shared:
+                        shared[key] = vsl_user_value_encoder(entry.param)
+                    encoders[channel] = shared[key]
+                else:
+                    encoders[channel] = functools.partial(self._registry.encode, param_id)
+            mask = ids >= 0
+            kinds, coeffs = self._registry.columns(np.where(mask, ids, 0))
+            coeffs[:, ~mask] = 0.0
+            present_encoders = [e for e in encoders if e is not None]
+            single = present_encoders[0] if present_encoders else None
+            self._plans[control] = _ControlPlan(
+                ids, coeffs, ids[mask], np.ascontiguousarray(coeffs[:, mask]),
+                bool(np.isin(kinds[mask], _CURVE_KINDS).all()),
+                ids.tolist(), ids[mask].tolist(), encoders, present_encoders,
+                single if all(e is single for e in present_encoders) else None)
+
+    @property
+    def controls(self) -> Tuple[str, ...]:
+        return tuple(self._plans)
+
+    def channels_of(self, control: str) -> np.ndarray:
+        """Canales (1..N) que tienen el control."""
+        return np.flatnonzero(self._plan(control).ids >= 0)
+
+    def _plan(self, control: str) -> _ControlPlan:
+        try:
+            return self._plans[control]
+        except KeyError:
+            raise KeyError(f"Control desconocido para 0x{self.model_pid:04X}: {control}") from None
+
+    def _channel_list(self, channels) -> Optional[List[int]]:
+        if channels is None:
+            return None
+        if isinstance(channels, np.ndarray):
+            channels = channels.reshape(-1).tolist()
+        else:
+            channels = [operator.index(ch) for ch in channels]
+        if channels and (min(channels) < 1 or max(channels) > self.channels):
+            raise ValueError(f"Canal fuera de rango (1..{self.channels})")
+        return channels
+
+    def _select(self, control: str, channels: Optional[List[int]]):
+        """(plan, param_ids) del control en los canales indicados."""
+        plan = self._plan(control)
+        if channels is None:
+            return plan, plan.present_list
+        id_list = plan.id_list
+        selected = [id_list[ch] for ch in channels]
+        if -1 in selected:
+            missing = [ch for ch, pid in zip(channels, selected) if pid < 0]
+            raise ValueError(f"{control}: los canales {missing} no tienen este control")
+        return plan, selected
+
+    def resolve(self, control: str, channels: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        param_id de un control en los canales indicados.
+
+        Args:
+            channels: Canales 1..N (None = todos los que tienen el control)
+
+        Raises:
+            KeyError: Si el control no existe en el modelo
+            ValueError: Si algún canal no existe o no tiene el control
+        """
+        return np.array(self._select(control, self._channel_list(channels))[1], dtype=np.intp)
+
+    # ------------------------------------------------------------------
+    # Operaciones
+    # ------------------------------------------------------------------
+
+    def _encode_lists(self, updates: StripValues,
+                      channels: Optional[List[int]]) -> Tuple[List[int], List[int]]:
+        """Ruta escalar: codificadores precalculados, sin pasar por NumPy."""
+        param_ids: List[int] = []
+        ints: List[int] = []
+        for control, values in updates.items():
+            plan, ids = self._select(control, channels)
+            if channels is None:
+                encoders = plan.present_encoders
+            else:
+                encoders = [plan.encoders[ch] for ch in channels]
+
+            if isinstance(values, np.ndarray) and values.ndim == 0:
+                values = values.item()
+            if isinstance(values, _SCALAR_TYPES):
+                value = float(values)
+                if plan.shared_encoder is not None:
+                    encoded = [plan.shared_encoder(value)] * len(ids)
+                else:
+                    encoded = [encoder(value) for encoder in encoders]
+            else:
+                if isinstance(values, np.ndarray):
+                    values = values.tolist() if values.ndim == 1 else [values]
+                if len(values) != len(ids):
+                    raise ValueError(f"{control}: se esperaban {len(ids)} valores, "
+                                     f"no {np.size(values)}")
+                encoded = [encoder(float(value)) for encoder, value in zip(encoders, values)]
+            param_ids += ids
+            ints += encoded
+        return param_ids, ints
+
+    def _encode_arrays(self, updates: StripValues,
+                       channels: Optional[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Ruta NumPy: una pasada vectorizada para todos los controles."""
+        id_parts = []
+        coeff_parts = []
+        value_parts = []
+        curve = True
+        for control, values in updates.items():
+            plan, _ = self._select(control, channels)
+            if channels is None:
+                ids, coeffs = plan.present, plan.present_coeffs
+            else:
+                ids, coeffs = plan.ids[channels], plan.coeffs[:, channels]
+            values = np.asarray(values, dtype=np.float64)
+            if values.ndim and values.shape != ids.shape:
+                raise ValueError(f"{control}: se esperaban {len(ids)} valores, "
+                                 f"no {values.size}")
+            id_parts.append(ids)
+            coeff_parts.append(coeffs)
+            value_parts.append(np.broadcast_to(values, ids.shape))
+            curve = curve and plan.curve
+        if not id_parts:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int64)
+        param_ids = np.concatenate(id_parts)
+        coeffs = np.concatenate(coeff_parts, axis=1)
+        values = np.concatenate(value_parts)
+        if curve:
+            return param_ids, vsl_encode_user_values_batch(values, None, coeffs)
+        return param_ids, self._registry.encode_batch(param_ids, values)
+
+    def _use_arrays(self, updates: StripValues, channels: Optional[List[int]]) -> bool:
+        if channels is not None:
+            return len(channels) * len(updates) >= VECTOR_MIN_PARAMS
+        return sum(len(self._plan(control).present_list)
+                   for control in updates) >= VECTOR_MIN_PARAMS
+
+    def encode(self, updates: StripValues,
+               channels: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Codifica varios controles en una sola pasada.
+
+        Args:
+            updates: Valores de usuario por control; cada uno es un escalar
+                (mismo valor en todos los canales) o un array por canal
+            channels: Canales a los que se aplican (None = todos)
+
+        Returns:
+            (param_ids, enteros codificados), en el orden de `updates` y
+            dentro de cada control por canal
+        """
+        channels = self._channel_list(channels)
+        if self._use_arrays(updates, channels):
+            return self._encode_arrays(updates, channels)
+        param_ids, ints = self._encode_lists(updates, channels)
+        return np.array(param_ids, dtype=np.intp), np.array(ints, dtype=np.int64)
+
+    def apply(self, updates: StripValues,
+              channels: Optional[Sequence[int]] = None) -> int:
+        """
+        Codifica y envía varios controles como un único lote.
+
+        Returns:
+            Número de paquetes entregados al sender
+        """
+        channels = self._channel_list(channels)
+        if self._use_arrays(updates, channels):
+            param_ids, ints = (a.tolist() for a in self._encode_arrays(updates, channels))
+        else:
+            param_ids, ints = self._encode_lists(updates, channels)
+        packets = build_packets(param_ids, ints, self._report_id)
+        if packets:
+            self._sender(packets)
+        return len(packets)
+
+    def set(self, control: str, values, channels: Optional[Sequence[int]] = None) -> int:
+        """Un solo control (ej: strip.set("gain", 0.75) en todos los canales)."""
+        return self.apply({control: values}, channels)
+
+    def __repr__(self) -> str:
+        return (f"VSLChannelStrip(model=0x{self.model_pid:04X}, channels={self.channels}, "
+                f"controls={list(self.controls)})")
+
+
+if __name__ == "__main__":
+    import time
+
+    from vsl_config import GAIN_CH1, FREQ_HPF_CH1
+    from vsl_core import vsl_encode_user_value
+
+    print("=== Tests de vsl_channel_strip.py ===\n")
+
+    batches: List[List[VSLPacket]] = []
+    strip = VSLChannelStrip(0x0103, batches.append, report_id=0x01)
+    print(f"  {strip}\n")
+
+    # Test 1: Todas las entradas del 1818 VSL en un lote
+    print("Test 1: gain + hpf en 18 canales")
+    gains = np.linspace(0.0, 1.0, strip.channels)
+    sent = strip.apply({"gain": gains, "hpf": 80.0})
+    packets = batches[-1]
+    assert len(batches) == 1 and sent == 36, "❌ Se esperaba un único lote de 36"
+    for ch in range(1, strip.channels + 1):
+        gain_param = GAIN_CH1._replace(dsp_param_id=0x1A00 + ch)
+        expected = vsl_encode_user_value(gains[ch - 1], gain_param)
+        assert (packets[ch - 1].param_id, packets[ch - 1].encoded_value) == \
+            (0x1A00 + ch, expected), f"❌ Canal {ch}"
+    hpf_int = vsl_encode_user_value(80.0, FREQ_HPF_CH1)
+    assert all(p.encoded_value == hpf_int for p in packets[18:]), "❌ Escalar no difundido"
+    print(f"  ✅ {sent} paquetes, valores idénticos a vsl_encode_user_value\n")
+
+    # Test 2: Subconjunto de canales y errores
+    print("Test 2: Canales concretos y validación")
+    strip.set("gain", [0.1, 0.2], channels=[3, 17])
+    assert [p.param_id for p in batches[-1]] == [0x1A03, 0x1A11], "❌ Canales"
+    small = VSLChannelStrip(0x0101, batches.append, report_id=0x01)
+    for call, exc in ((lambda: small.set("gain", 0.5, channels=[3]), ValueError),
+                      (lambda: small.set("pan", 0.5), KeyError),
+                      (lambda: small.set("gain", [0.1, 0.2, 0.3]), ValueError)):
+        try:
+            call()
+            raise AssertionError(f"❌ Se esperaba {exc.__name__}")
+        except exc as e:
+            print(f"  {exc.__name__}: {e}")
+    print("  ✅ Canal inexistente, control desconocido y longitud incorrecta\n")
+
+    # Test 3: Coste de todos los canales frente a uno y frente al bucle
+    print("Test 3: Coste por operación")
+
+    def timed(fn, n=300, rounds=5) -> float:
+        """Mejor de `rounds` tandas (el ruido del sistema solo suma tiempo)."""
+        fn()
+        best = float("inf")
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            for _ in range(n):
+                fn()
+            best = min(best, (time.perf_counter() - t0) / n * 1e6)
+        return best
+
+    noop = VSLChannelStrip(0x0103, lambda packets: None, report_id=0x01)
+    one_us = timed(lambda: noop.set("gain", 0.5, channels=[1]))
+    all_us = timed(lambda: noop.apply({"gain": gains, "hpf": 80.0}))
+
+    params = ([GAIN_CH1._replace(dsp_param_id=0x1A00 + ch) for ch in range(1, 19)]
+              + [FREQ_HPF_CH1._replace(dsp_param_id=0x2B04 + ch) for ch in range(1, 19)])
+    values = list(gains) + [80.0] * 18
+
+    def one_by_one():
+        for param, value in zip(params, values):
+            noop._sender([VSLPacket(param.dsp_param_id,
+                                    vsl_encode_user_value(value, param), report_id=0x01)])
+
+    loop_us = timed(one_by_one)
+    print(f"  1 canal:                {one_us:7.1f} µs")
+    print(f"  36 parámetros (lote):   {all_us:7.1f} µs ({all_us / 36:.1f} µs/parámetro)")
+    print(f"  36 parámetros (bucle):  {loop_us:7.1f} µs")
+    # El coste fijo de una operación no domina y el lote gana al bucle ingenuo
+    assert one_us < 0.25 * all_us, "❌ Coste fijo por operación excesivo"
+    assert all_us < 0.75 * loop_us, "❌ El lote no mejora el bucle por parámetro"
+    print("  ✅ Un envío por operación, coste fijo bajo\n")
+
+    # Test 4: Las rutas escalar y NumPy coinciden
+    print("Test 4: Ruta escalar frente a NumPy")
+    repeated = list(range(1, strip.channels + 1)) * 8
+    rng = np.random.default_rng(7)
+    updates = {"gain": rng.uniform(-0.1, 1.1, len(repeated)),
+               "hpf": rng.uniform(10.0, 25000.0, len(repeated))}
+    scalar_ids, scalar_ints = strip._encode_lists(updates, repeated)
+    array_ids, array_ints = strip._encode_arrays(updates, repeated)
+    assert scalar_ids == array_ids.tolist() and scalar_ints == array_ints.tolist(), \
+        "❌ Las rutas difieren"
+    assert strip._use_arrays(updates, repeated), "❌ Lote grande por la ruta escalar"
+    print(f"  ✅ {len(scalar_ints)} enteros idénticos (umbral NumPy: {VECTOR_MIN_PARAMS})")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+VSL-DSP Command Line Interface
+Punto de entrada único con subcomandos.
+
+    python3 vsl_cli.py poc                      Batería de validación de la PoC
+    python3 vsl_cli.py config                   Estado de la configuración
+    python3 vsl_cli.py enumerate                Dispositivos HID de audio conectados
+    python3 vsl_cli.py analyze captura.pcap     Analizador de tráfico (ver --help)
+    python3 vsl_cli.py bench --filter core.     Benchmarks (ver --help)
+    python3 vsl_cli.py verify --require-c       Verificación exhaustiva de curvas (ver --help)
+
+Este módulo solo importa argparse: cada subcomando importa su módulo al
+ejecutarse, de modo que `--help` no paga scapy, hidapi ni numpy. El
+tope de arranque lo comprueba el test de vsl_startup.py.
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+
+# ============================================================================
+# SUBCOMANDOS
+# ============================================================================
+
+def _cmd_poc(args: argparse.Namespace) -> int:
+    from vsl_poc_main import main as poc_main
+    return poc_main()
+
+
+def _cmd_config(args: argparse.Namespace) -> int:
+    from vsl_config import print_configuration_status, validate_configuration
+    print_configuration_status()
+    is_valid, _ = validate_configuration()
+    return 0 if is_valid else 1
+
+
+def _cmd_enumerate(args: argparse.Namespace) -> int:
+    from vsl_hid_io import HID_AVAILABLE, enumerate_vsl_devices
+    enumerate_vsl_devices()
+    return 0 if HID_AVAILABLE else 1
+
+
+# analyze, bench y verify tienen su propio parser: reciben el resto de argv tal
+# cual (incluido --help), sin pasar por el parser de este módulo
+
+def _cmd_analyze(argv: List[str]) -> int:
+    from vsl_protocol_analyzer import main as analyzer_main
+    return analyzer_main(argv)
+
+
+def _cmd_bench(argv: List[str]) -> int:
+    from vsl_bench import main as bench_main
+    return bench_main(argv)
+
+
+def _cmd_verify(argv: List[str]) -> int:
+    from vsl_verify import main as verify_main
+    return verify_main(argv)
+
+
+_FORWARDED = {"analyze": _cmd_analyze, "bench": _cmd_bench, "verify": _cmd_verify}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="vsl_cli.py",
+                                     description="Herramientas de la PoC VSL-DSP")
+    subparsers = parser.add_subparsers(dest="command", metavar="COMANDO")
+    subparsers.required = True
+
+    sub = subparsers.add_parser("poc", help="Batería de validación de la PoC")
+    sub.set_defaults(func=_cmd_poc)
+
+    sub = subparsers.add_parser("config", help="Estado de la configuración")
+    sub.set_defaults(func=_cmd_config)
+
+    sub = subparsers.add_parser("enumerate", help="Dispositivos HID de audio conectados")
+    sub.set_defaults(func=_cmd_enumerate)
+
+    # Solo para listarlos en --help (ver main)
+    subparsers.add_parser("analyze", help="Analizador de tráfico USB (pcap)")
+    subparsers.add_parser("bench", help="Benchmarks y presupuestos de rendimiento")
+    subparsers.add_parser("verify", help="Verificación exhaustiva de las curvas (Python y C)")
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in _FORWARDED:
+        return _FORWARDED[argv[0]](argv[1:])
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,7 +9,7 @@ Contiene todas las constantes y configuraciones del protocolo.
 """
 
 import sys
-from typing import NamedTuple
+from typing import NamedTuple, Optional
 
 # ============================================================================
 # CONSTANTES DEL PROTOCOLO (Confirmadas del Desensamblado)
@@ -57,6 +57,10 @@ class VSLParameter(NamedTuple):
 # BASE DE DATOS DE PARÁMETROS (Coeficientes de Prueba)
 # ============================================================================
 
+# Las tablas completas por modelo (todos los canales) están en
+# vsl_params.json y se cargan con vsl_param_db; estos dos son los del
+# canal 1, compartidos por los tres modelos.
+
 # Parámetro de Ganancia Canal 1 (Valores aproximados para testing)
 # NOTA: Estos coeficientes deben ser extraídos del constructor del driver
 GAIN_CH1 = VSLParameter(
@@ -85,6 +89,35 @@ FREQ_HPF_CH1 = VSLParameter(
 )
 
 
+# ============================================================================
+# MODELOS DE LA FAMILIA AUDIOBOX VSL (Espejo de audiobox_vsl.h)
+# ============================================================================
+
+# Vendor ID de PreSonus compartido por todos los modelos
+AUDIOBOX_VENDOR_ID = 0x194F
+
+
+class VSLModel(NamedTuple):
+    """Par PID / nombre canónico, igual que audiobox_model_info_t."""
+    pid: int
+    product_name: str
+
+
+AUDIOBOX_MODELS = (
+    VSLModel(0x0101, "AudioBox 22 VSL"),
+    VSLModel(0x0102, "AudioBox 44 VSL"),
+    VSLModel(0x0103, "AudioBox 1818 VSL"),
+)
+
+
+def lookup_model(pid: int) -> Optional[VSLModel]:
+    """Modelo correspondiente a un Product ID, o None si no es un VSL soportado."""
+    for model in AUDIOBOX_MODELS:
+        if model.pid == pid:
+            return model
+    return None
+
+
 # ============================================================================
 # VALIDACIÓN DE CONFIGURACIÓN
 # ============================================================================
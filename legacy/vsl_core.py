@@ -4,9 +4,15 @@ Implementa las funciones matemáticas de encoding/decoding.
 Traducción 1:1 del código C desensamblado.
 """
 
+import importlib.util
 import math
-from typing import Union
-from vsl_config import VSLParameter, VSL_MAX_ENCODED_FLOAT
+from typing import Callable, Optional, Sequence, Union
+from vsl_config import VSLParameter, VSL_MAX_ENCODED_FLOAT, VSL_INV_LN2
+
+# NumPy es opcional: solo lo requieren las variantes *_batch, que lo importan
+# en su primer uso (las funciones escalares no pagan su importación)
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+np = None
 
 
 # ============================================================================
@@ -163,6 +169,400 @@ def vsl_decode_frequency(freq_hz_value: float, param: VSLParameter) -> float:
     return (log2_current - log2_min) / log2_range
 
 
+def vsl_decode_gain(encoded_float: float, param: VSLParameter) -> float:
+    """
+    Inversa de vsl_encode_gain.
+    
+    Convierte un valor codificado de la curva exponencial a su valor
+    lineal (0.0 - 1.0).
+    
+    Fórmula:
+        linear = curve_min_map + range * ln((encoded - coeff_offset_A) / coeff_C1) / log_factor
+    
+    Args:
+        encoded_float: Valor codificado en float
+        param: Estructura de parámetros con coeficientes
+        
+    Returns:
+        Valor lineal clampeado a (0.0 a 1.0)
+    """
+    if not isinstance(param, VSLParameter):
+        raise ValueError("param debe ser instancia de VSLParameter")
+    
+    range_val = param.curve_max_map - param.curve_min_map
+    
+    if abs(range_val) < 1e-7 or abs(param.coeff_C1) < 1e-7 or abs(param.log_factor) < 1e-7:
+        return 0.0
+    
+    ratio = (encoded_float - param.coeff_offset_A) / param.coeff_C1
+    
+    # Por debajo del inicio de la curva (exp(x) > 0 siempre)
+    if ratio <= 0.0:
+        return 0.0
+    
+    linear = param.curve_min_map + range_val * math.log(ratio) / param.log_factor
+    
+    return max(0.0, min(linear, 1.0))
+
+
+def vsl_int_to_encoded_float(encoded_int: int, param: VSLParameter) -> float:
+    """
+    Inversa de vsl_final_encode_to_int.
+    
+    Args:
+        encoded_int: Valor entero del DSP (0 a max_encoded_int)
+        param: Estructura de parámetros con max_encoded_int
+        
+    Returns:
+        Valor codificado en float (0.0 a VSL_MAX_ENCODED_FLOAT)
+    """
+    if not isinstance(param, VSLParameter):
+        raise ValueError("param debe ser instancia de VSLParameter")
+    
+    if param.max_encoded_int == 0:
+        return 0.0
+    
+    clamped_int = max(0, min(encoded_int, param.max_encoded_int))
+    
+    return clamped_int * VSL_MAX_ENCODED_FLOAT / param.max_encoded_int
+
+
+# ============================================================================
+# VALOR DE USUARIO ↔ ENTERO DEL DSP
+# ============================================================================
+
+def is_frequency_parameter(param: VSLParameter) -> bool:
+    """Un parámetro con rango de frecuencia se expresa en Hz (ver validate_parameter)."""
+    return param.freq_max_hz > 0.0
+
+
+def vsl_encode_user_value(user_value: float, param: VSLParameter) -> int:
+    """
+    Codifica un valor de usuario al entero que viaja en el paquete HID.
+    
+    - Ganancia: user_value es lineal (0.0 - 1.0) → vsl_encode_gain → int
+    - Frecuencia: user_value en Hz → posición lineal → int (posición * max)
+    
+    Returns:
+        Valor entero (0 a max_encoded_int)
+    """
+    if is_frequency_parameter(param):
+        position = vsl_decode_frequency(user_value, param)
+        return int(round(position * param.max_encoded_int))
+    
+    return vsl_final_encode_to_int(vsl_encode_gain(user_value, param), param)
+
+
+def vsl_decode_user_value(encoded_int: int, param: VSLParameter) -> float:
+    """
+    Inversa de vsl_encode_user_value.
+    
+    Returns:
+        Valor lineal (0.0 - 1.0) para ganancia o frecuencia en Hz
+    """
+    if is_frequency_parameter(param):
+        if param.max_encoded_int == 0:
+            return param.freq_min_hz
+        position = max(0, min(encoded_int, param.max_encoded_int)) / param.max_encoded_int
+        return vsl_map_frequency(position, param)
+    
+    return vsl_decode_gain(vsl_int_to_encoded_float(encoded_int, param), param)
+
+
+def vsl_user_value_encoder(param: VSLParameter) -> Callable[[float], int]:
+    """
+    vsl_encode_user_value con los coeficientes de `param` precalculados.
+    
+    Devuelve una función de un argumento con el mismo resultado bit a bit
+    (mismas operaciones en el mismo orden), sin la validación ni las
+    búsquedas de atributos de cada llamada. Para caminos calientes con
+    pocos valores, donde el coste fijo de NumPy domina (ver vsl_channel_strip).
+    
+    Raises:
+        ValueError: Si param es inválido o es de frecuencia con rango <= 0
+    """
+    if not isinstance(param, VSLParameter):
+        raise ValueError("param debe ser instancia de VSLParameter")
+    
+    max_int = param.max_encoded_int
+    log = math.log
+    
+    if is_frequency_parameter(param):
+        if param.freq_min_hz <= 0.0:
+            raise ValueError("Frecuencias min/max deben ser > 0")
+        freq_min, freq_max = param.freq_min_hz, param.freq_max_hz
+        log2_min = log(freq_min) * 1.442695
+        log2_range = log(freq_max) * 1.442695 - log2_min
+        if abs(log2_range) < 1e-7:
+            return lambda user_value: 0
+        
+        def encode_frequency(user_value: float) -> int:
+            clamped = max(freq_min, min(user_value, freq_max))
+            return int(round((log(clamped) * 1.442695 - log2_min) / log2_range * max_int))
+        return encode_frequency
+    
+    if max_int == 0:
+        return lambda user_value: 0
+    coeff_A, coeff_C1, log_factor = param.coeff_offset_A, param.coeff_C1, param.log_factor
+    curve_min = param.curve_min_map
+    range_val = param.curve_max_map - curve_min
+    scale_factor = max_int / VSL_MAX_ENCODED_FLOAT
+    max_f = float(max_int)
+    if abs(range_val) < 1e-7:
+        constant = int(round(max(0.0, min(coeff_A * scale_factor, max_f))))
+        return lambda user_value: constant
+    exp = math.exp
+    
+    def encode_gain(user_value: float) -> int:
+        clamped = max(0.0, min(user_value, 1.0))
+        encoded = coeff_A + coeff_C1 * exp((clamped - curve_min) / range_val * log_factor)
+        return int(round(max(0.0, min(encoded * scale_factor, max_f))))
+    return encode_gain
+
+
+# ============================================================================
+# VARIANTES VECTORIZADAS (NumPy)
+# ============================================================================
+#
+# Misma matemática que las funciones escalares, aplicada a arrays. Las
+# variantes de un solo parámetro aceptan un VSLParameter; las de valor de
+# usuario aceptan una secuencia de parámetros (uno por valor) y reúnen sus
+# coeficientes en arrays para procesar parámetros mixtos en una pasada.
+
+def _require_numpy():
+    global np
+    if np is None:
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy no está disponible. Instalar con: pip install numpy")
+        import numpy
+        np = numpy
+
+
+def _encode_gain_np(linear, coeff_A, coeff_C1, log_factor, curve_min, curve_max):
+    clamped = np.clip(linear, 0.0, 1.0)
+    range_val = curve_max - curve_min
+    flat = np.abs(range_val) < 1e-7
+    safe_range = np.where(flat, 1.0, range_val)
+    encoded = coeff_A + coeff_C1 * np.exp((clamped - curve_min) / safe_range * log_factor)
+    return np.where(flat, coeff_A, encoded)
+
+
+def _decode_gain_np(encoded, coeff_A, coeff_C1, log_factor, curve_min, curve_max):
+    range_val = curve_max - curve_min
+    degenerate = ((np.abs(range_val) < 1e-7) | (np.abs(coeff_C1) < 1e-7)
+                  | (np.abs(log_factor) < 1e-7))
+    safe_C1 = np.where(degenerate, 1.0, coeff_C1)
+    safe_log = np.where(degenerate, 1.0, log_factor)
+    ratio = (encoded - coeff_A) / safe_C1
+    positive = (ratio > 0.0) & ~degenerate
+    log_ratio = np.log(np.where(positive, ratio, 1.0))
+    linear = curve_min + range_val * log_ratio / safe_log
+    return np.where(positive, np.clip(linear, 0.0, 1.0), 0.0)
+
+
+def _final_encode_to_int_np(encoded, max_int):
+    max_f = np.asarray(max_int, dtype=np.float64)
+    scaled = encoded * (max_f / VSL_MAX_ENCODED_FLOAT)
+    rounded = np.rint(np.clip(scaled, 0.0, max_f))
+    return np.where(max_f == 0, 0, rounded).astype(np.int64)
+
+
+def _int_to_encoded_float_np(encoded_int, max_int):
+    max_f = np.asarray(max_int, dtype=np.float64)
+    safe_max = np.where(max_f == 0, 1.0, max_f)
+    clamped = np.clip(encoded_int, 0, max_f)
+    return np.where(max_f == 0, 0.0, clamped * VSL_MAX_ENCODED_FLOAT / safe_max)
+
+
+def _log2_range_np(freq_min, freq_max):
+    log2_min = np.log(freq_min) * VSL_INV_LN2
+    log2_max = np.log(freq_max) * VSL_INV_LN2
+    return log2_min, log2_max
+
+
+def _map_frequency_np(position, freq_min, freq_max):
+    log2_min, log2_max = _log2_range_np(freq_min, freq_max)
+    clamped = np.clip(position, 0.0, 1.0)
+    return np.power(2.0, log2_min + clamped * (log2_max - log2_min))
+
+
+def _decode_frequency_np(freq_hz, freq_min, freq_max):
+    log2_min, log2_max = _log2_range_np(freq_min, freq_max)
+    log2_current = np.log(np.clip(freq_hz, freq_min, freq_max)) * VSL_INV_LN2
+    log2_range = log2_max - log2_min
+    flat = np.abs(log2_range) < 1e-7
+    safe_range = np.where(flat, 1.0, log2_range)
+    return np.where(flat, 0.0, (log2_current - log2_min) / safe_range)
+
+
+def _check_frequency_range(freq_min, freq_max):
+    if np.any(freq_min <= 0.0) or np.any(freq_max <= 0.0):
+        raise ValueError("Frecuencias min/max deben ser > 0 para mapeo logarítmico")
+
+
+def vsl_encode_gain_batch(linear_values, param: VSLParameter) -> "np.ndarray":
+    """Versión vectorizada de vsl_encode_gain."""
+    _require_numpy()
+    return _encode_gain_np(np.asarray(linear_values, dtype=np.float64),
+                           param.coeff_offset_A, param.coeff_C1, param.log_factor,
+                           param.curve_min_map, param.curve_max_map)
+
+
+def vsl_map_frequency_batch(linear_positions, param: VSLParameter) -> "np.ndarray":
+    """Versión vectorizada de vsl_map_frequency."""
+    _require_numpy()
+    _check_frequency_range(param.freq_min_hz, param.freq_max_hz)
+    return _map_frequency_np(np.asarray(linear_positions, dtype=np.float64),
+                             param.freq_min_hz, param.freq_max_hz)
+
+
+def vsl_final_encode_to_int_batch(encoded_floats, param: VSLParameter) -> "np.ndarray":
+    """Versión vectorizada de vsl_final_encode_to_int (retorna int64)."""
+    _require_numpy()
+    return _final_encode_to_int_np(np.asarray(encoded_floats, dtype=np.float64),
+                                   param.max_encoded_int)
+
+
+def vsl_decode_frequency_batch(freq_hz_values, param: VSLParameter) -> "np.ndarray":
+    """Versión vectorizada de vsl_decode_frequency."""
+    _require_numpy()
+    _check_frequency_range(param.freq_min_hz, param.freq_max_hz)
+    return _decode_frequency_np(np.asarray(freq_hz_values, dtype=np.float64),
+                                param.freq_min_hz, param.freq_max_hz)
+
+
+def vsl_decode_gain_batch(encoded_floats, param: VSLParameter) -> "np.ndarray":
+    """Versión vectorizada de vsl_decode_gain."""
+    _require_numpy()
+    return _decode_gain_np(np.asarray(encoded_floats, dtype=np.float64),
+                           param.coeff_offset_A, param.coeff_C1, param.log_factor,
+                           param.curve_min_map, param.curve_max_map)
+
+
+def vsl_param_arrays(params: Sequence[VSLParameter]) -> "np.ndarray":
+    """
+    Reúne los coeficientes de una secuencia de parámetros en arrays.
+    
+    Quien codifica el mismo conjunto de parámetros en cada tick puede
+    calcularlo una vez y pasarlo como `coeffs` a las funciones *_batch.
+    
+    Returns:
+        Array float64 de forma (8, n): una fila por campo de VSLParameter
+        a partir de max_encoded_int
+    """
+    _require_numpy()
+    columns = np.array([p[1:] for p in params], dtype=np.float64).reshape(-1, 8)
+    return columns.T.copy()
+
+
+def _batch_coeffs(params: Optional[Sequence[VSLParameter]],
+                  coeffs: "Optional[np.ndarray]") -> "np.ndarray":
+    if coeffs is not None:
+        return coeffs
+    if params is None:
+        raise ValueError("Se requiere params o coeffs")
+    return vsl_param_arrays(params)
+
+
+def _kind_selectors(freq_max):
+    """
+    Selectores (frecuencia, ganancia) y número de frecuencias de un lote.
+    
+    Si el lote es de un solo tipo (lo habitual: un control en varios
+    canales) el selector es slice(None), que indexa con una vista en lugar
+    de copiar cada array de coeficientes con una máscara.
+    """
+    is_freq = freq_max > 0.0
+    n_freq = int(np.count_nonzero(is_freq))
+    if n_freq == len(freq_max):
+        return slice(None), is_freq, n_freq
+    if n_freq == 0:
+        return is_freq, slice(None), n_freq
+    return is_freq, ~is_freq, n_freq
+
+
+def vsl_encode_user_values_batch(user_values,
+                                 params: Optional[Sequence[VSLParameter]],
+                                 coeffs: "Optional[np.ndarray]" = None) -> "np.ndarray":
+    """
+    Versión vectorizada de vsl_encode_user_value para parámetros mixtos.
+    
+    Args:
+        user_values: Un valor de usuario por parámetro
+        params: Parámetro correspondiente a cada valor (None si se pasa coeffs)
+        coeffs: Resultado precalculado de vsl_param_arrays(params), o columnas
+            reunidas de una tabla por param_id (ver vsl_param_registry)
+        
+    Returns:
+        Array int64 con el entero codificado de cada valor
+    """
+    _require_numpy()
+    coeffs = _batch_coeffs(params, coeffs)
+    values = np.asarray(user_values, dtype=np.float64)
+    if values.shape != (coeffs.shape[1],):
+        raise ValueError("user_values y params deben tener la misma longitud")
+    
+    (max_int, coeff_A, coeff_C1, log_factor,
+     curve_min, curve_max, freq_min, freq_max) = coeffs
+    
+    is_freq, is_gain, n_freq = _kind_selectors(freq_max)
+    out = np.empty(len(values), dtype=np.int64)
+    
+    if n_freq:
+        _check_frequency_range(freq_min[is_freq], freq_max[is_freq])
+        position = _decode_frequency_np(values[is_freq], freq_min[is_freq], freq_max[is_freq])
+        out[is_freq] = np.rint(position * max_int[is_freq]).astype(np.int64)
+    
+    if n_freq < len(values):
+        encoded = _encode_gain_np(values[is_gain], coeff_A[is_gain], coeff_C1[is_gain],
+                                  log_factor[is_gain], curve_min[is_gain], curve_max[is_gain])
+        out[is_gain] = _final_encode_to_int_np(encoded, max_int[is_gain])
+    
+    return out
+
+
+def vsl_decode_user_values_batch(encoded_ints,
+                                 params: Optional[Sequence[VSLParameter]],
+                                 coeffs: "Optional[np.ndarray]" = None) -> "np.ndarray":
+    """
+    Versión vectorizada de vsl_decode_user_value para parámetros mixtos.
+    
+    Args:
+        encoded_ints: Un entero codificado por parámetro
+        params: Parámetro correspondiente a cada entero (None si se pasa coeffs)
+        coeffs: Igual que en vsl_encode_user_values_batch
+    
+    Returns:
+        Array float64 con el valor de usuario de cada entero
+    """
+    _require_numpy()
+    coeffs = _batch_coeffs(params, coeffs)
+    ints = np.asarray(encoded_ints, dtype=np.float64)
+    if ints.shape != (coeffs.shape[1],):
+        raise ValueError("encoded_ints y params deben tener la misma longitud")
+    
+    (max_int, coeff_A, coeff_C1, log_factor,
+     curve_min, curve_max, freq_min, freq_max) = coeffs
+    
+    is_freq, is_gain, n_freq = _kind_selectors(freq_max)
+    out = np.empty(len(ints), dtype=np.float64)
+    
+    if n_freq:
+        fmax_int = max_int[is_freq]
+        safe_max = np.where(fmax_int == 0, 1.0, fmax_int)
+        position = np.where(fmax_int == 0, 0.0,
+                            np.clip(ints[is_freq], 0, fmax_int) / safe_max)
+        out[is_freq] = _map_frequency_np(position, freq_min[is_freq], freq_max[is_freq])
+    
+    if n_freq < len(ints):
+        encoded = _int_to_encoded_float_np(ints[is_gain], max_int[is_gain])
+        out[is_gain] = _decode_gain_np(encoded, coeff_A[is_gain], coeff_C1[is_gain],
+                                       log_factor[is_gain], curve_min[is_gain],
+                                       curve_max[is_gain])
+    
+    return out
+
+
 # ============================================================================
 # FUNCIÓN AUXILIAR DE VALIDACIÓN
 # ============================================================================
@@ -216,4 +616,38 @@ if __name__ == "__main__":
     print(f"  Input Position: {freq_pos}")
     print(f"  Mapped Frequency: {mapped_freq:.2f} Hz")
     print(f"  Decoded Position: {decoded_pos:.4f}")
-    print(f"  Round-trip Error: {abs(freq_pos - decoded_pos):.6f}")
\ No newline at end of file
+    print(f"  Round-trip Error: {abs(freq_pos - decoded_pos):.6f}")
+    
+    # Test 3: Round-trip valor de usuario ↔ entero
+    gain_int = vsl_encode_user_value(0.5, GAIN_CH1)
+    hpf_int = vsl_encode_user_value(1000.0, FREQ_HPF_CH1)
+    
+    print(f"\nTest User Value Round-trip:")
+    print(f"  Gain 0.5 → {gain_int} → {vsl_decode_user_value(gain_int, GAIN_CH1):.4f}")
+    print(f"  HPF 1000 Hz → {hpf_int} → {vsl_decode_user_value(hpf_int, FREQ_HPF_CH1):.2f} Hz")
+    
+    # Test 4: Las variantes batch coinciden con las escalares
+    if NUMPY_AVAILABLE:
+        params = [GAIN_CH1, FREQ_HPF_CH1] * 50
+        values = [i / 99.0 if p is GAIN_CH1 else 20.0 * 1000.0 ** (i / 99.0)
+                  for i, p in enumerate(params)]
+        batch = vsl_encode_user_values_batch(values, params)
+        scalar = [vsl_encode_user_value(v, p) for v, p in zip(values, params)]
+        mismatches = int(np.count_nonzero(batch != np.array(scalar)))
+        
+        print(f"\nTest Batch vs Escalar ({len(params)} valores mixtos):")
+        print(f"  Discrepancias: {mismatches}")
+        assert mismatches == 0, "❌ La variante batch difiere de la escalar"    
+    # Test 5: Codificador precalculado idéntico a vsl_encode_user_value
+    import random
+    rng = random.Random(5)
+    checked = 0
+    for param, low, high in ((GAIN_CH1, -0.5, 1.5), (FREQ_HPF_CH1, 0.0, 30000.0),
+                             (GAIN_CH1._replace(max_encoded_int=4095), 0.0, 1.0)):
+        encoder = vsl_user_value_encoder(param)
+        samples = [rng.uniform(low, high) for _ in range(20000)] + [low, high]
+        assert all(encoder(v) == vsl_encode_user_value(v, param) for v in samples), \
+            "❌ vsl_user_value_encoder difiere de vsl_encode_user_value"
+        checked += len(samples)
+    print(f"\nTest Codificador precalculado:")
+    print(f"  ✅ {checked} valores idénticos a vsl_encode_user_value")
@@ -0,0 +1,672 @@
+"""
+VSL-DSP Daemon Module
+Daemon local que comparte un único dispositivo entre muchos clientes.
+
+VSLDevice es un singleton por proceso y es el único dueño del handle HID,
+así que solo una herramienta a la vez podía hablar con la interfaz. El
+daemon es ese único dueño y atiende un protocolo binario compacto sobre
+un socket Unix: las escrituras de todos los clientes se agrupan y se
+coalescen (último valor por parámetro) en una VSLSendQueue compartida, y
+los clientes pueden suscribirse a los cambios del estado espejo. Como en
+el buzón de VSLOscBridge, la cola guarda como mucho un paquete pendiente
+por parámetro y carril: un SET sobre un parámetro que ya espera en la
+cola solo actualiza su valor, así que con un dispositivo lento la cola no
+crece sin límite ni reproduce valores obsoletos.
+
+Protocolo: tramas fijas de 6 bytes (Little-Endian) en ambos sentidos
+  [0]   : Opcode
+  [1]   : Flags (prioridad en OP_SET, FLAG_UNKNOWN en respuestas)
+  [2-3] : param_id (uint16)
+  [4-5] : Valor (uint16)
+
+  Cliente → daemon                     Daemon → cliente
+  OP_SET         pid, valor            OP_VALUE   respuesta a OP_GET
+  OP_GET         pid                   OP_CHANGED cambio en un rango suscrito
+  OP_SUBSCRIBE   pid=desde, valor=hasta OP_PONG   eco de OP_PING
+  OP_UNSUBSCRIBE (cancela todo)        OP_ERROR   pid=opcode, valor=código
+  OP_PING        valor=token
+
+Requiere NumPy.
+"""
+
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from vsl_metrics import VSLMetrics, WRITES_COALESCED
+from vsl_rate_control import VSLRateController
+from vsl_send_queue import VSLPriority, VSLSendQueue
+from vsl_state import VSLShadowState, SOURCE_WRITE, UNKNOWN_ENCODED
+from vsl_transport import VSLPacket
+
+
+# ============================================================================
+# PROTOCOLO
+# ============================================================================
+
+FRAME = struct.Struct("<BBHH")
+FRAME_DTYPE = np.dtype([("op", "u1"), ("flags", "u1"), ("pid", "<u2"), ("value", "<u2")])
+
+OP_SET = 0x01
+OP_GET = 0x02
+OP_SUBSCRIBE = 0x03
+OP_UNSUBSCRIBE = 0x04
+OP_PING = 0x05
+
+OP_VALUE = 0x82
+OP_CHANGED = 0x83
+OP_PONG = 0x85
+OP_ERROR = 0xFF
+
+FLAG_UNKNOWN = 0x01     # El parámetro no tiene estado conocido (valor = 0)
+
+ERR_BAD_OPCODE = 1
+ERR_BAD_PRIORITY = 2
+
+RECV_SIZE = 65536
+MAX_CLIENT_BACKLOG = 256 * 1024   # Bytes pendientes antes de desconectar a un cliente lento
+DEFAULT_POLL_INTERVAL_S = 0.005
+
+
+def _encode_changes(param_ids: np.ndarray, values: np.ndarray) -> bytes:
+    """Codifica un lote de OP_CHANGED sin iterar en Python."""
+    frames = np.zeros(len(param_ids), dtype=FRAME_DTYPE)
+    unknown = values == UNKNOWN_ENCODED
+    frames["op"] = OP_CHANGED
+    frames["flags"] = np.where(unknown, FLAG_UNKNOWN, 0)
+    frames["pid"] = param_ids
+    frames["value"] = np.where(unknown, 0, values)
+    return frames.tobytes()
+
+
+class _ClientConnection:
+    """Estado de un cliente conectado."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.ranges: List[Tuple[int, int]] = []
+
+    def wants(self, param_ids: np.ndarray) -> np.ndarray:
+        """Máscara de los param_id incluidos en algún rango suscrito."""
+        mask = np.zeros(len(param_ids), dtype=bool)
+        for lo, hi in self.ranges:
+            mask |= (param_ids >= lo) & (param_ids <= hi)
+        return mask
+
+
+# ============================================================================
+# DAEMON
+# ============================================================================
+
+class VSLDaemon:
+    """
+    Servidor de un solo hilo (selectors) más el hilo escritor de la cola.
+
+    En cada vuelta del bucle se leen todas las tramas disponibles de todos
+    los clientes; los OP_SET de esa vuelta se coalescen por param_id (gana
+    el último valor y la prioridad más urgente) y se encolan en un lote por
+    carril. Los cambios de estado se detectan por VSLShadowState.version y
+    se difunden comparando el espejo denso con la última copia notificada.
+
+    Los SET también se coalescen contra lo ya encolado: _pending guarda el
+    último valor de cada parámetro con paquete en cola, y el hilo escritor
+    escribe ese valor (no el del paquete) al despacharlo. Solo se encola
+    otro paquete si el SET nuevo es más urgente que el pendiente.
+    """
+
+    def __init__(self, socket_path: str,
+                 writer: Callable[[VSLPacket], bool],
+                 state: Optional[VSLShadowState] = None,
+                 report_id: Optional[int] = None,
+                 rate_controller: Optional[VSLRateController] = None,
+                 poll_interval_s: float = DEFAULT_POLL_INTERVAL_S,
+                 metrics: Optional[VSLMetrics] = None):
+        """
+        Args:
+            socket_path: Ruta del socket Unix (se reemplaza si ya existe)
+            writer: Función que escribe un paquete (ej: VSLDevice.send_packet)
+            state: Estado espejo compartido (None crea uno nuevo)
+            report_id: Report ID de los paquetes (None usa VSL_REPORT_ID)
+            rate_controller: Limitador de tasa de la cola compartida (opcional)
+            poll_interval_s: Periodo máximo entre comprobaciones de cambios
+                de estado que no provienen de escrituras del daemon
+            metrics: Registro de métricas (coalescidos y profundidad de cola)
+        """
+        self.socket_path = socket_path
+        self._writer = writer
+        self._state = state if state is not None else VSLShadowState()
+        self._report_id = report_id
+        self._queue = VSLSendQueue(self._write, rate_controller=rate_controller,
+                                   metrics=metrics)
+        self._metrics = metrics
+        self._poll_interval_s = poll_interval_s
+
+        # param_id → (carril más urgente con paquete en cola, último valor)
+        self._pending: Dict[int, Tuple[int, int]] = {}
+        self._pending_lock = threading.Lock()
+
+        self._dense = np.frombuffer(self._state.encoded_array(), dtype=np.intc)
+        self._notified = self._dense.copy()
+        self._notified_version = self._state.version
+
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._listener: Optional[socket.socket] = None
+        self._wake_r: Optional[socket.socket] = None
+        self._wake_w: Optional[socket.socket] = None
+        self._wake_pending = False
+        self._clients: Dict[int, _ClientConnection] = {}
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.frames_in = 0
+        self.sets_received = 0
+        self.writes_submitted = 0
+        self.notifications = 0
+        self.dropped_clients = 0
+
+    @classmethod
+    def for_device(cls, device: Any, socket_path: str, **kwargs) -> "VSLDaemon":
+        """Daemon sobre un VSLDevice abierto (adjunta un estado si no tiene)."""
+        if device.state is None:
+            device.attach_state(VSLShadowState())
+        return cls(socket_path, device.send_packet, device.state, **kwargs)
+
+    @property
+    def state(self) -> VSLShadowState:
+        return self._state
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Crea el socket y arranca el bucle del servidor y la cola."""
+        if self._running:
+            return
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.socket_path)
+        self._listener.listen(128)
+        self._listener.setblocking(False)
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ, "listener")
+        self._selector.register(self._wake_r, selectors.EVENT_READ, "wake")
+
+        self._queue.start()
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._serve, name="vsl-daemon", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Detiene el servidor, desconecta a los clientes y vacía la cola."""
+        if not self._running:
+            return
+        self._running = False
+        self._wake()
+        self._thread.join()
+        self._thread = None
+
+        for conn in list(self._clients.values()):
+            self._drop(conn)
+        self._selector.close()
+        self._listener.close()
+        self._wake_r.close()
+        self._wake_w.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._queue.stop(drain=True)
+
+    def _wake(self):
+        if self._wake_pending:
+            return
+        self._wake_pending = True
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    # ------------------------------------------------------------------
+    # Escritor (hilo de la cola)
+    # ------------------------------------------------------------------
+
+    def _write(self, packet: VSLPacket) -> bool:
+        with self._pending_lock:
+            entry = self._pending.pop(packet.param_id, None)
+        if entry is None:
+            # Un paquete más urgente del mismo parámetro ya escribió su valor
+            return True
+        if entry[1] != packet.encoded_value:
+            packet = VSLPacket(packet.param_id, entry[1], report_id=self._report_id)
+        ok = bool(self._writer(packet))
+        if ok and self._state.update(packet.param_id, packet.encoded_value, SOURCE_WRITE):
+            self._wake()
+        return ok
+
+    # ------------------------------------------------------------------
+    # Bucle del servidor
+    # ------------------------------------------------------------------
+
+    def _serve(self):
+        while self._running:
+            events = self._selector.select(self._poll_interval_s)
+            sets: Dict[int, Tuple[int, int]] = {}
+            for key, mask in events:
+                if key.data == "listener":
+                    self._accept()
+                elif key.data == "wake":
+                    self._wake_pending = False
+                    try:
+                        self._wake_r.recv(4096)
+                    except BlockingIOError:
+                        pass
+                else:
+                    conn = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._read_client(conn, sets)
+                    if mask & selectors.EVENT_WRITE and conn.sock.fileno() in self._clients:
+                        self._flush_client(conn)
+            if sets:
+                self._submit(sets)
+            if self._state.version != self._notified_version:
+                self._notify_changes()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except BlockingIOError:
+                return
+            sock.setblocking(False)
+            conn = _ClientConnection(sock)
+            self._clients[sock.fileno()] = conn
+            self._selector.register(sock, selectors.EVENT_READ, conn)
+
+    def _drop(self, conn: _ClientConnection):
+        self._clients.pop(conn.sock.fileno(), None)
+        try:
+            self._selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        conn.sock.close()
+
+    def _read_client(self, conn: _ClientConnection, sets: Dict[int, Tuple[int, int]]):
+        try:
+            data = conn.sock.recv(RECV_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(conn)
+            return
+
+        conn.inbuf += data
+        usable = len(conn.inbuf) - len(conn.inbuf) % FRAME.size
+        for op, flags, param_id, value in FRAME.iter_unpack(memoryview(conn.inbuf)[:usable]):
+            self.frames_in += 1
+            if op == OP_SET:
+                if flags > VSLPriority.BULK:
+                    self._send(conn, FRAME.pack(OP_ERROR, 0, op, ERR_BAD_PRIORITY))
+                    continue
+                self.sets_received += 1
+                previous = sets.get(param_id)
+                if previous is not None:
+                    flags = min(flags, previous[0])
+                    if self._metrics is not None:
+                        self._metrics.inc(WRITES_COALESCED)
+                sets[param_id] = (flags, value)
+            elif op == OP_GET:
+                encoded = self._state.get_encoded(param_id)
+                if encoded is None:
+                    self._send(conn, FRAME.pack(OP_VALUE, FLAG_UNKNOWN, param_id, 0))
+                else:
+                    self._send(conn, FRAME.pack(OP_VALUE, 0, param_id, encoded))
+            elif op == OP_SUBSCRIBE:
+                lo, hi = min(param_id, value), max(param_id, value)
+                conn.ranges.append((lo, hi))
+                # Estado inicial del rango, para que el cliente no tenga que pedirlo
+                ids = np.arange(lo, hi + 1)
+                known = ids[self._notified[lo:hi + 1] != UNKNOWN_ENCODED]
+                if len(known):
+                    self._send(conn, _encode_changes(known, self._notified[known]))
+            elif op == OP_UNSUBSCRIBE:
+                conn.ranges = []
+            elif op == OP_PING:
+                self._send(conn, FRAME.pack(OP_PONG, 0, param_id, value))
+            else:
+                self._send(conn, FRAME.pack(OP_ERROR, 0, op, ERR_BAD_OPCODE))
+        del conn.inbuf[:usable]
+
+    def _submit(self, sets: Dict[int, Tuple[int, int]]):
+        lanes: Dict[int, List[VSLPacket]] = {}
+        merged = 0
+        with self._pending_lock:
+            for param_id, (priority, value) in sets.items():
+                queued = self._pending.get(param_id)
+                if queued is not None:
+                    merged += 1
+                    self._pending[param_id] = (min(priority, queued[0]), value)
+                    if priority >= queued[0]:
+                        continue
+                else:
+                    self._pending[param_id] = (priority, value)
+                lanes.setdefault(priority, []).append(
+                    VSLPacket(param_id, value, report_id=self._report_id))
+        if merged and self._metrics is not None:
+            self._metrics.inc(WRITES_COALESCED, merged)
+        for priority in sorted(lanes):
+            self._queue.submit_batch(lanes[priority], VSLPriority(priority))
+        self.writes_submitted += sum(len(packets) for packets in lanes.values())
+
+    def _notify_changes(self):
+        self._notified_version = self._state.version
+        changed = np.flatnonzero(self._dense != self._notified)
+        if len(changed) == 0:
+            return
+        values = self._dense[changed]
+        self._notified[changed] = values
+
+        payload_all = None
+        for conn in list(self._clients.values()):
+            if not conn.ranges:
+                continue
+            if conn.ranges == [(0, 0xFFFF)]:
+                if payload_all is None:
+                    payload_all = _encode_changes(changed, values)
+                payload = payload_all
+            else:
+                mask = conn.wants(changed)
+                if not mask.any():
+                    continue
+                payload = _encode_changes(changed[mask], values[mask])
+            self.notifications += len(payload) // FRAME.size
+            self._send(conn, payload)
+
+    def _send(self, conn: _ClientConnection, data: bytes):
+        """Encola datos hacia un cliente sin bloquear nunca el bucle."""
+        if conn.sock.fileno() not in self._clients:
+            return
+        conn.outbuf += data
+        self._flush_client(conn)
+
+    def _flush_client(self, conn: _ClientConnection):
+        try:
+            sent = conn.sock.send(conn.outbuf)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(conn)
+            return
+        del conn.outbuf[:sent]
+
+        if len(conn.outbuf) > MAX_CLIENT_BACKLOG:
+            self.dropped_clients += 1
+            self._drop(conn)
+            return
+        events = selectors.EVENT_READ
+        if conn.outbuf:
+            events |= selectors.EVENT_WRITE
+        self._selector.modify(conn.sock, events, conn)
+
+    # ------------------------------------------------------------------
+    # Estadísticas
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Diccionario con clients, frames_in, sets_received,
+            writes_submitted, coalesced, notifications, dropped_clients
+        """
+        return {
+            "clients": len(self._clients),
+            "frames_in": self.frames_in,
+            "sets_received": self.sets_received,
+            "writes_submitted": self.writes_submitted,
+            "coalesced": self.sets_received - self.writes_submitted,
+            "notifications": self.notifications,
+            "dropped_clients": self.dropped_clients,
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+# ============================================================================
+# CLIENTE
+# ============================================================================
+
+class VSLDaemonClient:
+    """
+    Cliente síncrono del daemon.
+
+    Las notificaciones OP_CHANGED que llegan mientras se espera una
+    respuesta se guardan y se entregan con read_events().
+    """
+
+    def __init__(self, socket_path: str):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(socket_path)
+        self._inbuf = bytearray()
+        self._events: Deque[Tuple[int, Optional[int]]] = deque()
+        self._token = 0
+
+    def set(self, param_id: int, value: int,
+            priority: VSLPriority = VSLPriority.INTERACTIVE):
+        """Envía una escritura (sin confirmación)."""
+        self._sock.sendall(FRAME.pack(OP_SET, priority, param_id, value))
+
+    def set_many(self, items: Iterable[Tuple[int, int]],
+                 priority: VSLPriority = VSLPriority.BULK):
+        """Envía varias escrituras en un único sendall."""
+        self._sock.sendall(b"".join(FRAME.pack(OP_SET, priority, pid, value)
+                                    for pid, value in items))
+
+    def get(self, param_id: int, timeout: float = 1.0) -> Optional[int]:
+        """
+        Último valor conocido por el daemon.
+
+        Returns:
+            Entero codificado o None si el daemon no lo conoce
+
+        Raises:
+            TimeoutError: Si no llega respuesta
+        """
+        self._sock.sendall(FRAME.pack(OP_GET, 0, param_id, 0))
+        _, flags, _, value = self._wait_for(
+            lambda f: f[0] == OP_VALUE and f[2] == param_id, timeout)
+        return None if flags & FLAG_UNKNOWN else value
+
+    def subscribe(self, first_id: int = 0, last_id: int = 0xFFFF):
+        """Recibe OP_CHANGED para los param_id del rango (incluido el estado actual)."""
+        self._sock.sendall(FRAME.pack(OP_SUBSCRIBE, 0, first_id, last_id))
+
+    def unsubscribe(self):
+        self._sock.sendall(FRAME.pack(OP_UNSUBSCRIBE, 0, 0, 0))
+
+    def ping(self, timeout: float = 1.0) -> float:
+        """
+        Returns:
+            Tiempo de ida y vuelta en segundos
+        """
+        self._token = (self._token + 1) & 0xFFFF
+        token = self._token
+        t0 = time.perf_counter()
+        self._sock.sendall(FRAME.pack(OP_PING, 0, 0, token))
+        self._wait_for(lambda f: f[0] == OP_PONG and f[3] == token, timeout)
+        return time.perf_counter() - t0
+
+    def read_events(self, timeout: float = 0.0) -> List[Tuple[int, Optional[int]]]:
+        """
+        Cambios recibidos: lista de (param_id, valor o None si es desconocido).
+
+        Espera como mucho `timeout` segundos si no hay ninguno pendiente.
+        """
+        if not self._events:
+            self._receive(timeout)
+        events = list(self._events)
+        self._events.clear()
+        return events
+
+    def _wait_for(self, predicate, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Sin respuesta del daemon")
+            for frame in self._receive(remaining):
+                if predicate(frame):
+                    return frame
+
+    def _receive(self, timeout: float) -> List[Tuple[int, int, int, int]]:
+        """Lee tramas disponibles; guarda las notificaciones y devuelve el resto."""
+        self._sock.settimeout(timeout if timeout > 0 else 0.0)
+        try:
+            data = self._sock.recv(RECV_SIZE)
+        except (BlockingIOError, socket.timeout):
+            return []
+        if not data:
+            raise ConnectionError("El daemon cerró la conexión")
+
+        self._inbuf += data
+        usable = len(self._inbuf) - len(self._inbuf) % FRAME.size
+        replies = []
+        for frame in FRAME.iter_unpack(memoryview(self._inbuf)[:usable]):
+            op, flags, param_id, value = frame
+            if op == OP_CHANGED:
+                self._events.append((param_id, None if flags & FLAG_UNKNOWN else value))
+            elif op == OP_ERROR:
+                raise RuntimeError(f"Error del daemon: opcode 0x{param_id:02X}, código {value}")
+            else:
+                replies.append(frame)
+        del self._inbuf[:usable]
+        return replies
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from vsl_fake_device import FakeVSLHandle
+
+    print("=== Tests de vsl_daemon.py ===\n")
+
+    handle = FakeVSLHandle(latency_s=0.0)
+    device_writes: List[VSLPacket] = []
+
+    def fake_writer(packet: VSLPacket) -> bool:
+        device_writes.append(packet)
+        return handle.write(packet.buffer) > 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vsl.sock")
+        with VSLDaemon(path, fake_writer, report_id=0x01) as daemon:
+            clients = [VSLDaemonClient(path) for _ in range(32)]
+            for client in clients[1:]:
+                client.subscribe(0x1A00, 0x1AFF)
+
+            # Test 1: GET de un parámetro desconocido y conocido
+            print("Test 1: Escritura y lectura")
+            assert clients[0].get(0x1A01) is None, "❌ Debería ser desconocido"
+            clients[0].set(0x1A01, 40793)
+            time.sleep(0.05)
+            value = clients[0].get(0x1A01)
+            print(f"  GET 0x1A01 → {value}")
+            assert value == 40793, "❌ Valor incorrecto"
+            print("  ✅ El daemon escribe y recuerda el valor\n")
+
+            # Test 2: Latencia añadida con 32 clientes conectados
+            print("Test 2: Latencia con 32 clientes")
+            for client in clients[1:]:
+                client.read_events(0.05)
+            rtts = sorted(clients[0].ping() for _ in range(500))
+            fanout = []
+            for i in range(200):
+                t0 = time.perf_counter()
+                clients[0].set(0x1A02, i)
+                while not clients[-1].read_events(1.0):
+                    pass
+                fanout.append(time.perf_counter() - t0)
+            fanout.sort()
+            print(f"  PING RTT:          p50={rtts[250] * 1e3:.3f} ms  "
+                  f"p99={rtts[495] * 1e3:.3f} ms")
+            print(f"  SET → notificación: p50={fanout[100] * 1e3:.3f} ms  "
+                  f"p99={fanout[198] * 1e3:.3f} ms")
+            assert rtts[250] < 0.001, "❌ Latencia añadida superior a 1 ms"
+            print("  ✅ Latencia sub-milisegundo\n")
+
+            # Test 3: Coalescencia de ráfagas de varios clientes
+            print("Test 3: 10 clientes x 1000 escrituras sobre 8 parámetros")
+            device_writes.clear()
+            received_before = daemon.get_stats()["sets_received"]
+            for n, client in enumerate(clients[:10]):
+                client.set_many((0x1A10 + i % 8, n * 1000 + i) for i in range(1000))
+            time.sleep(0.2)
+            stats = daemon.get_stats()
+            final = {pid: clients[0].get(pid) for pid in range(0x1A10, 0x1A18)}
+            print(f"  Recibidas: {stats['sets_received'] - received_before}  "
+                  f"Escritas al dispositivo: {len(device_writes)}")
+            assert len(device_writes) < 10000 // 10, "❌ Coalescencia insuficiente"
+            assert all(v is not None for v in final.values()), "❌ Parámetros sin escribir"
+            print("  ✅ Escrituras coalescidas\n")
+
+            # Test 4: Coalescencia contra la cola con un dispositivo lento
+            print("Test 4: 2000 SET en 20 tandas sobre 4 parámetros, escrituras de 5 ms")
+            device_writes.clear()
+            real_writer = fake_writer
+
+            def slow_writer(packet: VSLPacket) -> bool:
+                time.sleep(0.005)
+                return real_writer(packet)
+            daemon._writer = slow_writer
+            max_pending = 0
+            for burst in range(20):
+                clients[0].set_many((0x1A20 + i % 4, burst * 100 + i) for i in range(100))
+                time.sleep(0.005)
+                max_pending = max(max_pending, daemon._queue.pending())
+            daemon._queue.flush(timeout=2.0)
+            daemon._writer = fake_writer
+            final = {pid: clients[0].get(pid) for pid in range(0x1A20, 0x1A24)}
+            print(f"  Escritas al dispositivo: {len(device_writes)}  "
+                  f"Máximo en cola: {max_pending}  Finales: {sorted(final.values())}")
+            assert max_pending <= 4, "❌ La cola crece con los SET de un parámetro pendiente"
+            assert len(device_writes) < 2000 // 10, "❌ Valores obsoletos reproducidos"
+            assert final == {0x1A20 + i: 1996 + i for i in range(4)}, "❌ No ganó el último valor"
+            print("  ✅ Un paquete pendiente por parámetro, gana el último valor\n")
+
+            for client in clients:
+                client.close()
+            time.sleep(0.05)
+            assert daemon.get_stats()["clients"] == 0, "❌ Clientes no liberados"
+
+        assert not os.path.exists(path), "❌ Socket no eliminado"
+    print("✅ Daemon detenido correctamente")
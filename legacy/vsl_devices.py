@@ -0,0 +1,537 @@
+"""
+VSL-DSP Multi-Device Module
+Gestor de varias unidades AudioBox VSL en el mismo host.
+
+VSLDevice es un singleton que abre siempre el par VSL_VENDOR_ID /
+VSL_PRODUCT_ID. En un rack con varias 22, 44 y 1818 VSL cada unidad se
+abre aquí por ruta HID o número de serie, el modelo se deduce del PID
+(tabla AUDIOBOX_MODELS, espejo de audiobox_vsl.h) y cada unidad tiene su
+propio handle, su propia VSLSendQueue y su propio hilo escritor: el
+tráfico hacia una unidad lenta nunca bloquea a las demás.
+"""
+
+import importlib.util
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+# hidapi se importa solo si no se inyectan handle_factory y enumerate_fn
+HID_AVAILABLE = importlib.util.find_spec("hid") is not None
+
+from vsl_config import AUDIOBOX_VENDOR_ID, VSLModel, lookup_model
+from vsl_log import get_event_log
+from vsl_metrics import VSLMetrics, WRITES_SKIPPED, DISCONNECTS, RECONNECTS
+from vsl_send_queue import VSLPriority, VSLSendQueue
+from vsl_state import VSLShadowState, SOURCE_WRITE
+from vsl_transport import VSLPacket
+
+
+DEFAULT_RECONNECT_TIMEOUT_S = 10.0
+RECOVERY_SAMPLES = 64
+
+
+def _path_key(path) -> str:
+    return path.decode(errors="replace") if isinstance(path, bytes) else str(path)
+
+
+def unit_key(info: Dict) -> str:
+    """Clave estable de una unidad: número de serie, o ruta HID si no tiene."""
+    return info.get("serial_number") or _path_key(info["path"])
+
+
+# ============================================================================
+# UNIDAD
+# ============================================================================
+
+class VSLUnit:
+    """
+    Una unidad abierta: handle, modelo, cola de envío y estado opcional.
+
+    Equivale a un VSLDevice no singleton y sin salida por consola en el
+    camino de envío (los errores se cuentan en write_errors).
+
+    Con reconnect activo (lo activa VSLHotplugMonitor), un fallo de
+    escritura cierra el handle y el hilo de la cola espera a que la unidad
+    vuelva (hasta reconnect_timeout_s) en lugar de descartar paquetes: lo
+    que quedó encolado se reenvía en orden tras reattach(). Sin nadie que
+    reabra la unidad, el paquete fallido se descarta y el handle sigue
+    abierto.
+    """
+
+    def __init__(self, key: str, handle: Any, model: VSLModel,
+                 path, serial: str = "",
+                 state: Optional[VSLShadowState] = None,
+                 reconnect_timeout_s: float = DEFAULT_RECONNECT_TIMEOUT_S,
+                 metrics: Optional[VSLMetrics] = None,
+                 reconnect: bool = False):
+        self.key = key
+        self.model = model
+        self.path = path
+        self.serial = serial
+        self.reconnect_timeout_s = reconnect_timeout_s
+        self.reconnect = reconnect
+        self._handle = handle
+        self._state = state
+        self._connected = threading.Event()
+        self._connected.set()
+        self._handle_lock = threading.Lock()
+        self._t_lost: Optional[float] = None
+        self._closed = False
+        self.recovery_times: deque = deque(maxlen=RECOVERY_SAMPLES)
+        self._metrics = metrics
+        self._labels = (("unit", key),)
+        self._queue = VSLSendQueue(self.send_packet, metrics=metrics,
+                                   metrics_labels=self._labels)
+        self._queue.start()
+        self.writes = 0
+        self.skipped_writes = 0
+        self.write_errors = 0
+
+    @property
+    def handle(self) -> Any:
+        return self._handle
+
+    @property
+    def queue(self) -> VSLSendQueue:
+        return self._queue
+
+    @property
+    def state(self) -> Optional[VSLShadowState]:
+        return self._state
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def send_packet(self, packet: VSLPacket) -> bool:
+        """
+        Escribe un paquete directamente (usado por el hilo de la cola).
+
+        Con reconnect activo, un fallo de escritura marca la unidad como
+        desconectada y el mismo paquete se reintenta tras la reconexión;
+        sin él, el paquete cuenta como fallido y retorna False.
+        """
+        if self._state is not None and self._state.matches(packet.param_id,
+                                                           packet.encoded_value):
+            self.skipped_writes += 1
+            if self._metrics is not None:
+                self._metrics.inc(WRITES_SKIPPED, 1, self._labels)
+            return True
+
+        metrics = self._metrics
+        while True:
+            if not self._connected.wait(self.reconnect_timeout_s) or self._closed:
+                self.write_errors += 1
+                if metrics is not None:
+                    metrics.record_failure(packet.param_id, self._labels)
+                return False
+            handle = self._handle
+            t_write = time.perf_counter()
+            try:
+                written = handle.write(packet.buffer) if handle is not None else -1
+            except Exception:
+                written = -1
+            if written >= 0:
+                break
+            self.write_errors += 1
+            if metrics is not None:
+                metrics.record_failure(packet.param_id, self._labels)
+            if not self.reconnect:
+                return False
+            self.mark_disconnected(handle)
+
+        self.writes += 1
+        if metrics is not None:
+            metrics.record_write(packet.param_id, written,
+                                 time.perf_counter() - t_write, self._labels)
+        if self._state is not None:
+            self._state.update(packet.param_id, packet.encoded_value, SOURCE_WRITE)
+        return True
+
+    # ------------------------------------------------------------------
+    # Desconexión / reconexión
+    # ------------------------------------------------------------------
+
+    def mark_disconnected(self, failed_handle: Any = None):
+        """
+        Cierra el handle actual y pausa el envío hasta reattach().
+
+        Args:
+            failed_handle: Handle que falló (si ya fue reemplazado, no se hace nada)
+        """
+        with self._handle_lock:
+            if failed_handle is not None and failed_handle is not self._handle:
+                return
+            if not self._connected.is_set():
+                return
+            self._connected.clear()
+            self._t_lost = time.perf_counter()
+            handle, self._handle = self._handle, None
+        # Al volver, la unidad estará en estado de fábrica
+        if self._state is not None:
+            self._state.invalidate()
+        if self._metrics is not None:
+            self._metrics.inc(DISCONNECTS, 1, self._labels)
+        if handle is not None:
+            try:
+                handle.close()
+            except Exception:
+                pass
+
+    def reattach(self, handle: Any, path=None):
+        """Instala un handle reabierto y reanuda el envío de lo encolado."""
+        if self._state is not None:
+            self._state.invalidate()
+        with self._handle_lock:
+            self._handle = handle
+            if path is not None:
+                self.path = path
+            if self._t_lost is not None:
+                self.recovery_times.append(time.perf_counter() - self._t_lost)
+                self._t_lost = None
+            self._connected.set()
+        if self._metrics is not None:
+            self._metrics.inc(RECONNECTS, 1, self._labels)
+
+    def get_recovery_stats(self) -> Dict[str, float]:
+        """
+        Tiempo de recuperación (desconexión detectada → unidad reabierta).
+
+        Returns:
+            Diccionario con count, last_ms, max_ms
+        """
+        samples = list(self.recovery_times)
+        return {"count": len(samples),
+                "last_ms": samples[-1] * 1000.0 if samples else 0.0,
+                "max_ms": max(samples) * 1000.0 if samples else 0.0}
+
+    def submit(self, packet: VSLPacket,
+               priority: VSLPriority = VSLPriority.INTERACTIVE) -> bool:
+        return self._queue.submit(packet, priority)
+
+    def submit_batch(self, packets: Sequence[VSLPacket],
+                     priority: VSLPriority = VSLPriority.BULK) -> bool:
+        return self._queue.submit_batch(packets, priority)
+
+    def close(self, drain: bool = True):
+        """Vacía la cola (opcional) y cierra el handle."""
+        if not self.connected:
+            # Despierta al escritor que espera la reconexión y descarta lo pendiente
+            drain = False
+            self._closed = True
+            self._connected.set()
+        self._queue.stop(drain=drain)
+        self._closed = True
+        if self._handle is not None:
+            try:
+                self._handle.close()
+            except Exception:
+                pass
+            self._handle = None
+
+    def __repr__(self) -> str:
+        return f"VSLUnit(key={self.key!r}, model={self.model.product_name!r})"
+
+
+# ============================================================================
+# GESTOR
+# ============================================================================
+
+class VSLDeviceManager:
+    """
+    Descubre y abre cualquier número de unidades VSL.
+
+    Ejemplo:
+        manager = VSLDeviceManager()
+        for unit in manager.open_all():
+            print(unit.model.product_name, unit.serial)
+        manager.fan_out([VSLPacket(0x1A01, 0, report_id=0x01)],
+                        VSLPriority.URGENT)
+    """
+
+    def __init__(self, vendor_id: int = AUDIOBOX_VENDOR_ID,
+                 handle_factory: Optional[Callable[[], Any]] = None,
+                 enumerate_fn: Optional[Callable[[int, int], List[Dict]]] = None,
+                 metrics: Optional[VSLMetrics] = None):
+        """
+        Args:
+            vendor_id: Vendor ID a enumerar
+            handle_factory: Crea un handle sin abrir (por defecto hid.device)
+            enumerate_fn: Enumeración estilo hid.enumerate(vid, pid)
+            metrics: Registro de métricas compartido por todas las unidades
+                (series etiquetadas con unit=<clave de la unidad>)
+
+        Backend hidraw directo (ver vsl_hidraw.select_backend):
+            factory, enumerate_fn = select_backend("hidraw")
+            VSLDeviceManager(handle_factory=factory, enumerate_fn=enumerate_fn)
+
+        Raises:
+            RuntimeError: Si hidapi no está disponible y no se inyectan
+                handle_factory y enumerate_fn
+        """
+        if handle_factory is None or enumerate_fn is None:
+            if not HID_AVAILABLE:
+                raise RuntimeError("hidapi no está disponible")
+            import hid
+            handle_factory = handle_factory or hid.device
+            enumerate_fn = enumerate_fn or hid.enumerate
+        self._vendor_id = vendor_id
+        self._handle_factory = handle_factory
+        self._enumerate = enumerate_fn
+        self._metrics = metrics
+        self._reconnect = False
+        self._units: Dict[str, VSLUnit] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Descubrimiento
+    # ------------------------------------------------------------------
+
+    def enumerate(self) -> List[Dict]:
+        """
+        Unidades VSL conectadas (PID presente en AUDIOBOX_MODELS).
+
+        Returns:
+            Entradas de hid.enumerate con la clave extra 'model'
+        """
+        found = []
+        for info in self._enumerate(self._vendor_id, 0):
+            model = lookup_model(info.get("product_id", 0))
+            if model is None:
+                continue
+            entry = dict(info)
+            entry["model"] = model
+            found.append(entry)
+        return found
+
+    # ------------------------------------------------------------------
+    # Apertura
+    # ------------------------------------------------------------------
+
+    def open_path(self, path, state: Optional[VSLShadowState] = None) -> VSLUnit:
+        """
+        Abre la unidad de una ruta HID concreta.
+
+        Raises:
+            ValueError: Si la ruta no corresponde a una unidad VSL conectada
+            OSError: Si el handle no se puede abrir
+        """
+        for info in self.enumerate():
+            if info["path"] == path:
+                return self._open(info, state)
+        raise ValueError(f"Ninguna unidad VSL en la ruta {_path_key(path)}")
+
+    def open_serial(self, serial: str, state: Optional[VSLShadowState] = None) -> VSLUnit:
+        """
+        Abre la unidad con un número de serie concreto.
+
+        Raises:
+            ValueError: Si no hay ninguna unidad VSL con ese número de serie
+        """
+        for info in self.enumerate():
+            if info.get("serial_number") == serial:
+                return self._open(info, state)
+        raise ValueError(f"Ninguna unidad VSL con número de serie {serial!r}")
+
+    def open_all(self) -> List[VSLUnit]:
+        """Abre todas las unidades VSL conectadas que aún no estén abiertas."""
+        units = []
+        for info in self.enumerate():
+            try:
+                units.append(self._open(info, None))
+            except OSError as e:
+                get_event_log().warning("unit_open_failed", "No se pudo abrir la unidad",
+                                        path=_path_key(info["path"]), error=str(e))
+        return units
+
+    def _open(self, info: Dict, state: Optional[VSLShadowState]) -> VSLUnit:
+        serial = info.get("serial_number") or ""
+        key = unit_key(info)
+        with self._lock:
+            unit = self._units.get(key)
+            if unit is not None:
+                return unit
+            handle = self._handle_factory()
+            handle.open_path(info["path"])
+            unit = VSLUnit(key, handle, info["model"], info["path"], serial, state,
+                           metrics=self._metrics, reconnect=self._reconnect)
+            self._units[key] = unit
+        return unit
+
+    def set_reconnect(self, enabled: bool):
+        """
+        Indica si hay alguien (VSLHotplugMonitor) que reabre las unidades.
+
+        Solo entonces un fallo de escritura deja la unidad en espera de
+        reattach(); sin reconexión el paquete fallido se descarta.
+        """
+        with self._lock:
+            self._reconnect = enabled
+            for unit in self._units.values():
+                unit.reconnect = enabled
+
+    def reopen(self, unit: VSLUnit, info: Dict):
+        """
+        Reabre una unidad desconectada en su (posiblemente nueva) ruta.
+
+        Raises:
+            OSError: Si el handle no se puede abrir
+        """
+        handle = self._handle_factory()
+        handle.open_path(info["path"])
+        unit.reattach(handle, info["path"])
+
+    # ------------------------------------------------------------------
+    # Acceso
+    # ------------------------------------------------------------------
+
+    @property
+    def units(self) -> List[VSLUnit]:
+        with self._lock:
+            return list(self._units.values())
+
+    def get(self, key: str) -> Optional[VSLUnit]:
+        """Unidad abierta por número de serie (o ruta si no tiene serie)."""
+        return self._units.get(key)
+
+    def by_model(self, pid: int) -> List[VSLUnit]:
+        return [unit for unit in self.units if unit.model.pid == pid]
+
+    def close(self, key: str, drain: bool = True):
+        with self._lock:
+            unit = self._units.pop(key, None)
+        if unit is not None:
+            unit.close(drain)
+
+    def close_all(self, drain: bool = True):
+        with self._lock:
+            units, self._units = list(self._units.values()), {}
+        for unit in units:
+            unit.close(drain)
+
+    # ------------------------------------------------------------------
+    # Fan-out
+    # ------------------------------------------------------------------
+
+    def fan_out(self, packets: Sequence[VSLPacket],
+                priority: VSLPriority = VSLPriority.INTERACTIVE,
+                units: Optional[Iterable[VSLUnit]] = None) -> int:
+        """
+        Encola el mismo lote en varias unidades a la vez.
+
+        Cada unidad lo escribe desde su propio hilo, así que el tiempo total
+        es el de la unidad más lenta y no la suma de todas.
+
+        Returns:
+            Número de unidades que aceptaron el lote
+        """
+        targets = list(units) if units is not None else self.units
+        return sum(1 for unit in targets if unit.submit_batch(packets, priority))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que todas las colas se vacíen."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for unit in self.units:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not unit.queue.flush(remaining):
+                return False
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close_all()
+
+
+if __name__ == "__main__":
+    from vsl_fake_device import FakeVSLHandle
+
+    print("=== Tests de vsl_devices.py ===\n")
+
+    # Rack simulado: una 22, una 44 y una 1818 (la 1818 con escrituras lentas)
+    SLOW_WRITE_S = 0.005
+    rack = [
+        {"path": b"/dev/hidraw0", "vendor_id": AUDIOBOX_VENDOR_ID,
+         "product_id": 0x0101, "serial_number": "VSL22-0001"},
+        {"path": b"/dev/hidraw1", "vendor_id": AUDIOBOX_VENDOR_ID,
+         "product_id": 0x0102, "serial_number": "VSL44-0001"},
+        {"path": b"/dev/hidraw2", "vendor_id": AUDIOBOX_VENDOR_ID,
+         "product_id": 0x0103, "serial_number": ""},
+        {"path": b"/dev/hidraw3", "vendor_id": AUDIOBOX_VENDOR_ID,
+         "product_id": 0x9999, "serial_number": "OTRO"},
+    ]
+
+    class RackHandle(FakeVSLHandle):
+        def open_path(self, path: bytes):
+            super().open_path(path)
+            self.slow = path == b"/dev/hidraw2"
+
+        def write(self, data) -> int:
+            if self.slow:
+                time.sleep(SLOW_WRITE_S)
+            return super().write(data)
+
+    manager = VSLDeviceManager(handle_factory=lambda: RackHandle(latency_s=0.0),
+                               enumerate_fn=lambda vid, pid: rack)
+
+    # Test 1: Enumeración y modelo por PID
+    print("Test 1: Apertura de todas las unidades")
+    units = manager.open_all()
+    for unit in units:
+        print(f"  {unit.key:<14} → {unit.model.product_name}")
+    assert [u.model.pid for u in units] == [0x0101, 0x0102, 0x0103], "❌ Modelos incorrectos"
+    assert manager.open_serial("VSL44-0001") is units[1], "❌ Unidad duplicada"
+    assert units[2].key == "/dev/hidraw2", "❌ Clave por ruta incorrecta"
+    print("  ✅ Unidades abiertas por serie o ruta\n")
+
+    # Test 2: Una unidad lenta no bloquea a las demás
+    print("Test 2: Fan-out de 100 paquetes a 3 unidades (1818 lenta)")
+    packets = [VSLPacket(0x1A01, i, report_id=0x01) for i in range(100)]
+    t0 = time.perf_counter()
+    accepted = manager.fan_out(packets, VSLPriority.BULK)
+    units[0].queue.flush()
+    units[1].queue.flush()
+    fast_ms = (time.perf_counter() - t0) * 1000.0
+    manager.flush()
+    total_ms = (time.perf_counter() - t0) * 1000.0
+    serial_ms = 100 * SLOW_WRITE_S * 1000.0
+    print(f"  Unidades rápidas listas en {fast_ms:.1f} ms; "
+          f"todas en {total_ms:.1f} ms (solo la lenta: {serial_ms:.0f} ms)")
+    assert accepted == 3, "❌ Lote rechazado"
+    assert all(u.handle.writes == 100 for u in units), "❌ Escrituras perdidas"
+    assert fast_ms < serial_ms / 4, "❌ La unidad lenta bloqueó a las rápidas"
+    assert total_ms < serial_ms * 1.5, "❌ El fan-out no es paralelo"
+    print("  ✅ Colas independientes por unidad\n")
+
+    # Test 3: Sin monitor de hotplug un fallo no deja la unidad en espera
+    print("Test 3: Fallo de escritura aislado sin reconexión")
+    unit = units[0]
+    unit.reconnect_timeout_s = 0.5
+    flaky = unit.handle
+    real_write = flaky.write
+    calls = []
+
+    def write_fifth_failing(data):
+        calls.append(data)
+        return -1 if len(calls) == 5 else real_write(data)
+    flaky.write = write_fifth_failing
+
+    before_writes, before_errors = flaky.writes, unit.write_errors
+    t0 = time.perf_counter()
+    for i in range(10):
+        unit.submit(VSLPacket(0x1A02, i, report_id=0x01), VSLPriority.BULK)
+    unit.queue.flush()
+    flush_ms = (time.perf_counter() - t0) * 1000.0
+    print(f"  Escrituras: {flaky.writes - before_writes}  "
+          f"Errores: {unit.write_errors - before_errors}  Flush: {flush_ms:.1f} ms")
+    assert unit.connected and unit.handle is flaky and not flaky._closed, "❌ Handle cerrado"
+    assert flaky.writes - before_writes == 9 and unit.write_errors - before_errors == 1, \
+        "❌ Escrituras perdidas tras el fallo"
+    assert flush_ms < 250.0, "❌ La cola esperó una reconexión que nadie hará"
+    print("  ✅ Paquete fallido descartado, unidad operativa\n")
+
+    manager.close_all()
+    assert not manager.units, "❌ Unidades sin cerrar"
+    print("✅ Gestor cerrado correctamente")
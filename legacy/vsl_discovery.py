@@ -0,0 +1,333 @@
+"""
+VSL-DSP Discovery Module
+Caché de descubrimiento de dispositivos y reconexión en caliente.
+
+enumerate_vsl_devices() recorre toda la lista de hid.enumerate() y
+compara nombres de fabricante en cada llamada. Aquí la enumeración se
+filtra por Vendor ID en origen y el resultado se indexa por
+(VID, PID, serie) y por ruta; las búsquedas posteriores no tocan el bus.
+
+VSLHotplugMonitor refresca la caché por sondeo (o en cuanto udev avisa,
+si pyudev está instalado), marca como desconectadas las unidades que
+desaparecen y reabre en cada ciclo las que están en el bus pero
+desconectadas (replug, fallo de escritura transitorio o reapertura
+fallida). Los paquetes encolados
+mientras tanto se reenvían en orden (ver VSLUnit) y el tiempo de
+recuperación queda registrado en cada unidad.
+"""
+
+import importlib.util
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# hidapi y pyudev se importan en el primer uso
+HID_AVAILABLE = importlib.util.find_spec("hid") is not None
+PYUDEV_AVAILABLE = importlib.util.find_spec("pyudev") is not None
+
+from vsl_config import AUDIOBOX_VENDOR_ID, lookup_model
+from vsl_devices import VSLDeviceManager, unit_key
+from vsl_log import get_event_log
+
+
+DEFAULT_POLL_INTERVAL_S = 0.5
+
+# Clave del índice principal
+DeviceKey = Tuple[int, int, str]   # (vendor_id, product_id, serial_number)
+
+
+# ============================================================================
+# CACHÉ
+# ============================================================================
+
+class VSLDiscoveryCache:
+    """
+    Índice de dispositivos PreSonus conectados.
+
+    enumerate() tiene la firma de hid.enumerate(vid, pid), así que la caché
+    puede pasarse como enumerate_fn de VSLDeviceManager.
+    """
+
+    def __init__(self, vendor_id: int = AUDIOBOX_VENDOR_ID,
+                 enumerate_fn: Optional[Callable[[int, int], List[Dict]]] = None):
+        """
+        Raises:
+            RuntimeError: Si hidapi no está disponible y no se inyecta enumerate_fn
+        """
+        if enumerate_fn is None:
+            if not HID_AVAILABLE:
+                raise RuntimeError("hidapi no está disponible")
+            import hid
+            enumerate_fn = hid.enumerate
+        self._vendor_id = vendor_id
+        self._enumerate = enumerate_fn
+        self._by_key: Dict[DeviceKey, Dict] = {}
+        self._by_path: Dict[Any, Dict] = {}
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.refreshes = 0
+
+    def refresh(self) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Vuelve a enumerar el Vendor ID y actualiza el índice.
+
+        Returns:
+            (entradas nuevas, entradas desaparecidas)
+        """
+        by_key: Dict[DeviceKey, Dict] = {}
+        for info in self._enumerate(self._vendor_id, 0):
+            product_id = info.get("product_id", 0)
+            model = lookup_model(product_id)
+            if model is None:
+                continue
+            entry = dict(info)
+            entry["model"] = model
+            key = (info.get("vendor_id", self._vendor_id), product_id,
+                   info.get("serial_number") or "")
+            # Sin número de serie, la ruta distingue unidades iguales
+            if not key[2]:
+                key = key[:2] + (unit_key(info),)
+            by_key[key] = entry
+
+        with self._lock:
+            added = [by_key[k] for k in by_key.keys() - self._by_key.keys()]
+            removed = [self._by_key[k] for k in self._by_key.keys() - by_key.keys()]
+            # Misma unidad en otra ruta (replug en otro puerto)
+            for key in by_key.keys() & self._by_key.keys():
+                if by_key[key]["path"] != self._by_key[key]["path"]:
+                    removed.append(self._by_key[key])
+                    added.append(by_key[key])
+            self._by_key = by_key
+            self._by_path = {entry["path"]: entry for entry in by_key.values()}
+            self.refreshes += 1
+            if added or removed:
+                self.generation += 1
+        return added, removed
+
+    def enumerate(self, vendor_id: int = 0, product_id: int = 0) -> List[Dict]:
+        """Entradas en caché (refresca solo si la caché nunca se llenó)."""
+        if self.refreshes == 0:
+            self.refresh()
+        with self._lock:
+            return [entry for entry in self._by_key.values()
+                    if (not vendor_id or entry.get("vendor_id") == vendor_id)
+                    and (not product_id or entry.get("product_id") == product_id)]
+
+    def find(self, product_id: Optional[int] = None,
+             serial: Optional[str] = None, path=None) -> Optional[Dict]:
+        """Primera entrada que coincide con todos los criterios dados."""
+        with self._lock:
+            if path is not None:
+                entry = self._by_path.get(path)
+                candidates = [entry] if entry is not None else []
+            else:
+                candidates = list(self._by_key.values())
+        for entry in candidates:
+            if product_id is not None and entry.get("product_id") != product_id:
+                continue
+            if serial is not None and (entry.get("serial_number") or "") != serial:
+                continue
+            return entry
+        return None
+
+
+# ============================================================================
+# HOTPLUG
+# ============================================================================
+
+class VSLHotplugMonitor:
+    """
+    Hilo que mantiene la caché al día y reconecta las unidades abiertas.
+
+    Mientras corre, las unidades del gestor esperan la reconexión ante un
+    fallo de escritura (VSLDeviceManager.set_reconnect).
+
+    Con pyudev, cada evento del subsistema hidraw provoca un refresco
+    inmediato; sin él, se sondea cada interval_s.
+    """
+
+    def __init__(self, cache: VSLDiscoveryCache, manager: VSLDeviceManager,
+                 interval_s: float = DEFAULT_POLL_INTERVAL_S,
+                 use_udev: bool = True):
+        self._cache = cache
+        self._manager = manager
+        self._interval_s = interval_s
+        self._use_udev = use_udev and PYUDEV_AVAILABLE
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+        self.reconnects = 0
+        self.disconnects = 0
+        self.reopen_errors = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._cache.refresh()
+        self._manager.set_reconnect(True)
+        if self._use_udev:
+            import pyudev
+            context = pyudev.Context()
+            monitor = pyudev.Monitor.from_netlink(context)
+            monitor.filter_by(subsystem="hidraw")
+            self._observer = pyudev.MonitorObserver(
+                monitor, lambda action, device: self._wake.set())
+            self._observer.start()
+        self._thread = threading.Thread(
+            target=self._monitor_loop, name="vsl-hotplug", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self._manager.set_reconnect(False)
+
+    def poll(self):
+        """Un ciclo de refresco y reconexión (lo llama el hilo)."""
+        added, removed = self._cache.refresh()
+        for info in removed:
+            unit = self._manager.get(unit_key(info))
+            if unit is not None and unit.path == info["path"]:
+                unit.mark_disconnected()
+                self.disconnects += 1
+        # Toda unidad presente en el bus y desconectada se reabre, no solo las
+        # recién enchufadas: un fallo de escritura transitorio o una
+        # reapertura fallida dejan la unidad desconectada sin salir del bus
+        for info in self._cache.enumerate():
+            unit = self._manager.get(unit_key(info))
+            if unit is None or unit.connected:
+                continue
+            try:
+                self._manager.reopen(unit, info)
+                self.reconnects += 1
+            except OSError as e:
+                self.reopen_errors += 1
+                get_event_log().warning("unit_reopen_failed", "No se pudo reabrir la unidad",
+                                        unit=unit.key, error=str(e))
+
+    def _monitor_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self._interval_s)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.poll()
+            except Exception as e:
+                get_event_log().error("hotplug_poll_failed", "Error en el monitor de hotplug",
+                                      error=str(e))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import time
+
+    from vsl_fake_device import FakeVSLHandle
+    from vsl_send_queue import VSLPriority
+    from vsl_transport import VSLPacket
+
+    print("=== Tests de vsl_discovery.py ===\n")
+
+    bus = [
+        {"path": b"/dev/hidraw0", "vendor_id": AUDIOBOX_VENDOR_ID,
+         "product_id": 0x0102, "serial_number": "VSL44-0001"},
+        {"path": b"/dev/hidraw1", "vendor_id": AUDIOBOX_VENDOR_ID,
+         "product_id": 0x0103, "serial_number": "VSL1818-0001"},
+    ]
+    enumerations = []
+
+    def fake_enumerate(vendor_id: int, product_id: int) -> List[Dict]:
+        enumerations.append(vendor_id)
+        return list(bus)
+
+    handles: List[FakeVSLHandle] = []
+
+    def handle_factory() -> FakeVSLHandle:
+        handles.append(FakeVSLHandle(latency_s=0.0))
+        return handles[-1]
+
+    cache = VSLDiscoveryCache(enumerate_fn=fake_enumerate)
+    manager = VSLDeviceManager(handle_factory=handle_factory,
+                               enumerate_fn=cache.enumerate)
+
+    # Test 1: Búsquedas sin tocar el bus
+    print("Test 1: Índice por VID/PID/serie")
+    cache.refresh()
+    before = len(enumerations)
+    for _ in range(1000):
+        cache.find(product_id=0x0103, serial="VSL1818-0001")
+    unit = manager.open_serial("VSL1818-0001")
+    print(f"  Enumeraciones para 1000 búsquedas + open: {len(enumerations) - before}")
+    assert len(enumerations) == before, "❌ La búsqueda volvió a enumerar"
+    print("  ✅ Búsquedas servidas desde la caché\n")
+
+    # Test 2: Desconexión, reconexión en otra ruta y reenvío
+    print("Test 2: Desenchufar / volver a enchufar con escrituras en curso")
+    with VSLHotplugMonitor(cache, manager, interval_s=0.01) as monitor:
+        for i in range(100):
+            unit.submit(VSLPacket(0x1A01, i, report_id=0x01), VSLPriority.BULK)
+        unit.queue.flush()
+
+        # Desenchufado: el handle falla y la unidad desaparece del bus
+        handles[0].close()
+        bus.pop(1)
+        for i in range(100, 200):
+            unit.submit(VSLPacket(0x1A01, i, report_id=0x01), VSLPriority.BULK)
+        time.sleep(0.1)
+        assert not unit.connected, "❌ Desconexión no detectada"
+
+        # Re-enchufado en otro puerto
+        bus.append({"path": b"/dev/hidraw5", "vendor_id": AUDIOBOX_VENDOR_ID,
+                    "product_id": 0x0103, "serial_number": "VSL1818-0001"})
+        unit.queue.flush(timeout=2.0)
+
+    recovery = unit.get_recovery_stats()
+    replayed = handles[-1].writes
+    print(f"  Escrituras: {handles[0].writes} antes + {replayed} tras reconectar "
+          f"(ruta {unit.path.decode()})")
+    print(f"  Tiempo de recuperación: {recovery['last_ms']:.1f} ms "
+          f"({monitor.disconnects} desconexión, {monitor.reconnects} reconexión)")
+    assert handles[0].writes + replayed == 200, "❌ Se perdieron escrituras"
+    assert recovery["count"] == 1, "❌ Recuperación no registrada"
+    print("  ✅ Escrituras encoladas reenviadas tras la reconexión")
+
+    # Test 3: Un fallo de escritura transitorio con la unidad en el bus
+    print("\nTest 3: Fallo de escritura aislado sin desenchufar")
+    with VSLHotplugMonitor(cache, manager, interval_s=0.01) as monitor:
+        flaky = handles[-1]
+        flaky.fail_rate = 1.0          # Solo la próxima escritura falla
+        real_write = flaky.write
+
+        def write_once_failing(data):
+            result = real_write(data)
+            flaky.fail_rate = 0.0
+            return result
+        flaky.write = write_once_failing
+
+        before = unit.write_errors
+        for i in range(20):
+            unit.submit(VSLPacket(0x1A01, 300 + i, report_id=0x01), VSLPriority.BULK)
+        flushed = unit.queue.flush(timeout=2.0)
+
+    print(f"  connected={unit.connected}, errores={unit.write_errors - before}, "
+          f"reconexiones={monitor.reconnects}, escrituras nuevas={handles[-1].writes}")
+    assert flushed and unit.connected, "❌ La unidad no se recuperó"
+    assert unit.write_errors - before == 1 and monitor.reconnects == 1, "❌ Recuento"
+    assert handles[-1].writes == 20, "❌ Se perdieron escrituras tras el fallo"
+    print("  ✅ Unidad reabierta en la misma ruta y escrituras reenviadas")
+
+    manager.close_all()
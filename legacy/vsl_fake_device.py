@@ -0,0 +1,409 @@
+"""
+VSL-DSP Fake Device Module
+Dispositivo HID simulado con la misma interfaz que el handle de hidapi.
+
+Permite medir el camino de envío sin hardware: cada escritura se
+"procesa" tras una latencia configurable y el dispositivo devuelve un
+reporte de entrada con el eco de (report_id, param_id, valor), que es la
+confirmación esperada por el modo pipeline.
+
+Modelo configurable:
+  - Latencia por escritura: constante o una distribución (ver
+    constant_latency, uniform_latency, lognormal_latency)
+  - Límite de ancho de banda: write() bloquea como lo haría un endpoint
+    de interrupción saturado
+  - Inyección de fallos: escrituras fallidas aleatorias y desconexión
+    tras N escrituras (o manual con disconnect()/reconnect())
+  - Reportes de entrada espontáneos reproducidos desde una captura pcap
+    (ver load_pcap_input_reports)
+
+Se conecta a VSLDevice con VSLDevice(handle_factory=lambda: FakeVSLHandle(...)).
+"""
+
+import heapq
+import math
+import random
+import struct
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from vsl_config import VSL_PACKET_SIZE
+
+
+LatencyModel = Callable[[random.Random], float]
+
+# Reporte de entrada programado: (segundos desde el inicio, payload)
+InputReport = Tuple[float, bytes]
+
+
+# ============================================================================
+# MODELOS DE LATENCIA
+# ============================================================================
+
+def constant_latency(seconds: float) -> LatencyModel:
+    return lambda rng: seconds
+
+
+def uniform_latency(low_s: float, high_s: float) -> LatencyModel:
+    return lambda rng: rng.uniform(low_s, high_s)
+
+
+def lognormal_latency(median_s: float, sigma: float = 0.5) -> LatencyModel:
+    """Cola larga típica de la planificación USB: mediana median_s."""
+    mu = math.log(median_s)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+# ============================================================================
+# REPORTES DE ENTRADA DESDE PCAP
+# ============================================================================
+
+# Cabecera usbmon por linktype (220 = mmapped de 64 bytes, 189 = 48 bytes)
+_USBMON_HEADER_SIZE = {220: 64, 189: 48}
+_URB_COMPLETE = ord("C")
+_XFER_INTERRUPT = 1
+
+
+def load_pcap_input_reports(path: str, endpoint: int = 0x81,
+                            devnum: Optional[int] = None,
+                            max_reports: Optional[int] = None) -> List[InputReport]:
+    """
+    Extrae los reportes de entrada (interrupt IN completados) de una captura usbmon.
+
+    Args:
+        path: Archivo pcap (linktype 189 o 220)
+        endpoint: Endpoint IN a extraer
+        devnum: Dirección USB del dispositivo (None = cualquiera)
+        max_reports: Límite de reportes devueltos
+
+    Returns:
+        Lista de (segundos desde el primer reporte, payload)
+
+    Raises:
+        ValueError: Si el archivo no es un pcap usbmon soportado
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < 24:
+        raise ValueError("pcap truncado")
+
+    magic = data[:4]
+    if magic == b"\xd4\xc3\xb2\xa1":
+        endian = "<"
+    elif magic == b"\xa1\xb2\xc3\xd4":
+        endian = ">"
+    else:
+        raise ValueError("No es un pcap clásico (¿pcapng?)")
+    linktype = struct.unpack_from(endian + "I", data, 20)[0]
+    header_size = _USBMON_HEADER_SIZE.get(linktype)
+    if header_size is None:
+        raise ValueError(f"Linktype no soportado: {linktype}")
+
+    reports: List[InputReport] = []
+    t_first = None
+    offset = 24
+    record = struct.Struct(endian + "IIII")
+    while offset + record.size <= len(data):
+        ts_sec, ts_usec, incl_len, _ = record.unpack_from(data, offset)
+        offset += record.size
+        urb = data[offset:offset + incl_len]
+        offset += incl_len
+        if len(urb) <= header_size:
+            continue
+        # usbmon: [8] tipo de URB, [9] tipo de transferencia, [10] endpoint, [11] dispositivo
+        if urb[8] != _URB_COMPLETE or urb[9] != _XFER_INTERRUPT or urb[10] != endpoint:
+            continue
+        if devnum is not None and urb[11] != devnum:
+            continue
+        timestamp = ts_sec + ts_usec / 1e6
+        if t_first is None:
+            t_first = timestamp
+        reports.append((timestamp - t_first, bytes(urb[header_size:])))
+        if max_reports is not None and len(reports) >= max_reports:
+            break
+    return reports
+
+
+# ============================================================================
+# DISPOSITIVO SIMULADO
+# ============================================================================
+
+class FakeVSLHandle:
+    """
+    Sustituto de hid.device() para pruebas y benchmarks.
+
+    Implementa write(), read(), close() y los getters de strings de
+    hidapi. Las respuestas se entregan en orden de vencimiento, de modo
+    que varias escrituras pueden estar "en vuelo" a la vez.
+    """
+
+    def __init__(self, latency_s: float = 0.001, drop_rate: float = 0.0,
+                 seed: Optional[int] = None,
+                 latency_model: Optional[LatencyModel] = None,
+                 bandwidth_bps: Optional[float] = None,
+                 fail_rate: float = 0.0,
+                 disconnect_after: Optional[int] = None,
+                 input_reports: Optional[Sequence[InputReport]] = None,
+                 input_time_scale: float = 1.0,
+                 input_loop: bool = False):
+        """
+        Args:
+            latency_s: Tiempo entre una escritura y su reporte de eco
+            drop_rate: Probabilidad (0.0 - 1.0) de no responder a una escritura
+            seed: Semilla del generador aleatorio (reproducibilidad)
+            latency_model: Distribución de latencia (sustituye a latency_s)
+            bandwidth_bps: Bytes por segundo aceptados como máximo (None = sin límite)
+            fail_rate: Probabilidad de que write() falle (retorna -1)
+            disconnect_after: Escrituras tras las que el dispositivo se desconecta
+            input_reports: Reportes espontáneos (p.ej. load_pcap_input_reports)
+            input_time_scale: Factor sobre los tiempos de input_reports
+            input_loop: Repetir input_reports indefinidamente
+        """
+        if latency_s < 0.0:
+            raise ValueError("latency_s debe ser >= 0")
+        if not (0.0 <= drop_rate <= 1.0):
+            raise ValueError("drop_rate debe estar en [0, 1]")
+        if not (0.0 <= fail_rate <= 1.0):
+            raise ValueError("fail_rate debe estar en [0, 1]")
+        if bandwidth_bps is not None and bandwidth_bps <= 0:
+            raise ValueError("bandwidth_bps debe ser > 0")
+
+        self.latency_s = latency_s
+        self.drop_rate = drop_rate
+        self.fail_rate = fail_rate
+        self.bandwidth_bps = bandwidth_bps
+        self.disconnect_after = disconnect_after
+        self._latency_model = latency_model or constant_latency(latency_s)
+        self._rng = random.Random(seed)
+
+        self._cond = threading.Condition()
+        self._responses: List[Tuple[float, int, bytes]] = []
+        self._sequence = 0
+        self._closed = False
+        self.connected = True
+        self._link_free_at = 0.0
+
+        self._inputs = list(input_reports or ())
+        self._input_scale = input_time_scale
+        self._input_loop = input_loop and bool(self._inputs)
+        self._input_period = (self._inputs[-1][0] * input_time_scale + 0.001
+                              if self._inputs else 0.0)
+        self._input_index = 0
+        self._input_t0 = time.monotonic()
+
+        self.writes = 0
+        self.dropped = 0
+        self.failures = 0
+        self.bytes_written = 0
+        self.input_reports_sent = 0
+
+    # ------------------------------------------------------------------
+    # Interfaz hidapi
+    # ------------------------------------------------------------------
+
+    def open(self, vendor_id: int = 0, product_id: int = 0, serial=None):
+        self._closed = False
+        self._input_t0 = time.monotonic()
+
+    def open_path(self, path: bytes):
+        self._closed = False
+        self._input_t0 = time.monotonic()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get_manufacturer_string(self) -> str:
+        return "PreSonus (simulado)"
+
+    def get_product_string(self) -> str:
+        return "AudioBox VSL (simulado)"
+
+    def set_nonblocking(self, enable: bool) -> int:
+        return 0
+
+    def write(self, data) -> int:
+        """Acepta un reporte de salida y programa su eco."""
+        if self._closed or not self.connected:
+            return -1
+        if self.fail_rate and self._rng.random() < self.fail_rate:
+            self.failures += 1
+            return -1
+
+        if self.bandwidth_bps is not None:
+            now = time.monotonic()
+            with self._cond:
+                start = max(now, self._link_free_at)
+                self._link_free_at = start + len(data) / self.bandwidth_bps
+                done = self._link_free_at
+            if done > now:
+                time.sleep(done - now)
+
+        payload = bytes(data[:VSL_PACKET_SIZE])
+        with self._cond:
+            self.writes += 1
+            self.bytes_written += len(data)
+            if self.disconnect_after is not None and self.writes >= self.disconnect_after:
+                self.connected = False
+            if self.drop_rate and self._rng.random() < self.drop_rate:
+                self.dropped += 1
+                return len(data)
+            due = time.monotonic() + max(0.0, self._latency_model(self._rng))
+            self._sequence += 1
+            heapq.heappush(self._responses, (due, self._sequence, payload))
+            self._cond.notify_all()
+        return len(data)
+
+    def read(self, max_length: int, timeout_ms: int = 0) -> List[int]:
+        """
+        Lee el siguiente reporte de entrada vencido.
+
+        Returns:
+            Lista de enteros (como hidapi) o lista vacía si no hubo reporte
+            antes de timeout_ms (0 = no bloqueante)
+        """
+        deadline = time.monotonic() + timeout_ms / 1000.0
+        with self._cond:
+            while not self._closed and self.connected:
+                now = time.monotonic()
+                next_input = self._schedule_inputs(now)
+                if self._responses and self._responses[0][0] <= now:
+                    _, _, payload = heapq.heappop(self._responses)
+                    return list(payload[:max_length])
+                if now >= deadline:
+                    return []
+                wake = deadline
+                if self._responses:
+                    wake = min(wake, self._responses[0][0])
+                if next_input is not None:
+                    wake = min(wake, next_input)
+                self._cond.wait(wake - now)
+        return []
+
+    # ------------------------------------------------------------------
+    # Simulación
+    # ------------------------------------------------------------------
+
+    def _schedule_inputs(self, now: float) -> Optional[float]:
+        """
+        Pasa a la cola de respuestas los reportes espontáneos vencidos.
+
+        Returns:
+            Instante del siguiente reporte espontáneo (None si no quedan)
+        """
+        inputs = self._inputs
+        while inputs:
+            cycle, index = divmod(self._input_index, len(inputs))
+            if cycle and not self._input_loop:
+                return None
+            offset, payload = inputs[index]
+            due = self._input_t0 + cycle * self._input_period + offset * self._input_scale
+            if due > now:
+                return due
+            self._sequence += 1
+            heapq.heappush(self._responses, (due, self._sequence, payload))
+            self._input_index += 1
+            self.input_reports_sent += 1
+        return None
+
+    def disconnect(self):
+        """Simula un desenchufado: todas las operaciones fallan."""
+        with self._cond:
+            self.connected = False
+            self._responses.clear()
+            self._cond.notify_all()
+
+    def reconnect(self):
+        with self._cond:
+            self.connected = True
+            if self.disconnect_after is not None:
+                self.disconnect_after += self.writes
+
+
+if __name__ == "__main__":
+    import os
+
+    from vsl_transport import VSLPacket, parse_vsl_report
+
+    print("=== Tests de vsl_fake_device.py ===\n")
+
+    # Test 1: Eco tras la latencia configurada
+    print("Test 1: Eco con latencia constante")
+    handle = FakeVSLHandle(latency_s=0.002)
+    packet = VSLPacket(0x1A01, 40793, report_id=0x01)
+
+    t0 = time.monotonic()
+    handle.write(packet.buffer)
+    assert handle.read(64, timeout_ms=0) == [], "❌ Eco entregado antes de tiempo"
+    echo = handle.read(64, timeout_ms=50)
+    rtt_ms = (time.monotonic() - t0) * 1000.0
+
+    print(f"  Eco recibido: {parse_vsl_report(echo)} tras {rtt_ms:.2f} ms")
+    assert parse_vsl_report(echo) == (0x01, 0x1A01, 40793), "❌ Eco incorrecto"
+    assert rtt_ms >= 2.0, "❌ Latencia no respetada"
+    print("  ✅ Dispositivo simulado funcionando correctamente\n")
+
+    # Test 2: Distribución de latencia
+    print("Test 2: Latencia lognormal (mediana 1 ms)")
+    model = lognormal_latency(0.001, sigma=0.6)
+    rng = random.Random(7)
+    samples = sorted(model(rng) for _ in range(10000))
+    print(f"  p50={samples[5000] * 1e3:.2f} ms  p99={samples[9900] * 1e3:.2f} ms")
+    assert 0.0009 < samples[5000] < 0.0011, "❌ Mediana fuera de rango"
+    print("  ✅ Distribución con cola larga\n")
+
+    # Test 3: Límite de ancho de banda
+    print("Test 3: Límite de 64 KB/s (interrupt full-speed)")
+    handle = FakeVSLHandle(latency_s=0.0, bandwidth_bps=64000)
+    t0 = time.perf_counter()
+    for _ in range(100):
+        handle.write(packet.buffer)
+    throughput = handle.bytes_written / (time.perf_counter() - t0)
+    print(f"  {throughput:,.0f} B/s efectivos")
+    assert 40000 < throughput < 66000, "❌ Límite no respetado"
+    print("  ✅ write() bloquea al saturar el enlace\n")
+
+    # Test 4: Inyección de fallos
+    print("Test 4: Fallos aleatorios y desconexión")
+    handle = FakeVSLHandle(latency_s=0.0, fail_rate=0.1, disconnect_after=500, seed=1)
+    results = [handle.write(packet.buffer) for _ in range(1000)]
+    print(f"  Escrituras OK: {handle.writes}  Fallos inyectados: {handle.failures}  "
+          f"Conectado: {handle.connected}")
+    assert handle.writes == 500 and not handle.connected, "❌ Desconexión no simulada"
+    assert 20 < handle.failures < 100, "❌ Tasa de fallos incorrecta"
+    print("  ✅ Fallos inyectados\n")
+
+    # Test 5: Reportes de entrada reproducidos desde pcap
+    print("Test 5: Reportes de entrada desde vsl_official_complete.pcap")
+    pcap_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "vsl_official_complete.pcap")
+    reports = load_pcap_input_reports(pcap_path, endpoint=0x81, max_reports=200)
+    span = reports[-1][0]
+    handle = FakeVSLHandle(input_reports=reports, input_time_scale=0.05 / span)
+    received = []
+    t0 = time.monotonic()
+    while len(received) < len(reports) and time.monotonic() - t0 < 1.0:
+        data = handle.read(64, timeout_ms=20)
+        if data:
+            received.append(bytes(data))
+    print(f"  {len(reports)} reportes ({span:.1f} s de captura reproducidos en 50 ms), "
+          f"{len(received)} leídos; primero: {received[0].hex()}")
+    assert received == [payload for _, payload in reports], "❌ Secuencia distinta"
+    print("  ✅ Reportes reproducidos en orden\n")
+
+    # Test 6: VSLDevice sobre el dispositivo simulado
+    print("Test 6: VSLDevice con handle_factory")
+    from vsl_hid_io import VSLDevice
+
+    sim = FakeVSLHandle(latency_s=0.0)
+    VSLDevice.release()
+    device = VSLDevice(handle_factory=lambda: sim)
+    assert device.open(), "❌ No se pudo abrir el dispositivo simulado"
+    sent = device.send_packets([VSLPacket(0x1A01, i, report_id=0x01) for i in range(3)])
+    device.close()
+    VSLDevice.release()
+    print(f"  Enviados: {sent}  Escritos en el simulador: {sim.writes}")
+    assert sent == 3 and sim.writes == 3, "❌ VSLDevice no usó el simulador"
+    print("  ✅ VSLDevice funciona sin hardware ni IDs configurados")
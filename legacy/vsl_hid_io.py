@@ -3,22 +3,30 @@ VSL-DSP HID I/O Module (OPCIONAL)
 Comunicación real con hardware via hidapi.
 Requiere: pip install hidapi
 
+Los mensajes de estado se registran como eventos estructurados (ver
+vsl_log.py); el envío de paquetes solo genera eventos DEBUG.
+
 ⚠️ Este módulo solo funcionará cuando los 3 bloqueadores estén resueltos:
    - VSL_VENDOR_ID
    - VSL_PRODUCT_ID
    - VSL_REPORT_ID
 """
 
-from typing import Optional
+from typing import Callable, Optional, Sequence
+import importlib.util
+import os
 import sys
+import time
 
-try:
-    import hid
-    HID_AVAILABLE = True
-except ImportError:
-    HID_AVAILABLE = False
-    print("⚠️ Advertencia: hidapi no está instalado. I/O real no disponible.")
-    print("   Instalar con: pip install hidapi")
+from vsl_log import DEBUG, get_event_log
+
+_log = get_event_log()
+
+# hidapi se importa al abrir o enumerar, no al importar este módulo
+HID_AVAILABLE = importlib.util.find_spec("hid") is not None
+if not HID_AVAILABLE:
+    _log.debug("hidapi_missing", "hidapi no está instalado. I/O real no disponible",
+               hint="pip install hidapi")
 
 from vsl_config import (
     VSL_VENDOR_ID,
@@ -26,78 +34,145 @@ from vsl_config import (
     validate_configuration
 )
 from vsl_transport import VSLPacket
+from vsl_send_queue import VSLSendQueue, DEFAULT_STARVATION_LIMIT
+from vsl_rate_control import VSLRateController
+from vsl_pipeline import VSLPipeline, DEFAULT_WINDOW
+from vsl_state import VSLShadowState, VSLStateReader, SOURCE_WRITE
+from vsl_snapshot import restore_snapshot
+from vsl_metrics import VSLMetrics, WRITES_SKIPPED
 
 
 class VSLDevice:
     """
     Gestor de dispositivo VSL-DSP con patrón Singleton.
     Maneja la conexión HID y envío de paquetes.
+    Para varias unidades en el mismo host ver VSLDeviceManager (vsl_devices.py).
+    Sin hardware, handle_factory permite usar FakeVSLHandle (vsl_fake_device.py).
     """
     
     _instance: Optional['VSLDevice'] = None
     
-    def __new__(cls):
+    def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance._initialized = False
         return cls._instance
     
-    def __init__(self):
+    def __init__(self, handle_factory: Optional[Callable[[], object]] = None):
+        """
+        Args:
+            handle_factory: Crea el handle HID (por defecto hid.device). Con un
+                factory inyectado no se exigen hidapi ni VID/PID configurados.
+        """
         if self._initialized:
             return
         
-        if not HID_AVAILABLE:
-            raise RuntimeError("hidapi no está disponible")
-        
-        is_valid, message = validate_configuration()
-        if not is_valid:
-            raise RuntimeError(f"Configuración inválida: {message}")
+        if handle_factory is None:
+            if not HID_AVAILABLE:
+                raise RuntimeError("hidapi no está disponible")
+            
+            is_valid, message = validate_configuration()
+            if not is_valid:
+                raise RuntimeError(f"Configuración inválida: {message}")
+            import hid
+            handle_factory = hid.device
         
-        self._handle: Optional[hid.device] = None
+        self._handle_factory = handle_factory
+        self._handle = None
+        self._state: Optional[VSLShadowState] = None
+        self._metrics: Optional[VSLMetrics] = None
+        self.skipped_writes = 0
+        self.last_restore_ms: Optional[float] = None
         self._initialized = True
     
-    def open(self) -> bool:
+    def open(self, snapshot_path: Optional[str] = None) -> bool:
         """
         Abre la conexión con el dispositivo VSL.
         
+        Args:
+            snapshot_path: Snapshot persistido (ver vsl_snapshot.py) a restaurar
+                tras conectar. Si el archivo no existe se ignora.
+        
         Returns:
             True si la conexión fue exitosa, False en caso contrario
         """
         if self._handle is not None:
-            print("⚠️ Dispositivo ya está abierto")
+            _log.warning("device_already_open", "Dispositivo ya está abierto")
             return True
         
+        t_open = time.perf_counter()
         try:
-            self._handle = hid.device()
-            self._handle.open(VSL_VENDOR_ID, VSL_PRODUCT_ID)
+            self._handle = self._handle_factory()
+            self._handle.open(VSL_VENDOR_ID or 0, VSL_PRODUCT_ID or 0)
             
             # Obtener información del dispositivo
             manufacturer = self._handle.get_manufacturer_string()
             product = self._handle.get_product_string()
             
-            print(f"✅ Dispositivo VSL conectado:")
-            print(f"   Manufacturer: {manufacturer}")
-            print(f"   Product: {product}")
-            print(f"   VID:PID: {VSL_VENDOR_ID:04X}:{VSL_PRODUCT_ID:04X}")
+            ids = {}
+            if VSL_VENDOR_ID is not None and VSL_PRODUCT_ID is not None:
+                ids["vid_pid"] = f"{VSL_VENDOR_ID:04X}:{VSL_PRODUCT_ID:04X}"
+            _log.info("device_open", "Dispositivo VSL conectado",
+                      manufacturer=manufacturer, product=product, **ids)
+            
+            # El dispositivo arranca en estado de fábrica: la caché ya no lo
+            # describe y omitiría escrituras necesarias
+            if self._state is not None:
+                self._state.invalidate()
+            
+            if snapshot_path is not None and os.path.exists(snapshot_path):
+                self._restore(snapshot_path, t_open)
             
             return True
         
         except Exception as e:
-            print(f"❌ Error abriendo dispositivo: {e}")
-            self._handle = None
+            _log.error("device_open_failed", "Error abriendo dispositivo", error=str(e))
+            handle, self._handle = self._handle, None
+            if handle is not None:
+                try:
+                    handle.close()
+                except Exception:
+                    pass
             return False
     
+    def _restore(self, snapshot_path: str, t_open: float):
+        """
+        Restaura un snapshot: una carga más un único envío en bloque.
+        
+        Un snapshot que no se puede restaurar (archivo ilegible o corrupto,
+        VSL_REPORT_ID sin configurar) se registra y el dispositivo sigue abierto.
+        """
+        try:
+            restored = restore_snapshot(snapshot_path, None, self.send_packets)
+        except (OSError, ValueError, RuntimeError) as e:
+            _log.warning("snapshot_not_restored", "Snapshot no restaurado",
+                         path=snapshot_path, error=str(e))
+            return
+        
+        # Tiempo de host desde la llamada a open() hasta la mezcla restaurada
+        self.last_restore_ms = (time.perf_counter() - t_open) * 1000.0
+        _log.info("snapshot_restored", "Snapshot restaurado", params=restored,
+                  ms=round(self.last_restore_ms, 2))
+    
     def close(self):
         """Cierra la conexión con el dispositivo."""
         if self._handle:
             try:
                 self._handle.close()
-                print("✅ Dispositivo VSL cerrado")
+                _log.info("device_closed", "Dispositivo VSL cerrado")
             except Exception as e:
-                print(f"⚠️ Error cerrando dispositivo: {e}")
+                _log.warning("device_close_failed", "Error cerrando dispositivo",
+                             error=str(e))
             finally:
                 self._handle = None
     
+    @classmethod
+    def release(cls):
+        """Cierra y descarta la instancia única (la siguiente llamada crea otra)."""
+        if cls._instance is not None and cls._instance._initialized:
+            cls._instance.close()
+        cls._instance = None
+    
     def send_packet(self, packet: VSLPacket) -> bool:
         """
         Envía un paquete VSL al dispositivo.
@@ -109,33 +184,155 @@ class VSLDevice:
             True si el envío fue exitoso
         """
         if self._handle is None:
-            print("❌ Error: Dispositivo no está abierto. Llama a open() primero.")
+            _log.error("device_not_open",
+                       "Dispositivo no está abierto. Llama a open() primero.",
+                       param_id=packet.param_id)
             return False
         
         # Validar paquete antes de enviar
         is_valid, message = packet.validate()
         if not is_valid:
-            print(f"❌ Error: Paquete inválido - {message}")
+            _log.error("packet_invalid", "Paquete inválido",
+                       param_id=packet.param_id, reason=message)
             return False
         
+        # El dispositivo ya tiene este valor: la escritura sobra
+        if self._state is not None and self._state.matches(packet.param_id,
+                                                           packet.encoded_value):
+            self.skipped_writes += 1
+            if self._metrics is not None:
+                self._metrics.inc(WRITES_SKIPPED)
+            return True
+        
+        metrics = self._metrics
         try:
             # Enviar via HID Write (Output Report)
             # Nota: Alternativamente usar send_feature_report() si el dispositivo usa Feature Reports
-            bytes_written = self._handle.write(packet.buffer)
+            if metrics is not None:
+                t_write = time.perf_counter()
+                bytes_written = self._handle.write(packet.buffer)
+                if bytes_written >= 0:
+                    metrics.record_write(packet.param_id, bytes_written,
+                                         time.perf_counter() - t_write)
+                else:
+                    metrics.record_failure(packet.param_id)
+            else:
+                bytes_written = self._handle.write(packet.buffer)
             
             if bytes_written < 0:
-                print(f"❌ Error en escritura HID: {bytes_written}")
+                _log.error("write_failed", "Error en escritura HID",
+                           param_id=packet.param_id, result=bytes_written)
                 return False
             
-            print(f"✅ Paquete enviado: {packet}")
-            print(f"   Bytes escritos: {bytes_written}")
+            if self._state is not None:
+                self._state.update(packet.param_id, packet.encoded_value, SOURCE_WRITE)
+            
+            if _log.level <= DEBUG:
+                _log.log(DEBUG, "packet_sent", param_id=packet.param_id,
+                         value=packet.encoded_value, bytes=bytes_written)
             
             return True
         
         except Exception as e:
-            print(f"❌ Error enviando paquete: {e}")
+            if metrics is not None:
+                metrics.record_failure(packet.param_id)
+            _log.error("write_exception", "Error enviando paquete",
+                       param_id=packet.param_id, error=str(e))
             return False
     
+    def create_send_queue(self,
+                          starvation_limit: int = DEFAULT_STARVATION_LIMIT,
+                          rate_controller: Optional[VSLRateController] = None,
+                          max_pending: Optional[int] = None) -> VSLSendQueue:
+        """
+        Crea una cola de envío con carriles de prioridad sobre este dispositivo.
+        
+        Args:
+            starvation_limit: Despachos máximos que un carril puede ser adelantado
+            rate_controller: Control de tasa AIMD (None = sin límite de tasa)
+            max_pending: Capacidad antes de aplicar backpressure (None = sin límite)
+            
+        Returns:
+            VSLSendQueue (sin arrancar) que escribe mediante send_packet()
+        """
+        return VSLSendQueue(self.send_packet,
+                            starvation_limit=starvation_limit,
+                            rate_controller=rate_controller,
+                            max_pending=max_pending,
+                            metrics=self._metrics)
+    
+    def send_packets(self, packets: Sequence[VSLPacket]) -> int:
+        """
+        Envía una secuencia de paquetes en orden.
+        
+        Args:
+            packets: Paquetes a enviar
+            
+        Returns:
+            Número de paquetes enviados (u omitidos por coincidir con la caché)
+        """
+        sent = 0
+        for packet in packets:
+            if self.send_packet(packet):
+                sent += 1
+        return sent
+    
+    def attach_state(self, state: Optional[VSLShadowState]):
+        """
+        Asocia una caché de estado espejo al dispositivo.
+        
+        Con una caché asociada, send_packet() la actualiza tras cada escritura
+        exitosa y omite (retornando True) las escrituras cuyo valor coincide
+        con el último estado conocido.
+        """
+        self._state = state
+    
+    @property
+    def state(self) -> Optional[VSLShadowState]:
+        return self._state
+    
+    def attach_metrics(self, metrics: Optional[VSLMetrics]):
+        """
+        Asocia un registro de métricas (ver vsl_metrics.py).
+        
+        send_packet() cuenta escrituras y fallos por parámetro, bytes y
+        latencia; las colas creadas después publican su profundidad y los
+        pipelines sus escrituras, retransmisiones y timeouts.
+        Con None (por defecto) el envío no mide nada.
+        """
+        self._metrics = metrics
+    
+    def create_state_reader(self, report_id: Optional[int] = None) -> VSLStateReader:
+        """
+        Crea el lector en segundo plano de reportes de entrada.
+        
+        Raises:
+            RuntimeError: Si el dispositivo no está abierto o no hay caché asociada
+        """
+        if self._handle is None:
+            raise RuntimeError("Dispositivo no está abierto. Llama a open() primero.")
+        if self._state is None:
+            raise RuntimeError("No hay caché de estado. Llama a attach_state() primero.")
+        return VSLStateReader(self._handle, self._state, report_id=report_id)
+    
+    def create_pipeline(self, window: int = DEFAULT_WINDOW, **kwargs) -> VSLPipeline:
+        """
+        Crea un pipeline de escrituras con `window` reportes en vuelo.
+        
+        Args:
+            window: Número máximo de escrituras sin confirmar
+            **kwargs: ack_timeout_s, max_retries, on_report (ver VSLPipeline)
+            
+        Returns:
+            VSLPipeline (sin arrancar) sobre el handle abierto
+            
+        Raises:
+            RuntimeError: Si el dispositivo no está abierto
+        """
+        if self._handle is None:
+            raise RuntimeError("Dispositivo no está abierto. Llama a open() primero.")
+        return VSLPipeline(self._handle, window=window, metrics=self._metrics, **kwargs)
+    
     def __enter__(self):
         """Context manager entry."""
         self.open()
@@ -155,6 +352,7 @@ def enumerate_vsl_devices():
         print("❌ hidapi no está disponible")
         return
     
+    import hid
     print("=== Enumeración de Dispositivos HID ===\n")
     
     for device_info in hid.enumerate():
@@ -0,0 +1,634 @@
+"""
+VSL-DSP hidraw Backend Module (Linux)
+Acceso directo a /dev/hidrawN con os.read / os.write no bloqueantes.
+
+Evita la sobrecarga por llamada del binding `hid`. Incluye:
+  - HidrawHandle: misma interfaz que el handle de hidapi (write, read,
+    open_path, close...), intercambiable en VSLDeviceManager o VSLPipeline.
+  - VSLHidrawReactor: un único hilo que atiende lecturas y escrituras de
+    muchos dispositivos con selectors (epoll en Linux).
+  - enumerate_hidraw(): enumeración vía sysfs con el formato de hid.enumerate.
+  - select_backend(): elige "hidapi" o "hidraw" en tiempo de ejecución
+    (argumento o variable de entorno VSL_HID_BACKEND).
+
+Cualquier ruta o descriptor sirve como dispositivo: en pruebas, un pty en
+modo raw o un par de pipes sustituye a /dev/hidrawN.
+"""
+
+import glob
+import os
+import selectors
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from vsl_config import VSL_PACKET_SIZE
+
+
+WRITE_TIMEOUT_MS = 1000
+BACKEND_ENV = "VSL_HID_BACKEND"
+SYSFS_HIDRAW = "/sys/class/hidraw"
+
+
+# ============================================================================
+# HANDLE
+# ============================================================================
+
+class HidrawHandle:
+    """
+    Handle de un nodo hidraw con la interfaz de hid.device().
+
+    El descriptor es siempre no bloqueante; write() y read() esperan con
+    selectors cuando hace falta, así que el mismo handle sirve para un
+    hilo escritor dedicado o para VSLHidrawReactor.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._read_fd: Optional[int] = None
+        self._write_fd: Optional[int] = None
+        self._selector: Optional[selectors.BaseSelector] = None
+        self.path = None
+        if path is not None:
+            self.open_path(path)
+
+    @classmethod
+    def from_fds(cls, read_fd: int, write_fd: int) -> "HidrawHandle":
+        """Handle sobre descriptores ya abiertos (p.ej. un par de pipes)."""
+        handle = cls()
+        handle._attach(read_fd, write_fd)
+        return handle
+
+    def _attach(self, read_fd: int, write_fd: int):
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False)
+        self._read_fd = read_fd
+        self._write_fd = write_fd
+        self._selector = selectors.DefaultSelector()
+
+    # ------------------------------------------------------------------
+    # Interfaz hidapi
+    # ------------------------------------------------------------------
+
+    def open_path(self, path):
+        """
+        Raises:
+            OSError: Si el nodo no existe o no hay permisos
+        """
+        if isinstance(path, bytes):
+            path = path.decode()
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+        self.path = path
+        self._attach(fd, fd)
+
+    def open(self, vendor_id: int = 0, product_id: int = 0, serial=None):
+        """Abre el primer nodo hidraw que coincide con VID/PID (y serie)."""
+        for info in enumerate_hidraw(vendor_id, product_id):
+            if serial is None or info["serial_number"] == serial:
+                self.open_path(info["path"])
+                return
+        raise OSError(f"Dispositivo {vendor_id:04X}:{product_id:04X} no encontrado")
+
+    def close(self):
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        fds = {self._read_fd, self._write_fd} - {None}
+        self._read_fd = self._write_fd = None
+        for fd in fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def fileno(self) -> int:
+        """Descriptor de lectura (para registrarlo en un selector)."""
+        return self._read_fd
+
+    @property
+    def write_fd(self) -> int:
+        return self._write_fd
+
+    def set_nonblocking(self, enable: bool) -> int:
+        return 0
+
+    def get_manufacturer_string(self) -> str:
+        return _sysfs_attr(self.path, "HID_NAME") or ""
+
+    def get_product_string(self) -> str:
+        return _sysfs_attr(self.path, "HID_NAME") or ""
+
+    def get_serial_number_string(self) -> str:
+        return _sysfs_attr(self.path, "HID_UNIQ") or ""
+
+    def write(self, data) -> int:
+        """
+        Escribe un reporte de salida completo.
+
+        Returns:
+            Bytes escritos, o -1 si el handle está cerrado o el descriptor
+            no acepta datos en WRITE_TIMEOUT_MS
+        """
+        if self._write_fd is None:
+            return -1
+        payload = bytes(data)
+        try:
+            return os.write(self._write_fd, payload)
+        except BlockingIOError:
+            pass
+        except OSError:
+            return -1
+        if not self._wait(self._write_fd, selectors.EVENT_WRITE, WRITE_TIMEOUT_MS):
+            return -1
+        try:
+            return os.write(self._write_fd, payload)
+        except OSError:
+            return -1
+
+    def read(self, max_length: int, timeout_ms: int = 0) -> List[int]:
+        """
+        Lee un reporte de entrada.
+
+        Returns:
+            Lista de enteros (como hidapi) o lista vacía si no hubo datos
+            antes de timeout_ms (0 = no bloqueante)
+        """
+        data = self.read_bytes(max_length, timeout_ms)
+        return list(data) if data else []
+
+    def read_bytes(self, max_length: int, timeout_ms: int = 0) -> bytes:
+        """Como read(), pero sin convertir a lista."""
+        if self._read_fd is None:
+            return b""
+        try:
+            return os.read(self._read_fd, max_length)
+        except BlockingIOError:
+            pass
+        except OSError:
+            return b""
+        if timeout_ms <= 0 or not self._wait(self._read_fd, selectors.EVENT_READ, timeout_ms):
+            return b""
+        try:
+            return os.read(self._read_fd, max_length)
+        except OSError:
+            return b""
+
+    def readinto(self, buffer) -> int:
+        """
+        Lee un reporte directamente en `buffer` (p.ej. VSLMeterBuffer.slot_buffer()).
+
+        Returns:
+            Bytes leídos, 0 si no hay datos, o -1 si el handle está cerrado o
+            el dispositivo desapareció (EOF, ENODEV...), como hidapi
+        """
+        if self._read_fd is None:
+            return -1
+        try:
+            read = os.readv(self._read_fd, [buffer])
+        except BlockingIOError:
+            return 0
+        except OSError:
+            return -1
+        return read if read > 0 else -1
+
+    def _wait(self, fd: int, event: int, timeout_ms: int) -> bool:
+        selector = self._selector
+        if selector is None:
+            return False
+        selector.register(fd, event)
+        try:
+            return bool(selector.select(timeout_ms / 1000.0))
+        finally:
+            selector.unregister(fd)
+
+
+# ============================================================================
+# REACTOR (un hilo, muchos dispositivos)
+# ============================================================================
+
+class _ReactorEntry:
+    def __init__(self, handle: HidrawHandle, on_report: Optional[Callable[[Any, bytes], None]],
+                 on_disconnect: Optional[Callable[[Any], None]] = None):
+        self.handle = handle
+        self.on_report = on_report
+        self.on_disconnect = on_disconnect
+        self.pending: Deque[bytes] = deque()
+        self.lock = threading.Lock()
+        self.want_write = False
+
+
+class VSLHidrawReactor:
+    """
+    Atiende lecturas y escrituras de varios HidrawHandle desde un hilo.
+
+    write() es seguro desde cualquier hilo: intenta la escritura directa
+    no bloqueante y, si el descriptor está lleno, la deja pendiente para
+    que el reactor la complete cuando sea escribible. Cada reporte leído
+    se entrega a on_report(handle, data) en el hilo del reactor.
+
+    Un descriptor que llega a EOF o falla al leer (ENODEV al desenchufar)
+    se da de baja del reactor y se avisa con on_disconnect(handle); si
+    siguiera registrado, el selector lo daría por legible en cada vuelta.
+    """
+
+    def __init__(self, report_size: int = VSL_PACKET_SIZE):
+        self._report_size = report_size
+        self._selector = selectors.DefaultSelector()
+        self._entries: Dict[int, _ReactorEntry] = {}
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._changes: Deque[Tuple[str, _ReactorEntry]] = deque()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.reports_in = 0
+        self.reports_out = 0
+        self.deferred_writes = 0
+        self.write_errors = 0
+        self.disconnects = 0
+
+    # ------------------------------------------------------------------
+    # Registro
+    # ------------------------------------------------------------------
+
+    def add(self, handle: HidrawHandle,
+            on_report: Optional[Callable[[Any, bytes], None]] = None,
+            on_disconnect: Optional[Callable[[Any], None]] = None):
+        """Registra un dispositivo (seguro desde cualquier hilo)."""
+        entry = _ReactorEntry(handle, on_report, on_disconnect)
+        self._entries[handle.write_fd] = entry
+        self._changes.append(("add", entry))
+        self._wake()
+
+    def remove(self, handle: HidrawHandle):
+        entry = self._entries.pop(handle.write_fd, None)
+        if entry is not None:
+            self._changes.append(("remove", entry))
+            self._wake()
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def write(self, handle: HidrawHandle, data) -> bool:
+        """
+        Escribe (o deja pendiente) un reporte hacia un dispositivo registrado.
+
+        Returns:
+            False si el dispositivo no está registrado
+        """
+        entry = self._entries.get(handle.write_fd)
+        if entry is None:
+            return False
+        payload = bytes(data)
+        with entry.lock:
+            if not entry.pending:
+                try:
+                    os.write(handle.write_fd, payload)
+                    self.reports_out += 1
+                    return True
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    self.write_errors += 1
+                    return False
+            entry.pending.append(payload)
+            self.deferred_writes += 1
+            first = not entry.want_write
+            entry.want_write = True
+        if first:
+            self._changes.append(("write", entry))
+            self._wake()
+        return True
+
+    def _flush_entry(self, entry: _ReactorEntry) -> bool:
+        """Escribe lo pendiente. Retorna True si quedó vacío."""
+        fd = entry.handle.write_fd
+        with entry.lock:
+            while entry.pending:
+                try:
+                    os.write(fd, entry.pending[0])
+                except BlockingIOError:
+                    return False
+                except OSError:
+                    self.write_errors += len(entry.pending)
+                    entry.pending.clear()
+                    break
+                entry.pending.popleft()
+                self.reports_out += 1
+            entry.want_write = False
+            return True
+
+    # ------------------------------------------------------------------
+    # Bucle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._reactor_loop, name="vsl-hidraw-reactor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self._selector.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    def _register(self, entry: _ReactorEntry):
+        read_fd = entry.handle.fileno()
+        write_fd = entry.handle.write_fd
+        wants_write = entry.want_write
+        if read_fd == write_fd:
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if wants_write else 0)
+            self._set_interest(read_fd, events, entry)
+        else:
+            self._set_interest(read_fd, selectors.EVENT_READ, entry)
+            self._set_interest(write_fd, selectors.EVENT_WRITE if wants_write else 0, entry)
+
+    def _set_interest(self, fd: int, events: int, entry: _ReactorEntry):
+        try:
+            key = self._selector.get_key(fd)
+        except KeyError:
+            key = None
+        if events == 0:
+            if key is not None:
+                self._selector.unregister(fd)
+        elif key is None:
+            self._selector.register(fd, events, entry)
+        elif key.events != events:
+            self._selector.modify(fd, events, entry)
+
+    def _apply_changes(self):
+        while self._changes:
+            action, entry = self._changes.popleft()
+            if action == "remove":
+                for fd in {entry.handle.fileno(), entry.handle.write_fd}:
+                    self._set_interest(fd, 0, entry)
+            else:
+                self._register(entry)
+
+    def _reactor_loop(self):
+        report_size = self._report_size
+        while self._running:
+            for key, mask in self._selector.select(0.5):
+                entry = key.data
+                if entry is None:
+                    try:
+                        os.read(self._wake_r, 4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                if mask & selectors.EVENT_WRITE:
+                    if self._flush_entry(entry):
+                        self._register(entry)
+                if mask & selectors.EVENT_READ and key.fd == entry.handle.fileno():
+                    while True:
+                        try:
+                            data = os.read(key.fd, report_size)
+                        except BlockingIOError:
+                            break
+                        except OSError:
+                            data = b""
+                        if not data:
+                            self._drop(entry)
+                            break
+                        self.reports_in += 1
+                        if entry.on_report is not None:
+                            entry.on_report(entry.handle, data)
+            self._apply_changes()
+
+    def _drop(self, entry: _ReactorEntry):
+        """Da de baja un dispositivo desaparecido (hilo del reactor)."""
+        if self._entries.get(entry.handle.write_fd) is entry:
+            del self._entries[entry.handle.write_fd]
+        for fd in {entry.handle.fileno(), entry.handle.write_fd}:
+            self._set_interest(fd, 0, entry)
+        self.disconnects += 1
+        if entry.on_disconnect is not None:
+            entry.on_disconnect(entry.handle)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# ============================================================================
+# ENUMERACIÓN Y SELECCIÓN DE BACKEND
+# ============================================================================
+
+def _read_uevent(node_dir: str) -> Dict[str, str]:
+    fields = {}
+    try:
+        with open(os.path.join(node_dir, "device", "uevent")) as f:
+            for line in f:
+                name, _, value = line.strip().partition("=")
+                fields[name] = value
+    except OSError:
+        pass
+    return fields
+
+
+def _sysfs_attr(path: Optional[str], name: str) -> Optional[str]:
+    if not path:
+        return None
+    node_dir = os.path.join(SYSFS_HIDRAW, os.path.basename(path))
+    return _read_uevent(node_dir).get(name)
+
+
+def enumerate_hidraw(vendor_id: int = 0, product_id: int = 0) -> List[Dict]:
+    """
+    Enumera los nodos hidraw vía sysfs (sin abrirlos).
+
+    Returns:
+        Entradas con las claves de hid.enumerate: path, vendor_id,
+        product_id, serial_number, product_string, interface_number
+    """
+    devices = []
+    for node_dir in sorted(glob.glob(os.path.join(SYSFS_HIDRAW, "hidraw*"))):
+        fields = _read_uevent(node_dir)
+        # HID_ID=<bus>:<vendor 8 hex>:<product 8 hex>
+        parts = fields.get("HID_ID", "").split(":")
+        if len(parts) != 3:
+            continue
+        vid, pid = int(parts[1], 16), int(parts[2], 16)
+        if (vendor_id and vid != vendor_id) or (product_id and pid != product_id):
+            continue
+        devices.append({
+            "path": os.path.join("/dev", os.path.basename(node_dir)).encode(),
+            "vendor_id": vid,
+            "product_id": pid,
+            "serial_number": fields.get("HID_UNIQ", ""),
+            "product_string": fields.get("HID_NAME", ""),
+            "manufacturer_string": "",
+            "interface_number": -1,
+        })
+    return devices
+
+
+def select_backend(name: Optional[str] = None
+                   ) -> Tuple[Callable[[], Any], Callable[[int, int], List[Dict]]]:
+    """
+    Elige el backend HID en tiempo de ejecución.
+
+    Args:
+        name: "hidapi" o "hidraw" (None usa $VSL_HID_BACKEND, y si no está
+            definida, hidapi cuando está instalado)
+
+    Returns:
+        (handle_factory, enumerate_fn) para VSLDeviceManager
+
+    Raises:
+        ValueError: Si el backend es desconocido
+        RuntimeError: Si se pide hidapi y no está instalado
+    """
+    name = name or os.environ.get(BACKEND_ENV)
+    if name is None:
+        try:
+            import hid  # noqa: F401
+            name = "hidapi"
+        except ImportError:
+            name = "hidraw"
+
+    if name == "hidraw":
+        return HidrawHandle, enumerate_hidraw
+    if name == "hidapi":
+        try:
+            import hid
+        except ImportError:
+            raise RuntimeError("hidapi no está disponible") from None
+        return hid.device, hid.enumerate
+    raise ValueError(f"Backend HID desconocido: {name!r}")
+
+
+if __name__ == "__main__":
+    import pty
+    import time
+    import tty
+
+    from vsl_transport import VSLPacket, parse_vsl_report
+
+    print("=== Tests de vsl_hidraw.py ===\n")
+
+    # Test 1: Handle sobre un pty en modo raw (sustituto de /dev/hidrawN)
+    print("Test 1: HidrawHandle sobre un pty")
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    handle = HidrawHandle(os.ttyname(slave))
+    packet = VSLPacket(0x1A01, 40793, report_id=0x01)
+    written = handle.write(packet.buffer)
+    echoed = os.read(master, 64)
+    os.write(master, echoed)
+    report = handle.read(64, timeout_ms=100)
+    print(f"  Escritos: {written} bytes  Eco: {parse_vsl_report(report)}")
+    assert parse_vsl_report(report) == (0x01, 0x1A01, 40793), "❌ Eco incorrecto"
+    assert handle.read(64, timeout_ms=0) == [], "❌ Lectura no bloqueante con datos fantasma"
+    handle.close()
+    os.close(master)
+    os.close(slave)
+    print("  ✅ Lectura/escritura directa\n")
+
+    # Test 2: Un hilo atiende 8 dispositivos (pipes que devuelven el eco)
+    print("Test 2: Reactor con 8 dispositivos simulados")
+    DEVICES = 8
+    PER_DEVICE = 2000
+    devices = []
+    for _ in range(DEVICES):
+        to_dev_r, to_dev_w = os.pipe()      # host → dispositivo
+        from_dev_r, from_dev_w = os.pipe()  # dispositivo → host
+        devices.append((HidrawHandle.from_fds(from_dev_r, to_dev_w), to_dev_r, from_dev_w))
+
+    received: Dict[int, int] = {}
+    done = threading.Event()
+
+    def on_report(h: HidrawHandle, data: bytes):
+        received[h.write_fd] = received.get(h.write_fd, 0) + len(data) // VSL_PACKET_SIZE
+        if sum(received.values()) >= DEVICES * PER_DEVICE:
+            done.set()
+
+    def echo_device(read_fd: int, write_fd: int):
+        """Firmware simulado: devuelve cada reporte recibido."""
+        os.set_blocking(read_fd, True)
+        remaining = PER_DEVICE * VSL_PACKET_SIZE
+        while remaining:
+            data = os.read(read_fd, min(remaining, 65536))
+            os.write(write_fd, data)
+            remaining -= len(data)
+
+    echoers = [threading.Thread(target=echo_device, args=(r, w), daemon=True)
+               for _, r, w in devices]
+    for t in echoers:
+        t.start()
+
+    payload = VSLPacket(0x1A01, 1, report_id=0x01).buffer
+    with VSLHidrawReactor() as reactor:
+        for h, _, _ in devices:
+            reactor.add(h, on_report)
+        t0 = time.perf_counter()
+        for _ in range(PER_DEVICE):
+            for h, _, _ in devices:
+                reactor.write(h, payload)
+        assert done.wait(10.0), "❌ Reportes perdidos"
+        elapsed = time.perf_counter() - t0
+
+    total = DEVICES * PER_DEVICE
+    print(f"  {total} escrituras + {total} reportes en {elapsed * 1000:.1f} ms "
+          f"({total / elapsed:,.0f} ida y vuelta/s, "
+          f"{reactor.deferred_writes} escrituras diferidas)")
+    assert reactor.reports_out == total and reactor.write_errors == 0, "❌ Escrituras perdidas"
+    print("  ✅ Un hilo sirve a todos los dispositivos\n")
+
+    # Test 3: Desconexión (EOF) con el reactor en marcha
+    print("Test 3: Dispositivo desconectado")
+    to_dev_r, to_dev_w = os.pipe()
+    from_dev_r, from_dev_w = os.pipe()
+    gone = HidrawHandle.from_fds(from_dev_r, to_dev_w)
+    lost = threading.Event()
+    with VSLHidrawReactor() as reactor:
+        reactor.add(gone, on_disconnect=lambda h: lost.set())
+        os.close(from_dev_w)              # El dispositivo desaparece
+        assert lost.wait(1.0), "❌ Desconexión no notificada"
+        cpu0, t0 = time.process_time(), time.perf_counter()
+        time.sleep(0.3)
+        cpu_ratio = (time.process_time() - cpu0) / (time.perf_counter() - t0)
+        print(f"  Avisos: {reactor.disconnects}  CPU del proceso tras la baja: "
+              f"{cpu_ratio:.0%} del tiempo real")
+        assert reactor.disconnects == 1 and cpu_ratio < 0.2, "❌ El reactor gira en vacío"
+        assert not reactor.write(gone, payload), "❌ Dispositivo aún registrado"
+    slot = bytearray(VSL_PACKET_SIZE)
+    assert gone.readinto(slot) == -1, "❌ readinto() confunde EOF con falta de datos"
+    gone.close()
+    os.close(to_dev_r)
+    print("  ✅ Dado de baja, sin espera activa, readinto() → -1\n")
+
+    # Test 4: Selección de backend en tiempo de ejecución
+    print("Test 4: Selección de backend")
+    os.environ[BACKEND_ENV] = "hidraw"
+    factory, enumerate_fn = select_backend()
+    print(f"  {BACKEND_ENV}=hidraw → {factory.__name__}, "
+          f"{len(enumerate_fn())} nodos hidraw en este equipo")
+    assert factory is HidrawHandle, "❌ Backend incorrecto"
+    try:
+        select_backend("usbfs")
+        print("  ❌ Error: Debería haber lanzado ValueError")
+    except ValueError as e:
+        print(f"  ✅ ValueError capturado correctamente: {e}")
@@ -0,0 +1,359 @@
+"""
+VSL-DSP Event Log Module
+Registro estructurado de eventos fuera del camino caliente.
+
+Cada evento es un VSLEvent (instante, nivel, nombre, mensaje, campos)
+que se guarda en un anillo de tamaño fijo sin tomar locks; un hilo
+"vsl-log-flush" lo vacía de forma asíncrona hacia un sink (consola,
+JSON Lines o cualquier función). Los eventos por debajo del nivel
+configurado se descartan con una sola comparación, y si el sink no da
+abasto el anillo sobrescribe los más antiguos y cuenta los perdidos en
+lugar de frenar al productor.
+
+En modo producción (nivel INFO, el predeterminado) el envío de paquetes
+no produce ninguna salida; los eventos por paquete son DEBUG.
+"""
+
+import atexit
+import itertools
+import json
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, TextIO
+
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+_LEVEL_ICONS = {DEBUG: "·", INFO: "✅", WARNING: "⚠️", ERROR: "❌"}
+
+DEFAULT_CAPACITY = 4096
+DEFAULT_FLUSH_INTERVAL_S = 0.2
+
+
+class VSLEvent(NamedTuple):
+    timestamp: float            # time.time() del evento
+    level: int
+    event: str                  # Nombre estable del evento (ej: "packet_sent")
+    message: str                # Texto legible (puede estar vacío)
+    fields: Dict[str, Any]
+
+
+Sink = Callable[[List[VSLEvent]], None]
+
+
+# ============================================================================
+# SINKS
+# ============================================================================
+
+def _format_fields(fields: Dict[str, Any]) -> str:
+    parts = []
+    for key, value in fields.items():
+        if key == "param_id" and isinstance(value, int):
+            value = f"0x{value:04X}"
+        parts.append(f"{key}={value}")
+    return " ".join(parts)
+
+
+class StreamSink:
+    """Una línea legible por evento (por defecto en stdout)."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self._stream = stream
+
+    def __call__(self, events: List[VSLEvent]):
+        stream = self._stream or sys.stdout
+        lines = []
+        for ev in events:
+            text = ev.message or ev.event
+            if ev.fields:
+                text = f"{text} ({_format_fields(ev.fields)})"
+            lines.append(f"{_LEVEL_ICONS.get(ev.level, '')} {text}\n")
+        stream.write("".join(lines))
+        stream.flush()
+
+
+class JsonLinesSink:
+    """Un objeto JSON por línea, añadido al final de un archivo."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, events: List[VSLEvent]):
+        for ev in events:
+            record = {"ts": ev.timestamp, "level": LEVEL_NAMES.get(ev.level, ev.level),
+                      "event": ev.event}
+            if ev.message:
+                record["message"] = ev.message
+            record.update(ev.fields)
+            self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# ============================================================================
+# REGISTRO
+# ============================================================================
+
+class VSLEventLog:
+    """
+    Anillo de eventos con filtrado por nivel y vaciado asíncrono.
+
+    log() reserva una posición con un contador atómico (next() sobre
+    itertools.count es atómico en CPython) y escribe el evento en ella;
+    ningún productor espera al sink.
+    """
+
+    def __init__(self, level: int = INFO,
+                 sink: Optional[Sink] = None,
+                 capacity: int = DEFAULT_CAPACITY,
+                 flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S):
+        """
+        Args:
+            level: Nivel mínimo registrado
+            sink: Destino de los eventos (None = solo memoria, ver recent())
+            capacity: Eventos retenidos (potencia de 2)
+            flush_interval_s: Periodo máximo entre vaciados
+
+        Raises:
+            ValueError: Si capacity no es una potencia de 2
+        """
+        if capacity < 1 or capacity & (capacity - 1):
+            raise ValueError("capacity debe ser una potencia de 2")
+        self.level = level
+        self._sink = sink
+        self._mask = capacity - 1
+        self._ring: List[Optional[tuple]] = [None] * capacity
+        self._counter = itertools.count()
+        self._flushed = 0                 # Siguiente secuencia a entregar al sink
+        self._flush_interval_s = flush_interval_s
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self.dropped = 0
+        self.sink_errors = 0
+
+    # ------------------------------------------------------------------
+    # Productores
+    # ------------------------------------------------------------------
+
+    def log(self, level: int, event: str, message: str = "", **fields):
+        if level < self.level:
+            return
+        seq = next(self._counter)
+        self._ring[seq & self._mask] = (seq, VSLEvent(time.time(), level, event,
+                                                      message, fields))
+        if self._sink is not None:
+            if self._thread is None:
+                self._start()
+            if level >= ERROR:
+                self._wake.set()
+
+    def debug(self, event: str, message: str = "", **fields):
+        if DEBUG >= self.level:
+            self.log(DEBUG, event, message, **fields)
+
+    def info(self, event: str, message: str = "", **fields):
+        self.log(INFO, event, message, **fields)
+
+    def warning(self, event: str, message: str = "", **fields):
+        self.log(WARNING, event, message, **fields)
+
+    def error(self, event: str, message: str = "", **fields):
+        self.log(ERROR, event, message, **fields)
+
+    def enabled_for(self, level: int) -> bool:
+        """Para evitar construir campos costosos de eventos que se descartarían."""
+        return level >= self.level
+
+    # ------------------------------------------------------------------
+    # Consumidores
+    # ------------------------------------------------------------------
+
+    def _collect(self, start: int) -> tuple:
+        """
+        Eventos escritos desde la secuencia `start`.
+
+        Returns:
+            (eventos, siguiente secuencia, perdidos por sobrescritura)
+        """
+        capacity = self._mask + 1
+        events: List[VSLEvent] = []
+        lost = 0
+        seq = start
+        while True:
+            slot = self._ring[seq & self._mask]
+            if slot is None or slot[0] < seq:
+                break                      # Aún no escrito
+            if slot[0] > seq:
+                # El anillo dio la vuelta: saltar a lo más antiguo que sigue ahí
+                oldest = max(seq + 1, slot[0] - capacity + 1)
+                lost += oldest - seq
+                seq = oldest
+                continue
+            events.append(slot[1])
+            seq += 1
+        return events, seq, lost
+
+    def recent(self, n: Optional[int] = None) -> List[VSLEvent]:
+        """Eventos retenidos en el anillo (los n más recientes), ya vaciados o no."""
+        capacity = self._mask + 1
+        slots = [slot for slot in list(self._ring) if slot is not None]
+        slots.sort(key=lambda slot: slot[0])
+        if slots:
+            newest = slots[-1][0]
+            slots = [slot for slot in slots if slot[0] > newest - capacity]
+        events = [slot[1] for slot in slots]
+        return events if n is None else events[-n:]
+
+    def flush(self):
+        """Entrega al sink todo lo pendiente (síncrono)."""
+        with self._flush_lock:
+            events, self._flushed, lost = self._collect(self._flushed)
+            self.dropped += lost
+            if not events or self._sink is None:
+                return
+            try:
+                self._sink(events)
+            except Exception:
+                self.sink_errors += 1
+
+    def set_sink(self, sink: Optional[Sink]):
+        self.flush()
+        self._sink = sink
+
+    # ------------------------------------------------------------------
+    # Hilo de vaciado
+    # ------------------------------------------------------------------
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._flush_loop, name="vsl-log-flush", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self._flush_interval_s)
+            self._wake.clear()
+            self.flush()
+
+
+# ============================================================================
+# REGISTRO POR DEFECTO
+# ============================================================================
+
+_event_log = VSLEventLog(level=INFO, sink=StreamSink())
+
+
+def get_event_log() -> VSLEventLog:
+    """Registro compartido por los módulos de la PoC."""
+    return _event_log
+
+
+def configure_event_log(level: Optional[int] = None, sink: Any = ...) -> VSLEventLog:
+    """
+    Ajusta el registro compartido.
+
+    Args:
+        level: Nuevo nivel mínimo (None = sin cambios)
+        sink: Nuevo sink (None = solo memoria; omitido = sin cambios)
+    """
+    if level is not None:
+        _event_log.level = level
+    if sink is not ...:
+        _event_log.set_sink(sink)
+    return _event_log
+
+
+if __name__ == "__main__":
+    import io
+    import os
+    import tempfile
+
+    print("=== Tests de vsl_log.py ===\n")
+
+    # Test 1: Filtrado por nivel y campos estructurados
+    print("Test 1: Filtrado por nivel")
+    log = VSLEventLog(level=INFO, capacity=64)
+    log.debug("packet_sent", param_id=0x1A01, value=1)
+    log.info("device_open", "Dispositivo abierto", product="AudioBox 44 VSL")
+    log.error("write_failed", param_id=0x1A01, result=-1)
+    names = [ev.event for ev in log.recent()]
+    print(f"  Retenidos: {names}")
+    assert names == ["device_open", "write_failed"], "❌ Filtrado incorrecto"
+    print("  ✅ DEBUG descartado en modo producción\n")
+
+    # Test 2: Anillo acotado, pérdidas contadas
+    print("Test 2: Sobrescritura del anillo")
+    buffer = io.StringIO()
+    log = VSLEventLog(level=DEBUG, sink=StreamSink(buffer), capacity=16,
+                      flush_interval_s=60.0)
+    for i in range(100):
+        log.debug("packet_sent", param_id=0x1A01, value=i)
+    log.flush()
+    lines = buffer.getvalue().splitlines()
+    print(f"  Entregados: {len(lines)}  Perdidos: {log.dropped}  Último: {lines[-1]}")
+    assert len(lines) == 16 and log.dropped == 84, "❌ Conteo de pérdidas incorrecto"
+    assert lines[-1].endswith("value=99)"), "❌ Orden incorrecto"
+    print("  ✅ Memoria acotada y pérdidas contadas\n")
+
+    # Test 3: Vaciado asíncrono a JSON Lines desde varios hilos
+    print("Test 3: 4 hilos → JSON Lines")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vsl.jsonl")
+        sink = JsonLinesSink(path)
+        log = VSLEventLog(level=DEBUG, sink=sink, capacity=1 << 16,
+                          flush_interval_s=0.01)
+
+        def produce(worker: int):
+            for i in range(5000):
+                log.debug("packet_sent", param_id=0x1A00 + worker, value=i)
+
+        threads = [threading.Thread(target=produce, args=(w,)) for w in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        time.sleep(0.05)
+        log.flush()
+        sink.close()
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+    per_worker = {}
+    for r in records:
+        per_worker.setdefault(r["param_id"], []).append(r["value"])
+    print(f"  Registros: {len(records)}  Perdidos: {log.dropped}")
+    assert len(records) == 20000 and log.dropped == 0, "❌ Eventos perdidos"
+    assert all(v == list(range(5000)) for v in per_worker.values()), "❌ Orden por hilo"
+    print("  ✅ Sin pérdidas ni desorden por productor\n")
+
+    # Test 4: Throughput de VSLDevice sin salida por paquete
+    print("Test 4: VSLDevice.send_packet con el registro por defecto")
+    from vsl_fake_device import FakeVSLHandle
+    from vsl_hid_io import VSLDevice
+    from vsl_transport import VSLPacket
+
+    VSLDevice.release()
+    device = VSLDevice(handle_factory=lambda: FakeVSLHandle(latency_s=0.0, drop_rate=1.0))
+    device.open()
+    packets = [VSLPacket(0x1A01, i, report_id=0x01) for i in range(20000)]
+    t0 = time.perf_counter()
+    device.send_packets(packets)
+    elapsed = time.perf_counter() - t0
+    device.close()
+    VSLDevice.release()
+    get_event_log().flush()
+    print(f"  {len(packets) / elapsed:,.0f} paquetes/s")
+    print("  ✅ Ninguna línea por paquete en modo producción")
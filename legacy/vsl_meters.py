@@ -0,0 +1,432 @@
+"""
+VSL-DSP Meters Module
+Adquisición de medidores de nivel a alta tasa.
+
+Un hilo lector recibe los reportes de entrada de medidores y los copia
+tal cual en un ring buffer de NumPy preasignado (sin asignaciones por
+muestra). La decodificación de niveles se hace en bloque, al leer, con
+una vista uint16 sobre los bytes crudos. Los consumidores obtienen vistas
+diezmadas de pico/RMS a tasa de UI. Si un consumidor se queda atrás, el
+lector nunca espera: sobrescribe y el consumidor cuenta un overrun.
+
+Formato asumido del reporte de medidores (Little-Endian):
+  [0]              : Report ID de medidores
+  [1 .. 2*N]       : N niveles uint16 (0 = silencio, 65535 = 0 dBFS)
+
+Requiere NumPy.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from vsl_config import VSL_MAX_ENCODED_INT, VSL_PACKET_SIZE
+from vsl_log import get_event_log
+
+
+DEFAULT_CAPACITY = 8192      # Reportes retenidos (potencia de 2)
+DEFAULT_CHANNELS = 8
+READ_POLL_MS = 10
+
+# Errores de lectura seguidos: espera creciente entre reintentos y, al
+# llegar a MAX_READ_ERRORS, el handle se da por perdido
+READ_ERROR_BACKOFF_S = 0.01
+READ_ERROR_BACKOFF_MAX_S = 0.1
+MAX_READ_ERRORS = 8
+
+# Máximo de canales que caben en un reporte de 64 bytes
+MAX_METER_CHANNELS = (VSL_PACKET_SIZE - 1) // 2
+
+
+class VSLMeterBuffer:
+    """
+    Ring buffer de reportes crudos con un único escritor.
+
+    write_index cuenta reportes escritos desde el arranque (nunca se
+    reinicia); la ranura de un reporte es index % capacity. El escritor
+    publica write_index después de copiar la ranura, y los lectores
+    comprueban tras copiar que el productor no haya alcanzado la región
+    leída (si lo hizo, descartan lo pisado y lo cuentan como overrun).
+    """
+
+    def __init__(self, channels: int = DEFAULT_CHANNELS,
+                 capacity: int = DEFAULT_CAPACITY):
+        if not (1 <= channels <= MAX_METER_CHANNELS):
+            raise ValueError(f"channels debe estar en [1, {MAX_METER_CHANNELS}]")
+        if capacity < 2 or capacity & (capacity - 1):
+            raise ValueError("capacity debe ser una potencia de 2")
+
+        self.channels = channels
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._raw = np.zeros((capacity, VSL_PACKET_SIZE), dtype=np.uint8)
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._levels_view = self._raw[:, 1:1 + 2 * channels].view("<u2")
+        self.write_index = 0
+
+    # ------------------------------------------------------------------
+    # Escritor
+    # ------------------------------------------------------------------
+
+    def push(self, data, timestamp: float):
+        """Copia un reporte crudo en la siguiente ranura (nunca bloquea)."""
+        slot = self.write_index & self._mask
+        n = min(len(data), VSL_PACKET_SIZE)
+        self._raw[slot, :n] = data[:n]
+        self._timestamps[slot] = timestamp
+        self.write_index += 1
+
+    def slot_buffer(self) -> memoryview:
+        """Ranura de escritura actual, para backends que leen directo (readinto)."""
+        return memoryview(self._raw[self.write_index & self._mask])
+
+    def commit(self, timestamp: float):
+        """Publica la ranura escrita vía slot_buffer()."""
+        self._timestamps[self.write_index & self._mask] = timestamp
+        self.write_index += 1
+
+    # ------------------------------------------------------------------
+    # Lectores
+    # ------------------------------------------------------------------
+
+    def read_since(self, cursor: int, max_reports: Optional[int] = None
+                   ) -> Tuple[np.ndarray, np.ndarray, int, int]:
+        """
+        Niveles decodificados de los reportes escritos desde `cursor`.
+
+        Args:
+            cursor: write_index visto en la lectura anterior
+            max_reports: Limita el número de reportes devueltos (los más recientes)
+
+        Returns:
+            (levels[n, channels] uint16, timestamps[n], nuevo cursor, overruns)
+        """
+        end = self.write_index
+        start = max(cursor, end - self.capacity)
+        if max_reports is not None:
+            start = max(start, end - max_reports)
+        overruns = start - cursor if start > cursor else 0
+
+        idx = np.arange(start, end) & self._mask
+        levels = self._levels_view[idx]
+        stamps = self._timestamps[idx]
+
+        # El escritor pudo pisar las ranuras más antiguas durante la copia; la
+        # ranura de write_index (la de write_index - capacity) puede estar a medias
+        lapped = self.write_index - self.capacity + 1 - start
+        if lapped > 0:
+            levels = levels[lapped:]
+            stamps = stamps[lapped:]
+            overruns += lapped
+        return levels, stamps, end, overruns
+
+    def latest(self, n: int) -> np.ndarray:
+        """Niveles de los últimos n reportes (uint16, forma [n, channels])."""
+        levels, _, _, _ = self.read_since(0, max_reports=n)
+        return levels
+
+
+def decimate_peak_rms(levels: np.ndarray, block: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce niveles crudos a bloques de pico y RMS normalizados (0.0 - 1.0).
+
+    Args:
+        levels: Niveles uint16 con forma [n, channels]
+        block: Reportes por bloque de salida (el resto incompleto se descarta)
+
+    Returns:
+        (peak[m, channels], rms[m, channels]) con m = n // block
+    """
+    if block < 1:
+        raise ValueError("block debe ser >= 1")
+    m = len(levels) // block
+    if m == 0:
+        empty = np.zeros((0, levels.shape[1]), dtype=np.float64)
+        return empty, empty
+    blocks = levels[len(levels) - m * block:].reshape(m, block, -1).astype(np.float64)
+    blocks /= VSL_MAX_ENCODED_INT
+    return blocks.max(axis=1), np.sqrt((blocks * blocks).mean(axis=1))
+
+
+# ============================================================================
+# ADQUISICIÓN
+# ============================================================================
+
+class VSLMeterReader:
+    """
+    Hilo lector de reportes de medidores.
+
+    Los reportes con el report ID de medidores van al ring buffer; el resto
+    (p.ej. ecos de parámetros) se reenvía a on_other_report, que puede ser
+    VSLStateReader.handle_report. Opcionalmente escribe `poll_report` cada
+    poll_interval_s para dispositivos que solo envían niveles bajo demanda.
+
+    Tras MAX_READ_ERRORS lecturas fallidas seguidas (handle desenchufado)
+    el hilo termina, marca disconnected y avisa con on_disconnect().
+    """
+
+    def __init__(self, handle: Any, buffer: VSLMeterBuffer,
+                 meter_report_id: int,
+                 on_other_report: Optional[Callable[[List[int]], None]] = None,
+                 poll_report: Optional[bytes] = None,
+                 poll_interval_s: float = 0.005,
+                 on_disconnect: Optional[Callable[[], None]] = None):
+        self._handle = handle
+        self.buffer = buffer
+        self._meter_report_id = meter_report_id
+        self._on_other_report = on_other_report
+        self._poll_report = poll_report
+        self._poll_interval_s = poll_interval_s
+        self._on_disconnect = on_disconnect
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.read_errors = 0
+        self.other_reports = 0
+        self.disconnected = False
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._reader_loop, name="vsl-meter-reader", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _reader_loop(self):
+        buffer = self.buffer
+        next_poll = time.monotonic()
+        errors = 0
+        while self._running:
+            now = time.monotonic()
+            if self._poll_report is not None and now >= next_poll:
+                try:
+                    self._handle.write(self._poll_report)
+                except Exception:
+                    self.read_errors += 1
+                next_poll = now + self._poll_interval_s
+
+            try:
+                data = self._handle.read(VSL_PACKET_SIZE, READ_POLL_MS)
+            except Exception as e:
+                self.read_errors += 1
+                errors += 1
+                if errors >= MAX_READ_ERRORS:
+                    self._disconnect(e)
+                    return
+                # Sin espera, un handle desenchufado haría girar el hilo al 100%
+                time.sleep(min(READ_ERROR_BACKOFF_S * (1 << (errors - 1)),
+                               READ_ERROR_BACKOFF_MAX_S))
+                continue
+            errors = 0
+            if not data:
+                continue
+
+            if data[0] == self._meter_report_id:
+                buffer.push(data, time.monotonic())
+            else:
+                self.other_reports += 1
+                if self._on_other_report is not None:
+                    self._on_other_report(data)
+
+    def _disconnect(self, error: Exception):
+        self._running = False
+        self.disconnected = True
+        get_event_log().warning("meter_reader_disconnected",
+                                "El handle no responde, lector de medidores detenido",
+                                errors=self.read_errors, error=str(error))
+        if self._on_disconnect is not None:
+            self._on_disconnect()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class VSLMeterView:
+    """
+    Consumidor con cursor propio que entrega pico/RMS a tasa de UI.
+
+    Cada consumidor (UI, grabador...) tiene su propio VSLMeterView, así
+    que uno lento no afecta a los demás: solo acumula sus overruns.
+    """
+
+    def __init__(self, buffer: VSLMeterBuffer, block: int = 1):
+        self._buffer = buffer
+        self._block = block
+        self._cursor = buffer.write_index
+        self.overruns = 0
+
+    def poll(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Pico y RMS de todo lo recibido desde la última llamada.
+
+        Returns:
+            (peak[channels], rms[channels]) normalizados, o ceros si no hubo
+            reportes nuevos
+        """
+        levels, _, self._cursor, overruns = self._buffer.read_since(self._cursor)
+        self.overruns += overruns
+        if len(levels) == 0:
+            zeros = np.zeros(self._buffer.channels, dtype=np.float64)
+            return zeros, zeros
+        peak, rms = decimate_peak_rms(levels, len(levels))
+        return peak[0], rms[0]
+
+    def poll_blocks(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Como poll(), pero en bloques de `block` reportes (historial diezmado)."""
+        levels, _, cursor, overruns = self._buffer.read_since(self._cursor)
+        used = (len(levels) // self._block) * self._block
+        # Los reportes del bloque incompleto se devuelven en la próxima llamada
+        self._cursor = cursor - (len(levels) - used)
+        self.overruns += overruns
+        return decimate_peak_rms(levels[:used], self._block)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"cursor": self._cursor, "overruns": self.overruns,
+                "write_index": self._buffer.write_index}
+
+
+if __name__ == "__main__":
+    from vsl_transport import VSLPacket
+
+    print("=== Tests de vsl_meters.py ===\n")
+
+    METER_ID = 0x05
+    CHANNELS = 8
+
+    class _MeterSource:
+        """Genera reportes de medidores a `rate_hz` con un seno por canal."""
+
+        def __init__(self, rate_hz: float):
+            self.period = 1.0 / rate_hz
+            self.t0 = time.monotonic()
+            self.sent = 0
+            self.echo: List[List[int]] = []
+
+        def read(self, max_length: int, timeout_ms: int = 0) -> List[int]:
+            if self.echo:
+                return self.echo.pop()
+            due = self.t0 + self.sent * self.period
+            wait = due - time.monotonic()
+            if wait > timeout_ms / 1000.0:
+                time.sleep(timeout_ms / 1000.0)
+                return []
+            if wait > 0:
+                time.sleep(wait)
+            phase = self.sent * 0.01
+            levels = (32767 + 32767 * np.sin(phase + np.arange(CHANNELS))).astype("<u2")
+            self.sent += 1
+            return [METER_ID] + list(levels.tobytes())
+
+        def write(self, data) -> int:
+            return len(data)
+
+    # Test 1: Adquisición y vistas diezmadas
+    print("Test 1: Adquisición a 4 kHz y vista de UI a 30 Hz")
+    others: List[List[int]] = []
+    buffer = VSLMeterBuffer(channels=CHANNELS, capacity=1024)
+    source = _MeterSource(rate_hz=4000.0)
+    source.echo.append(list(VSLPacket(0x1A01, 100, report_id=0x01).buffer))
+    view = VSLMeterView(buffer)
+    frames = 0
+    with VSLMeterReader(source, buffer, METER_ID, on_other_report=others.append):
+        for _ in range(15):
+            time.sleep(1 / 30)
+            peak, rms = view.poll()
+            frames += 1
+    print(f"  Reportes: {buffer.write_index}  Frames UI: {frames}  "
+          f"Overruns UI: {view.overruns}")
+    print(f"  Último frame: pico={np.round(peak[:3], 3)} rms={np.round(rms[:3], 3)}")
+    assert buffer.write_index > 1000, "❌ Tasa de adquisición insuficiente"
+    assert view.overruns == 0, "❌ Overruns con consumidor a tiempo"
+    assert len(others) == 1, "❌ Reporte no-medidor no reenviado"
+    assert np.all(peak >= rms), "❌ Pico menor que RMS"
+    print("  ✅ Vistas de pico/RMS a tasa de UI\n")
+
+    # Test 2: Un consumidor lento cuenta overruns, el lector no se bloquea
+    print("Test 2: Consumidor lento")
+    slow = VSLMeterView(buffer)
+    start_index = buffer.write_index
+    with VSLMeterReader(_MeterSource(rate_hz=4000.0), buffer, METER_ID):
+        time.sleep(0.5)
+    slow.poll()
+    produced = buffer.write_index - start_index
+    print(f"  Producidos: {produced}  Capacidad: {buffer.capacity}  "
+          f"Overruns: {slow.overruns}")
+    # La ranura más antigua comparte posición con la que el escritor llena
+    assert slow.overruns == produced - buffer.capacity + 1 > 0, "❌ Overruns no contados"
+    print("  ✅ Overruns contados sin bloquear al lector\n")
+
+    # Test 3: Historial diezmado
+    print("Test 3: Historial diezmado en bloques de 64")
+    peaks, rmss = decimate_peak_rms(buffer.latest(512), 64)
+    print(f"  Forma: {peaks.shape}")
+    assert peaks.shape == (8, CHANNELS), "❌ Forma incorrecta"
+    print("  ✅ Diezmado correcto\n")
+
+    # Test 4: El escritor alcanza al lector durante la copia
+    print("Test 4: Lector alcanzado por el escritor a mitad de lectura")
+
+    def meter_report(index: int) -> List[int]:
+        return [METER_ID] + list(np.full(CHANNELS, index & 0xFFFF, dtype="<u2").tobytes())
+
+    lapped_buffer = VSLMeterBuffer(channels=CHANNELS, capacity=64)
+    for i in range(100):
+        lapped_buffer.push(meter_report(i), float(i))
+
+    class _RacingView:
+        """Simula al escritor publicando 5 reportes y empezando el sexto durante la copia."""
+
+        def __init__(self, levels: np.ndarray):
+            self.levels = levels
+
+        def __getitem__(self, idx):
+            for i in range(100, 105):
+                lapped_buffer.push(meter_report(i), float(i))
+            lapped_buffer.slot_buffer()[:] = bytes(meter_report(0xFFFF)) + bytes(
+                VSL_PACKET_SIZE - 1 - 2 * CHANNELS)
+            return self.levels[idx]
+
+    lapped_buffer._levels_view = _RacingView(lapped_buffer._levels_view)
+    levels, stamps, cursor, overruns = lapped_buffer.read_since(0)
+    print(f"  Devueltos: {len(levels)}  Overruns: {overruns}  "
+          f"Primer reporte: {stamps[0]:.0f}")
+    assert np.all(levels[:, 0] == stamps.astype(np.uint16)), "❌ Ranura pisada devuelta"
+    assert cursor == 100 and overruns == 100 - len(levels), "❌ Overruns mal contados"
+    assert stamps[0] == 100 - 64 + 6, "❌ Reportes válidos descartados"
+    print("  ✅ Ranuras pisadas y a medias descartadas\n")
+
+    # Test 5: Un handle desenchufado no hace girar al lector
+    print("Test 5: Lector sobre un handle que siempre falla")
+
+    class _UnpluggedSource(_MeterSource):
+        def read(self, max_length: int, timeout_ms: int = 0) -> List[int]:
+            self.sent += 1
+            raise OSError("read error")
+
+    unplugged = _UnpluggedSource(rate_hz=4000.0)
+    lost: List[int] = []
+    reader = VSLMeterReader(unplugged, VSLMeterBuffer(channels=CHANNELS), METER_ID,
+                            on_disconnect=lambda: lost.append(1))
+    t0 = time.monotonic()
+    reader.start()
+    reader._thread.join(2.0)
+    elapsed_ms = (time.monotonic() - t0) * 1000.0
+    reader.stop()
+    print(f"  Lecturas: {unplugged.sent}  Detenido tras {elapsed_ms:.0f} ms  "
+          f"disconnected={reader.disconnected}")
+    assert unplugged.sent == MAX_READ_ERRORS, "❌ El lector giró sobre el handle caído"
+    assert reader.disconnected and lost == [1], "❌ Desconexión no notificada"
+    print("  ✅ Reintentos con espera y desconexión notificada")
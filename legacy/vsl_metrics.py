@@ -0,0 +1,449 @@
+"""
+VSL-DSP Metrics Module
+Métricas de tiempo de ejecución del camino de envío.
+
+Contadores e histogramas sin locks en el camino caliente: cada hilo
+escribe en su propio fragmento (threading.local) y snapshot() los suma.
+Las profundidades de cola son gauges que se evalúan solo al tomar el
+snapshot. format_prometheus() produce el formato de texto de Prometheus
+y VSLMetricsExporter lo escribe periódicamente para el textfile
+collector de node_exporter.
+
+Los componentes instrumentados (VSLDevice, VSLSendQueue, VSLPipeline,
+VSLDeviceManager, VSLDaemon) reciben un VSLMetrics opcional; con None
+el camino de envío solo paga una comparación.
+"""
+
+import bisect
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from vsl_log import get_event_log
+
+
+# Etiquetas: tupla de pares (nombre, valor); la tupla vacía es la serie sin etiquetas
+Labels = Tuple[Tuple[str, Any], ...]
+MetricKey = Tuple[str, Labels]
+
+# Límites superiores de los buckets de latencia (segundos)
+DEFAULT_LATENCY_BUCKETS_S = (
+    0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 1.0,
+)
+
+DEFAULT_EXPORT_INTERVAL_S = 5.0
+
+
+# ============================================================================
+# NOMBRES DE MÉTRICAS
+# ============================================================================
+
+PACKETS_SENT = "vsl_packets_sent_total"
+PACKETS_FAILED = "vsl_packets_failed_total"
+BYTES_WRITTEN = "vsl_bytes_written_total"
+WRITE_LATENCY = "vsl_write_latency_seconds"
+WRITES_SKIPPED = "vsl_writes_skipped_total"
+WRITES_COALESCED = "vsl_writes_coalesced_total"
+QUEUE_DEPTH = "vsl_queue_depth"
+QUEUE_REJECTED = "vsl_queue_rejected_total"
+PACKETS_DROPPED = "vsl_packets_dropped_total"
+RETRANSMITS = "vsl_retransmits_total"
+ACK_TIMEOUTS = "vsl_ack_timeouts_total"
+DISCONNECTS = "vsl_disconnects_total"
+RECONNECTS = "vsl_reconnects_total"
+
+METRIC_HELP = {
+    PACKETS_SENT: "Reportes HID escritos con éxito",
+    PACKETS_FAILED: "Escrituras HID fallidas",
+    BYTES_WRITTEN: "Bytes escritos en el dispositivo",
+    WRITE_LATENCY: "Duración de cada escritura HID",
+    WRITES_SKIPPED: "Escrituras omitidas por coincidir con el estado espejo",
+    WRITES_COALESCED: "Escrituras absorbidas por un valor más reciente",
+    QUEUE_DEPTH: "Paquetes encolados por carril",
+    QUEUE_REJECTED: "Paquetes rechazados por backpressure",
+    PACKETS_DROPPED: "Paquetes encolados descartados sin enviar",
+    RETRANSMITS: "Retransmisiones por confirmación vencida",
+    ACK_TIMEOUTS: "Escrituras sin confirmar tras agotar las retransmisiones",
+    DISCONNECTS: "Desconexiones de unidades detectadas",
+    RECONNECTS: "Unidades reabiertas tras una desconexión",
+}
+
+# Formato de exportación de valores de etiqueta conocidos
+_LABEL_FORMATS = {"param_id": "0x{:04X}"}
+
+
+class _Shard:
+    """Contadores e histogramas de un solo hilo."""
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters: Dict[MetricKey, float] = {}
+        # Por histograma: un conteo por bucket (+Inf al final) y la suma al final
+        self.histograms: Dict[MetricKey, List[float]] = {}
+
+
+# ============================================================================
+# REGISTRO
+# ============================================================================
+
+class VSLMetrics:
+    """
+    Registro de métricas compartido por los componentes de envío.
+
+    inc() y observe() no toman ningún lock: el fragmento del hilo se crea
+    en su primera escritura y las sumas se hacen en snapshot(). Los
+    fragmentos de hilos terminados se conservan, así que ningún conteo
+    se pierde.
+    """
+
+    def __init__(self, latency_buckets_s=DEFAULT_LATENCY_BUCKETS_S):
+        """
+        Raises:
+            ValueError: Si los buckets no son estrictamente crecientes
+        """
+        bounds = tuple(float(b) for b in latency_buckets_s)
+        if not bounds or any(a >= b for a, b in zip(bounds, bounds[1:])):
+            raise ValueError("latency_buckets_s debe ser estrictamente creciente")
+        self.buckets = bounds
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._gauges: Dict[MetricKey, List[Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        shard = _Shard()
+        with self._lock:
+            self._shards.append(shard)
+        self._local.shard = shard
+        return shard
+
+    # ------------------------------------------------------------------
+    # Camino caliente
+    # ------------------------------------------------------------------
+
+    def inc(self, name: str, amount: float = 1, labels: Labels = ()):
+        try:
+            counters = self._local.shard.counters
+        except AttributeError:
+            counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, labels: Labels = ()):
+        try:
+            histograms = self._local.shard.histograms
+        except AttributeError:
+            histograms = self._shard().histograms
+        key = (name, labels)
+        counts = histograms.get(key)
+        if counts is None:
+            counts = histograms[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def record_write(self, param_id: int, nbytes: int, latency_s: float,
+                     labels: Labels = ()):
+        """Una escritura HID exitosa: contador por parámetro, bytes y latencia."""
+        # Equivale a dos inc() y un observe() con un solo acceso al fragmento
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        counters = shard.counters
+        key = (PACKETS_SENT, labels + (("param_id", param_id),))
+        counters[key] = counters.get(key, 0) + 1
+        key = (BYTES_WRITTEN, labels)
+        counters[key] = counters.get(key, 0) + nbytes
+        key = (WRITE_LATENCY, labels)
+        counts = shard.histograms.get(key)
+        if counts is None:
+            counts = shard.histograms[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, latency_s)] += 1
+        counts[-1] += latency_s
+
+    def record_failure(self, param_id: int, labels: Labels = ()):
+        self.inc(PACKETS_FAILED, 1, labels + (("param_id", param_id),))
+
+    # ------------------------------------------------------------------
+    # Gauges
+    # ------------------------------------------------------------------
+
+    def register_gauge(self, name: str, fn: Callable[[], float], labels: Labels = ()):
+        """
+        Registra una función evaluada en cada snapshot (sin coste en el envío).
+
+        Varias funciones con el mismo nombre y etiquetas se suman en una
+        sola serie (p.ej. dos colas sin etiqueta de unidad).
+        """
+        with self._lock:
+            self._gauges.setdefault((name, labels), []).append(fn)
+
+    def unregister_gauge(self, name: str, labels: Labels = (),
+                         fn: Optional[Callable[[], float]] = None):
+        """Retira la función fn de la serie (o la serie entera si fn es None)."""
+        key = (name, labels)
+        with self._lock:
+            fns = self._gauges.get(key)
+            if fns is None:
+                return
+            if fn is not None:
+                fns[:] = [f for f in fns if f != fn]
+            if fn is None or not fns:
+                del self._gauges[key]
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, Dict[MetricKey, Any]]:
+        """
+        Suma los fragmentos de todos los hilos y evalúa los gauges.
+
+        Returns:
+            {"counters": {(nombre, etiquetas): valor},
+             "histograms": {(nombre, etiquetas): {"buckets": [(le, acumulado)],
+                                                  "count": n, "sum": s}},
+             "gauges": {(nombre, etiquetas): valor}}
+        """
+        with self._lock:
+            shards = list(self._shards)
+            gauges = [(key, list(fns)) for key, fns in self._gauges.items()]
+
+        counters: Dict[MetricKey, float] = {}
+        raw_hist: Dict[MetricKey, List[float]] = {}
+        for shard in shards:
+            # dict()/list() copian de una vez bajo el GIL aunque el hilo siga escribiendo
+            for key, value in dict(shard.counters).items():
+                counters[key] = counters.get(key, 0) + value
+            for key, counts in dict(shard.histograms).items():
+                counts = list(counts)
+                total = raw_hist.get(key)
+                if total is None:
+                    raw_hist[key] = counts
+                else:
+                    for i, c in enumerate(counts):
+                        total[i] += c
+
+        histograms = {}
+        for key, counts in raw_hist.items():
+            cumulative, buckets = 0, []
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                buckets.append((le, cumulative))
+            histograms[key] = {"buckets": buckets, "count": cumulative, "sum": counts[-1]}
+
+        gauge_values = {}
+        for key, fns in gauges:
+            try:
+                gauge_values[key] = sum(float(fn()) for fn in fns)
+            except Exception:
+                continue
+
+        return {"counters": counters, "histograms": histograms, "gauges": gauge_values}
+
+    def total(self, name: str) -> float:
+        """Suma de un contador sobre todas sus etiquetas."""
+        return sum(value for (n, _), value in self.snapshot()["counters"].items()
+                   if n == name)
+
+
+# ============================================================================
+# EXPORTACIÓN PROMETHEUS
+# ============================================================================
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = []
+    for name, value in labels:
+        fmt = _LABEL_FORMATS.get(name)
+        text = fmt.format(value) if fmt and isinstance(value, int) else str(value)
+        text = text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{text}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def format_prometheus(snapshot: Dict[str, Dict[MetricKey, Any]]) -> str:
+    """Convierte un snapshot al formato de texto de exposición de Prometheus."""
+    lines: List[str] = []
+
+    def header(name: str, kind: str):
+        if name in METRIC_HELP:
+            lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for kind, section in (("counter", "counters"), ("gauge", "gauges")):
+        current = None
+        for (name, labels), value in sorted(snapshot[section].items(), key=_sort_key):
+            if name != current:
+                header(name, kind)
+                current = name
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    current = None
+    for (name, labels), hist in sorted(snapshot["histograms"].items(), key=_sort_key):
+        if name != current:
+            header(name, "histogram")
+            current = name
+        for le, count in hist["buckets"]:
+            le_label = f'le="{_format_value(le)}"'
+            lines.append(f"{name}_bucket{_format_labels(labels, le_label)} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(hist['sum'])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _sort_key(item):
+    (name, labels), _ = item
+    return name, tuple((k, str(v)) for k, v in labels)
+
+
+def write_prometheus_textfile(metrics: VSLMetrics, path: str):
+    """Escritura atómica (archivo temporal + rename) para el textfile collector."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(format_prometheus(metrics.snapshot()))
+    os.replace(tmp_path, path)
+
+
+class VSLMetricsExporter:
+    """Hilo que reescribe el archivo de métricas cada interval_s."""
+
+    def __init__(self, metrics: VSLMetrics, path: str,
+                 interval_s: float = DEFAULT_EXPORT_INTERVAL_S):
+        if interval_s <= 0.0:
+            raise ValueError("interval_s debe ser > 0")
+        self._metrics = metrics
+        self._path = path
+        self._interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.exports = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._export_loop, name="vsl-metrics-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Detiene el hilo tras una última exportación."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.export()
+
+    def export(self):
+        try:
+            write_prometheus_textfile(self._metrics, self._path)
+            self.exports += 1
+        except OSError as e:
+            get_event_log().warning("metrics_export_failed",
+                                    "No se pudieron exportar las métricas",
+                                    path=self._path, error=str(e))
+
+    def _export_loop(self):
+        while not self._stop.wait(self._interval_s):
+            self.export()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from vsl_fake_device import FakeVSLHandle
+    from vsl_hid_io import VSLDevice
+    from vsl_send_queue import VSLPriority
+    from vsl_transport import VSLPacket
+
+    print("=== Tests de vsl_metrics.py ===\n")
+
+    # Test 1: Contadores por hilo sin locks
+    print("Test 1: 8 hilos x 50000 incrementos")
+    metrics = VSLMetrics()
+
+    def hammer():
+        for i in range(50000):
+            metrics.inc(PACKETS_SENT, 1, (("param_id", 0x1A01 + i % 4),))
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"  Total: {metrics.total(PACKETS_SENT):,.0f}")
+    assert metrics.total(PACKETS_SENT) == 400000, "❌ Se perdieron incrementos"
+    print("  ✅ Ningún incremento perdido\n")
+
+    # Test 2: Coste del camino caliente
+    print("Test 2: Coste por operación")
+    n = 200000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        metrics.inc(WRITES_SKIPPED)
+    inc_ns = (time.perf_counter() - t0) / n * 1e9
+    t0 = time.perf_counter()
+    for _ in range(n):
+        metrics.record_write(0x1A01, 64, 0.0003)
+    write_ns = (time.perf_counter() - t0) / n * 1e9
+    disabled = None
+    t0 = time.perf_counter()
+    for _ in range(n):
+        if disabled is not None:
+            disabled.record_write(0x1A01, 64, 0.0003)
+    off_ns = (time.perf_counter() - t0) / n * 1e9
+    print(f"  inc: {inc_ns:.0f} ns  record_write: {write_ns:.0f} ns  "
+          f"desactivadas: {off_ns:.0f} ns")
+    print("  ✅ Sin métricas el coste es una comparación\n")
+
+    # Test 3: VSLDevice + cola instrumentados y exportación
+    print("Test 3: VSLDevice instrumentado y archivo Prometheus")
+    metrics = VSLMetrics()
+    VSLDevice.release()
+    device = VSLDevice(handle_factory=lambda: FakeVSLHandle(latency_s=0.0))
+    device.open()
+    device.attach_metrics(metrics)
+    queue = device.create_send_queue()
+    queue.start()
+    for i in range(5):
+        queue.submit(VSLPacket(0x1A01 + i % 2, i, report_id=0x01), VSLPriority.BULK)
+    queue.flush()
+    assert metrics.snapshot()["gauges"][(QUEUE_DEPTH, (("lane", "BULK"),))] == 0, \
+        "❌ Gauge de cola"
+    queue.stop()
+    device.close()
+    VSLDevice.release()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vsl.prom")
+        with VSLMetricsExporter(metrics, path, interval_s=0.01):
+            time.sleep(0.05)
+        with open(path) as f:
+            text = f.read()
+    print("  " + "\n  ".join(line for line in text.splitlines()
+                             if not line.startswith("#") and "_bucket" not in line))
+    assert 'vsl_packets_sent_total{param_id="0x1A01"} 3' in text, "❌ Contador por parámetro"
+    assert "vsl_bytes_written_total 320" in text, "❌ Bytes escritos"
+    assert 'vsl_write_latency_seconds_bucket{le="+Inf"} 5' in text, "❌ Histograma"
+    assert "vsl_queue_depth" not in text, "❌ Gauge de una cola detenida"
+    print("  ✅ Métricas exportadas en formato Prometheus")
@@ -0,0 +1,440 @@
+"""
+VSL-DSP OSC Bridge Module
+Puente OSC/UDP (asyncio) para superficies de control y tablets.
+
+Cada dirección OSC se asocia a un VSLParameter. El primer argumento del
+mensaje es un valor normalizado (0.0 - 1.0): para ganancias pasa por
+vsl_encode_gain, y para frecuencias es la posición lineal que
+vsl_map_frequency convierte en Hz (y que viaja tal cual en el paquete).
+
+Una ráfaga de eventos táctiles no puede acumularse delante del
+dispositivo: el camino de envío es un buzón con un único valor pendiente
+por parámetro, que un hilo escritor vacía en cada pasada. Los valores
+intermedios que llegan mientras se escribe simplemente se sobrescriben.
+"""
+
+import asyncio
+import random
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from vsl_config import VSLParameter, FREQ_HPF_CH1, GAIN_CH1
+from vsl_core import is_frequency_parameter, vsl_encode_gain, vsl_final_encode_to_int
+from vsl_transport import VSLPacket
+
+
+LATENCY_SAMPLES = 4096
+
+# Mapa de ejemplo (direcciones al estilo de TouchOSC)
+DEFAULT_OSC_MAP: Dict[str, VSLParameter] = {
+    "/ch/1/gain": GAIN_CH1,
+    "/ch/1/hpf": FREQ_HPF_CH1,
+}
+
+
+# ============================================================================
+# CODIFICACIÓN OSC 1.0 (mínima)
+# ============================================================================
+#
+# Soporta mensajes y bundles con argumentos i (int32), f (float32),
+# d (float64), s (string) y T/F. Todo Big-Endian, cadenas terminadas en
+# NUL y rellenadas a múltiplos de 4 bytes.
+
+OscMessage = Tuple[str, List[object]]
+
+
+def _read_string(data: bytes, offset: int) -> Tuple[str, int]:
+    end = data.find(b"\0", offset)
+    if end < 0:
+        raise ValueError("Cadena OSC sin terminador")
+    return data[offset:end].decode("ascii"), (end + 4) & ~3
+
+
+def _pad_string(text: str) -> bytes:
+    raw = text.encode("ascii") + b"\0"
+    return raw + b"\0" * (-len(raw) % 4)
+
+
+def parse_osc_packet(data: bytes) -> List[OscMessage]:
+    """
+    Decodifica un datagrama OSC (mensaje o bundle).
+
+    Returns:
+        Lista de (dirección, argumentos)
+
+    Raises:
+        ValueError: Si el datagrama está mal formado
+    """
+    try:
+        if data.startswith(b"#bundle\0"):
+            messages: List[OscMessage] = []
+            offset = 16  # "#bundle\0" + time tag de 8 bytes
+            while offset < len(data):
+                (size,) = struct.unpack_from(">i", data, offset)
+                offset += 4
+                messages.extend(parse_osc_packet(data[offset:offset + size]))
+                offset += size
+            return messages
+
+        address, offset = _read_string(data, 0)
+        if not address.startswith("/"):
+            raise ValueError(f"Dirección OSC inválida: {address!r}")
+        if offset >= len(data):
+            return [(address, [])]
+
+        tags, offset = _read_string(data, offset)
+        if not tags.startswith(","):
+            raise ValueError("Falta la cadena de tipos")
+
+        args: List[object] = []
+        for tag in tags[1:]:
+            if tag == "f":
+                args.append(struct.unpack_from(">f", data, offset)[0])
+                offset += 4
+            elif tag == "i":
+                args.append(struct.unpack_from(">i", data, offset)[0])
+                offset += 4
+            elif tag == "d":
+                args.append(struct.unpack_from(">d", data, offset)[0])
+                offset += 8
+            elif tag == "s":
+                text, offset = _read_string(data, offset)
+                args.append(text)
+            elif tag in "TF":
+                args.append(tag == "T")
+            else:
+                raise ValueError(f"Tipo OSC no soportado: {tag!r}")
+        return [(address, args)]
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Datagrama OSC mal formado: {e}") from e
+
+
+def encode_osc_message(address: str, *args: object) -> bytes:
+    """Codifica un mensaje OSC (floats como f, ints como i, str como s)."""
+    tags = ","
+    payload = b""
+    for arg in args:
+        if isinstance(arg, bool):
+            tags += "T" if arg else "F"
+        elif isinstance(arg, int):
+            tags += "i"
+            payload += struct.pack(">i", arg)
+        elif isinstance(arg, float):
+            tags += "f"
+            payload += struct.pack(">f", arg)
+        elif isinstance(arg, str):
+            tags += "s"
+            payload += _pad_string(arg)
+        else:
+            raise ValueError(f"Tipo no soportado en OSC: {type(arg).__name__}")
+    return _pad_string(address) + _pad_string(tags) + payload
+
+
+def encode_normalized(value: float, param: VSLParameter) -> int:
+    """
+    Convierte un valor normalizado de superficie (0.0 - 1.0) al entero del DSP.
+
+    - Ganancia: vsl_encode_gain → vsl_final_encode_to_int
+    - Frecuencia: la posición es la que vsl_map_frequency lleva a Hz; en el
+      paquete viaja como round(posición * max_encoded_int)
+    """
+    value = max(0.0, min(1.0, float(value)))
+    if is_frequency_parameter(param):
+        return int(round(value * param.max_encoded_int))
+    return vsl_final_encode_to_int(vsl_encode_gain(value, param), param)
+
+
+# ============================================================================
+# PUENTE
+# ============================================================================
+
+class VSLOscBridge(asyncio.DatagramProtocol):
+    """
+    Recibe OSC por UDP en el bucle de asyncio y escribe en un hilo aparte.
+
+    datagram_received() solo decodifica y deja el último valor de cada
+    parámetro en el buzón; las escrituras HID (bloqueantes) ocurren en el
+    hilo escritor, así que el bucle de asyncio nunca espera al dispositivo.
+    """
+
+    def __init__(self, writer: Callable[[VSLPacket], bool],
+                 osc_map: Mapping[str, VSLParameter] = DEFAULT_OSC_MAP,
+                 report_id: Optional[int] = None):
+        """
+        Args:
+            writer: Función que escribe un paquete (ej: VSLDevice.send_packet)
+            osc_map: Dirección OSC → VSLParameter
+            report_id: Report ID de los paquetes (None usa VSL_REPORT_ID)
+        """
+        self._writer = writer
+        self._map = dict(osc_map)
+        self._report_id = report_id
+        self._transport: Optional[asyncio.DatagramTransport] = None
+
+        # Buzón: param_id → (entero, instante de recepción)
+        self._pending: Dict[int, Tuple[int, float]] = {}
+        self._last_written: Dict[int, int] = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.received = 0
+        self.unmapped = 0
+        self.malformed = 0
+        self.coalesced = 0      # Sobrescritos en el buzón antes de escribirse
+        self.unchanged = 0      # Iguales al último valor escrito
+        self.written = 0
+        self.failed = 0
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    async def start(self, host: str = "127.0.0.1", port: int = 9000
+                    ) -> Tuple[str, int]:
+        """
+        Abre el socket UDP y arranca el hilo escritor.
+
+        Returns:
+            (host, puerto) efectivos (útil con port=0)
+
+        Raises:
+            OSError: Si no se puede abrir el socket (el hilo no llega a arrancar)
+        """
+        # Los datagramas que lleguen antes de arrancar el hilo esperan en el buzón
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, local_addr=(host, port))
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._writer_loop, name="vsl-osc-writer", daemon=True
+        )
+        self._thread.start()
+        return self._transport.get_extra_info("sockname")[:2]
+
+    def close(self):
+        """Cierra el socket y escribe los valores pendientes antes de salir."""
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # ------------------------------------------------------------------
+    # asyncio.DatagramProtocol
+    # ------------------------------------------------------------------
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        t_in = time.perf_counter()
+        try:
+            messages = parse_osc_packet(data)
+        except ValueError:
+            self.malformed += 1
+            return
+
+        updates = []
+        for address, args in messages:
+            self.received += 1
+            param = self._map.get(address)
+            if param is None or not args or isinstance(args[0], str):
+                self.unmapped += 1
+                continue
+            updates.append((param.dsp_param_id, encode_normalized(args[0], param)))
+
+        if updates:
+            with self._cond:
+                for param_id, value in updates:
+                    if param_id in self._pending:
+                        self.coalesced += 1
+                    self._pending[param_id] = (value, t_in)
+                self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Hilo escritor
+    # ------------------------------------------------------------------
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and self._running:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+
+            for param_id, (value, t_in) in batch.items():
+                if self._last_written.get(param_id) == value:
+                    self.unchanged += 1
+                    continue
+                try:
+                    ok = bool(self._writer(VSLPacket(param_id, value,
+                                                     report_id=self._report_id)))
+                except Exception:
+                    ok = False
+                if ok:
+                    self._last_written[param_id] = value
+                    self.written += 1
+                    self._latencies.append(time.perf_counter() - t_in)
+                else:
+                    self.failed += 1
+
+    # ------------------------------------------------------------------
+    # Estadísticas
+    # ------------------------------------------------------------------
+
+    def get_latency_stats(self) -> Dict[str, float]:
+        """
+        Latencia de extremo a extremo: datagrama recibido → escritura completada.
+
+        Returns:
+            Diccionario con count, mean_ms, p50_ms, p99_ms, max_ms
+        """
+        samples = sorted(self._latencies)
+        stats = {"count": len(samples), "mean_ms": 0.0, "p50_ms": 0.0,
+                 "p99_ms": 0.0, "max_ms": 0.0}
+        if samples:
+            n = len(samples)
+            stats["mean_ms"] = sum(samples) / n * 1000.0
+            stats["p50_ms"] = samples[n // 2] * 1000.0
+            stats["p99_ms"] = samples[min(n - 1, int(n * 0.99))] * 1000.0
+            stats["max_ms"] = samples[-1] * 1000.0
+        return stats
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"received": self.received, "unmapped": self.unmapped,
+                "malformed": self.malformed, "coalesced": self.coalesced,
+                "unchanged": self.unchanged, "written": self.written, "failed": self.failed}
+
+
+# ============================================================================
+# GENERADOR DE CARGA
+# ============================================================================
+
+def generate_osc_load(host: str, port: int, addresses: Sequence[str],
+                      rate_hz: float, duration_s: float,
+                      seed: Optional[int] = None) -> int:
+    """
+    Envía mensajes OSC con valores aleatorios a una tasa fija (bloqueante).
+
+    Pensado para ejecutarse en un hilo o proceso aparte contra el puente.
+
+    Returns:
+        Número de mensajes enviados
+    """
+    rng = random.Random(seed)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    period = 1.0 / rate_hz
+    t0 = time.perf_counter()
+    sent = 0
+    try:
+        while True:
+            now = time.perf_counter()
+            if now - t0 >= duration_s:
+                break
+            due = t0 + sent * period
+            if due > now:
+                time.sleep(due - now)
+            address = addresses[sent % len(addresses)]
+            sock.sendto(encode_osc_message(address, rng.random()), (host, port))
+            sent += 1
+    finally:
+        sock.close()
+    return sent
+
+
+if __name__ == "__main__":
+    print("=== Tests de vsl_osc.py ===\n")
+
+    # Test 1: Codificación / decodificación
+    print("Test 1: Parser OSC")
+    message = encode_osc_message("/ch/1/gain", 0.5, 3, "x")
+    bundle = (b"#bundle\0" + b"\0" * 8 + struct.pack(">i", len(message)) + message)
+    parsed = parse_osc_packet(bundle)
+    print(f"  {parsed}")
+    assert parsed == [("/ch/1/gain", [0.5, 3, "x"])], "❌ Parser incorrecto"
+    try:
+        parse_osc_packet(b"/ch/1/gain")
+        print("  ❌ Error: Debería haber lanzado ValueError")
+    except ValueError as e:
+        print(f"  ✅ ValueError capturado correctamente: {e}")
+    assert encode_normalized(1.0, FREQ_HPF_CH1) == 65535, "❌ Frecuencia mal codificada"
+    print()
+
+    # Test 2: Inundación de eventos contra un dispositivo lento
+    print("Test 2: 5000 msg/s durante 1 s contra escrituras de 1 ms")
+    WRITE_TIME_S = 0.001
+    device_writes: List[VSLPacket] = []
+
+    def slow_writer(packet: VSLPacket) -> bool:
+        time.sleep(WRITE_TIME_S)
+        device_writes.append(packet)
+        return True
+
+    osc_map = {f"/ch/{i}/gain": GAIN_CH1._replace(dsp_param_id=0x1A00 + i)
+               for i in range(1, 9)}
+
+    async def run_flood():
+        bridge = VSLOscBridge(slow_writer, osc_map, report_id=0x01)
+        host, port = await bridge.start("127.0.0.1", 0)
+        sent = await asyncio.to_thread(generate_osc_load, host, port,
+                                       list(osc_map), 5000.0, 1.0, 42)
+        await asyncio.sleep(0.05)
+        bridge.close()
+        return bridge, sent
+
+    bridge, sent = asyncio.run(run_flood())
+    stats = bridge.get_stats()
+    latency = bridge.get_latency_stats()
+    print(f"  Enviados: {sent}  Recibidos: {stats['received']}  "
+          f"Coalescidos: {stats['coalesced']}  Escritos: {stats['written']}")
+    print(f"  Latencia entrada→escritura: p50={latency['p50_ms']:.2f} ms  "
+          f"p99={latency['p99_ms']:.2f} ms  max={latency['max_ms']:.2f} ms")
+    # El generador es determinista: último valor enviado a cada dirección
+    rng = random.Random(42)
+    last_sent: Dict[int, int] = {}
+    for i in range(sent):
+        param = osc_map[list(osc_map)[i % len(osc_map)]]
+        last_sent[param.dsp_param_id] = encode_normalized(rng.random(), param)
+    # Sin aserción sobre la latencia absoluta: depende de la carga de la máquina
+    assert stats["received"] == sent and stats["failed"] == 0, "❌ Mensajes perdidos"
+    assert stats["written"] < stats["received"] // 2, "❌ Sin coalescencia"
+    assert (stats["written"] + stats["coalesced"] + stats["unchanged"]
+            == stats["received"]), "❌ Mensajes sin contabilizar"
+    assert bridge._last_written == last_sent, "❌ El último valor no llegó al dispositivo"
+    print("  ✅ Buzón coalescido y último valor de cada parámetro escrito")
+
+    # Test 3: Un puerto ocupado no deja el hilo escritor vivo
+    print("\nTest 3: start() sobre un puerto ocupado")
+
+    async def run_busy_port():
+        first = VSLOscBridge(slow_writer, osc_map)
+        host, port = await first.start("127.0.0.1", 0)
+        second = VSLOscBridge(slow_writer, osc_map)
+        try:
+            await second.start(host, port)
+        except OSError as e:
+            error = e
+        else:
+            error = None
+        finally:
+            first.close()
+        return second, error
+
+    second, error = asyncio.run(run_busy_port())
+    print(f"  OSError: {error}")
+    assert error is not None, "❌ Debería haber lanzado OSError"
+    assert not second._running and second._thread is None, "❌ Hilo escritor huérfano"
+    assert not any(t.name == "vsl-osc-writer" for t in threading.enumerate()), \
+        "❌ Hilo escritor vivo"
+    print("  ✅ Sin hilo escritor tras el fallo")
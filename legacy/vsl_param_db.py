@@ -0,0 +1,543 @@
+"""
+VSL-DSP Parameter Database Module
+Tablas de parámetros por modelo, cargadas desde un archivo de datos.
+
+La fuente es un JSON legible (vsl_params.json): curvas con nombre y una
+tabla de parámetros por modelo (pid de audiobox_models[]). La primera
+carga la compila a un binario de registros fijos con las constantes
+derivadas ya calculadas y lo guarda en __pycache__/; las siguientes solo
+comprueban la firma de la fuente (mtime_ns + tamaño, como los .pyc) y
+mapean el binario en memoria. Si la fuente cambia, se recompila.
+
+Formato del binario (little-endian):
+  [0-7]    : Magic b"VSLPDB\\0\\0"
+  [8-11]   : Versión del formato (uint32)
+  [16-23]  : mtime_ns de la fuente (int64)
+  [24-31]  : Tamaño de la fuente en bytes (int64)
+  [32-35]  : Modelos (uint32)
+  [36-39]  : Parámetros (uint32)
+  [40-43]  : Cadenas (uint32)
+  [44-47]  : Bytes de la tabla de cadenas (uint32)
+  [64-..]  : Modelos: pid, cadena del nombre, primer parámetro, cantidad
+  [....]   : (cadenas + 1) x uint32 offsets + cadenas UTF-8
+  [....]   : Parámetros (alineados a 8), RECORD_SIZE bytes cada uno,
+             ordenados por modelo y dentro del modelo por param_id
+
+Cada registro de parámetro lleva los campos de VSLParameter tal cual.
+Las constantes derivadas (escalas, log2 del rango) no se guardan: el
+codec de vsl_core las calcula con sus propias constantes y el binario
+solo podría duplicarlas con otro redondeo.
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from vsl_config import VSLParameter, VSLModel
+from vsl_core import NUMPY_AVAILABLE, validate_parameter
+from vsl_log import get_event_log
+
+_log = get_event_log()
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vsl_params.json")
+
+DB_MAGIC = b"VSLPDB\0\0"
+DB_VERSION = 2
+SOURCE_FORMAT = 1
+
+DB_HEADER = struct.Struct("<8sI4xqqIIII")
+DB_HEADER_SIZE = 64
+MODEL_RECORD = struct.Struct("<HHII")
+# param_id, nombre, control, canal, tipo, max_encoded_int + 7 float64
+PARAM_RECORD = struct.Struct("<HHHBBI4x7d")
+RECORD_SIZE = PARAM_RECORD.size
+
+# Tipos de curva
+KIND_GAIN = 0
+KIND_FREQUENCY = 1
+KIND_LINEAR = 2           # Posición 0.0 - 1.0 escalada a max_encoded_int (pan, mute...)
+KIND_NAMES = {"gain": KIND_GAIN, "frequency": KIND_FREQUENCY, "linear": KIND_LINEAR}
+
+_CURVE_FIELDS = VSLParameter._fields[1:]
+_DEFAULT_CURVE = dict(max_encoded_int=65535, coeff_offset_A=0.0, coeff_C1=0.0,
+                      log_factor=0.0, curve_min_map=0.0, curve_max_map=0.0,
+                      freq_min_hz=0.0, freq_max_hz=0.0)
+
+
+class VSLParamSpec(NamedTuple):
+    """Un parámetro de la tabla de un modelo."""
+    name: str                 # Nombre estable (ej: "GAIN_CH1")
+    model_pid: int
+    control: str              # Control de la tira de canal (ej: "gain", "hpf")
+    channel: int              # 1..N (0 = global)
+    kind: int                 # KIND_GAIN / KIND_FREQUENCY / KIND_LINEAR
+    param: VSLParameter
+
+
+def _record_dtype():
+    """dtype NumPy idéntico a PARAM_RECORD (vista sin copia del binario)."""
+    import numpy as np
+    return np.dtype({
+        "names": ["param_id", "name", "control", "channel", "kind", "max_encoded_int",
+                  "coeff_offset_A", "coeff_C1", "log_factor", "curve_min_map",
+                  "curve_max_map", "freq_min_hz", "freq_max_hz"],
+        "formats": ["<u2", "<u2", "<u2", "u1", "u1", "<u4"] + ["<f8"] * 7,
+        "offsets": [0, 2, 4, 6, 7, 8] + [16 + 8 * i for i in range(7)],
+        "itemsize": RECORD_SIZE,
+    })
+
+
+# ============================================================================
+# COMPILACIÓN (JSON → binario)
+# ============================================================================
+
+def _parse_int(value: Any, what: str) -> int:
+    try:
+        return int(value, 0) if isinstance(value, str) else int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{what}: entero inválido {value!r}") from None
+
+
+def _build_param(row: Dict[str, Any], curves: Dict[str, Dict[str, Any]],
+                 where: str) -> Tuple[int, VSLParameter]:
+    curve_name = row.get("curve")
+    if curve_name not in curves:
+        raise ValueError(f"{where}: curva desconocida {curve_name!r}")
+    curve = dict(curves[curve_name])
+    # Los campos de la fila sustituyen a los de la curva
+    curve.update({k: v for k, v in row.items() if k in _CURVE_FIELDS or k == "kind"})
+
+    kind_name = curve.pop("kind", None)
+    if kind_name not in KIND_NAMES:
+        raise ValueError(f"{where}: tipo de curva inválido {kind_name!r}")
+    unknown = set(curve) - set(_CURVE_FIELDS)
+    if unknown:
+        raise ValueError(f"{where}: campos desconocidos {sorted(unknown)}")
+
+    fields = dict(_DEFAULT_CURVE, **curve)
+    param = VSLParameter(
+        dsp_param_id=_parse_int(row.get("id"), where),
+        max_encoded_int=_parse_int(fields.pop("max_encoded_int"), where),
+        **{k: float(v) for k, v in fields.items()},
+    )
+    if not 0 <= param.dsp_param_id <= 0xFFFF:
+        raise ValueError(f"{where}: param_id fuera de rango (16 bits)")
+    kind = KIND_NAMES[kind_name]
+    if (kind == KIND_FREQUENCY) != (param.freq_max_hz > 0.0):
+        raise ValueError(f"{where}: el tipo no coincide con el rango de frecuencia")
+    is_valid, message = validate_parameter(param)
+    if not is_valid:
+        raise ValueError(f"{where}: {message}")
+    return kind, param
+
+
+def compile_param_db(source: Dict[str, Any], mtime_ns: int = 0, size: int = 0) -> bytes:
+    """
+    Compila el documento JSON de parámetros al formato binario.
+
+    Args:
+        source: Documento ya decodificado (ver vsl_params.json)
+        mtime_ns, size: Firma de la fuente que se guarda en el encabezado
+
+    Raises:
+        ValueError: Si el documento no es válido (curvas, IDs repetidos...)
+    """
+    if source.get("format") != SOURCE_FORMAT:
+        raise ValueError(f"Formato de fuente no soportado: {source.get('format')!r}")
+    curves = source.get("curves", {})
+
+    strings: List[str] = []
+    string_index: Dict[str, int] = {}
+
+    def intern(text: str) -> int:
+        if text not in string_index:
+            string_index[text] = len(strings)
+            strings.append(text)
+        return string_index[text]
+
+    models = []
+    records = []
+    seen_pids = set()
+    for model in source.get("models", []):
+        pid = _parse_int(model.get("pid"), "pid de modelo")
+        if pid in seen_pids:
+            raise ValueError(f"Modelo repetido: 0x{pid:04X}")
+        seen_pids.add(pid)
+        rows = []
+        names = set()
+        for i, row in enumerate(model.get("parameters", [])):
+            where = f"modelo 0x{pid:04X}, parámetro {row.get('name', i)!r}"
+            if not row.get("name"):
+                raise ValueError(f"{where}: falta el nombre")
+            if row["name"] in names:
+                raise ValueError(f"{where}: nombre repetido")
+            names.add(row["name"])
+            kind, param = _build_param(row, curves, where)
+            rows.append((param.dsp_param_id, row["name"], row.get("control", ""),
+                         int(row.get("channel", 0)), kind, param))
+        rows.sort(key=lambda r: r[0])
+        for prev, cur in zip(rows, rows[1:]):
+            if prev[0] == cur[0]:
+                raise ValueError(f"modelo 0x{pid:04X}: param_id 0x{cur[0]:04X} repetido")
+
+        models.append((pid, intern(model.get("name", "")), len(records), len(rows)))
+        for param_id, name, control, channel, kind, param in rows:
+            records.append(PARAM_RECORD.pack(
+                param_id, intern(name), intern(control), channel, kind,
+                param.max_encoded_int, *param[2:]))
+
+    blob = bytearray()
+    offsets = []
+    for text in strings:
+        offsets.append(len(blob))
+        blob += text.encode("utf-8")
+    offsets.append(len(blob))
+
+    out = bytearray(DB_HEADER_SIZE)
+    DB_HEADER.pack_into(out, 0, DB_MAGIC, DB_VERSION, mtime_ns, size,
+                        len(models), len(records), len(strings), len(blob))
+    for model in models:
+        out += MODEL_RECORD.pack(*model)
+    out += struct.pack(f"<{len(offsets)}I", *offsets)
+    out += blob
+    out += b"\0" * (-len(out) % 8)
+    out += b"".join(records)
+    return bytes(out)
+
+
+# ============================================================================
+# BASE DE DATOS (vista sobre el binario)
+# ============================================================================
+
+class VSLParamDB:
+    """
+    Tablas de parámetros de todos los modelos, sobre el binario compilado.
+
+    Los registros se leen bajo demanda del buffer (mmap del cache o bytes
+    recién compilados); al cargar solo se decodifican los modelos y la
+    tabla de cadenas.
+    """
+
+    def __init__(self, buf, cache_path: Optional[str] = None, from_cache: bool = False):
+        """
+        Raises:
+            ValueError: Si el buffer no es un binario válido de esta versión
+        """
+        if len(buf) < DB_HEADER_SIZE:
+            raise ValueError("Binario de parámetros truncado")
+        (magic, version, self.source_mtime_ns, self.source_size,
+         n_models, n_params, n_strings, strings_size) = DB_HEADER.unpack_from(buf, 0)
+        if magic != DB_MAGIC or version != DB_VERSION:
+            raise ValueError("Binario de parámetros de otra versión")
+
+        offset = DB_HEADER_SIZE
+        raw_models = [MODEL_RECORD.unpack_from(buf, offset + i * MODEL_RECORD.size)
+                      for i in range(n_models)]
+        offset += n_models * MODEL_RECORD.size
+        bounds = struct.unpack_from(f"<{n_strings + 1}I", buf, offset)
+        offset += (n_strings + 1) * 4
+        blob = bytes(buf[offset:offset + strings_size])
+        offset += strings_size
+        offset += -offset % 8
+        if len(buf) < offset + n_params * RECORD_SIZE:
+            raise ValueError("Binario de parámetros truncado")
+
+        self._buf = buf
+        self._records_offset = offset
+        self._strings = [blob[bounds[i]:bounds[i + 1]].decode("utf-8")
+                         for i in range(n_strings)]
+        self.models: Tuple[VSLModel, ...] = tuple(
+            VSLModel(pid, self._strings[name]) for pid, name, _, _ in raw_models)
+        self._ranges: Dict[int, Tuple[int, int]] = {
+            pid: (first, first + count) for pid, _, first, count in raw_models}
+        self._by_name: Optional[Dict[Tuple[int, str], int]] = None
+        self.cache_path = cache_path
+        self.from_cache = from_cache
+
+    def __len__(self) -> int:
+        return sum(stop - start for start, stop in self._ranges.values())
+
+    def close(self):
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _range(self, pid: int) -> Tuple[int, int]:
+        try:
+            return self._ranges[pid]
+        except KeyError:
+            raise KeyError(f"Modelo sin tabla de parámetros: 0x{pid:04X}") from None
+
+    def _spec(self, index: int, pid: int) -> VSLParamSpec:
+        (param_id, name, control, channel, kind, max_int,
+         *values) = PARAM_RECORD.unpack_from(self._buf, self._records_offset + index * RECORD_SIZE)
+        param = VSLParameter(param_id, max_int, *values)
+        return VSLParamSpec(self._strings[name], pid, self._strings[control],
+                            channel, kind, param)
+
+    def table(self, pid: int) -> List[VSLParamSpec]:
+        """
+        Parámetros de un modelo ordenados por param_id.
+
+        Raises:
+            KeyError: Si el modelo no tiene tabla
+        """
+        start, stop = self._range(pid)
+        return [self._spec(i, pid) for i in range(start, stop)]
+
+    def lookup(self, pid: int, name: str) -> VSLParamSpec:
+        """
+        Raises:
+            KeyError: Si el modelo o el parámetro no existen
+        """
+        if self._by_name is None:
+            by_name = {}
+            for model_pid, (start, stop) in self._ranges.items():
+                for i in range(start, stop):
+                    name_index = struct.unpack_from(
+                        "<H", self._buf, self._records_offset + i * RECORD_SIZE + 2)[0]
+                    by_name[(model_pid, self._strings[name_index])] = i
+            self._by_name = by_name
+        self._range(pid)
+        try:
+            return self._spec(self._by_name[(pid, name)], pid)
+        except KeyError:
+            raise KeyError(f"Parámetro desconocido en 0x{pid:04X}: {name}") from None
+
+    def find_id(self, pid: int, param_id: int) -> Optional[VSLParamSpec]:
+        """Búsqueda binaria por param_id dentro de la tabla del modelo."""
+        lo, hi = self._range(pid)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_id = struct.unpack_from("<H", self._buf, self._records_offset + mid * RECORD_SIZE)[0]
+            if mid_id < param_id:
+                lo = mid + 1
+            elif mid_id > param_id:
+                hi = mid
+            else:
+                return self._spec(mid, pid)
+        return None
+
+    def channel_params(self, pid: int, control: str) -> List[VSLParamSpec]:
+        """Parámetros de un control (ej: "gain") de un modelo, ordenados por canal."""
+        specs = [spec for spec in self.table(pid) if spec.control == control]
+        specs.sort(key=lambda spec: spec.channel)
+        return specs
+
+    def records(self, pid: Optional[int] = None) -> "np.ndarray":
+        """
+        Vista NumPy estructurada (sin copia) de los registros. Es válida
+        mientras la base siga abierta (close() falla si quedan vistas vivas).
+
+        Args:
+            pid: Solo los de este modelo (None = todos)
+
+        Raises:
+            RuntimeError: Si numpy no está disponible
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy no está disponible. Instalar con: pip install numpy")
+        import numpy as np
+        start, stop = self._range(pid) if pid is not None else (0, len(self))
+        return np.frombuffer(self._buf, dtype=_record_dtype(), count=stop - start,
+                             offset=self._records_offset + start * RECORD_SIZE)
+
+
+# ============================================================================
+# CARGA CON CACHE
+# ============================================================================
+
+def default_cache_path(source_path: str) -> str:
+    directory, filename = os.path.split(os.path.abspath(source_path))
+    return os.path.join(directory, "__pycache__", os.path.splitext(filename)[0] + ".vslpdb")
+
+
+def _open_cache(cache_path: str, mtime_ns: int, size: int) -> Optional[VSLParamDB]:
+    """El cache mapeado en memoria si existe y corresponde a la fuente actual."""
+    try:
+        with open(cache_path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):        # Ausente o vacío
+        return None
+    try:
+        db = VSLParamDB(buf, cache_path, from_cache=True)
+    except (ValueError, struct.error):
+        buf.close()
+        return None
+    if db.source_mtime_ns != mtime_ns or db.source_size != size:
+        db.close()
+        return None
+    return db
+
+
+def _write_cache(cache_path: str, data: bytes) -> bool:
+    """Escritura atómica (archivo temporal + rename); False si no se pudo."""
+    import tempfile
+    directory = os.path.dirname(cache_path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".vslpdb-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        _log.debug("param_db_cache_write_failed", str(e), path=cache_path)
+        return False
+    return True
+
+
+def load_param_db(path: str = DEFAULT_DB_PATH,
+                  cache_path: Optional[str] = None) -> VSLParamDB:
+    """
+    Carga la base de datos de parámetros.
+
+    Usa el binario de cache si su firma coincide con la fuente; si no,
+    compila la fuente y reescribe el cache. Si el cache no se puede
+    escribir (directorio de solo lectura) se usa el binario en memoria.
+
+    Args:
+        path: Archivo JSON fuente
+        cache_path: Binario compilado (None = __pycache__/ junto a la fuente)
+
+    Raises:
+        OSError: Si la fuente no se puede leer
+        ValueError: Si la fuente no es válida
+    """
+    cache_path = cache_path or default_cache_path(path)
+    st = os.stat(path)
+    db = _open_cache(cache_path, st.st_mtime_ns, st.st_size)
+    if db is not None:
+        return db
+
+    with open(path, encoding="utf-8") as f:
+        try:
+            source = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}: JSON inválido ({e})") from None
+    data = compile_param_db(source, st.st_mtime_ns, st.st_size)
+    _log.debug("param_db_compiled", path=path, bytes=len(data))
+    if _write_cache(cache_path, data):
+        db = _open_cache(cache_path, st.st_mtime_ns, st.st_size)
+        if db is not None:
+            db.from_cache = False
+            return db
+    return VSLParamDB(data, None, from_cache=False)
+
+
+_param_db: Optional[VSLParamDB] = None
+
+
+def get_param_db() -> VSLParamDB:
+    """Base de datos por defecto (vsl_params.json), cargada en el primer uso."""
+    global _param_db
+    if _param_db is None:
+        _param_db = load_param_db()
+    return _param_db
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    import time
+
+    from vsl_config import AUDIOBOX_MODELS, GAIN_CH1, FREQ_HPF_CH1
+
+    print("=== Tests de vsl_param_db.py ===\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = os.path.join(tmp, "vsl_params.json")
+        shutil.copy(DEFAULT_DB_PATH, source_path)
+        cache_path = default_cache_path(source_path)
+
+        # Test 1: Primera carga compila; tablas coinciden con vsl_config
+        print("Test 1: Compilación y tablas por modelo")
+        t0 = time.perf_counter()
+        db = load_param_db(source_path)
+        compile_ms = (time.perf_counter() - t0) * 1e3
+        print(f"  {len(db)} parámetros, {len(db.models)} modelos, "
+              f"{os.path.getsize(cache_path)} bytes ({compile_ms:.2f} ms)")
+        assert not db.from_cache and os.path.exists(cache_path), "❌ Cache no escrito"
+        assert {m.pid for m in db.models} == {m.pid for m in AUDIOBOX_MODELS}, "❌ Modelos"
+        for model in AUDIOBOX_MODELS:
+            assert db.lookup(model.pid, "GAIN_CH1").param == GAIN_CH1, "❌ GAIN_CH1 difiere"
+            assert db.lookup(model.pid, "HPF_FREQ_CH1").param == FREQ_HPF_CH1, "❌ HPF difiere"
+        strip = db.channel_params(0x0103, "gain")
+        assert [s.channel for s in strip] == list(range(1, 19)), "❌ Canales del 1818"
+        assert db.find_id(0x0101, 0x2B06).name == "HPF_FREQ_CH2", "❌ find_id"
+        assert db.find_id(0x0101, 0x1A03) is None, "❌ El 22 VSL no tiene canal 3"
+        db.close()
+        print("  ✅ 22/44/1818 VSL con GAIN/HPF por canal\n")
+
+        # Test 2: Segunda carga desde el cache mapeado
+        print("Test 2: Carga desde el cache")
+        samples = []
+        for _ in range(20):
+            t0 = time.perf_counter()
+            db = load_param_db(source_path)
+            samples.append((time.perf_counter() - t0) * 1e6)
+            assert db.from_cache, "❌ No usó el cache"
+            db.close()
+        print(f"  Carga: {min(samples):.0f} µs (mín de 20)")
+        print("  ✅ Sin volver a leer el JSON\n")
+
+        # Test 3: Modificar la fuente invalida el cache
+        print("Test 3: Invalidación al cambiar la fuente")
+        with open(source_path, encoding="utf-8") as f:
+            doc = json.load(f)
+        doc["curves"]["hpf"]["freq_min_hz"] = 30.0
+        with open(source_path, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2)
+        db = load_param_db(source_path)
+        hpf = db.lookup(0x0101, "HPF_FREQ_CH1")
+        assert not db.from_cache and hpf.param.freq_min_hz == 30.0, "❌ Cache obsoleto"
+        db.close()
+        print(f"  freq_min_hz → {hpf.param.freq_min_hz}")
+        print("  ✅ Recompilado\n")
+
+        # Test 4: Cache corrupto y fuente inválida
+        print("Test 4: Errores")
+        with open(cache_path, "r+b") as f:
+            f.write(b"basura!!")
+        db = load_param_db(source_path)
+        assert not db.from_cache, "❌ Aceptó un cache corrupto"
+        db.close()
+        doc["models"][0]["parameters"][1]["id"] = doc["models"][0]["parameters"][0]["id"]
+        try:
+            compile_param_db(doc)
+            raise AssertionError("❌ Aceptó un param_id repetido")
+        except ValueError as e:
+            print(f"  ValueError: {e}")
+        print("  ✅ Cache corrupto recompilado, fuente inválida rechazada\n")
+
+        # Test 5: Vista NumPy como coeficientes del codec batch
+        if NUMPY_AVAILABLE:
+            import numpy as np
+            from vsl_core import vsl_encode_user_value, vsl_encode_user_values_batch
+            print("Test 5: Vista NumPy de los registros")
+            db = load_param_db(source_path)
+            rec = db.records(0x0103)
+            coeffs = np.stack([rec[f].astype(np.float64) for f in _CURVE_FIELDS])
+            specs = db.table(0x0103)
+            values = [1000.0 if s.kind == KIND_FREQUENCY else 0.7 for s in specs]
+            batch = vsl_encode_user_values_batch(values, None, coeffs)
+            scalar = [vsl_encode_user_value(v, s.param) for v, s in zip(values, specs)]
+            print(f"  1818 VSL: {len(rec)} registros, HPF 1000 Hz → {batch[-1]}")
+            assert len(rec) == 36 and batch.tolist() == scalar, "❌ Vista y codec difieren"
+            del rec, coeffs
+            db.close()
+            print("  ✅ Sin copia, las columnas alimentan el codec batch")
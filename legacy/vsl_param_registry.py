@@ -0,0 +1,368 @@
+"""
+VSL-DSP Parameter Registry Module
+Tabla de despacho indexada por param_id (un slot por cada ID de 16 bits).
+
+Cada slot guarda el nombre, el tipo de decodificador y el VSLParameter
+(de vsl_config) del parámetro registrado en ese ID. La decodificación
+escalar es un acceso por índice a la tabla y una llamada a la función del
+tipo, sin búsquedas en diccionarios ni comparaciones de cadenas; la
+decodificación por lotes reúne (gather) los coeficientes de los IDs
+pedidos desde arrays de 65536 columnas y aplica las variantes vectorizadas
+de vsl_core.
+
+El analizador de tráfico y el codificador usan el mismo registro (ver
+get_param_registry), cargado desde la base de datos de parámetros.
+"""
+
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+from vsl_config import VSLParameter
+from vsl_core import (
+    NUMPY_AVAILABLE,
+    vsl_encode_gain,
+    vsl_decode_gain,
+    vsl_map_frequency,
+    vsl_decode_frequency,
+    vsl_final_encode_to_int,
+    vsl_int_to_encoded_float,
+    vsl_encode_user_values_batch,
+    vsl_decode_user_values_batch,
+)
+from vsl_param_db import KIND_GAIN, KIND_FREQUENCY, KIND_LINEAR, VSLParamDB
+
+PARAM_SLOTS = 0x10000
+KIND_UNREGISTERED = 0xFF
+
+UNKNOWN_UNIT = "DESCONOCIDO"
+KIND_UNITS = {KIND_GAIN: "Norm", KIND_FREQUENCY: "Hz", KIND_LINEAR: "Norm"}
+
+
+class VSLRegistryEntry(NamedTuple):
+    name: str
+    kind: int                 # KIND_GAIN / KIND_FREQUENCY / KIND_LINEAR
+    unit: str
+    param: VSLParameter
+
+
+# ============================================================================
+# DECODIFICADORES / CODIFICADORES ESCALARES POR TIPO
+# ============================================================================
+
+def _decode_gain_int(encoded_int: int, param: VSLParameter) -> float:
+    return vsl_decode_gain(vsl_int_to_encoded_float(encoded_int, param), param)
+
+
+def _decode_frequency_int(encoded_int: int, param: VSLParameter) -> float:
+    if param.max_encoded_int == 0:
+        return param.freq_min_hz
+    position = max(0, min(encoded_int, param.max_encoded_int)) / param.max_encoded_int
+    return vsl_map_frequency(position, param)
+
+
+def _decode_linear_int(encoded_int: int, param: VSLParameter) -> float:
+    if param.max_encoded_int == 0:
+        return 0.0
+    return max(0, min(encoded_int, param.max_encoded_int)) / param.max_encoded_int
+
+
+def _encode_gain_value(user_value: float, param: VSLParameter) -> int:
+    return vsl_final_encode_to_int(vsl_encode_gain(user_value, param), param)
+
+
+def _encode_frequency_value(user_value: float, param: VSLParameter) -> int:
+    return int(round(vsl_decode_frequency(user_value, param) * param.max_encoded_int))
+
+
+def _encode_linear_value(user_value: float, param: VSLParameter) -> int:
+    return int(round(max(0.0, min(user_value, 1.0)) * param.max_encoded_int))
+
+
+_DECODERS = {KIND_GAIN: _decode_gain_int, KIND_FREQUENCY: _decode_frequency_int,
+             KIND_LINEAR: _decode_linear_int}
+_ENCODERS = {KIND_GAIN: _encode_gain_value, KIND_FREQUENCY: _encode_frequency_value,
+             KIND_LINEAR: _encode_linear_value}
+
+
+# ============================================================================
+# REGISTRO
+# ============================================================================
+
+class VSLParamRegistry:
+    """
+    65536 slots indexados por param_id.
+
+    Las tablas NumPy (tipo y coeficientes por columna) se construyen en el
+    primer uso por lotes y se mantienen al registrar nuevos parámetros.
+    """
+
+    def __init__(self):
+        self._entries: List[Optional[VSLRegistryEntry]] = [None] * PARAM_SLOTS
+        self._decoders: List[Optional[Callable[[int, VSLParameter], float]]] = [None] * PARAM_SLOTS
+        self._kinds = None            # np.uint8[PARAM_SLOTS]
+        self._coeffs = None           # np.float64[8, PARAM_SLOTS] (ver vsl_param_arrays)
+        self.count = 0
+
+    def register(self, param: VSLParameter, name: str, kind: Optional[int] = None,
+                 replace: bool = False):
+        """
+        Asigna el slot param.dsp_param_id.
+
+        Args:
+            kind: Tipo de decodificador (None = por el rango de frecuencia)
+            replace: Sustituir un parámetro distinto ya registrado en el slot
+
+        Raises:
+            ValueError: Si el ID no es de 16 bits, el tipo no existe o el
+                slot ya tiene otro parámetro (sin replace)
+        """
+        param_id = param.dsp_param_id
+        if not 0 <= param_id < PARAM_SLOTS:
+            raise ValueError(f"param_id fuera de rango: {param_id}")
+        if kind is None:
+            kind = KIND_FREQUENCY if param.freq_max_hz > 0.0 else KIND_GAIN
+        if kind not in _DECODERS:
+            raise ValueError(f"Tipo de decodificador desconocido: {kind}")
+
+        entry = VSLRegistryEntry(name, kind, KIND_UNITS[kind], param)
+        current = self._entries[param_id]
+        if current is not None and current != entry and not replace:
+            raise ValueError(f"0x{param_id:04X} ya registrado como {current.name}")
+        if current is None:
+            self.count += 1
+        self._entries[param_id] = entry
+        self._decoders[param_id] = _DECODERS[kind]
+        if self._kinds is not None:
+            self._kinds[param_id] = kind
+            self._coeffs[:, param_id] = param[1:]
+
+    def register_db(self, db: VSLParamDB, pid: Optional[int] = None):
+        """Registra las tablas de todos los modelos (o solo la de `pid`)."""
+        pids = [pid] if pid is not None else [model.pid for model in db.models]
+        for model_pid in pids:
+            for spec in db.table(model_pid):
+                self.register(spec.param, spec.name, spec.kind)
+
+    # ------------------------------------------------------------------
+    # Escalar
+    # ------------------------------------------------------------------
+
+    def get(self, param_id: int) -> Optional[VSLRegistryEntry]:
+        return self._entries[param_id]
+
+    def entries(self) -> Iterator[Tuple[int, VSLRegistryEntry]]:
+        """(param_id, entrada) de cada slot ocupado, en orden de param_id."""
+        return ((param_id, entry) for param_id, entry in enumerate(self._entries)
+                if entry is not None)
+
+    def name(self, param_id: int) -> Optional[str]:
+        entry = self._entries[param_id]
+        return entry.name if entry is not None else None
+
+    def decode(self, param_id: int, encoded_int: int) -> Tuple[float, str]:
+        """
+        Returns:
+            (valor de usuario, unidad); (0.0, UNKNOWN_UNIT) si no está registrado
+        """
+        decoder = self._decoders[param_id]
+        if decoder is None:
+            return 0.0, UNKNOWN_UNIT
+        entry = self._entries[param_id]
+        return decoder(encoded_int, entry.param), entry.unit
+
+    def encode(self, param_id: int, user_value: float) -> int:
+        """
+        Raises:
+            KeyError: Si el param_id no está registrado
+        """
+        entry = self._entries[param_id]
+        if entry is None:
+            raise KeyError(f"Parámetro no registrado: 0x{param_id:04X}")
+        return _ENCODERS[entry.kind](user_value, entry.param)
+
+    # ------------------------------------------------------------------
+    # Por lotes (NumPy)
+    # ------------------------------------------------------------------
+
+    def _tables(self):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy no está disponible. Instalar con: pip install numpy")
+        import numpy as np
+        if self._kinds is None:
+            kinds = np.full(PARAM_SLOTS, KIND_UNREGISTERED, dtype=np.uint8)
+            coeffs = np.zeros((8, PARAM_SLOTS), dtype=np.float64)
+            for param_id, entry in enumerate(self._entries):
+                if entry is not None:
+                    kinds[param_id] = entry.kind
+                    coeffs[:, param_id] = entry.param[1:]
+            self._kinds, self._coeffs = kinds, coeffs
+        return np, self._kinds, self._coeffs
+
+    def _gather(self, param_ids, values, what: str):
+        np, kinds, coeffs = self._tables()
+        ids = np.asarray(param_ids)
+        values = np.asarray(values, dtype=np.float64)
+        if ids.ndim != 1 or values.shape != ids.shape:
+            raise ValueError(f"param_ids y {what} deben ser vectores de la misma longitud")
+        if ids.size and (ids.min() < 0 or ids.max() >= PARAM_SLOTS):
+            raise ValueError("param_id fuera de rango (16 bits)")
+        ids = ids.astype(np.intp, copy=False)
+        return np, ids, values, kinds[ids], coeffs
+
+    def columns(self, param_ids) -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        Tipos y coeficientes de varios IDs (gather sobre las tablas).
+
+        Returns:
+            (tipos uint8, coeficientes float64 de forma (8, n) en el orden
+            de vsl_param_arrays); el tipo es KIND_UNREGISTERED en IDs sin slot
+        """
+        np, kinds, coeffs = self._tables()
+        ids = np.asarray(param_ids, dtype=np.intp).reshape(-1)
+        if ids.size and (ids.min() < 0 or ids.max() >= PARAM_SLOTS):
+            raise ValueError("param_id fuera de rango (16 bits)")
+        return kinds[ids], coeffs[:, ids]
+
+    def decode_batch(self, param_ids, encoded_ints) -> "np.ndarray":
+        """
+        Versión vectorizada de decode para IDs mixtos.
+
+        Returns:
+            Array float64 con el valor de usuario (NaN para IDs no registrados)
+
+        Raises:
+            RuntimeError: Si numpy no está disponible
+        """
+        np, ids, ints, kinds, coeffs = self._gather(param_ids, encoded_ints, "encoded_ints")
+        out = np.full(len(ids), np.nan)
+
+        curve = (kinds == KIND_GAIN) | (kinds == KIND_FREQUENCY)
+        if curve.any():
+            out[curve] = vsl_decode_user_values_batch(ints[curve], None,
+                                                      coeffs[:, ids[curve]])
+        linear = kinds == KIND_LINEAR
+        if linear.any():
+            max_int = coeffs[0, ids[linear]]
+            safe_max = np.where(max_int == 0, 1.0, max_int)
+            out[linear] = np.where(max_int == 0, 0.0,
+                                   np.clip(ints[linear], 0, max_int) / safe_max)
+        return out
+
+    def encode_batch(self, param_ids, user_values) -> "np.ndarray":
+        """
+        Versión vectorizada de encode para IDs mixtos.
+
+        Returns:
+            Array int64 con el entero codificado de cada valor
+
+        Raises:
+            KeyError: Si algún param_id no está registrado
+            RuntimeError: Si numpy no está disponible
+        """
+        np, ids, values, kinds, coeffs = self._gather(param_ids, user_values, "user_values")
+        unregistered = kinds == KIND_UNREGISTERED
+        if unregistered.any():
+            raise KeyError(f"Parámetro no registrado: 0x{int(ids[unregistered][0]):04X}")
+        out = np.empty(len(ids), dtype=np.int64)
+
+        curve = kinds != KIND_LINEAR
+        if curve.any():
+            out[curve] = vsl_encode_user_values_batch(values[curve], None,
+                                                      coeffs[:, ids[curve]])
+        linear = ~curve
+        if linear.any():
+            max_int = coeffs[0, ids[linear]]
+            out[linear] = np.rint(np.clip(values[linear], 0.0, 1.0) * max_int).astype(np.int64)
+        return out
+
+
+# ============================================================================
+# REGISTRO POR DEFECTO
+# ============================================================================
+
+_registry: Optional[VSLParamRegistry] = None
+
+
+def get_param_registry() -> VSLParamRegistry:
+    """Registro compartido, con las tablas de todos los modelos de vsl_params.json."""
+    global _registry
+    if _registry is None:
+        from vsl_param_db import get_param_db
+        registry = VSLParamRegistry()
+        registry.register_db(get_param_db())
+        _registry = registry
+    return _registry
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    from vsl_config import GAIN_CH1, FREQ_HPF_CH1
+    from vsl_core import vsl_decode_user_value, vsl_encode_user_value
+
+    print("=== Tests de vsl_param_registry.py ===\n")
+
+    registry = get_param_registry()
+
+    # Test 1: Slots del registro por defecto
+    print("Test 1: Registro por defecto")
+    print(f"  {registry.count} param_id registrados de {PARAM_SLOTS}")
+    assert registry.get(0x1A01).param == GAIN_CH1, "❌ GAIN_CH1"
+    assert registry.get(0x2B05).param == FREQ_HPF_CH1, "❌ HPF_FREQ_CH1"
+    assert registry.name(0x1A12) == "GAIN_CH18", "❌ Canal 18 del 1818 VSL"
+    assert registry.decode(0x0000, 1234) == (0.0, UNKNOWN_UNIT), "❌ ID desconocido"
+    print("  ✅ IDs de los tres modelos, desconocidos sin slot\n")
+
+    # Test 2: Mismo resultado que vsl_core
+    print("Test 2: Escalar vs vsl_core")
+    for value in (0, 1, 40793, 65535):
+        assert registry.decode(0x1A01, value)[0] == vsl_decode_user_value(value, GAIN_CH1)
+        assert registry.decode(0x2B05, value)[0] == vsl_decode_user_value(value, FREQ_HPF_CH1)
+    for user in (0.0, 0.25, 0.75, 1.0):
+        assert registry.encode(0x1A01, user) == vsl_encode_user_value(user, GAIN_CH1)
+    assert registry.encode(0x2B05, 1000.0) == vsl_encode_user_value(1000.0, FREQ_HPF_CH1)
+    try:
+        registry.register(GAIN_CH1._replace(coeff_C1=10.0), "OTRO")
+        raise AssertionError("❌ Aceptó un parámetro distinto en un slot ocupado")
+    except ValueError as e:
+        print(f"  ValueError: {e}")
+    print("  ✅ Decodificación idéntica, slots protegidos\n")
+
+    # Test 3: Tipo lineal
+    print("Test 3: Tipo lineal")
+    local = VSLParamRegistry()
+    pan = VSLParameter(0x3C01, 65535, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+    local.register(pan, "PAN_CH1", KIND_LINEAR)
+    assert local.encode(0x3C01, 0.5) == 32768 and local.decode(0x3C01, 65535) == (1.0, "Norm")
+    print("  ✅ 0.5 → 32768, 65535 → 1.0\n")
+
+    if NUMPY_AVAILABLE:
+        import numpy as np
+
+        # Test 4: Lotes (gather) vs escalar
+        print("Test 4: decode_batch / encode_batch")
+        rng = random.Random(48)
+        known = [i for i in range(PARAM_SLOTS) if registry.get(i) is not None]
+        ids = [rng.choice(known + [0x0000, 0x7777]) for _ in range(100_000)]
+        ints = [rng.randrange(65536) for _ in ids]
+
+        t0 = time.perf_counter()
+        scalar = [registry.decode(i, v)[0] for i, v in zip(ids, ints)]
+        t_scalar = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        batch = registry.decode_batch(np.array(ids), np.array(ints))
+        t_batch = time.perf_counter() - t0
+
+        unknown = np.isnan(batch)
+        expected = np.array(scalar)
+        assert np.all(expected[unknown] == 0.0), "❌ Desconocidos"
+        assert np.allclose(batch[~unknown], expected[~unknown], rtol=1e-12), "❌ Lote ≠ escalar"
+
+        known_ids = np.array([i for i in ids if registry.get(i) is not None])
+        users = registry.decode_batch(known_ids, np.full(len(known_ids), 40793))
+        encoded = registry.encode_batch(known_ids, users)
+        assert np.all(np.abs(encoded - 40793) <= 1), "❌ Ida y vuelta por lotes"
+
+        print(f"  Escalar: {len(ids) / t_scalar:,.0f} paquetes/s")
+        print(f"  Lote:    {len(ids) / t_batch:,.0f} paquetes/s")
+        print("  ✅ Gather idéntico al camino escalar")
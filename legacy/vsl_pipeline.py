@@ -0,0 +1,469 @@
+"""
+VSL-DSP Pipeline Module
+Escrituras en pipeline con ventana de paquetes en vuelo.
+
+En modo síncrono cada escritura de parámetro cuesta un round trip
+completo. El pipeline mantiene hasta `window` reportes en vuelo y los
+empareja con el reporte de entrada que devuelve el dispositivo mediante
+la clave de correlación (report_id, param_id) del eco y su valor. Las
+escrituras sin confirmación se retransmiten tras un timeout.
+
+Con un VSLMetrics cada escritura HID (incluidas las retransmisiones)
+cuenta como enviada o fallida con sus bytes y latencia, y se cuentan
+aparte las retransmisiones y las escrituras que agotan los reintentos.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from vsl_config import VSL_PACKET_SIZE
+from vsl_log import get_event_log
+from vsl_metrics import VSLMetrics, Labels, RETRANSMITS, ACK_TIMEOUTS
+from vsl_transport import VSLPacket, parse_vsl_report
+
+
+DEFAULT_WINDOW = 8
+DEFAULT_ACK_TIMEOUT_S = 0.05
+DEFAULT_MAX_RETRIES = 3
+READ_POLL_MS = 5
+
+# Errores de lectura seguidos: espera creciente entre reintentos y, al
+# llegar a MAX_READ_ERRORS, el handle se da por perdido
+READ_ERROR_BACKOFF_S = 0.01
+READ_ERROR_BACKOFF_MAX_S = 0.1
+MAX_READ_ERRORS = 8
+
+# Clave de correlación de una escritura: (report_id, param_id)
+CorrelationKey = Tuple[int, int]
+
+
+class _InFlight:
+    """Escritura pendiente de confirmación."""
+    __slots__ = ("packet", "first_sent", "deadline", "retries")
+
+    def __init__(self, packet: VSLPacket, now: float, timeout_s: float):
+        self.packet = packet
+        self.first_sent = now
+        self.deadline = now + timeout_s
+        self.retries = 0
+
+
+class VSLPipeline:
+    """
+    Ventana de escrituras en vuelo con emparejamiento de confirmaciones.
+
+    submit() bloquea mientras la ventana está llena (backpressure) o
+    mientras ya hay en vuelo una escritura con la misma clave; así cada
+    eco identifica sin ambigüedad a su escritura. Un hilo lector consume
+    los reportes de entrada, completa las escrituras confirmadas y
+    retransmite las que vencen, hasta max_retries veces.
+
+    Tras MAX_READ_ERRORS lecturas fallidas seguidas (handle desenchufado)
+    el lector termina: las escrituras en vuelo y las siguientes fallan.
+    """
+
+    def __init__(self, handle: Any,
+                 window: int = DEFAULT_WINDOW,
+                 ack_timeout_s: float = DEFAULT_ACK_TIMEOUT_S,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 on_report: Optional[Callable[[List[int]], None]] = None,
+                 metrics: Optional[VSLMetrics] = None,
+                 metrics_labels: Labels = ()):
+        """
+        Args:
+            handle: Handle abierto con la interfaz de hidapi (write/read)
+            window: Número máximo de escrituras en vuelo
+            ack_timeout_s: Espera de confirmación antes de retransmitir
+            max_retries: Retransmisiones antes de dar la escritura por fallida
+            on_report: Callback opcional invocado con cada reporte leído
+            metrics: Registro de métricas (None = sin medir)
+            metrics_labels: Etiquetas extra de estas series (p.ej. la unidad)
+
+        Raises:
+            ValueError: Si window o ack_timeout_s no son positivos
+        """
+        if window < 1:
+            raise ValueError("window debe ser >= 1")
+        if ack_timeout_s <= 0.0:
+            raise ValueError("ack_timeout_s debe ser > 0")
+
+        self._handle = handle
+        self._window = window
+        self._ack_timeout_s = ack_timeout_s
+        self._max_retries = max_retries
+        self._on_report = on_report
+        self._metrics = metrics
+        self._metrics_labels = metrics_labels
+
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._in_flight: Dict[CorrelationKey, _InFlight] = {}
+        self._rtts: Deque[float] = deque(maxlen=4096)
+
+        self._acked = 0
+        self._retransmits = 0
+        self._failed = 0
+        self._unmatched = 0
+        self._read_errors = 0
+        self._disconnected = False
+
+        self._running = False
+        self._reader: Optional[threading.Thread] = None
+
+    @property
+    def window(self) -> int:
+        return self._window
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Arranca el hilo lector de confirmaciones (idempotente)."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._reader = threading.Thread(
+            target=self._reader_loop, name="vsl-pipeline-reader", daemon=True
+        )
+        self._reader.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Espera las confirmaciones pendientes y detiene el lector."""
+        self.flush(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._reader is not None:
+            self._reader.join(timeout)
+            self._reader = None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que no quede ninguna escritura en vuelo.
+
+        Returns:
+            True si la ventana se vació antes del timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._in_flight, timeout)
+
+    # ------------------------------------------------------------------
+    # API de envío
+    # ------------------------------------------------------------------
+
+    def submit(self, packet: VSLPacket, timeout: Optional[float] = None) -> bool:
+        """
+        Envía un paquete en cuanto la ventana lo permite.
+
+        Args:
+            packet: VSLPacket a enviar
+            timeout: Espera máxima por hueco en la ventana (None = sin límite)
+
+        Returns:
+            True si el paquete fue escrito, False si venció el timeout o
+            la escritura HID falló
+        """
+        key = (packet.report_id, packet.param_id)
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self._disconnected or (len(self._in_flight) < self._window
+                                               and key not in self._in_flight),
+                timeout
+            )
+            if not ready:
+                return False
+            if self._disconnected:
+                # Sin lector nadie confirmaría la escritura
+                self._failed += 1
+                return False
+            self._in_flight[key] = _InFlight(packet, time.monotonic(),
+                                             self._ack_timeout_s)
+
+        if self._write(packet):
+            return True
+
+        with self._cond:
+            self._in_flight.pop(key, None)
+            self._failed += 1
+            self._cond.notify_all()
+        return False
+
+    def _write(self, packet: VSLPacket) -> bool:
+        metrics = self._metrics
+        with self._write_lock:
+            if metrics is None:
+                try:
+                    return self._handle.write(packet.buffer) >= 0
+                except Exception:
+                    return False
+            t_write = time.perf_counter()
+            try:
+                written = self._handle.write(packet.buffer)
+            except Exception:
+                written = -1
+            latency = time.perf_counter() - t_write
+        if written >= 0:
+            metrics.record_write(packet.param_id, written, latency, self._metrics_labels)
+            return True
+        metrics.record_failure(packet.param_id, self._metrics_labels)
+        return False
+
+    # ------------------------------------------------------------------
+    # Hilo lector
+    # ------------------------------------------------------------------
+
+    def _reader_loop(self):
+        errors = 0
+        while self._running:
+            try:
+                data = self._handle.read(VSL_PACKET_SIZE, READ_POLL_MS)
+                errors = 0
+            except Exception as e:
+                data = []
+                errors += 1
+                with self._cond:
+                    self._read_errors += 1
+                if errors >= MAX_READ_ERRORS:
+                    self._disconnect(e)
+                    return
+                # Sin espera, un handle desenchufado haría girar el hilo al 100%
+                time.sleep(min(READ_ERROR_BACKOFF_S * (1 << (errors - 1)),
+                               READ_ERROR_BACKOFF_MAX_S))
+
+            if data:
+                self._handle_report(data)
+            self._check_timeouts()
+
+    def _disconnect(self, error: Exception):
+        """Da el handle por perdido: falla todo lo que esperaba confirmación."""
+        with self._cond:
+            self._running = False
+            self._disconnected = True
+            lost = len(self._in_flight)
+            self._failed += lost
+            self._in_flight.clear()
+            self._cond.notify_all()
+        if lost and self._metrics is not None:
+            self._metrics.inc(ACK_TIMEOUTS, lost, self._metrics_labels)
+        get_event_log().warning("pipeline_reader_disconnected",
+                                "El handle no responde, pipeline detenido",
+                                in_flight=lost, error=str(error))
+
+    def _handle_report(self, data: List[int]):
+        fields = parse_vsl_report(data)
+        if fields is not None:
+            report_id, param_id, value = fields
+            key = (report_id, param_id)
+            now = time.monotonic()
+            with self._cond:
+                entry = self._in_flight.get(key)
+                # El eco duplicado de una escritura anterior ya confirmada
+                # (retransmitida) trae otro valor: no confirma la actual
+                if entry is not None and entry.packet.encoded_value == value:
+                    del self._in_flight[key]
+                    self._acked += 1
+                    self._rtts.append(now - entry.first_sent)
+                    self._cond.notify_all()
+                else:
+                    self._unmatched += 1
+
+        if self._on_report is not None:
+            self._on_report(data)
+
+    def _check_timeouts(self):
+        now = time.monotonic()
+        retransmit: List[Tuple[CorrelationKey, _InFlight]] = []
+        timed_out = 0
+        with self._cond:
+            for key, entry in list(self._in_flight.items()):
+                if entry.deadline > now:
+                    continue
+                if entry.retries >= self._max_retries:
+                    del self._in_flight[key]
+                    self._failed += 1
+                    timed_out += 1
+                    self._cond.notify_all()
+                    continue
+                entry.retries += 1
+                entry.deadline = now + self._ack_timeout_s
+                self._retransmits += 1
+                retransmit.append((key, entry))
+
+        if self._metrics is not None:
+            if timed_out:
+                self._metrics.inc(ACK_TIMEOUTS, timed_out, self._metrics_labels)
+            if retransmit:
+                self._metrics.inc(RETRANSMITS, len(retransmit), self._metrics_labels)
+
+        for key, entry in retransmit:
+            if self._write(entry.packet):
+                continue
+            # Una retransmisión que no se pudo escribir falla ya, sin esperar al timeout
+            with self._cond:
+                if self._in_flight.get(key) is entry:
+                    del self._in_flight[key]
+                    self._failed += 1
+                    self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Estadísticas
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, float]:
+        """Snapshot de contadores y RTT (primer envío → confirmación)."""
+        with self._cond:
+            rtts = sorted(self._rtts)
+            stats = {
+                "window": self._window,
+                "in_flight": len(self._in_flight),
+                "acked": self._acked,
+                "retransmits": self._retransmits,
+                "failed": self._failed,
+                "unmatched": self._unmatched,
+                "read_errors": self._read_errors,
+                "disconnected": self._disconnected,
+                "rtt_p50_ms": 0.0,
+                "rtt_p99_ms": 0.0,
+            }
+        if rtts:
+            stats["rtt_p50_ms"] = rtts[len(rtts) // 2] * 1000.0
+            stats["rtt_p99_ms"] = rtts[min(len(rtts) - 1, int(len(rtts) * 0.99))] * 1000.0
+        return stats
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    from vsl_fake_device import FakeVSLHandle
+
+    print("=== Tests de vsl_pipeline.py ===\n")
+
+    LATENCY_S = 0.002
+    NUM_PACKETS = 400
+
+    # Test 1: Throughput frente al tamaño de ventana
+    print(f"Test 1: Throughput vs ventana (latencia simulada {LATENCY_S * 1000:.1f} ms)")
+    print(f"  {'Ventana':>8} {'pkt/s':>10} {'RTT p50 ms':>11} {'Fallidos':>9}")
+    results = {}
+    for window in (1, 2, 4, 8, 16, 32):
+        handle = FakeVSLHandle(latency_s=LATENCY_S)
+        with VSLPipeline(handle, window=window) as pipeline:
+            t0 = time.perf_counter()
+            for i in range(NUM_PACKETS):
+                # Se rotan 64 parámetros para no serializar por clave
+                pipeline.submit(VSLPacket(0x1A00 + (i % 64), i, report_id=0x01))
+            pipeline.flush()
+            elapsed = time.perf_counter() - t0
+            stats = pipeline.get_stats()
+        results[window] = NUM_PACKETS / elapsed
+        print(f"  {window:>8} {results[window]:>10.0f} "
+              f"{stats['rtt_p50_ms']:>11.2f} {stats['failed']:>9}")
+        assert stats["acked"] == NUM_PACKETS, "❌ Confirmaciones perdidas"
+
+    assert results[8] > 3 * results[1], "❌ El pipeline no mejora el throughput"
+    print("  ✅ El throughput escala con la ventana\n")
+
+    # Test 2: Retransmisión ante confirmaciones perdidas
+    print("Test 2: Retransmisión con 20% de confirmaciones perdidas")
+    handle = FakeVSLHandle(latency_s=LATENCY_S, drop_rate=0.2, seed=1234)
+    with VSLPipeline(handle, window=8, ack_timeout_s=0.01, max_retries=5) as pipeline:
+        for i in range(200):
+            pipeline.submit(VSLPacket(0x1A00 + (i % 32), i, report_id=0x01))
+        pipeline.flush()
+        stats = pipeline.get_stats()
+    print(f"  Confirmadas: {stats['acked']}  Retransmisiones: {stats['retransmits']}  "
+          f"Fallidas: {stats['failed']}")
+    assert stats["retransmits"] > 0, "❌ No hubo retransmisiones"
+    assert stats["acked"] + stats["failed"] == 200, "❌ Escrituras sin resolver"
+    print("  ✅ Retransmisión funcionando correctamente")
+
+    # Test 3: El eco duplicado de una retransmisión no confirma la siguiente escritura
+    print("\nTest 3: Eco tardío tras retransmitir (latencia 30 ms, timeout 20 ms)")
+    handle = FakeVSLHandle(latency_s=0.03)
+    with VSLPipeline(handle, window=8, ack_timeout_s=0.02, max_retries=5) as pipeline:
+        pipeline.submit(VSLPacket(0x1A01, 100, report_id=0x01))
+        # Bloquea hasta que el eco de 100 libera la clave
+        pipeline.submit(VSLPacket(0x1A01, 200, report_id=0x01))
+        t0 = time.monotonic()
+        pipeline.flush()
+        waited_ms = (time.monotonic() - t0) * 1000.0
+        stats = pipeline.get_stats()
+    print(f"  Confirmación de 200 tras {waited_ms:.1f} ms, "
+          f"ecos sin emparejar: {stats['unmatched']}")
+    assert waited_ms >= 25.0, "❌ 200 confirmado por el eco de 100"
+    assert stats["unmatched"] >= 1, "❌ El eco duplicado no se descartó"
+    print("  ✅ Ecos duplicados descartados")
+
+    # Test 4: Una retransmisión que falla cuenta como fallo inmediato
+    print("\nTest 4: Retransmisión con write() fallido")
+    handle = FakeVSLHandle(latency_s=0.0, drop_rate=1.0)
+    with VSLPipeline(handle, window=8, ack_timeout_s=0.01, max_retries=50) as pipeline:
+        pipeline.submit(VSLPacket(0x1A01, 1, report_id=0x01))
+        handle.fail_rate = 1.0
+        t0 = time.monotonic()
+        pipeline.flush(timeout=1.0)
+        elapsed_ms = (time.monotonic() - t0) * 1000.0
+        stats = pipeline.get_stats()
+    print(f"  Fallidas: {stats['failed']} en {elapsed_ms:.1f} ms")
+    assert stats["failed"] == 1 and elapsed_ms < 100.0, "❌ Esperó a agotar los reintentos"
+    print("  ✅ Fallo contado en la primera retransmisión")
+
+    # Test 5: Métricas del pipeline
+    print("\nTest 5: Métricas de envío, retransmisiones y timeouts")
+    from vsl_metrics import (PACKETS_SENT, PACKETS_FAILED, BYTES_WRITTEN,
+                             WRITE_LATENCY)
+    metrics = VSLMetrics()
+    handle = FakeVSLHandle(latency_s=LATENCY_S, drop_rate=1.0)
+    with VSLPipeline(handle, window=8, ack_timeout_s=0.01, max_retries=2,
+                     metrics=metrics) as pipeline:
+        for i in range(4):
+            pipeline.submit(VSLPacket(0x1A00 + i, i, report_id=0x01))
+        pipeline.flush()
+        handle.fail_rate = 1.0
+        pipeline.submit(VSLPacket(0x1A10, 1, report_id=0x01))
+        stats = pipeline.get_stats()
+    snapshot = metrics.snapshot()
+    writes = snapshot["histograms"][(WRITE_LATENCY, ())]["count"]
+    print(f"  Enviados: {metrics.total(PACKETS_SENT):.0f}  "
+          f"Fallidos: {metrics.total(PACKETS_FAILED):.0f}  "
+          f"Retransmisiones: {metrics.total(RETRANSMITS):.0f}  "
+          f"Timeouts: {metrics.total(ACK_TIMEOUTS):.0f}")
+    assert metrics.total(PACKETS_SENT) == 12, "❌ Escrituras sin contar"
+    assert metrics.total(BYTES_WRITTEN) == 12 * VSL_PACKET_SIZE, "❌ Bytes sin contar"
+    assert metrics.total(PACKETS_FAILED) == 1 and writes == 12, "❌ Fallo/latencia sin contar"
+    assert metrics.total(RETRANSMITS) == stats["retransmits"] == 8, "❌ Retransmisiones"
+    assert metrics.total(ACK_TIMEOUTS) == 4, "❌ Timeouts sin contar"
+    print("  ✅ Pipeline instrumentado")
+
+    # Test 6: Un handle desenchufado no hace girar al lector
+    print("\nTest 6: Lector sobre un handle cuyas lecturas siempre fallan")
+
+    class _UnpluggedHandle(FakeVSLHandle):
+        def read(self, max_length: int, timeout_ms: int = 0):
+            self.failed_reads = getattr(self, "failed_reads", 0) + 1
+            raise OSError("read error")
+
+    handle = _UnpluggedHandle(latency_s=0.0)
+    with VSLPipeline(handle, window=8, ack_timeout_s=1.0) as pipeline:
+        for i in range(3):
+            pipeline.submit(VSLPacket(0x1A00 + i, i, report_id=0x01))
+        t0 = time.monotonic()
+        flushed = pipeline.flush(timeout=2.0)
+        elapsed_ms = (time.monotonic() - t0) * 1000.0
+        late = pipeline.submit(VSLPacket(0x1A10, 1, report_id=0x01), timeout=0.1)
+        stats = pipeline.get_stats()
+    print(f"  Lecturas: {handle.failed_reads}  Fallidas: {stats['failed']}  "
+          f"Vaciado en {elapsed_ms:.0f} ms")
+    assert flushed and stats["disconnected"], "❌ Desconexión no detectada"
+    assert handle.failed_reads == MAX_READ_ERRORS, "❌ El lector giró sobre el handle caído"
+    assert not late and stats["failed"] == 4, "❌ Escrituras sin fallar tras la desconexión"
+    print("  ✅ Reintentos con espera y escrituras pendientes fallidas")
@@ -0,0 +1,430 @@
+"""
+VSL-DSP Ramp Module
+Planificador de rampas de parámetros a tasa de control fija.
+
+Un salto brusco de ganancia es audible. En lugar de que cada cliente
+simule rampas con muchas llamadas sueltas a send_packet, el planificador
+recibe (parámetro, objetivo, duración) y en cada tick de control evalúa
+todas las rampas activas de una vez con NumPy, codifica con la ruta
+batch de vsl_core y envía un único lote con los valores que cambiaron.
+
+Requiere NumPy.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from vsl_config import VSLParameter
+from vsl_core import (
+    is_frequency_parameter,
+    vsl_encode_user_values_batch,
+    vsl_param_arrays,
+)
+from vsl_state import VSLShadowState
+from vsl_transport import VSLPacket
+
+
+DEFAULT_CONTROL_RATE_HZ = 100.0
+JITTER_SAMPLES = 4096
+
+
+# ============================================================================
+# RELOJ DE CONTROL
+# ============================================================================
+
+class VSLControlClock:
+    """
+    Reloj de ticks periódicos sobre time.monotonic().
+
+    Los plazos se calculan como t0 + n * period (no como "ahora + period"),
+    así que el error de cada espera no se acumula. Si un tick llega tarde
+    más de un periodo completo, los ticks perdidos se saltan y se cuentan
+    como overruns en lugar de ejecutarse en ráfaga.
+    """
+
+    def __init__(self, rate_hz: float = DEFAULT_CONTROL_RATE_HZ):
+        if rate_hz <= 0.0:
+            raise ValueError("rate_hz debe ser > 0")
+        self.period = 1.0 / rate_hz
+        self._t0 = time.monotonic()
+        self._tick = 0
+        self._lateness: Deque[float] = deque(maxlen=JITTER_SAMPLES)
+        self.overruns = 0
+
+    def reset(self):
+        self._t0 = time.monotonic()
+        self._tick = 0
+        self._lateness.clear()
+        self.overruns = 0
+
+    def wait_next(self, stop: Optional[threading.Event] = None) -> Tuple[int, float]:
+        """
+        Duerme hasta el siguiente plazo.
+
+        Args:
+            stop: Evento que interrumpe la espera
+
+        Returns:
+            (índice del tick, plazo en time.monotonic())
+        """
+        self._tick += 1
+        deadline = self._t0 + self._tick * self.period
+        now = time.monotonic()
+
+        if now - deadline >= self.period:
+            missed = int((now - deadline) / self.period)
+            self._tick += missed
+            self.overruns += missed
+            deadline = self._t0 + self._tick * self.period
+
+        remaining = deadline - now
+        if remaining > 0.0:
+            if stop is not None:
+                stop.wait(remaining)
+            else:
+                time.sleep(remaining)
+
+        self._lateness.append(time.monotonic() - deadline)
+        return self._tick, deadline
+
+    def get_jitter_stats(self) -> Dict[str, float]:
+        """Retraso de despertar respecto al plazo (µs)."""
+        samples = sorted(self._lateness)
+        stats = {"ticks": self._tick, "overruns": self.overruns,
+                 "jitter_p50_us": 0.0, "jitter_p99_us": 0.0, "jitter_max_us": 0.0}
+        if samples:
+            n = len(samples)
+            stats["jitter_p50_us"] = samples[n // 2] * 1e6
+            stats["jitter_p99_us"] = samples[min(n - 1, int(n * 0.99))] * 1e6
+            stats["jitter_max_us"] = samples[-1] * 1e6
+        return stats
+
+
+# ============================================================================
+# PLANIFICADOR DE RAMPAS
+# ============================================================================
+
+class _RampRequest(NamedTuple):
+    param: VSLParameter
+    target: float
+    duration_s: float
+    start_value: Optional[float]
+
+
+class VSLRampScheduler:
+    """
+    Evalúa todas las rampas activas en cada tick y envía un lote coalescido.
+
+    Las ganancias se interpolan linealmente en su escala de usuario (0-1) y
+    las frecuencias geométricamente (lineal en octavas), que es como suena
+    un barrido. Solo se envían los parámetros cuyo entero codificado cambió
+    respecto al tick anterior.
+    """
+
+    def __init__(self, sender: Callable[[List[VSLPacket]], object],
+                 control_rate_hz: float = DEFAULT_CONTROL_RATE_HZ,
+                 state: Optional[VSLShadowState] = None,
+                 report_id: Optional[int] = None):
+        """
+        Args:
+            sender: Función que envía un lote de paquetes (ej: send_packets)
+            control_rate_hz: Frecuencia del tick de control
+            state: Estado espejo del que tomar el valor inicial de cada rampa
+            report_id: Report ID de los paquetes (None usa VSL_REPORT_ID)
+        """
+        self._sender = sender
+        self._state = state
+        self._report_id = report_id
+        self.clock = VSLControlClock(control_rate_hz)
+
+        self._lock = threading.Lock()
+        self._requests: List[_RampRequest] = []
+        self._cancelled: List[int] = []
+        self._merging = False
+
+        # Rampas activas como columnas (una fila por rampa)
+        self._params = np.empty(0, dtype=object)
+        self._param_ids = np.empty(0, dtype=np.int64)
+        self._start = np.empty(0, dtype=np.float64)
+        self._target = np.empty(0, dtype=np.float64)
+        self._t0 = np.empty(0, dtype=np.float64)
+        self._duration = np.empty(0, dtype=np.float64)
+        self._is_freq = np.empty(0, dtype=bool)
+        self._last_sent = np.empty(0, dtype=np.int64)
+        self._coeffs = np.empty((8, 0), dtype=np.float64)
+        self._current = np.empty(0, dtype=np.float64)
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._compute_s: Deque[Tuple[int, float]] = deque(maxlen=JITTER_SAMPLES)
+        self.packets_sent = 0
+        self.max_active = 0
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def ramp_to(self, param: VSLParameter, target: float, duration_s: float,
+                start_value: Optional[float] = None):
+        """
+        Programa una rampa hacia `target` (valor de usuario) en `duration_s`.
+
+        Si no se indica start_value, la rampa parte del valor en curso de una
+        rampa activa del mismo parámetro, o del estado espejo, o salta
+        directamente al objetivo si el valor actual es desconocido.
+        """
+        if duration_s < 0.0:
+            raise ValueError("duration_s debe ser >= 0")
+        with self._lock:
+            self._requests.append(_RampRequest(param, float(target),
+                                               float(duration_s), start_value))
+
+    def cancel(self, param_id: int):
+        """Detiene la rampa de un parámetro en su valor actual."""
+        with self._lock:
+            self._cancelled.append(param_id)
+
+    @property
+    def active_ramps(self) -> int:
+        return len(self._param_ids)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.clock.reset()
+        self._thread = threading.Thread(
+            target=self._tick_loop, name="vsl-ramp-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que todas las rampas terminen."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                pending = bool(self._requests) or self._merging
+            if not pending and not self.active_ramps:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.clock.period)
+
+    # ------------------------------------------------------------------
+    # Tick de control
+    # ------------------------------------------------------------------
+
+    def _merge_requests(self, now: float):
+        with self._lock:
+            requests, self._requests = self._requests, []
+            cancelled, self._cancelled = self._cancelled, []
+            self._merging = bool(requests)
+
+        if cancelled:
+            self._remove(np.isin(self._param_ids, cancelled))
+        if not requests:
+            return
+
+        # La última petición por parámetro gana
+        latest: Dict[int, _RampRequest] = {}
+        for request in requests:
+            latest[request.param.dsp_param_id] = request
+
+        ids = np.fromiter(latest.keys(), dtype=np.int64, count=len(latest))
+        replaced = np.isin(self._param_ids, ids)
+        in_flight = dict(zip(self._param_ids[replaced].tolist(),
+                             self._current[replaced].tolist()))
+        self._remove(replaced)
+
+        new_params = [r.param for r in latest.values()]
+        starts = []
+        for request in latest.values():
+            start = request.start_value
+            pid = request.param.dsp_param_id
+            if start is None:
+                start = in_flight.get(pid)
+            if start is None and self._state is not None:
+                start = self._state.get_value(pid)
+            if start is None:
+                start = request.target
+            starts.append(float(start))
+
+        n = len(new_params)
+        params_col = np.empty(n, dtype=object)
+        params_col[:] = new_params
+        self._params = np.concatenate([self._params, params_col])
+        self._param_ids = np.concatenate([self._param_ids, ids])
+        self._start = np.concatenate([self._start, starts])
+        self._target = np.concatenate([self._target, [r.target for r in latest.values()]])
+        self._t0 = np.concatenate([self._t0, np.full(n, now)])
+        self._duration = np.concatenate([self._duration,
+                                         [r.duration_s for r in latest.values()]])
+        self._is_freq = np.concatenate([self._is_freq,
+                                        [is_frequency_parameter(p) for p in new_params]])
+        self._last_sent = np.concatenate([self._last_sent, np.full(n, -1, dtype=np.int64)])
+        self._coeffs = np.concatenate([self._coeffs, vsl_param_arrays(new_params)], axis=1)
+        self._current = np.concatenate([self._current, starts])
+        self._merging = False
+
+    def _remove(self, mask: np.ndarray):
+        if not np.any(mask):
+            return
+        keep = ~mask
+        self._params = self._params[keep]
+        self._param_ids = self._param_ids[keep]
+        self._start = self._start[keep]
+        self._target = self._target[keep]
+        self._t0 = self._t0[keep]
+        self._duration = self._duration[keep]
+        self._is_freq = self._is_freq[keep]
+        self._last_sent = self._last_sent[keep]
+        self._coeffs = self._coeffs[:, keep]
+        self._current = self._current[keep]
+
+    def tick(self, now: Optional[float] = None) -> int:
+        """
+        Evalúa todas las rampas en el instante `now` y envía un lote.
+
+        Returns:
+            Número de paquetes enviados en este tick
+        """
+        t_compute = time.perf_counter()
+        if now is None:
+            now = time.monotonic()
+
+        self._merge_requests(now)
+        n_active = len(self._param_ids)
+        if n_active == 0:
+            return 0
+        self.max_active = max(self.max_active, n_active)
+
+        safe_duration = np.where(self._duration > 0.0, self._duration, 1.0)
+        progress = np.where(self._duration > 0.0,
+                            np.clip((now - self._t0) / safe_duration, 0.0, 1.0), 1.0)
+
+        linear = self._start + (self._target - self._start) * progress
+        geometric_ok = self._is_freq & (self._start > 0.0) & (self._target > 0.0)
+        ratio = np.where(geometric_ok, self._target / np.where(geometric_ok, self._start, 1.0), 1.0)
+        geometric = self._start * np.power(ratio, progress)
+        self._current = np.where(geometric_ok, geometric, linear)
+
+        encoded = vsl_encode_user_values_batch(self._current, self._params, self._coeffs)
+        changed = np.flatnonzero(encoded != self._last_sent)
+        self._last_sent = encoded
+
+        packets = [VSLPacket(int(pid), int(value), report_id=self._report_id)
+                   for pid, value in zip(self._param_ids[changed], encoded[changed])]
+
+        self._remove(progress >= 1.0)
+        self._compute_s.append((n_active, time.perf_counter() - t_compute))
+
+        if packets:
+            self._sender(packets)
+            self.packets_sent += len(packets)
+        return len(packets)
+
+    def _tick_loop(self):
+        while not self._stop.is_set():
+            _, deadline = self.clock.wait_next(self._stop)
+            if self._stop.is_set():
+                break
+            self.tick(deadline)
+
+    # ------------------------------------------------------------------
+    # Estadísticas
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Jitter del tick, coste de cálculo y capacidad estimada.
+
+        ramps_per_tick_capacity estima cuántas rampas caben en un periodo
+        de control a partir del coste medio por rampa medido.
+        """
+        stats = self.clock.get_jitter_stats()
+        samples = [(n, s) for n, s in self._compute_s if n > 0]
+        stats.update({"packets_sent": self.packets_sent,
+                      "max_active": self.max_active,
+                      "compute_mean_us": 0.0, "compute_max_us": 0.0,
+                      "ramps_per_tick_capacity": 0})
+        if samples:
+            per_ramp = sum(s / n for n, s in samples) / len(samples)
+            stats["compute_mean_us"] = sum(s for _, s in samples) / len(samples) * 1e6
+            stats["compute_max_us"] = max(s for _, s in samples) * 1e6
+            stats["ramps_per_tick_capacity"] = int(self.clock.period / per_ramp)
+        return stats
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    from vsl_config import GAIN_CH1, FREQ_HPF_CH1
+
+    print("=== Tests de vsl_ramp.py ===\n")
+
+    gains = [GAIN_CH1._replace(dsp_param_id=0x1A00 + i) for i in range(180)]
+    hpfs = [FREQ_HPF_CH1._replace(dsp_param_id=0x2B00 + i) for i in range(20)]
+
+    state = VSLShadowState(gains + hpfs)
+    batches: List[List[VSLPacket]] = []
+
+    def fake_sender(packets: List[VSLPacket]):
+        batches.append(packets)
+        for packet in packets:
+            state.update(packet.param_id, packet.encoded_value)
+
+    # Test 1: 200 rampas simultáneas a 100 Hz
+    print("Test 1: 200 rampas de 300 ms a 100 Hz")
+    with VSLRampScheduler(fake_sender, control_rate_hz=100.0, state=state,
+                          report_id=0x01) as scheduler:
+        for p in gains:
+            scheduler.ramp_to(p, 0.8, 0.3, start_value=0.1)
+        for p in hpfs:
+            scheduler.ramp_to(p, 400.0, 0.3, start_value=40.0)
+        assert scheduler.wait_idle(timeout=2.0), "❌ Las rampas no terminaron"
+        stats = scheduler.get_stats()
+
+    print(f"  Lotes enviados: {len(batches)}  Paquetes: {stats['packets_sent']}")
+    print(f"  Jitter p50/p99/max: {stats['jitter_p50_us']:.0f} / "
+          f"{stats['jitter_p99_us']:.0f} / {stats['jitter_max_us']:.0f} µs")
+    print(f"  Overruns: {stats['overruns']}")
+    print(f"  Cálculo por tick: {stats['compute_mean_us']:.0f} µs (media), "
+          f"{stats['compute_max_us']:.0f} µs (máx)")
+    print(f"  Capacidad estimada: {stats['ramps_per_tick_capacity']} rampas por tick")
+
+    assert all(abs(state.get_value(p.dsp_param_id) - 0.8) < 1e-3 for p in gains), \
+        "❌ Ganancias fuera de objetivo"
+    assert all(abs(state.get_value(p.dsp_param_id) - 400.0) < 0.5 for p in hpfs), \
+        "❌ Frecuencias fuera de objetivo"
+    assert max(len(b) for b in batches) <= len(gains) + len(hpfs), "❌ Lote duplicado"
+    print("  ✅ Todas las rampas alcanzaron su objetivo")
+
+    # Test 2: Una rampa nueva parte del valor en curso
+    print("\nTest 2: Reprogramar una rampa en curso")
+    scheduler = VSLRampScheduler(fake_sender, state=state, report_id=0x01)
+    t = 1000.0
+    scheduler.ramp_to(gains[0], 0.0, 1.0, start_value=1.0)
+    scheduler.tick(t)
+    scheduler.tick(t + 0.5)
+    scheduler.ramp_to(gains[0], 1.0, 1.0)
+    scheduler.tick(t + 0.5)
+    mid = state.get_value(gains[0].dsp_param_id)
+    print(f"  Valor al reprogramar: {mid:.3f}")
+    assert abs(mid - 0.5) < 0.01, "❌ La rampa saltó al reprogramar"
+    print("  ✅ Sin saltos al reprogramar")
@@ -0,0 +1,279 @@
+"""
+VSL-DSP Rate Control Module
+Control adaptativo de tasa (AIMD) para escrituras HID.
+
+El dispositivo no publica su capacidad: cuando se satura, las escrituras
+tardan más o fallan. El controlador mide la latencia y el resultado de
+cada escritura y ajusta la tasa permitida con una política AIMD
+(incremento aditivo, decremento multiplicativo), igual que el control de
+congestión de TCP, incluido un arranque lento exponencial hasta el primer
+episodio de congestión. Como el SRTT de TCP, la latencia se suaviza con
+una media móvil exponencial antes de compararla con el objetivo, para
+que el jitter del planificador no se tome por congestión. La tasa
+resultante se aplica con un token bucket.
+"""
+
+import threading
+import time
+from typing import Dict
+
+
+# ============================================================================
+# VALORES POR DEFECTO (Paquetes por segundo)
+# ============================================================================
+
+DEFAULT_INITIAL_RATE = 500.0      # Tasa de arranque conservadora
+DEFAULT_MIN_RATE = 20.0           # Nunca bajar de aquí (mute/urgentes)
+DEFAULT_MAX_RATE = 8000.0         # Límite superior (64 bytes @ USB full speed)
+DEFAULT_ADDITIVE_INCREASE = 500.0 # Paquetes/s ganados por segundo sin congestión
+DEFAULT_SLOW_START_GAIN = 5.0     # Paquetes/s ganados por escritura en arranque lento
+DEFAULT_DECREASE_FACTOR = 0.5     # Factor multiplicativo ante congestión
+DEFAULT_LATENCY_TARGET_S = 0.002  # Latencia de escritura considerada congestión
+DEFAULT_LATENCY_GAIN = 0.125      # Peso de cada muestra en la media (el 1/8 de TCP)
+LATENCY_SAMPLE_CAP = 4.0          # Una muestra aporta como mucho 4x el objetivo
+DEFAULT_HOLDOFF_S = 0.05          # Un solo decremento por episodio de congestión
+DEFAULT_BURST = 4.0               # Capacidad del token bucket
+
+
+# ============================================================================
+# CONTROLADOR AIMD
+# ============================================================================
+
+class VSLRateController:
+    """
+    Limitador de tasa adaptativo con política AIMD.
+
+    Uso desde el hilo escritor:
+        controller.acquire()              # Espera un token
+        ok = write(packet)
+        controller.record(ok, latency_s)  # Ajusta la tasa
+
+    Hasta la primera congestión (arranque lento) cada escritura exitosa
+    suma slow_start_gain, lo que hace crecer la tasa exponencialmente.
+    Después, cada escritura exitosa con latencia por debajo del objetivo
+    suma additive_increase / rate, es decir, unos additive_increase
+    paquetes/s por segundo de operación limpia. Un fallo o una latencia
+    media excesiva multiplica la tasa por decrease_factor, como mucho una
+    vez cada holdoff_s para no colapsar ante una ráfaga de errores.
+
+    La latencia media es una EWMA con peso latency_gain en la que cada
+    muestra se limita a LATENCY_SAMPLE_CAP veces el objetivo: una escritura
+    lenta aislada (el hilo perdió la CPU) no basta para cruzar el objetivo,
+    una latencia sostenida sí.
+    """
+
+    def __init__(self,
+                 initial_rate: float = DEFAULT_INITIAL_RATE,
+                 min_rate: float = DEFAULT_MIN_RATE,
+                 max_rate: float = DEFAULT_MAX_RATE,
+                 additive_increase: float = DEFAULT_ADDITIVE_INCREASE,
+                 slow_start_gain: float = DEFAULT_SLOW_START_GAIN,
+                 decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+                 latency_target_s: float = DEFAULT_LATENCY_TARGET_S,
+                 holdoff_s: float = DEFAULT_HOLDOFF_S,
+                 burst: float = DEFAULT_BURST,
+                 latency_gain: float = DEFAULT_LATENCY_GAIN):
+        """
+        Raises:
+            ValueError: Si los límites o factores son inconsistentes
+        """
+        if not (0.0 < min_rate <= initial_rate <= max_rate):
+            raise ValueError("Se requiere 0 < min_rate <= initial_rate <= max_rate")
+        if not (0.0 < decrease_factor < 1.0):
+            raise ValueError("decrease_factor debe estar en (0, 1)")
+        if burst < 1.0:
+            raise ValueError("burst debe ser >= 1")
+        if not (0.0 < latency_gain <= 1.0):
+            raise ValueError("latency_gain debe estar en (0, 1]")
+
+        self._rate = float(initial_rate)
+        self._min_rate = float(min_rate)
+        self._max_rate = float(max_rate)
+        self._additive_increase = float(additive_increase)
+        self._slow_start_gain = float(slow_start_gain)
+        self._slow_start = True
+        self._decrease_factor = float(decrease_factor)
+        self._latency_target_s = float(latency_target_s)
+        self._latency_gain = float(latency_gain)
+        self._latency_cap_s = LATENCY_SAMPLE_CAP * self._latency_target_s
+        self._latency_avg_s = 0.0
+        self._holdoff_s = float(holdoff_s)
+        self._burst = float(burst)
+
+        self._lock = threading.Lock()
+        self._tokens = self._burst
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+
+        self._successes = 0
+        self._failures = 0
+        self._slow_writes = 0
+        self._decreases = 0
+        self._throttled_s = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Tasa permitida actual en paquetes por segundo."""
+        return self._rate
+
+    def acquire(self) -> float:
+        """
+        Bloquea hasta que la tasa actual permita una escritura más.
+
+        Returns:
+            Segundos esperados por limitación de tasa
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst,
+                               self._tokens + (now - self._last_refill) * self._rate)
+            self._last_refill = now
+
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+
+            # Reservar el token: el saldo negativo se repone durante la espera
+            wait = (1.0 - self._tokens) / self._rate
+            self._tokens -= 1.0
+            self._throttled_s += wait
+
+        time.sleep(wait)
+        return wait
+
+    def record(self, ok: bool, latency_s: float):
+        """
+        Retroalimenta el resultado de una escritura.
+
+        Args:
+            ok: True si la escritura fue exitosa
+            latency_s: Duración de la escritura en segundos
+        """
+        with self._lock:
+            sample = min(latency_s, self._latency_cap_s)
+            self._latency_avg_s += self._latency_gain * (sample - self._latency_avg_s)
+            congested = (not ok) or self._latency_avg_s > self._latency_target_s
+
+            if ok:
+                self._successes += 1
+            else:
+                self._failures += 1
+
+            if not congested:
+                if self._slow_start:
+                    step = self._slow_start_gain
+                else:
+                    step = self._additive_increase / self._rate
+                self._rate = min(self._max_rate, self._rate + step)
+                return
+
+            self._slow_start = False
+
+            if ok:
+                self._slow_writes += 1
+
+            now = time.monotonic()
+            if now - self._last_decrease >= self._holdoff_s:
+                self._rate = max(self._min_rate, self._rate * self._decrease_factor)
+                self._last_decrease = now
+                self._decreases += 1
+                # Vaciar el bucket: la ráfaga acumulada ya no es válida
+                self._tokens = min(self._tokens, 0.0)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Snapshot de la tasa y los contadores del controlador."""
+        with self._lock:
+            return {
+                "rate": self._rate,
+                "successes": self._successes,
+                "failures": self._failures,
+                "slow_writes": self._slow_writes,
+                "decreases": self._decreases,
+                "slow_start": self._slow_start,
+                "throttled_s": self._throttled_s,
+                "latency_avg_ms": self._latency_avg_s * 1000.0,
+            }
+
+
+if __name__ == "__main__":
+    from vsl_send_queue import VSLSendQueue, VSLPriority
+    from vsl_transport import VSLPacket
+
+    print("=== Tests de vsl_rate_control.py ===\n")
+
+    class _SaturatingDevice:
+        """Dispositivo con buffer interno finito que drena a `capacity` pkt/s."""
+
+        def __init__(self, capacity: float, depth: int = 32):
+            self.capacity = capacity
+            self.depth = depth
+            self.fill = 0.0
+            self.last = time.perf_counter()
+            self.accepted = 0
+            self.rejected = 0
+
+        def write(self, packet: VSLPacket) -> bool:
+            now = time.perf_counter()
+            self.fill = max(0.0, self.fill - (now - self.last) * self.capacity)
+            self.last = now
+            if self.fill >= self.depth:
+                self.rejected += 1
+                time.sleep(0.001)  # Timeout de escritura HID
+                return False
+            self.fill += 1.0
+            self.accepted += 1
+            time.sleep(0.00003)
+            return True
+
+    DURATION_S = 2.0
+    CAPACITY = 1500.0
+
+    def run(controller, duration_s: float = DURATION_S):
+        device = _SaturatingDevice(capacity=CAPACITY)
+        queue = VSLSendQueue(device.write, rate_controller=controller,
+                             max_pending=256)
+        queue.start()
+        blocked = 0
+        deadline = time.perf_counter() + duration_s
+        i = 0
+        while time.perf_counter() < deadline:
+            if not queue.submit(VSLPacket(0x1A01, i & 0xFFFF, report_id=0x01),
+                                VSLPriority.BULK, block=False):
+                blocked += 1
+                queue.wait_for_space(timeout=0.01)
+            i += 1
+        queue.stop(drain=False)
+        return device, blocked
+
+    # Test 1: Sin control de tasa el dispositivo se satura
+    print("Test 1: Escrituras sin control de tasa")
+    device, _ = run(None)
+    print(f"  Aceptadas: {device.accepted}  Rechazadas: {device.rejected}")
+
+    # Test 2: Con AIMD la tasa converge a la capacidad sin tormenta de errores
+    print("\nTest 2: Escrituras con VSLRateController (AIMD)")
+    controller = VSLRateController(initial_rate=200.0)
+    device_aimd, blocked = run(controller)
+    stats = controller.get_stats()
+    print(f"  Aceptadas: {device_aimd.accepted}  Rechazadas: {device_aimd.rejected}")
+    print(f"  Tasa final: {stats['rate']:.0f} pkt/s  Decrementos: {stats['decreases']}")
+    print(f"  Submits rechazados por backpressure: {blocked}")
+    assert device_aimd.rejected < device.rejected, "❌ AIMD no redujo los fallos"
+    assert device_aimd.rejected <= 0.05 * device_aimd.accepted, "❌ Tormenta de errores"
+    assert device_aimd.accepted >= 0.6 * CAPACITY * DURATION_S, "❌ Throughput insuficiente"
+    assert blocked > 0, "❌ La cola no aplicó backpressure"
+    print("  ✅ Tasa adaptada y backpressure propagado al productor")
+
+    # Test 3: El jitter aislado no es congestión, la latencia sostenida sí
+    print("\nTest 3: Escrituras lentas aisladas frente a sostenidas")
+    jitter = VSLRateController(initial_rate=1000.0, holdoff_s=0.0)
+    for i in range(1000):
+        jitter.record(True, 0.05 if i % 50 == 0 else 0.0001)
+    sustained = VSLRateController(initial_rate=1000.0, holdoff_s=0.0)
+    for _ in range(20):
+        sustained.record(True, 0.005)
+    print(f"  Picos de 50 ms cada 50 escrituras: {jitter.get_stats()['decreases']} decrementos")
+    print(f"  20 escrituras de 5 ms seguidas: {sustained.get_stats()['decreases']} decrementos")
+    assert jitter.get_stats()["decreases"] == 0, "❌ El jitter redujo la tasa"
+    assert sustained.get_stats()["decreases"] > 0, "❌ Congestión sostenida ignorada"
+    print("  ✅ Latencia suavizada antes de reaccionar")
@@ -0,0 +1,247 @@
+"""
+VSL-DSP Scene Module
+Snapshots de escena y recall incremental basado en diferencias.
+
+Una escena es un conjunto con nombre de valores de usuario (lineal 0-1
+para ganancias, Hz para frecuencias). Al recuperarla solo se escriben
+los parámetros cuyo entero codificado difiere del estado espejo del
+dispositivo, de modo que el coste del recall depende del tamaño del
+cambio y no del tamaño de la escena.
+
+Requiere NumPy.
+"""
+
+import time
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from vsl_config import VSLParameter
+from vsl_core import is_frequency_parameter, vsl_encode_user_values_batch
+from vsl_state import VSLShadowState, UNKNOWN_ENCODED
+from vsl_transport import VSLPacket
+
+
+# ============================================================================
+# FASES DEL RECALL (Orden anti-glitch)
+# ============================================================================
+#
+# 1. Ganancias que bajan (o cuyo valor actual se desconoce)
+# 2. Resto de parámetros (frecuencias, ruteo)
+# 3. Ganancias que suben
+#
+# Así ningún cambio de ruteo o filtro ocurre con una ganancia todavía alta.
+
+PHASE_GAIN_DOWN = 0
+PHASE_OTHER = 1
+PHASE_GAIN_UP = 2
+
+
+class VSLScene:
+    """
+    Snapshot inmutable de valores de usuario.
+
+    Los enteros codificados se calculan una sola vez al crear la escena
+    (con la ruta batch de vsl_core), así que cada recall solo compara.
+    """
+
+    def __init__(self, name: str, values: Mapping[VSLParameter, float]):
+        """
+        Args:
+            name: Nombre de la escena
+            values: Valor de usuario por parámetro
+
+        Raises:
+            ValueError: Si la escena está vacía o repite un param_id
+        """
+        if not values:
+            raise ValueError("La escena debe contener al menos un parámetro")
+
+        self.name = name
+        self.params: Sequence[VSLParameter] = tuple(values.keys())
+        self.user_values: Sequence[float] = tuple(float(v) for v in values.values())
+
+        self.param_ids = np.array([p.dsp_param_id for p in self.params], dtype=np.intp)
+        if len(np.unique(self.param_ids)) != len(self.param_ids):
+            raise ValueError("La escena contiene param_id duplicados")
+
+        self.encoded = vsl_encode_user_values_batch(self.user_values, self.params)
+        self.is_gain = np.array([not is_frequency_parameter(p) for p in self.params],
+                                dtype=bool)
+
+    @classmethod
+    def capture(cls, name: str, state: VSLShadowState,
+                params: Sequence[VSLParameter]) -> "VSLScene":
+        """
+        Crea una escena con el estado actual de los parámetros indicados.
+
+        Raises:
+            ValueError: Si algún parámetro no tiene estado conocido
+        """
+        values: Dict[VSLParameter, float] = {}
+        for param in params:
+            value = state.get_value(param.dsp_param_id)
+            if value is None:
+                raise ValueError(f"Estado desconocido para 0x{param.dsp_param_id:04X}")
+            values[param] = value
+        return cls(name, values)
+
+    def __len__(self) -> int:
+        return len(self.params)
+
+    def __repr__(self) -> str:
+        return f"VSLScene(name={self.name!r}, params={len(self)})"
+
+
+class VSLRecallResult(NamedTuple):
+    """Resultado de un recall."""
+    scene: str
+    written: int          # Paquetes enviados
+    unchanged: int        # Parámetros que ya tenían el valor de la escena
+    phase_counts: tuple   # Paquetes por fase (bajadas, otros, subidas)
+    elapsed_s: float      # Diff + codificación + envío
+
+
+# ============================================================================
+# MOTOR DE RECALL
+# ============================================================================
+
+class VSLSceneEngine:
+    """
+    Calcula y envía el conjunto mínimo de escrituras para una escena.
+
+    El envío se delega en `sender`, que recibe la lista ordenada de
+    paquetes. Ejemplos:
+        VSLSceneEngine(state, device.send_packets)
+        VSLSceneEngine(state, lambda pkts: queue.submit_batch(pkts, VSLPriority.BULK))
+    """
+
+    def __init__(self, state: VSLShadowState,
+                 sender: Callable[[List[VSLPacket]], object],
+                 report_id: Optional[int] = None):
+        """
+        Args:
+            state: Estado espejo contra el que se calcula la diferencia
+            sender: Función que envía un lote ordenado de paquetes
+            report_id: Report ID de los paquetes (None usa VSL_REPORT_ID)
+        """
+        self._state = state
+        self._sender = sender
+        self._report_id = report_id
+        self._current = np.frombuffer(state.encoded_array(), dtype=np.intc)
+
+    def diff(self, scene: VSLScene) -> np.ndarray:
+        """
+        Índices (en la escena) de los parámetros a escribir, en orden de envío.
+
+        Returns:
+            Array de índices ordenado por fase anti-glitch
+        """
+        current = self._current[scene.param_ids]
+        changed = np.flatnonzero(current != scene.encoded)
+        if changed.size == 0:
+            return changed
+
+        target = scene.encoded[changed]
+        known = current[changed] != UNKNOWN_ENCODED
+        gain = scene.is_gain[changed]
+
+        phase = np.full(changed.size, PHASE_OTHER, dtype=np.int8)
+        phase[gain] = PHASE_GAIN_DOWN
+        phase[gain & known & (target > current[changed])] = PHASE_GAIN_UP
+
+        return changed[np.argsort(phase, kind="stable")]
+
+    def recall(self, scene: VSLScene) -> VSLRecallResult:
+        """Envía solo los parámetros de la escena que difieren del estado actual."""
+        t0 = time.perf_counter()
+
+        order = self.diff(scene)
+        current = self._current[scene.param_ids[order]]
+        is_gain = scene.is_gain[order]
+        target = scene.encoded[order]
+        up = is_gain & (current != UNKNOWN_ENCODED) & (target > current)
+        phase_counts = (int(np.count_nonzero(is_gain & ~up)),
+                        int(np.count_nonzero(~is_gain)),
+                        int(np.count_nonzero(up)))
+
+        packets = [
+            VSLPacket(int(param_id), int(value), report_id=self._report_id)
+            for param_id, value in zip(scene.param_ids[order], target)
+        ]
+        if packets:
+            self._sender(packets)
+
+        return VSLRecallResult(
+            scene=scene.name,
+            written=len(packets),
+            unchanged=len(scene) - len(packets),
+            phase_counts=phase_counts,
+            elapsed_s=time.perf_counter() - t0,
+        )
+
+
+if __name__ == "__main__":
+    from vsl_config import GAIN_CH1, FREQ_HPF_CH1
+
+    print("=== Tests de vsl_scene.py ===\n")
+
+    # Consola sintética: 900 ganancias + 100 HPF
+    gains = [GAIN_CH1._replace(dsp_param_id=0x1A00 + i) for i in range(900)]
+    hpfs = [FREQ_HPF_CH1._replace(dsp_param_id=0x2B00 + i) for i in range(100)]
+    params = gains + hpfs
+
+    state = VSLShadowState(params)
+    sent: List[VSLPacket] = []
+
+    def fake_sender(packets: List[VSLPacket]):
+        for packet in packets:
+            sent.append(packet)
+            state.update(packet.param_id, packet.encoded_value)
+
+    engine = VSLSceneEngine(state, fake_sender, report_id=0x01)
+
+    # Test 1: Primer recall escribe toda la escena
+    base_values = {p: 0.5 for p in gains}
+    base_values.update({p: 80.0 for p in hpfs})
+    base = VSLScene("base", base_values)
+    result = engine.recall(base)
+    print(f"Test 1: Primer recall → {result.written} escrituras en "
+          f"{result.elapsed_s * 1000:.2f} ms")
+    assert result.written == len(base), "❌ Debería escribir toda la escena"
+
+    # Test 2: Recall idéntico no escribe nada
+    result = engine.recall(base)
+    print(f"Test 2: Recall repetido → {result.written} escrituras en "
+          f"{result.elapsed_s * 1000:.3f} ms")
+    assert result.written == 0, "❌ No debería escribir nada"
+
+    # Test 3: Cambio pequeño y orden anti-glitch
+    small_values = dict(base_values)
+    small_values[gains[0]] = 0.9       # Sube
+    small_values[gains[1]] = 0.1       # Baja
+    small_values[hpfs[0]] = 120.0      # Ruteo/filtro
+    small = VSLScene("small", small_values)
+    sent.clear()
+    result = engine.recall(small)
+    order = [p.param_id for p in sent]
+    print(f"Test 3: Cambio de 3 parámetros → {result.written} escrituras "
+          f"{result.phase_counts} en {result.elapsed_s * 1000:.3f} ms")
+    assert order == [gains[1].dsp_param_id, hpfs[0].dsp_param_id,
+                     gains[0].dsp_param_id], "❌ Orden anti-glitch incorrecto"
+    print("  ✅ Bajadas → filtros → subidas")
+
+    # Test 4: El coste escala con el cambio, no con la escena
+    timings = {}
+    for n_changes in (0, 10, 1000):
+        values = dict(base_values)
+        for p in params[:n_changes]:
+            values[p] = 0.25 if p in gains else 200.0
+        engine.recall(VSLScene("prep", base_values))
+        scene = VSLScene(f"delta_{n_changes}", values)
+        timings[n_changes] = engine.recall(scene).elapsed_s
+    print("Test 4: Tiempo de recall frente al tamaño del cambio (escena de 1000)")
+    for n_changes, elapsed in timings.items():
+        print(f"  {n_changes:>5} cambios: {elapsed * 1000:.3f} ms")
+    assert timings[10] < timings[1000] / 5, "❌ El recall no escala con el cambio"
+    print("  ✅ Recall proporcional al tamaño del cambio")
@@ -0,0 +1,458 @@
+"""
+VSL-DSP Send Queue Module
+Cola de envío con carriles de prioridad para paquetes HID.
+
+Un recall de escena o una automatización pueden encolar miles de
+escrituras masivas. Un mute o una bajada de ganancia no deben esperar
+detrás de ellas: cada paquete entra en un carril (URGENT, INTERACTIVE,
+BULK) y un único hilo escritor despacha siempre el carril más prioritario
+disponible, con protección anti-inanición para los carriles inferiores.
+
+Opcionalmente, un VSLRateController limita la tasa de escritura y una
+capacidad máxima (max_pending) devuelve backpressure a los productores.
+"""
+
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from vsl_metrics import VSLMetrics, Labels, QUEUE_DEPTH, QUEUE_REJECTED, PACKETS_DROPPED
+from vsl_rate_control import VSLRateController
+from vsl_transport import VSLPacket
+
+
+# ============================================================================
+# CLASES DE PRIORIDAD
+# ============================================================================
+
+class VSLPriority(IntEnum):
+    """Carriles de envío. Un valor menor significa mayor prioridad."""
+    URGENT = 0        # Mute, bajadas de ganancia, pánico
+    INTERACTIVE = 1   # Movimientos de fader del usuario
+    BULK = 2          # Recall de escenas, automatización, restauración
+
+
+# Número de despachos que un carril no vacío puede ser adelantado
+# antes de que se le conceda un turno forzado (anti-inanición)
+DEFAULT_STARVATION_LIMIT = 16
+
+# Muestras de latencia retenidas por carril para las estadísticas
+LATENCY_SAMPLES = 4096
+
+# Entrada de la cola: (paquete, instante de encolado en perf_counter)
+QueueEntry = Tuple[VSLPacket, float]
+
+
+# ============================================================================
+# COLA DE ENVÍO CON PRIORIDADES
+# ============================================================================
+
+class VSLSendQueue:
+    """
+    Cola de envío con carriles de prioridad y un hilo escritor dedicado.
+
+    El escritor siempre toma el carril más prioritario con paquetes, de
+    modo que un paquete URGENT adelanta a todo lo que esté encolado y solo
+    espera a la escritura en curso. Para que BULK no quede bloqueado bajo
+    tráfico interactivo sostenido, un carril adelantado `starvation_limit`
+    veces seguidas recibe el siguiente turno.
+    """
+
+    def __init__(self, writer: Callable[[VSLPacket], bool],
+                 starvation_limit: int = DEFAULT_STARVATION_LIMIT,
+                 rate_controller: Optional[VSLRateController] = None,
+                 max_pending: Optional[int] = None,
+                 metrics: Optional[VSLMetrics] = None,
+                 metrics_labels: Labels = ()):
+        """
+        Args:
+            writer: Función que escribe un paquete (ej: VSLDevice.send_packet)
+                y retorna True si el envío fue exitoso
+            starvation_limit: Despachos máximos que un carril puede ser
+                adelantado antes de recibir un turno forzado
+            rate_controller: Limitador adaptativo consultado antes de cada
+                escritura INTERACTIVE/BULK; URGENT no espera (None = sin
+                límite de tasa)
+            max_pending: Paquetes INTERACTIVE + BULK encolados como máximo
+                antes de aplicar backpressure (None = sin límite). URGENT
+                nunca se rechaza.
+            metrics: Registro de métricas: profundidad por carril (gauge) y
+                paquetes rechazados por backpressure
+            metrics_labels: Etiquetas extra de estas series (p.ej. la unidad)
+
+        Raises:
+            ValueError: Si starvation_limit o max_pending no son positivos
+        """
+        if starvation_limit < 1:
+            raise ValueError("starvation_limit debe ser >= 1")
+        if max_pending is not None and max_pending < 1:
+            raise ValueError("max_pending debe ser >= 1")
+
+        self._writer = writer
+        self._starvation_limit = starvation_limit
+        self._rate = rate_controller
+        self._max_pending = max_pending
+        self._bounded_pending = 0
+
+        self._lanes: Dict[VSLPriority, Deque[QueueEntry]] = {
+            prio: deque() for prio in VSLPriority
+        }
+        self._skipped: Dict[VSLPriority, int] = {prio: 0 for prio in VSLPriority}
+        self._latencies: Dict[VSLPriority, Deque[float]] = {
+            prio: deque(maxlen=LATENCY_SAMPLES) for prio in VSLPriority
+        }
+        self._sent: Dict[VSLPriority, int] = {prio: 0 for prio in VSLPriority}
+        self._failed: Dict[VSLPriority, int] = {prio: 0 for prio in VSLPriority}
+
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._in_flight = 0
+
+        self._metrics = metrics
+        self._metrics_labels = metrics_labels
+        self._gauges: List[Tuple[Labels, Callable[[], int]]] = []
+        if metrics is not None:
+            for prio in VSLPriority:
+                # len() de un deque no necesita el lock
+                labels = metrics_labels + (("lane", prio.name),)
+                depth = self._lanes[prio].__len__
+                metrics.register_gauge(QUEUE_DEPTH, depth, labels)
+                self._gauges.append((labels, depth))
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Arranca el hilo escritor (idempotente)."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(
+            target=self._writer_loop, name="vsl-send-queue", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, drain: bool = True, timeout: Optional[float] = None) -> int:
+        """
+        Detiene el hilo escritor y retira los gauges de profundidad.
+
+        Args:
+            drain: Si es True, espera a que se envíen los paquetes encolados;
+                   si es False, descarta los pendientes
+            timeout: Tiempo máximo de espera en segundos (None = sin límite)
+
+        Returns:
+            Número de paquetes descartados sin enviar
+        """
+        if drain:
+            self.flush(timeout)
+        dropped = 0
+        with self._cond:
+            self._running = False
+            if not drain:
+                for lane in self._lanes.values():
+                    dropped += len(lane)
+                    lane.clear()
+                self._bounded_pending = 0
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._metrics is not None:
+            if dropped:
+                self._metrics.inc(PACKETS_DROPPED, dropped, self._metrics_labels)
+            for labels, gauge in self._gauges:
+                self._metrics.unregister_gauge(QUEUE_DEPTH, labels, gauge)
+            self._gauges.clear()
+        return dropped
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que todos los carriles queden vacíos.
+
+        Returns:
+            True si la cola se vació antes del timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._in_flight == 0 and not any(self._lanes.values()),
+                timeout
+            )
+
+    # ------------------------------------------------------------------
+    # API de envío
+    # ------------------------------------------------------------------
+
+    def submit(self, packet: VSLPacket,
+               priority: VSLPriority = VSLPriority.INTERACTIVE,
+               block: bool = True,
+               timeout: Optional[float] = None) -> bool:
+        """
+        Encola un paquete en el carril indicado.
+
+        Si la cola está llena (max_pending), el productor espera a que haya
+        hueco (block=True) o recibe False inmediatamente (block=False).
+
+        Args:
+            packet: VSLPacket a enviar
+            priority: Carril de envío
+            block: Esperar si la cola está llena
+            timeout: Espera máxima en segundos (None = sin límite)
+
+        Returns:
+            True si el paquete fue encolado, False si hubo backpressure
+        """
+        priority = VSLPriority(priority)
+        bounded = priority != VSLPriority.URGENT and self._max_pending is not None
+        with self._cond:
+            if bounded and not self._has_space():
+                if not block or not self._cond.wait_for(self._has_space, timeout):
+                    if self._metrics is not None:
+                        self._metrics.inc(QUEUE_REJECTED, 1, self._metrics_labels)
+                    return False
+            self._lanes[priority].append((packet, time.perf_counter()))
+            if priority != VSLPriority.URGENT:
+                self._bounded_pending += 1
+            self._cond.notify_all()
+        return True
+
+    def submit_batch(self, packets: Sequence[VSLPacket],
+                     priority: VSLPriority = VSLPriority.BULK,
+                     block: bool = True,
+                     timeout: Optional[float] = None) -> bool:
+        """
+        Encola una secuencia de paquetes de forma atómica y en orden.
+
+        Ningún otro paquete del mismo carril se intercala dentro del lote.
+        El backpressure se evalúa una sola vez: basta con que haya hueco
+        para que el lote completo entre, aunque supere max_pending.
+
+        Returns:
+            True si el lote fue encolado, False si hubo backpressure
+        """
+        priority = VSLPriority(priority)
+        if not packets:
+            return True
+        bounded = priority != VSLPriority.URGENT and self._max_pending is not None
+        with self._cond:
+            if bounded and not self._has_space():
+                if not block or not self._cond.wait_for(self._has_space, timeout):
+                    if self._metrics is not None:
+                        self._metrics.inc(QUEUE_REJECTED, len(packets),
+                                          self._metrics_labels)
+                    return False
+            now = time.perf_counter()
+            self._lanes[priority].extend((packet, now) for packet in packets)
+            if priority != VSLPriority.URGENT:
+                self._bounded_pending += len(packets)
+            self._cond.notify_all()
+        return True
+
+    def _has_space(self) -> bool:
+        return self._max_pending is None or self._bounded_pending < self._max_pending
+
+    def wait_for_space(self, timeout: Optional[float] = None) -> bool:
+        """
+        Bloquea hasta que la cola acepte paquetes INTERACTIVE/BULK.
+
+        Returns:
+            True si hay hueco antes del timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(self._has_space, timeout)
+
+    def pending(self, priority: Optional[VSLPriority] = None) -> int:
+        """Número de paquetes encolados (en un carril o en total)."""
+        with self._cond:
+            if priority is not None:
+                return len(self._lanes[VSLPriority(priority)])
+            return sum(len(lane) for lane in self._lanes.values())
+
+    # ------------------------------------------------------------------
+    # Hilo escritor
+    # ------------------------------------------------------------------
+
+    def _select_lane(self) -> Optional[VSLPriority]:
+        """
+        Elige el carril a despachar. Debe llamarse con self._cond tomado.
+
+        El carril más prioritario con paquetes gana, salvo que un carril
+        inferior haya sido adelantado starvation_limit veces seguidas.
+        """
+        waiting = [prio for prio in VSLPriority if self._lanes[prio]]
+        if not waiting:
+            return None
+
+        chosen = waiting[0]
+        for prio in reversed(waiting[1:]):
+            if self._skipped[prio] >= self._starvation_limit:
+                chosen = prio
+                break
+
+        for prio in waiting:
+            if prio == chosen:
+                self._skipped[prio] = 0
+            else:
+                self._skipped[prio] += 1
+
+        return chosen
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                lane = self._select_lane()
+                while lane is None:
+                    if not self._running:
+                        return
+                    self._cond.wait()
+                    lane = self._select_lane()
+                packet, t_submit = self._lanes[lane].popleft()
+                if lane != VSLPriority.URGENT:
+                    self._bounded_pending -= 1
+                self._in_flight += 1
+                self._cond.notify_all()
+
+            # URGENT (mute, pánico) no espera al limitador de tasa
+            if self._rate is not None and lane != VSLPriority.URGENT:
+                self._rate.acquire()
+
+            t_write = time.perf_counter()
+            try:
+                ok = bool(self._writer(packet))
+            except Exception:
+                ok = False
+            t_done = time.perf_counter()
+            latency = t_done - t_submit
+
+            if self._rate is not None:
+                self._rate.record(ok, t_done - t_write)
+
+            with self._cond:
+                self._in_flight -= 1
+                self._latencies[lane].append(latency)
+                if ok:
+                    self._sent[lane] += 1
+                else:
+                    self._failed[lane] += 1
+                self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Estadísticas
+    # ------------------------------------------------------------------
+
+    def get_latency_stats(self, priority: VSLPriority) -> Dict[str, float]:
+        """
+        Estadísticas de latencia encolado→escrito de un carril.
+
+        Returns:
+            Diccionario con count, sent, failed, mean_ms, p50_ms, p99_ms, max_ms
+        """
+        priority = VSLPriority(priority)
+        with self._cond:
+            samples: List[float] = sorted(self._latencies[priority])
+            sent = self._sent[priority]
+            failed = self._failed[priority]
+
+        stats = {"count": len(samples), "sent": sent, "failed": failed,
+                 "mean_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        if samples:
+            n = len(samples)
+            stats["mean_ms"] = sum(samples) / n * 1000.0
+            stats["p50_ms"] = samples[n // 2] * 1000.0
+            stats["p99_ms"] = samples[min(n - 1, int(n * 0.99))] * 1000.0
+            stats["max_ms"] = samples[-1] * 1000.0
+        return stats
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop(drain=exc_type is None)
+
+
+if __name__ == "__main__":
+    print("=== Tests de vsl_send_queue.py ===\n")
+
+    WRITE_TIME_S = 0.0002  # Escritura HID simulada de 200 µs
+
+    def fake_writer(packet: VSLPacket) -> bool:
+        time.sleep(WRITE_TIME_S)
+        return True
+
+    # Test 1: Latencia URGENT bajo carga BULK saturada
+    print("Test 1: Latencia de URGENT con 2000 paquetes BULK encolados")
+    with VSLSendQueue(fake_writer) as queue:
+        for i in range(2000):
+            queue.submit(VSLPacket(0x1A01, i, report_id=0x01), VSLPriority.BULK)
+        for i in range(20):
+            queue.submit(VSLPacket(0x1A02, 0, report_id=0x01), VSLPriority.URGENT)
+            time.sleep(0.005)
+        queue.flush()
+
+        urgent = queue.get_latency_stats(VSLPriority.URGENT)
+        bulk = queue.get_latency_stats(VSLPriority.BULK)
+
+    print(f"  URGENT: n={urgent['count']} p50={urgent['p50_ms']:.3f} ms "
+          f"p99={urgent['p99_ms']:.3f} ms max={urgent['max_ms']:.3f} ms")
+    print(f"  BULK:   n={bulk['count']} p50={bulk['p50_ms']:.3f} ms "
+          f"p99={bulk['p99_ms']:.3f} ms max={bulk['max_ms']:.3f} ms")
+    assert urgent["sent"] == 20 and bulk["sent"] == 2000, "❌ Paquetes perdidos"
+    assert urgent["p99_ms"] < bulk["p50_ms"], "❌ URGENT no adelantó a BULK"
+    print("  ✅ URGENT adelanta al tráfico BULK encolado\n")
+
+    # Test 2: Protección anti-inanición
+    print("Test 2: BULK progresa bajo tráfico INTERACTIVE sostenido")
+    order: List[VSLPriority] = []
+    queue = VSLSendQueue(lambda pkt: order.append(pkt.report_id) or True,
+                         starvation_limit=4)
+    for i in range(40):
+        queue.submit(VSLPacket(0x1A01, i, report_id=VSLPriority.INTERACTIVE),
+                     VSLPriority.INTERACTIVE)
+    for i in range(5):
+        queue.submit(VSLPacket(0x1A01, i, report_id=VSLPriority.BULK),
+                     VSLPriority.BULK)
+    queue.start()
+    queue.stop(drain=True)
+    first_bulk = order.index(VSLPriority.BULK)
+    print(f"  Primer BULK despachado en la posición {first_bulk}")
+    assert first_bulk <= 4, "❌ BULK sufrió inanición"
+    print("  ✅ Anti-inanición funcionando correctamente")
+
+    # Test 3: Descartes contados y gauges retirados al detener
+    print("\nTest 3: stop(drain=False) con dos colas sin etiquetas")
+    from vsl_metrics import VSLMetrics
+    metrics = VSLMetrics()
+    depth_key = (QUEUE_DEPTH, (("lane", "BULK"),))
+    first = VSLSendQueue(fake_writer, metrics=metrics)
+    second = VSLSendQueue(fake_writer, metrics=metrics)
+    first.submit_batch([VSLPacket(0x1A01, i, report_id=0x01) for i in range(30)])
+    second.submit_batch([VSLPacket(0x1A02, i, report_id=0x01) for i in range(12)])
+    depth = metrics.snapshot()["gauges"][depth_key]
+    dropped = first.stop(drain=False)
+    depth_after = metrics.snapshot()["gauges"][depth_key]
+    second.stop(drain=False)
+    print(f"  Profundidad BULK: {depth:.0f} → {depth_after:.0f}, descartados: "
+          f"{metrics.total(PACKETS_DROPPED):.0f}")
+    assert depth == 42 and depth_after == 12, "❌ Gauges de colas sin etiquetas pisados"
+    assert dropped == 30 and metrics.total(PACKETS_DROPPED) == 42, "❌ Descartes sin contar"
+    assert not metrics.snapshot()["gauges"], "❌ Gauges de colas detenidas"
+    print("  ✅ Descartes contados y gauges retirados")
+
+    # Test 4: URGENT no pasa por el limitador de tasa
+    print("\nTest 4: 5 URGENT con un limitador a 20 pkt/s")
+    limiter = VSLRateController(initial_rate=20.0, min_rate=20.0, burst=1.0)
+    with VSLSendQueue(lambda pkt: True, rate_controller=limiter) as queue:
+        t0 = time.perf_counter()
+        for i in range(5):
+            queue.submit(VSLPacket(0x1A02, i, report_id=0x01), VSLPriority.URGENT)
+        queue.flush()
+        urgent_ms = (time.perf_counter() - t0) * 1000.0
+    print(f"  5 URGENT escritos en {urgent_ms:.1f} ms (a 20 pkt/s serían 200 ms)")
+    assert urgent_ms < 100.0, "❌ URGENT esperó al limitador de tasa"
+    print("  ✅ URGENT exento del control de tasa")
@@ -0,0 +1,460 @@
+"""
+VSL-DSP Shared Memory Module
+Publicación del estado del dispositivo en memoria compartida.
+
+Un único proceso (el dueño del handle HID) publica el estado espejo de
+parámetros y el ring de medidores en un segmento de
+multiprocessing.shared_memory. Otros procesos (UI, grabador, panel web)
+se adjuntan por nombre y leen directamente de la memoria: sin syscalls,
+sin serialización y sin abrir el dispositivo.
+
+Consistencia:
+  - Parámetros: seqlock. El publicador incrementa param_seq a impar antes
+    de copiar y a par después; el lector reintenta si lo ve impar o si
+    cambió durante la copia.
+  - Medidores: ring con índice de escritura monótono (igual que
+    VSLMeterBuffer). El publicador anuncia en meter_claim el índice hasta
+    el que va a escribir antes de copiar un lote y publica el índice de
+    escritura después; el lector descarta lo que el publicador pisó o
+    está pisando durante la copia y lo cuenta como overrun.
+
+Se asume un orden de memoria TSO (x86-64). En arquitecturas con orden
+débil el seqlock puede necesitar barreras explícitas.
+
+Formato del segmento (orden nativo):
+  [0-3]    : Magic b"VSLM"
+  [4-5]    : Versión del formato (uint16)
+  [6-7]    : Canales de medidores (uint16, 0 = sin medidores)
+  [8-11]   : Capacidad del ring de medidores (uint32)
+  [16-23]  : param_seq (uint64)
+  [24-31]  : Versión del estado publicada (uint64)
+  [32-39]  : Índice de escritura de medidores (uint64)
+  [40-47]  : Heartbeat del publicador, time.time() (float64)
+  [48-55]  : meter_claim, fin del lote de medidores en escritura (uint64)
+  [64-..]  : 65536 x int32 valores codificados (UNKNOWN_ENCODED si no se conoce)
+  [....]   : capacidad x canales x uint16 niveles de medidores
+  [....]   : capacidad x float64 timestamps de medidores
+
+Requiere NumPy.
+"""
+
+import struct
+import sys
+import threading
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from vsl_config import VSLParameter
+from vsl_core import vsl_decode_user_value
+from vsl_meters import VSLMeterBuffer
+from vsl_state import VSLShadowState, UNKNOWN_ENCODED
+
+
+SHM_MAGIC = b"VSLM"
+SHM_VERSION = 2
+SHM_HEADER = struct.Struct("=4sHHI")
+SHM_HEADER_SIZE = 64
+PARAM_SLOTS = 0x10000
+
+DEFAULT_PUBLISH_INTERVAL_S = 0.005
+SEQLOCK_TIMEOUT_S = 0.1
+
+# Índices de los contadores uint64 del encabezado
+_SEQ = 0
+_STATE_VERSION = 1
+_METER_INDEX = 2
+
+
+def _segment_size(channels: int, capacity: int) -> int:
+    return SHM_HEADER_SIZE + PARAM_SLOTS * 4 + capacity * channels * 2 + capacity * 8
+
+
+class _SegmentLayout:
+    """Vistas NumPy sobre un segmento ya dimensionado."""
+
+    def __init__(self, buf: memoryview, channels: int, capacity: int):
+        self.channels = channels
+        self.capacity = capacity
+        self.counters = np.ndarray((3,), dtype=np.uint64, buffer=buf, offset=16)
+        self.heartbeat = np.ndarray((1,), dtype=np.float64, buffer=buf, offset=40)
+        self.meter_claim = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=48)
+        self.params = np.ndarray((PARAM_SLOTS,), dtype=np.int32, buffer=buf,
+                                 offset=SHM_HEADER_SIZE)
+
+        offset = SHM_HEADER_SIZE + PARAM_SLOTS * 4
+        self.levels = np.ndarray((capacity, channels), dtype=np.uint16,
+                                 buffer=buf, offset=offset)
+        offset += capacity * channels * 2
+        # El bloque de niveles es múltiplo de 8 bytes si la capacidad es potencia de 2 >= 4
+        self.timestamps = np.ndarray((capacity,), dtype=np.float64,
+                                     buffer=buf, offset=offset)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Se adjunta a un segmento existente sin que este proceso lo elimine al salir."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # Un hijo de multiprocessing comparte el resource_tracker del padre:
+    # ahí el registro ya existe y no debe borrarse
+    if multiprocessing.parent_process() is None:
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm
+
+
+# ============================================================================
+# PUBLICADOR
+# ============================================================================
+
+class VSLStatePublisher:
+    """
+    Copia el estado espejo (y opcionalmente los medidores) al segmento
+    compartido, como mucho una vez cada interval_s.
+
+    Los parámetros solo se copian cuando cambia VSLShadowState.version, y
+    entonces solo los param_id cuyo valor difiere del segmento.
+    """
+
+    def __init__(self, state: VSLShadowState,
+                 meters: Optional[VSLMeterBuffer] = None,
+                 name: Optional[str] = None,
+                 interval_s: float = DEFAULT_PUBLISH_INTERVAL_S):
+        """
+        Args:
+            state: Estado espejo a publicar
+            meters: Ring de medidores a publicar (opcional)
+            name: Nombre del segmento (None genera uno aleatorio)
+            interval_s: Periodo del hilo publicador
+        """
+        channels = meters.channels if meters is not None else 0
+        capacity = meters.capacity if meters is not None else 0
+
+        self._state = state
+        self._meters = meters
+        self._interval_s = interval_s
+        self._source = np.frombuffer(state.encoded_array(), dtype=np.intc)
+        self._published_version = -1
+        self._meter_cursor = meters.write_index if meters is not None else 0
+
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=True, size=_segment_size(channels, capacity)
+        )
+        SHM_HEADER.pack_into(self._shm.buf, 0, SHM_MAGIC, SHM_VERSION,
+                             channels, capacity)
+        self._layout = _SegmentLayout(self._shm.buf, channels, capacity)
+        self._layout.params[:] = UNKNOWN_ENCODED
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.publications = 0
+
+    @property
+    def name(self) -> str:
+        """Nombre del segmento para VSLStateSubscriber."""
+        return self._shm.name
+
+    def publish(self) -> bool:
+        """
+        Publica los cambios pendientes.
+
+        Returns:
+            True si se publicó algún parámetro o medidor
+        """
+        layout = self._layout
+        published = False
+
+        version = self._state.version
+        if version != self._published_version:
+            changed = np.flatnonzero(self._source != layout.params)
+            counters = layout.counters
+            counters[_SEQ] += 1                      # Impar: escritura en curso
+            layout.params[changed] = self._source[changed]
+            counters[_STATE_VERSION] = version
+            counters[_SEQ] += 1                      # Par: consistente
+            self._published_version = version
+            published = True
+
+        if self._meters is not None:
+            levels, stamps, self._meter_cursor, _ = self._meters.read_since(
+                self._meter_cursor, max_reports=layout.capacity)
+            if len(levels):
+                start = int(layout.counters[_METER_INDEX])
+                layout.meter_claim[0] = start + len(levels)
+                idx = (start + np.arange(len(levels))) & (layout.capacity - 1)
+                layout.levels[idx] = levels
+                layout.timestamps[idx] = stamps
+                layout.counters[_METER_INDEX] = start + len(levels)
+                published = True
+
+        layout.heartbeat[0] = time.time()
+        if published:
+            self.publications += 1
+        return published
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._publisher_loop, name="vsl-shm-publisher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.publish()
+
+    def close(self):
+        """Detiene el publicador y elimina el segmento."""
+        self.stop()
+        self._layout = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def _publisher_loop(self):
+        while not self._stop.wait(self._interval_s):
+            self.publish()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# ============================================================================
+# LECTOR
+# ============================================================================
+
+class VSLStateSubscriber:
+    """
+    Vista de solo lectura del segmento publicado, para otros procesos.
+
+    Todas las lecturas son accesos directos a memoria compartida.
+    """
+
+    def __init__(self, name: str):
+        """
+        Raises:
+            FileNotFoundError: Si el segmento no existe
+            ValueError: Si el segmento no es un segmento VSL compatible
+        """
+        self._shm = _attach(name)
+        magic, version, channels, capacity = SHM_HEADER.unpack_from(self._shm.buf, 0)
+        if magic != SHM_MAGIC:
+            self._shm.close()
+            raise ValueError("Magic de segmento inválido")
+        if version != SHM_VERSION:
+            self._shm.close()
+            raise ValueError(f"Versión de segmento no soportada: {version}")
+        self._layout = _SegmentLayout(self._shm.buf, channels, capacity)
+        self.retries = 0
+
+    @property
+    def channels(self) -> int:
+        return self._layout.channels
+
+    @property
+    def state_version(self) -> int:
+        return int(self._layout.counters[_STATE_VERSION])
+
+    @property
+    def heartbeat_age(self) -> float:
+        """Segundos desde la última pasada del publicador (detecta publicador caído)."""
+        return time.time() - float(self._layout.heartbeat[0])
+
+    # ------------------------------------------------------------------
+    # Parámetros
+    # ------------------------------------------------------------------
+
+    def get_encoded(self, param_id: int) -> Optional[int]:
+        """Valor de un parámetro (una lectura de 32 bits, siempre consistente)."""
+        value = int(self._layout.params[param_id])
+        return None if value == UNKNOWN_ENCODED else value
+
+    def get_value(self, param: VSLParameter) -> Optional[float]:
+        """Valor de usuario decodificado (lineal 0-1 o Hz)."""
+        value = self.get_encoded(param.dsp_param_id)
+        return None if value is None else vsl_decode_user_value(value, param)
+
+    def read_params(self, out: Optional[np.ndarray] = None) -> Tuple[int, np.ndarray]:
+        """
+        Copia consistente de los 65536 valores codificados.
+
+        Args:
+            out: Array int32 de 65536 a reutilizar (evita asignaciones)
+
+        Returns:
+            (versión del estado, valores)
+
+        Raises:
+            RuntimeError: Si el publicador quedó a mitad de una escritura
+        """
+        layout = self._layout
+        if out is None:
+            out = np.empty(PARAM_SLOTS, dtype=np.int32)
+        deadline = None
+        while True:
+            seq = int(layout.counters[_SEQ])
+            if not seq & 1:
+                np.copyto(out, layout.params)
+                version = int(layout.counters[_STATE_VERSION])
+                if int(layout.counters[_SEQ]) == seq:
+                    return version, out
+            self.retries += 1
+            if deadline is None:
+                deadline = time.monotonic() + SEQLOCK_TIMEOUT_S
+            elif time.monotonic() > deadline:
+                raise RuntimeError("El publicador no completó la escritura (¿proceso caído?)")
+
+    # ------------------------------------------------------------------
+    # Medidores
+    # ------------------------------------------------------------------
+
+    @property
+    def meter_index(self) -> int:
+        return int(self._layout.counters[_METER_INDEX])
+
+    def read_meters_since(self, cursor: int, max_reports: Optional[int] = None
+                          ) -> Tuple[np.ndarray, np.ndarray, int, int]:
+        """
+        Niveles publicados desde `cursor` (misma semántica que
+        VSLMeterBuffer.read_since).
+
+        Returns:
+            (levels[n, channels] uint16, timestamps[n], nuevo cursor, overruns)
+        """
+        layout = self._layout
+        if layout.capacity == 0:
+            raise RuntimeError("El segmento no publica medidores")
+
+        end = int(layout.counters[_METER_INDEX])
+        start = max(cursor, end - layout.capacity)
+        if max_reports is not None:
+            start = max(start, end - max_reports)
+        overruns = start - cursor if start > cursor else 0
+
+        idx = np.arange(start, end) & (layout.capacity - 1)
+        levels = layout.levels[idx]
+        stamps = layout.timestamps[idx]
+
+        # Las ranuras de [índice, meter_claim) pueden estar a medio escribir y
+        # son las de los reportes [índice - capacity, meter_claim - capacity)
+        lapped = int(layout.meter_claim[0]) - layout.capacity - start
+        if lapped > 0:
+            levels = levels[lapped:]
+            stamps = stamps[lapped:]
+            overruns += lapped
+        return levels, stamps, end, overruns
+
+    def close(self):
+        self._layout = None
+        self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _consistency_worker(name: str, result_queue, last_round: int, ids: np.ndarray):
+    """Proceso lector del self-test: cada snapshot debe ser uniforme."""
+    torn = 0
+    reads = 0
+    out = np.empty(PARAM_SLOTS, dtype=np.int32)
+    with VSLStateSubscriber(name) as sub:
+        t0 = time.perf_counter()
+        while True:
+            _, values = sub.read_params(out)
+            sample = values[ids]
+            reads += 1
+            if sample.min() != sample.max():
+                torn += 1
+            elif sample[0] == last_round:
+                break
+        elapsed = time.perf_counter() - t0
+        result_queue.put((reads, torn, elapsed, sub.retries))
+
+
+if __name__ == "__main__":
+    from vsl_config import GAIN_CH1
+
+    print("=== Tests de vsl_shm.py ===\n")
+
+    params = [GAIN_CH1._replace(dsp_param_id=0x1A00 + i) for i in range(1000)]
+    ids = np.array([p.dsp_param_id for p in params])
+    state = VSLShadowState(params)
+    meters = VSLMeterBuffer(channels=8, capacity=256)
+
+    # Se publica a mano tras cada ronda completa, sin el hilo periódico
+    publisher = VSLStatePublisher(state, meters)
+    try:
+        # Test 1: Lecturas puntuales y medidores
+        print(f"Test 1: Publicación en el segmento {publisher.name}")
+        state.update(params[0].dsp_param_id, 40000)
+        for i in range(300):
+            meters.push([0x05] + list(np.full(8, i, dtype="<u2").tobytes()), float(i))
+        publisher.publish()
+        with VSLStateSubscriber(publisher.name) as sub:
+            value = sub.get_encoded(params[0].dsp_param_id)
+            levels, _, cursor, overruns = sub.read_meters_since(0)
+            print(f"  Parámetro: {value}  Medidores: {len(levels)} "
+                  f"(cursor {cursor}, overruns {overruns})")
+            assert value == 40000, "❌ Valor publicado incorrecto"
+            assert sub.get_encoded(params[1].dsp_param_id) is None, "❌ Debería ser desconocido"
+            # El publicador no copia la ranura que el escritor del ring podría estar llenando
+            assert len(levels) == 255 and levels[-1, 0] == 299, "❌ Ring de medidores incorrecto"
+            print("  ✅ Estado y medidores visibles desde el lector\n")
+
+        # Test 2: Lector alcanzado por un lote del publicador en curso
+        print("Test 2: Lote de medidores anunciado y aún sin publicar")
+        with VSLStateSubscriber(publisher.name) as sub:
+            publisher._layout.meter_claim[0] = cursor + 10
+            try:
+                levels, stamps, _, overruns = sub.read_meters_since(0)
+            finally:
+                publisher._layout.meter_claim[0] = cursor
+            print(f"  Devueltos: {len(levels)}  Overruns: {overruns}  "
+                  f"Primer reporte: {stamps[0]:.0f}")
+            assert len(levels) == 255 - 9 and overruns == 9, "❌ Ranuras en escritura devueltas"
+            assert levels[0, 0] == 299 - 255 + 10, "❌ Reportes válidos descartados"
+            print("  ✅ Ranuras en escritura descartadas\n")
+
+        # Test 3: Snapshots consistentes desde otro proceso
+        print("Test 3: Seqlock con un lector en otro proceso")
+        rounds = 400
+        for param in params:
+            state.update(param.dsp_param_id, 0)
+        publisher.publish()
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        worker = ctx.Process(target=_consistency_worker,
+                             args=(publisher.name, results, rounds, ids))
+        worker.start()
+        time.sleep(0.5)
+        for k in range(1, rounds + 1):
+            for param in params:
+                state.update(param.dsp_param_id, k)
+            publisher.publish()
+        reads, torn, elapsed, retries = results.get(timeout=10)
+        worker.join()
+        print(f"  Lecturas: {reads}  Rotas: {torn}  Reintentos: {retries}  "
+              f"({elapsed / max(reads, 1) * 1e6:.1f} µs/snapshot)")
+        assert torn == 0, "❌ Snapshot inconsistente"
+        print("  ✅ Todas las lecturas consistentes")
+    finally:
+        publisher.close()
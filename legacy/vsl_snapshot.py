@@ -0,0 +1,293 @@
+"""
+VSL-DSP Snapshot Module
+Snapshot binario persistido del estado de parámetros.
+
+Tras un reinicio o una reconexión el dispositivo vuelve a su estado de
+fábrica. El snapshot guarda el último entero conocido de cada parámetro
+en un archivo binario versionado que se escribe de forma atómica (y con
+límite de frecuencia) cada vez que el estado cambia. Restaurar es una
+carga (mmap) más un único envío en bloque.
+
+Formato (Little-Endian):
+  [0-3]   : Magic b"VSLS"
+  [4-5]   : Versión del formato (uint16)
+  [6-7]   : Reservado (0)
+  [8-11]  : Número de registros N (uint32)
+  [12-15] : CRC32 de los registros (uint32)
+  [16-..] : N registros (param_id uint16, encoded_value uint16), ordenados
+            por param_id
+"""
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from vsl_log import get_event_log
+from vsl_state import VSLShadowState, SOURCE_RESTORE
+from vsl_transport import VSLPacket
+
+
+SNAPSHOT_MAGIC = b"VSLS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sHHII")
+
+DEFAULT_MIN_INTERVAL_S = 0.5
+
+
+# ============================================================================
+# LECTURA / ESCRITURA
+# ============================================================================
+
+def _to_little_endian(records: array) -> array:
+    if sys.byteorder != "little":
+        records = array("H", records)
+        records.byteswap()
+    return records
+
+
+def encode_snapshot(state: VSLShadowState) -> bytes:
+    """Serializa el estado actual en el formato de snapshot."""
+    entries = state.snapshot()
+    records = array("H")
+    for param_id in sorted(entries):
+        records.append(param_id)
+        records.append(entries[param_id].encoded_value)
+
+    payload = _to_little_endian(records).tobytes()
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0,
+                                  len(records) // 2, zlib.crc32(payload))
+    return header + payload
+
+
+def save_snapshot(path: str, state: VSLShadowState):
+    """
+    Escribe el snapshot de forma atómica (archivo temporal + os.replace).
+
+    Un corte de energía a mitad de escritura deja el snapshot anterior
+    intacto, nunca un archivo truncado.
+    """
+    data = encode_snapshot(state)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".vsl_snapshot.", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_snapshot(path: str) -> Tuple[array, array]:
+    """
+    Carga un snapshot mapeándolo en memoria.
+
+    Returns:
+        (param_ids, encoded_values) como array('H')
+
+    Raises:
+        OSError: Si el archivo no se puede abrir
+        ValueError: Si el archivo está corrupto o su versión no es soportada
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < SNAPSHOT_HEADER.size:
+            raise ValueError("Snapshot truncado")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, version, _, count, crc = SNAPSHOT_HEADER.unpack_from(mapped, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("Magic de snapshot inválido")
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Versión de snapshot no soportada: {version}")
+
+            end = SNAPSHOT_HEADER.size + count * 4
+            if end > size:
+                raise ValueError("Snapshot truncado")
+
+            view = memoryview(mapped)[SNAPSHOT_HEADER.size:end]
+            try:
+                if zlib.crc32(view) != crc:
+                    raise ValueError("CRC de snapshot inválido")
+                records = _to_little_endian(array("H", view.tobytes()))
+            finally:
+                view.release()
+
+    return records[0::2], records[1::2]
+
+
+def restore_snapshot(path: str, state: Optional[VSLShadowState],
+                     sender: Callable[[List[VSLPacket]], object],
+                     report_id: Optional[int] = None) -> int:
+    """
+    Restaura un snapshot: una carga más un único envío en bloque.
+
+    Args:
+        path: Archivo de snapshot
+        state: Caché a poblar con SOURCE_RESTORE tras el envío (opcional)
+        sender: Función que envía el lote de paquetes (ej: send_packets)
+        report_id: Report ID de los paquetes (None usa VSL_REPORT_ID)
+
+    Returns:
+        Número de parámetros restaurados
+    """
+    param_ids, values = load_snapshot(path)
+    packets = [VSLPacket(pid, value, report_id=report_id)
+               for pid, value in zip(param_ids, values)]
+    if packets:
+        sender(packets)
+    if state is not None:
+        for pid, value in zip(param_ids, values):
+            state.update(pid, value, SOURCE_RESTORE)
+    return len(packets)
+
+
+# ============================================================================
+# ESCRITOR EN SEGUNDO PLANO
+# ============================================================================
+
+class VSLSnapshotWriter:
+    """
+    Persiste el estado espejo cada vez que cambia, como mucho una vez cada
+    min_interval_s. Detecta cambios comparando VSLShadowState.version, así
+    que no añade coste al camino de envío.
+    """
+
+    def __init__(self, path: str, state: VSLShadowState,
+                 min_interval_s: float = DEFAULT_MIN_INTERVAL_S):
+        self._path = path
+        self._state = state
+        self._min_interval_s = min_interval_s
+        self._saved_version = state.version
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.writes = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._writer_loop, name="vsl-snapshot-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Detiene el hilo y persiste los cambios pendientes."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> bool:
+        """
+        Escribe el snapshot si hay cambios sin persistir.
+
+        Returns:
+            True si se escribió el archivo
+        """
+        version = self._state.version
+        if version == self._saved_version:
+            return False
+        save_snapshot(self._path, self._state)
+        self._saved_version = version
+        self.writes += 1
+        return True
+
+    def _writer_loop(self):
+        while not self._stop.wait(self._min_interval_s):
+            try:
+                self.flush()
+            except OSError as e:
+                get_event_log().warning("snapshot_save_failed", "Error guardando snapshot",
+                                        path=self._path, error=str(e))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    from vsl_config import GAIN_CH1
+
+    print("=== Tests de vsl_snapshot.py ===\n")
+
+    params = [GAIN_CH1._replace(dsp_param_id=0x1A00 + i) for i in range(1000)]
+    state = VSLShadowState(params)
+    for i, param in enumerate(params):
+        state.update(param.dsp_param_id, (i * 37) & 0xFFFF)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.vsls")
+
+        # Test 1: Escritor con límite de frecuencia
+        print("Test 1: Escritura atómica y limitada")
+        with VSLSnapshotWriter(path, state, min_interval_s=0.05) as writer:
+            for i in range(200):
+                state.update(params[0].dsp_param_id, i)
+            time.sleep(0.12)
+        print(f"  200 cambios → {writer.writes} escrituras de "
+              f"{os.path.getsize(path)} bytes")
+        assert 1 <= writer.writes <= 4, "❌ El límite de frecuencia no funcionó"
+        assert not [f for f in os.listdir(tmp) if f.startswith(".vsl_snapshot.")], \
+            "❌ Quedaron archivos temporales"
+
+        # Test 2: Restauración en frío (estado nuevo, un solo envío)
+        print("\nTest 2: Restauración en frío")
+        batches: List[Sequence[VSLPacket]] = []
+        cold_state = VSLShadowState(params)
+        t0 = time.perf_counter()
+        restored = restore_snapshot(path, cold_state, batches.append, report_id=0x01)
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        print(f"  {restored} parámetros restaurados en {elapsed_ms:.2f} ms "
+              f"({len(batches)} envío en bloque)")
+        assert len(batches) == 1 and restored == len(params), "❌ Restauración incompleta"
+        assert cold_state.snapshot().keys() == state.snapshot().keys(), "❌ Estado distinto"
+        assert all(cold_state.get_encoded(p.dsp_param_id) == state.get_encoded(p.dsp_param_id)
+                   for p in params), "❌ Valores distintos"
+        print("  ✅ Estado restaurado idéntico")
+
+        # Test 3: Detección de corrupción
+        print("\nTest 3: Detección de corrupción")
+        with open(path, "r+b") as f:
+            f.seek(SNAPSHOT_HEADER.size + 2)
+            f.write(b"\xFF\xFF")
+        try:
+            load_snapshot(path)
+            print("  ❌ Error: Debería haber lanzado ValueError")
+        except ValueError as e:
+            print(f"  ✅ ValueError capturado correctamente: {e}")
+
+        # Test 4: Un snapshot que no se puede enviar no impide abrir el dispositivo
+        print("\nTest 4: open() con VSL_REPORT_ID sin configurar")
+        from vsl_fake_device import FakeVSLHandle
+        from vsl_hid_io import VSLDevice
+        state.update(params[0].dsp_param_id, 1)
+        save_snapshot(path, state)
+        handles: List[FakeVSLHandle] = []
+
+        def handle_factory() -> FakeVSLHandle:
+            handles.append(FakeVSLHandle(latency_s=0.0))
+            return handles[-1]
+
+        VSLDevice.release()
+        device = VSLDevice(handle_factory=handle_factory)
+        opened = device.open(snapshot_path=path)
+        print(f"  open → {opened}, handle cerrado: {handles[0]._closed}")
+        assert opened and device._handle is handles[0], "❌ El restore fallido cerró el dispositivo"
+        assert not handles[0]._closed, "❌ Handle cerrado"
+        VSLDevice.release()
+        assert handles[0]._closed, "❌ Handle sin cerrar al liberar"
+        print("  ✅ Restore registrado como aviso, dispositivo abierto")
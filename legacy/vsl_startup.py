@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+VSL-DSP Startup Check Module
+Test del coste de arranque de la CLI.
+
+Los wrappers lanzan muchos procesos cortos, así que `vsl_cli.py --help`
+(y el --help de cada subcomando) no debe cargar dependencias pesadas ni
+añadir más de STARTUP_BUDGET_MS al arranque del intérprete. Se comprueba
+de dos formas:
+
+  - Importaciones: -X importtime da la lista exacta de módulos cargados;
+    ninguno de HEAVY_MODULES puede aparecer. No depende de la carga de
+    la máquina.
+  - Tiempo: mínimo de varias ejecuciones de la CLI menos el mínimo de
+    `python -c pass`. Así no se cuenta el arranque del propio intérprete
+    (~40 ms en una máquina lenta), solo lo que añade la CLI.
+
+Uso:
+    python3 vsl_startup.py          # Falla (exit 1) si algún subcomando se pasa
+"""
+
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set
+
+
+CLI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vsl_cli.py")
+
+# Tope del coste añadido por la CLI sobre un intérprete vacío
+STARTUP_BUDGET_MS = 50.0
+DEFAULT_REPEAT = 7
+
+# bench y verify quedan fuera: no son wrappers y cargan lo que miden
+CLI_SUBCOMMANDS = (None, "analyze", "config", "enumerate", "poc")
+
+# Paquetes que `--help` nunca debe importar (raíz del nombre del módulo)
+HEAVY_MODULES = frozenset({
+    "numpy", "hid", "scapy", "pyudev", "ctypes", "asyncio",
+    "multiprocessing", "cProfile", "pstats", "tracemalloc",
+})
+
+
+class StartupReport(NamedTuple):
+    """Resultado de un subcomando."""
+    name: str
+    overhead_ms: float        # Mínimo de la CLI menos mínimo del intérprete
+    heavy: List[str]          # Módulos pesados importados (debe estar vacía)
+    ok: bool
+
+
+# ============================================================================
+# MEDICIÓN
+# ============================================================================
+
+def _cli_argv(subcommand: Optional[str]) -> List[str]:
+    return [CLI_PATH] + ([subcommand] if subcommand else []) + ["--help"]
+
+
+def _env() -> Dict[str, str]:
+    # Con caché de bytecode, como en una instalación normal
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def imported_modules(args: Sequence[str]) -> Set[str]:
+    """
+    Módulos que importa `python args...`, según -X importtime.
+
+    Raises:
+        subprocess.CalledProcessError: Si el proceso termina con error
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          env=_env(), text=True, check=True)
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and line.count("|") == 2:
+            name = line.rsplit("|", 1)[1].strip()
+            if name != "imported package":
+                modules.add(name)
+    return modules
+
+
+def min_run_ms(args: Sequence[str], repeat: int = DEFAULT_REPEAT) -> float:
+    """Mínimo de `repeat` ejecuciones de `python args...` (tras una de calentamiento)."""
+    argv = [sys.executable, *args]
+    env = _env()
+    subprocess.run(argv, stdout=subprocess.DEVNULL, env=env, check=True)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, env=env, check=True)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def check_startup(subcommands: Sequence[Optional[str]] = CLI_SUBCOMMANDS,
+                  budget_ms: float = STARTUP_BUDGET_MS,
+                  repeat: int = DEFAULT_REPEAT) -> List[StartupReport]:
+    """Comprueba importaciones y coste añadido de cada `--help`."""
+    baseline_ms = min_run_ms(["-c", "pass"], repeat)
+    reports = []
+    for subcommand in subcommands:
+        args = _cli_argv(subcommand)
+        heavy = sorted(m for m in imported_modules(args)
+                       if m.split(".", 1)[0] in HEAVY_MODULES)
+        overhead_ms = min_run_ms(args, repeat) - baseline_ms
+        reports.append(StartupReport(subcommand or "(ninguno)", overhead_ms, heavy,
+                                     not heavy and overhead_ms <= budget_ms))
+    return reports
+
+
+if __name__ == "__main__":
+    print("=== Test de arranque de vsl_cli.py ===\n")
+    print(f"Tope: {STARTUP_BUDGET_MS:.0f} ms sobre `python -c pass`, "
+          f"sin {', '.join(sorted(HEAVY_MODULES))}\n")
+
+    reports = check_startup()
+    for report in reports:
+        mark = "✅" if report.ok else "❌"
+        extra = f"  importa {', '.join(report.heavy)}" if report.heavy else ""
+        print(f"  {mark} {report.name:<10} +{report.overhead_ms:6.1f} ms{extra}")
+
+    failed = [r.name for r in reports if not r.ok]
+    if failed:
+        print(f"\n❌ Arranque fuera de presupuesto: {', '.join(failed)}")
+        sys.exit(1)
+    print("\n✅ Todos los --help dentro del presupuesto")
@@ -0,0 +1,363 @@
+"""
+VSL-DSP Shadow State Module
+Caché del último estado conocido de cada parámetro del DSP.
+
+El protocolo no ofrece lectura de parámetros bajo demanda, así que el
+estado se reconstruye a partir de dos fuentes: nuestras propias
+escrituras y los reportes de entrada que envía el dispositivo. La caché
+guarda el valor entero codificado y el valor de usuario decodificado de
+cada parámetro, con lecturas O(1) sin locks desde cualquier hilo.
+"""
+
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from vsl_config import VSL_MAX_ENCODED_INT, VSL_PACKET_SIZE, VSLParameter
+from vsl_core import vsl_decode_user_value
+from vsl_log import get_event_log
+from vsl_transport import parse_vsl_report
+
+
+# Origen de una entrada de la caché
+SOURCE_WRITE = "write"     # Escritura propia confirmada por send_packet
+SOURCE_DEVICE = "device"   # Reporte de entrada leído del dispositivo
+SOURCE_RESTORE = "restore" # Estado recuperado de un snapshot persistido
+
+READ_POLL_MS = 50
+
+# Errores de lectura seguidos: espera creciente entre reintentos y, al
+# llegar a MAX_READ_ERRORS, el handle se da por perdido
+READ_ERROR_BACKOFF_S = 0.01
+READ_ERROR_BACKOFF_MAX_S = 0.1
+MAX_READ_ERRORS = 8
+
+# Marca de "valor desconocido" en el espejo denso de enteros
+UNKNOWN_ENCODED = -1
+
+
+class VSLParamState(NamedTuple):
+    """Último estado conocido de un parámetro (inmutable)."""
+    encoded_value: int   # Entero de 16 bits tal como viaja en el paquete
+    user_value: float    # Valor de usuario (lineal 0-1 o Hz)
+    timestamp: float     # time.monotonic() de la actualización
+    source: str          # SOURCE_WRITE, SOURCE_DEVICE o SOURCE_RESTORE
+
+
+# ============================================================================
+# CACHÉ DE ESTADO
+# ============================================================================
+
+class VSLShadowState:
+    """
+    Estado espejo del DSP indexado por param_id.
+
+    Cada entrada es un VSLParamState inmutable que se reemplaza con una
+    única asignación al diccionario. Bajo el GIL esa asignación y dict.get
+    son atómicas, así que los lectores nunca toman un lock ni pueden ver
+    una entrada a medio escribir. Solo los escritores se serializan entre
+    sí para mantener el contador de versión coherente.
+
+    Además de las entradas, la caché mantiene un espejo denso de 65536
+    enteros (uno por param_id posible, UNKNOWN_ENCODED si no se conoce)
+    para comparar escenas completas con una sola operación vectorizada.
+    """
+
+    def __init__(self, params: Iterable[VSLParameter] = ()):
+        self._params: Dict[int, VSLParameter] = {}
+        self._entries: Dict[int, VSLParamState] = {}
+        self._dense = array("i", [UNKNOWN_ENCODED]) * 0x10000
+        self._write_lock = threading.Lock()
+        self._version = 0
+
+        for param in params:
+            self.register(param)
+
+    def register(self, param: VSLParameter):
+        """Registra un parámetro para decodificar sus valores de usuario."""
+        self._params[param.dsp_param_id] = param
+
+    @property
+    def version(self) -> int:
+        """Se incrementa con cada cambio de valor (útil para detectar cambios)."""
+        return self._version
+
+    # ------------------------------------------------------------------
+    # Lecturas (sin locks)
+    # ------------------------------------------------------------------
+
+    def get(self, param_id: int) -> Optional[VSLParamState]:
+        """Último estado conocido o None si el parámetro nunca se observó."""
+        return self._entries.get(param_id)
+
+    def get_encoded(self, param_id: int) -> Optional[int]:
+        entry = self._entries.get(param_id)
+        return None if entry is None else entry.encoded_value
+
+    def get_value(self, param_id: int) -> Optional[float]:
+        entry = self._entries.get(param_id)
+        return None if entry is None else entry.user_value
+
+    def matches(self, param_id: int, encoded_value: int) -> bool:
+        """True si el dispositivo ya tiene ese valor (la escritura sobra)."""
+        entry = self._entries.get(param_id)
+        return entry is not None and entry.encoded_value == encoded_value
+
+    def encoded_array(self) -> array:
+        """
+        Espejo denso de valores enteros indexado por param_id (solo lectura).
+
+        Con NumPy puede envolverse sin copia:
+            np.frombuffer(state.encoded_array(), dtype=np.intc)
+        """
+        return self._dense
+
+    def snapshot(self) -> Dict[int, VSLParamState]:
+        """Copia consistente de todas las entradas."""
+        with self._write_lock:
+            return dict(self._entries)
+
+    # ------------------------------------------------------------------
+    # Escrituras
+    # ------------------------------------------------------------------
+
+    def update(self, param_id: int, encoded_value: int,
+               source: str = SOURCE_WRITE) -> bool:
+        """
+        Actualiza el estado de un parámetro.
+
+        Returns:
+            True si el valor cambió
+        """
+        param = self._params.get(param_id)
+        if param is not None:
+            user_value = vsl_decode_user_value(encoded_value, param)
+        else:
+            user_value = encoded_value / VSL_MAX_ENCODED_INT
+
+        entry = VSLParamState(encoded_value, user_value, time.monotonic(), source)
+        with self._write_lock:
+            previous = self._entries.get(param_id)
+            self._entries[param_id] = entry
+            self._dense[param_id] = encoded_value
+            changed = previous is None or previous.encoded_value != encoded_value
+            if changed:
+                self._version += 1
+        return changed
+
+    def invalidate(self, param_id: Optional[int] = None):
+        """Olvida un parámetro (o todos), p.ej. tras un reset del dispositivo."""
+        with self._write_lock:
+            if param_id is None:
+                self._entries = {}
+                self._dense[:] = array("i", [UNKNOWN_ENCODED]) * 0x10000
+            else:
+                self._entries.pop(param_id, None)
+                self._dense[param_id] = UNKNOWN_ENCODED
+            self._version += 1
+
+
+# ============================================================================
+# LECTOR DE REPORTES DE ENTRADA
+# ============================================================================
+
+class VSLStateReader:
+    """
+    Hilo en segundo plano que lee reportes de entrada y actualiza la caché.
+
+    handle_report() también puede usarse directamente como callback
+    on_report de VSLPipeline cuando el pipeline ya es dueño de las lecturas.
+
+    Tras MAX_READ_ERRORS lecturas fallidas seguidas (handle desenchufado)
+    el hilo termina, marca disconnected y avisa con on_disconnect().
+    """
+
+    def __init__(self, handle: Any, state: VSLShadowState,
+                 report_id: Optional[int] = None,
+                 on_disconnect: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            handle: Handle abierto con la interfaz de hidapi (read)
+            state: Caché a actualizar
+            report_id: Aceptar solo reportes con este ID (None = todos)
+            on_disconnect: Callback opcional invocado si el handle deja de responder
+        """
+        self._handle = handle
+        self._state = state
+        self._report_id = report_id
+        self._on_disconnect = on_disconnect
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.reports = 0
+        self.ignored = 0
+        self.read_errors = 0
+        self.disconnected = False
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._reader_loop, name="vsl-state-reader", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def handle_report(self, data: List[int]):
+        """Decodifica un reporte de entrada y lo vuelca en la caché."""
+        fields = parse_vsl_report(data)
+        if fields is None or (self._report_id is not None and fields[0] != self._report_id):
+            self.ignored += 1
+            return
+        _, param_id, encoded_value = fields
+        self.reports += 1
+        self._state.update(param_id, encoded_value, SOURCE_DEVICE)
+
+    def _reader_loop(self):
+        errors = 0
+        while self._running:
+            try:
+                data = self._handle.read(VSL_PACKET_SIZE, READ_POLL_MS)
+            except Exception as e:
+                self.read_errors += 1
+                errors += 1
+                if errors >= MAX_READ_ERRORS:
+                    self._disconnect(e)
+                    return
+                # Sin espera, un handle desenchufado haría girar el hilo al 100%
+                time.sleep(min(READ_ERROR_BACKOFF_S * (1 << (errors - 1)),
+                               READ_ERROR_BACKOFF_MAX_S))
+                continue
+            errors = 0
+            if data:
+                self.handle_report(data)
+
+    def _disconnect(self, error: Exception):
+        self._running = False
+        self.disconnected = True
+        get_event_log().warning("state_reader_disconnected",
+                                "El handle no responde, lector detenido",
+                                errors=self.read_errors, error=str(error))
+        if self._on_disconnect is not None:
+            self._on_disconnect()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    from vsl_config import GAIN_CH1, FREQ_HPF_CH1
+    from vsl_fake_device import FakeVSLHandle
+    from vsl_transport import VSLPacket
+
+    print("=== Tests de vsl_state.py ===\n")
+
+    state = VSLShadowState([GAIN_CH1, FREQ_HPF_CH1])
+
+    # Test 1: Actualización desde escrituras propias
+    print("Test 1: Estado tras una escritura propia")
+    assert state.update(GAIN_CH1.dsp_param_id, 40793), "❌ Debería haber cambiado"
+    assert not state.update(GAIN_CH1.dsp_param_id, 40793), "❌ No debería haber cambiado"
+    entry = state.get(GAIN_CH1.dsp_param_id)
+    print(f"  {entry}")
+    assert abs(entry.user_value - 0.75) < 1e-3, "❌ Decodificación incorrecta"
+    assert state.matches(GAIN_CH1.dsp_param_id, 40793), "❌ matches() falló"
+    print("  ✅ Estado actualizado y decodificado\n")
+
+    # Test 2: Actualización desde reportes del dispositivo en segundo plano
+    print("Test 2: Lector de reportes de entrada en segundo plano")
+    handle = FakeVSLHandle(latency_s=0.001)
+    with VSLStateReader(handle, state) as reader:
+        handle.write(VSLPacket(FREQ_HPF_CH1.dsp_param_id, 37114, report_id=0x01).buffer)
+        deadline = time.monotonic() + 1.0
+        while state.get(FREQ_HPF_CH1.dsp_param_id) is None and time.monotonic() < deadline:
+            time.sleep(0.001)
+    entry = state.get(FREQ_HPF_CH1.dsp_param_id)
+    print(f"  {entry}")
+    assert entry is not None and entry.source == SOURCE_DEVICE, "❌ Reporte no procesado"
+    assert abs(entry.user_value - 1000.0) < 1.0, "❌ Frecuencia decodificada incorrecta"
+    print("  ✅ Reporte decodificado a 1000 Hz\n")
+
+    # Test 3: Coste de lectura
+    print("Test 3: Coste de lectura sin locks")
+    n = 200000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        state.get_value(GAIN_CH1.dsp_param_id)
+    per_read_ns = (time.perf_counter() - t0) / n * 1e9
+    print(f"  {per_read_ns:.0f} ns por lectura")
+    print("  ✅ Lecturas O(1)\n")
+
+    # Test 4: Tras un replug el dispositivo vuelve de fábrica y la caché se olvida
+    print("Test 4: Escrituras repetidas tras reabrir / reconectar")
+    from vsl_config import AUDIOBOX_MODELS
+    from vsl_devices import VSLUnit
+    from vsl_hid_io import VSLDevice
+
+    handles: List[FakeVSLHandle] = []
+
+    def handle_factory() -> FakeVSLHandle:
+        handles.append(FakeVSLHandle(latency_s=0.0))
+        return handles[-1]
+
+    packet = VSLPacket(GAIN_CH1.dsp_param_id, 1234, report_id=0x01)
+    VSLDevice.release()
+    device = VSLDevice(handle_factory=handle_factory)
+    device.attach_state(VSLShadowState([GAIN_CH1]))
+    device.open()
+    device.send_packet(packet)
+    device.close()
+    device.open()
+    device.send_packet(packet)
+    VSLDevice.release()
+
+    unit_state = VSLShadowState([GAIN_CH1])
+    unit = VSLUnit("VSL44-0001", handle_factory(), AUDIOBOX_MODELS[1],
+                   b"/dev/hidraw0", state=unit_state, reconnect=True)
+    unit.submit(packet)
+    unit.queue.flush()
+    unit.mark_disconnected()
+    unit.reattach(handle_factory())
+    unit.submit(packet)
+    unit.queue.flush()
+    unit.close()
+    writes = [h.writes for h in handles]
+    print(f"  Escrituras por handle: {writes}")
+    assert writes == [1, 1, 1, 1], "❌ La caché omitió escrituras tras el replug"
+    assert unit_state.matches(GAIN_CH1.dsp_param_id, 1234), "❌ Caché sin repoblar"
+    print("  ✅ Caché invalidada al abrir, desconectar y reconectar\n")
+
+    # Test 5: Un handle desenchufado no hace girar al lector
+    print("Test 5: Lector sobre un handle que siempre falla")
+
+    class _UnpluggedHandle:
+        def __init__(self):
+            self.reads = 0
+
+        def read(self, max_length: int, timeout_ms: int = 0) -> List[int]:
+            self.reads += 1
+            raise OSError("read error")
+
+    unplugged = _UnpluggedHandle()
+    lost = []
+    reader = VSLStateReader(unplugged, VSLShadowState(), on_disconnect=lambda: lost.append(1))
+    t0 = time.monotonic()
+    reader.start()
+    reader._thread.join(2.0)
+    elapsed_ms = (time.monotonic() - t0) * 1000.0
+    reader.stop()
+    print(f"  Lecturas: {unplugged.reads}  Detenido tras {elapsed_ms:.0f} ms  "
+          f"disconnected={reader.disconnected}")
+    assert unplugged.reads == MAX_READ_ERRORS, "❌ El lector giró sobre el handle caído"
+    assert reader.disconnected and lost == [1], "❌ Desconexión no notificada"
+    print("  ✅ Reintentos con espera y desconexión notificada")
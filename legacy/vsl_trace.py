@@ -0,0 +1,348 @@
+"""
+VSL-DSP Trace Module
+Instrumentación opcional por etapas (lectura, filtrado, decodificación...).
+
+Cada etapa acumula tiempo de pared, tiempo de CPU, llamadas y elementos
+procesados; opcionalmente también el pico de memoria (tracemalloc) y un
+perfil cProfile de toda la ejecución. Al terminar se imprime el desglose
+por etapa y se puede escribir un JSON en formato Chrome Trace (abrir en
+chrome://tracing o https://ui.perfetto.dev).
+
+Desactivado (por defecto), stage() devuelve un contexto nulo compartido
+y no mide nada.
+
+Variables de entorno (equivalentes a los flags de la CLI):
+    VSL_TRACE=1                 Activa el desglose por etapas
+    VSL_TRACE_FILE=trace.json   Escribe el Chrome Trace (implica VSL_TRACE)
+    VSL_PROFILE=perfil.prof     cProfile de la ejecución (implica VSL_TRACE)
+    VSL_TRACEMALLOC=1           Pico de memoria por etapa (implica VSL_TRACE)
+"""
+
+import atexit
+import io
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, TextIO
+
+
+PROFILE_TOP_N = 15
+
+# cProfile, pstats y tracemalloc se importan solo cuando se piden: suman
+# ~15 ms al arranque de cualquier CLI que use el tracer desactivado.
+
+
+class StageStats:
+    """Totales acumulados de una etapa."""
+    __slots__ = ("calls", "items", "wall_s", "cpu_s", "mem_peak")
+
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.mem_peak = 0          # Bytes (solo con tracemalloc)
+
+
+class _NullStage:
+    """Contexto que no mide nada (tracer desactivado)."""
+    __slots__ = ()
+    items = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("_tracer", "name", "items", "args", "_t0", "_c0", "_m0")
+
+    def __init__(self, tracer: "VSLTracer", name: str, items: int, args: Optional[Dict]):
+        self._tracer = tracer
+        self.name = name
+        self.items = items
+        self.args = args
+
+    def __enter__(self):
+        if self._tracer.trace_malloc:
+            import tracemalloc
+            tracemalloc.reset_peak()
+            self._m0 = tracemalloc.get_traced_memory()[0]
+        self._c0 = time.thread_time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        t1 = time.perf_counter()
+        c1 = time.thread_time()
+        mem_peak = 0
+        if self._tracer.trace_malloc:
+            import tracemalloc
+            mem_peak = max(0, tracemalloc.get_traced_memory()[1] - self._m0)
+        self._tracer._record(self, self._t0, t1, c1 - self._c0, mem_peak)
+        return False
+
+
+# ============================================================================
+# TRACER
+# ============================================================================
+
+class VSLTracer:
+    """
+    Registro de etapas de un pipeline.
+
+    Uso:
+        tracer = VSLTracer(enabled=True)
+        with tracer.stage("read") as st:
+            packets = rdpcap(path)
+            st.items = len(packets)
+        print(tracer.report())
+    """
+
+    def __init__(self, enabled: bool = False, profile: bool = False,
+                 trace_malloc: bool = False):
+        self.enabled = enabled or profile or trace_malloc
+        self.profile = profile
+        self.trace_malloc = trace_malloc
+        self._stats: Dict[str, StageStats] = {}
+        self._events: List[Dict] = []
+        self._lock = threading.Lock()
+        self._profiler = None            # cProfile.Profile
+        self._t_origin = time.perf_counter()
+        self._started = False
+
+    @classmethod
+    def from_env(cls, environ=os.environ) -> "VSLTracer":
+        profile = bool(environ.get("VSL_PROFILE"))
+        trace_malloc = environ.get("VSL_TRACEMALLOC", "") not in ("", "0")
+        enabled = (environ.get("VSL_TRACE", "") not in ("", "0")
+                   or bool(environ.get("VSL_TRACE_FILE")))
+        return cls(enabled=enabled, profile=profile, trace_malloc=trace_malloc)
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Arranca cProfile y tracemalloc si están pedidos (idempotente)."""
+        if self._started or not self.enabled:
+            return
+        self._started = True
+        self._t_origin = time.perf_counter()
+        if self.trace_malloc:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        if self.profile:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        if not self._started:
+            return
+        self._started = False
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self.trace_malloc:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    # ------------------------------------------------------------------
+    # Medición
+    # ------------------------------------------------------------------
+
+    def stage(self, name: str, items: int = 0, **args):
+        """
+        Contexto que mide una etapa. `items` puede asignarse dentro del bloque.
+
+        Los argumentos extra quedan en el evento del Chrome Trace.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, items, args or None)
+
+    def _record(self, stage: _Stage, t0: float, t1: float, cpu_s: float, mem_peak: int):
+        event = {
+            "name": stage.name, "cat": "stage", "ph": "X",
+            "ts": (t0 - self._t_origin) * 1e6, "dur": (t1 - t0) * 1e6,
+            "pid": os.getpid(), "tid": threading.get_ident(),
+            "args": {"items": stage.items, "cpu_ms": round(cpu_s * 1e3, 3)},
+        }
+        if stage.args:
+            event["args"].update(stage.args)
+        if self.trace_malloc:
+            event["args"]["mem_peak_kib"] = round(mem_peak / 1024, 1)
+        with self._lock:
+            stats = self._stats.get(stage.name)
+            if stats is None:
+                stats = self._stats[stage.name] = StageStats()
+            stats.calls += 1
+            stats.items += stage.items
+            stats.wall_s += t1 - t0
+            stats.cpu_s += cpu_s
+            stats.mem_peak = max(stats.mem_peak, mem_peak)
+            self._events.append(event)
+
+    @property
+    def stats(self) -> Dict[str, StageStats]:
+        with self._lock:
+            return dict(self._stats)
+
+    # ------------------------------------------------------------------
+    # Salida
+    # ------------------------------------------------------------------
+
+    def report(self) -> str:
+        """Tabla de etapas en orden de primera aparición."""
+        stats = self.stats
+        total = sum(s.wall_s for s in stats.values()) or 1.0
+        header = (f"{'Etapa':<16} {'Llamadas':>8} {'Elementos':>10} {'Pared ms':>10} "
+                  f"{'CPU ms':>10} {'%':>6} {'µs/elem':>9}")
+        if self.trace_malloc:
+            header += f" {'Pico KiB':>10}"
+        lines = [header, "-" * len(header)]
+        for name, s in stats.items():
+            per_item = f"{s.wall_s / s.items * 1e6:9.2f}" if s.items else f"{'-':>9}"
+            line = (f"{name:<16} {s.calls:>8} {s.items:>10} {s.wall_s * 1e3:>10.2f} "
+                    f"{s.cpu_s * 1e3:>10.2f} {s.wall_s / total * 100:>5.1f}% {per_item}")
+            if self.trace_malloc:
+                line += f" {s.mem_peak / 1024:>10.1f}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def profile_report(self, top_n: int = PROFILE_TOP_N) -> str:
+        if self._profiler is None:
+            return ""
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(top_n)
+        return out.getvalue()
+
+    def dump_profile(self, path: str):
+        """Guarda el perfil en formato pstats (snakeviz, gprof2dot...)."""
+        if self._profiler is not None:
+            self._profiler.dump_stats(path)
+
+    def chrome_trace(self) -> Dict:
+        with self._lock:
+            events = list(self._events)
+        meta = {"name": "process_name", "ph": "M", "pid": os.getpid(),
+                "args": {"name": os.path.basename(sys.argv[0]) or "vsl"}}
+        return {"traceEvents": [meta] + events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def install_exit_report(self, trace_file: Optional[str] = None,
+                            profile_file: Optional[str] = None,
+                            stream: Optional[TextIO] = None):
+        """Imprime el desglose (y escribe los archivos pedidos) al salir."""
+        if not self.enabled:
+            return
+
+        def _at_exit():
+            self.stop()
+            out = stream or sys.stderr
+            out.write("\n⏱️  Desglose por etapa\n" + self.report() + "\n")
+            if profile_file:
+                self.dump_profile(profile_file)
+                out.write(f"\n📈 Perfil cProfile guardado en: {profile_file}\n")
+                out.write(self.profile_report())
+            if trace_file:
+                self.write_chrome_trace(trace_file)
+                out.write(f"\n🧭 Chrome Trace guardado en: {trace_file}\n")
+            out.flush()
+
+        atexit.register(_at_exit)
+
+
+def tracer_from_args(trace: bool = False, trace_file: Optional[str] = None,
+                     profile_file: Optional[str] = None,
+                     trace_malloc: bool = False,
+                     environ=os.environ) -> VSLTracer:
+    """
+    Tracer configurado por flags de la CLI, con el entorno como respaldo.
+
+    Arranca el tracer e instala el informe de salida si queda activo.
+    """
+    trace_file = trace_file or environ.get("VSL_TRACE_FILE") or None
+    profile_file = profile_file or environ.get("VSL_PROFILE") or None
+    env = VSLTracer.from_env(environ)
+    tracer = VSLTracer(enabled=trace or bool(trace_file) or env.enabled,
+                       profile=bool(profile_file),
+                       trace_malloc=trace_malloc or env.trace_malloc)
+    tracer.start()
+    tracer.install_exit_report(trace_file, profile_file)
+    return tracer
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from vsl_transport import VSLPacket, parse_vsl_report
+
+    print("=== Tests de vsl_trace.py ===\n")
+
+    def pipeline(tracer: VSLTracer, n: int):
+        with tracer.stage("build") as st:
+            packets = [VSLPacket(0x1A01, i % 65536, report_id=0x01).buffer
+                       for i in range(n)]
+            st.items = len(packets)
+        with tracer.stage("decode", items=n):
+            decoded = [parse_vsl_report(p) for p in packets]
+        with tracer.stage("json", items=n):
+            json.dumps(decoded)
+
+    # Test 1: Desactivado no mide nada
+    print("Test 1: Tracer desactivado")
+    tracer = VSLTracer()
+    pipeline(tracer, 1000)
+    assert tracer.stats == {} and tracer.stage("x") is _NULL_STAGE, "❌ Midió desactivado"
+    print("  ✅ Contexto nulo compartido, sin registros\n")
+
+    # Test 2: Desglose por etapa con tracemalloc y cProfile
+    print("Test 2: Etapas + tracemalloc + cProfile")
+    tracer = VSLTracer(enabled=True, profile=True, trace_malloc=True)
+    tracer.start()
+    pipeline(tracer, 20000)
+    tracer.stop()
+    print("  " + tracer.report().replace("\n", "\n  "))
+    stats = tracer.stats
+    assert list(stats) == ["build", "decode", "json"], "❌ Etapas incorrectas"
+    assert stats["decode"].items == 20000, "❌ Elementos no contados"
+    assert stats["build"].mem_peak > 20000 * 64, "❌ Pico de memoria no medido"
+    assert "parse_vsl_report" in tracer.profile_report(), "❌ Perfil vacío"
+    print("  ✅ Tiempo, CPU, elementos, memoria y perfil por etapa\n")
+
+    # Test 3: Chrome Trace
+    print("Test 3: Chrome Trace JSON")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trace.json")
+        tracer.write_chrome_trace(path)
+        with open(path) as f:
+            trace = json.load(f)
+    spans = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    print(f"  {len(spans)} eventos: " + ", ".join(f"{e['name']}@{e['ts']:.0f}µs" for e in spans))
+    assert [e["name"] for e in spans] == ["build", "decode", "json"], "❌ Eventos incorrectos"
+    assert all(a["ts"] + a["dur"] <= b["ts"] for a, b in zip(spans, spans[1:])), "❌ Solapados"
+    print("  ✅ Trace válido para chrome://tracing / Perfetto\n")
+
+    # Test 4: Configuración por entorno
+    print("Test 4: Variables de entorno")
+    tracer = VSLTracer.from_env({"VSL_TRACEMALLOC": "1"})
+    assert tracer.enabled and tracer.trace_malloc and not tracer.profile, "❌ Entorno"
+    assert not VSLTracer.from_env({}).enabled, "❌ Activado sin variables"
+    print("  ✅ VSL_TRACE / VSL_TRACE_FILE / VSL_PROFILE / VSL_TRACEMALLOC")
@@ -3,7 +3,9 @@ VSL-DSP Transport Module
 Construcción y validación de paquetes HID.
 """
 
-from typing import Optional
+import struct
+from typing import List, Optional, Sequence
+from vsl_log import get_event_log
 from vsl_config import (
     VSL_PACKET_SIZE,
     VSL_REPORT_ID,
@@ -12,6 +14,21 @@ from vsl_config import (
 )
 
 
+def _resolve_report_id(report_id: Optional[int]) -> int:
+    """Report ID explícito o VSL_REPORT_ID (ver VSLPacket)."""
+    if report_id is None:
+        if VSL_REPORT_ID is None:
+            raise RuntimeError(
+                "VSL_REPORT_ID no configurado. "
+                "Proporciona report_id explícitamente o configura VSL_REPORT_ID."
+            )
+        report_id = VSL_REPORT_ID
+    
+    if not (0 <= report_id <= 0xFF):
+        raise ValueError(f"report_id fuera de rango 8-bit: 0x{report_id:X}")
+    return report_id
+
+
 class VSLPacket:
     """
     Representa un paquete HID VSL-DSP de 64 bytes.
@@ -38,17 +55,7 @@ class VSLPacket:
         if not (0 <= encoded_value <= 0xFFFF):
             raise ValueError(f"encoded_value fuera de rango 16-bit: {encoded_value}")
         
-        # Determinar Report ID
-        if report_id is None:
-            if VSL_REPORT_ID is None:
-                raise RuntimeError(
-                    "VSL_REPORT_ID no configurado. "
-                    "Proporciona report_id explícitamente o configura VSL_REPORT_ID."
-                )
-            report_id = VSL_REPORT_ID
-        
-        if not (0 <= report_id <= 0xFF):
-            raise ValueError(f"report_id fuera de rango 8-bit: 0x{report_id:X}")
+        report_id = _resolve_report_id(report_id)
         
         self.param_id = param_id
         self.encoded_value = encoded_value
@@ -154,16 +161,75 @@ def build_packet_safe(param: VSLParameter, encoded_value: int) -> Optional[VSLPa
         is_valid, message = packet.validate()
         
         if not is_valid:
-            print(f"⚠️ Error de validación: {message}")
+            get_event_log().warning("packet_invalid", "Error de validación",
+                                    param_id=param.dsp_param_id, reason=message)
             return None
         
         return packet
     
     except (ValueError, RuntimeError) as e:
-        print(f"⚠️ Error construyendo paquete: {e}")
+        get_event_log().warning("packet_build_failed", "Error construyendo paquete",
+                                param_id=param.dsp_param_id, error=str(e))
         return None
 
 
+_PACKET_HEADER = struct.Struct(f"<BHH{VSL_PACKET_SIZE - 5}x")
+
+
+def build_packets(param_ids: Sequence[int], encoded_values: Sequence[int],
+                  report_id: Optional[int] = None) -> List[VSLPacket]:
+    """
+    Construye un lote de paquetes validando los rangos una sola vez.
+    
+    Equivale a [VSLPacket(p, v, report_id) for p, v in zip(...)] a la
+    mitad de coste por paquete: útil para lotes codificados con la ruta
+    batch (ver vsl_channel_strip).
+    
+    Raises:
+        ValueError: Si las longitudes difieren o algún valor está fuera de rango
+        RuntimeError: Si VSL_REPORT_ID no está configurado y report_id es None
+    """
+    param_ids = list(param_ids)
+    encoded_values = list(encoded_values)
+    if len(param_ids) != len(encoded_values):
+        raise ValueError("param_ids y encoded_values deben tener la misma longitud")
+    if not param_ids:
+        return []
+    if min(param_ids) < 0 or max(param_ids) > 0xFFFF:
+        raise ValueError("param_id fuera de rango 16-bit")
+    if min(encoded_values) < 0 or max(encoded_values) > 0xFFFF:
+        raise ValueError("encoded_value fuera de rango 16-bit")
+    report_id = _resolve_report_id(report_id)
+    
+    new = VSLPacket.__new__
+    pack = _PACKET_HEADER.pack
+    packets = []
+    for param_id, value in zip(param_ids, encoded_values):
+        packet = new(VSLPacket)
+        packet.param_id = param_id
+        packet.encoded_value = value
+        packet.report_id = report_id
+        packet._buffer = bytearray(pack(report_id, param_id, value))
+        packets.append(packet)
+    return packets
+
+
+def parse_vsl_report(data) -> Optional[tuple[int, int, int]]:
+    """
+    Extrae los campos de un reporte VSL (inversa de VSLPacket._build_buffer).
+    
+    Args:
+        data: Reporte recibido (bytes, bytearray o lista de enteros de hidapi)
+        
+    Returns:
+        (report_id, param_id, encoded_value) o None si el reporte es muy corto
+    """
+    if len(data) < 5:
+        return None
+    
+    return data[0], data[1] | (data[2] << 8), data[3] | (data[4] << 8)
+
+
 if __name__ == "__main__":
     from vsl_config import GAIN_CH1
     
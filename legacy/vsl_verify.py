@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+VSL-DSP Verification Engine
+Verificación exhaustiva de las curvas de codificación.
+
+Los tests de vsl_poc_main.py y de vsl_core.py muestrean unos pocos
+puntos por curva. Este módulo recorre, para cada parámetro registrado,
+los 65536 enteros del espacio codificado y una rejilla densa de
+posiciones, con la ruta batch del registro por param_id, y comprueba:
+
+- decode: valores finitos dentro del rango de usuario, monotonía y
+  saturación por encima de max_encoded_int
+- int → usuario → int: exacto dentro del rango alcanzable, y fuera de
+  él satura a los extremos
+- rejilla de posiciones: monotonía del encode y error de ida y vuelta
+  acotado por medio paso de cuantización local
+- entradas fuera de dominio: se recortan al extremo correspondiente
+- escalar frente a batch en una muestra de puntos
+- Python frente a C: src/vsl_dsp_logic.c se compila con un arnés por
+  lotes y se carga con ctypes (float32, expf/exp2f/roundf)
+
+Los parámetros con el mismo tipo y coeficientes comparten curva: se
+verifica cada curva distinta una vez y se informa de todos sus IDs.
+
+Uso:
+    python3 vsl_verify.py
+    python3 vsl_verify.py --grid 1048577 --require-c
+    python3 vsl_verify.py --no-c
+
+Requiere NumPy; la comparación con C requiere un compilador (CC, cc o gcc).
+"""
+
+import argparse
+import ctypes
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from vsl_config import VSLParameter, VSL_INV_LN2
+from vsl_param_db import KIND_GAIN, KIND_FREQUENCY, KIND_LINEAR
+from vsl_param_registry import VSLParamRegistry, get_param_registry
+
+# Importado en el primer uso (ver _require_numpy), como en vsl_core
+np = None
+
+
+ENCODED_SPACE = 1 << 16
+GRID_POINTS = (1 << 18) + 1
+SCALAR_SAMPLES = 257
+
+# Holgura relativa sobre la cota de medio paso (error de redondeo en float64)
+ROUND_TRIP_SLACK = 1e-9
+
+# VSL_INV_LN2 está truncado a 1.442695 (igual que en C). En el encode de
+# frecuencia se cancela (cociente de logaritmos), pero el decode devuelve
+# f ** (VSL_INV_LN2 · ln 2) en lugar de f: se suma ese sesgo a la cota
+INV_LN2_BIAS = abs(1.0 - VSL_INV_LN2 * math.log(2.0))
+
+# Escalar (math) frente a batch (NumPy): enteros idénticos, flotantes a 1 ulp
+SCALAR_RTOL = 1e-12
+
+# C trabaja en float32 y redondea con roundf (mitades lejos de cero);
+# Python en float64 con rint (mitades al par): se tolera 1 LSB
+C_INT_TOLERANCE = 1
+C_FREQ_RTOL = 1e-5
+
+C_SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+KIND_LABELS = {KIND_GAIN: "gain", KIND_FREQUENCY: "frequency", KIND_LINEAR: "linear"}
+
+
+def _require_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+# ============================================================================
+# RESULTADOS
+# ============================================================================
+
+class VerifyCheck(NamedTuple):
+    name: str
+    passed: bool
+    detail: str
+
+
+class CurveReport(NamedTuple):
+    """Comprobaciones de una curva y los parámetros que la comparten."""
+    kind: int
+    param_ids: Tuple[int, ...]
+    names: Tuple[str, ...]
+    checks: Tuple[VerifyCheck, ...]
+
+    @property
+    def passed(self) -> bool:
+        return all(check.passed for check in self.checks)
+
+
+# ============================================================================
+# REFERENCIA C
+# ============================================================================
+
+# Arnés por lotes sobre las funciones de src/vsl_dsp_logic.c. La
+# codificación de frecuencia compone VSL_Decode_Frequency con el
+# redondeo de posición * max_encoded_int, igual que vsl_encode_user_value
+_C_HARNESS = r"""
+#include <stddef.h>
+#include "vsl_dsp_logic.c"
+
+void vsl_verify_encode_gain(const float *values, uint32_t *out, size_t n,
+                            const VSL_Parameter *param);
+void vsl_verify_encode_frequency(const float *hz, uint32_t *out, size_t n,
+                                 const VSL_Parameter *param);
+void vsl_verify_map_frequency(const float *positions, float *out, size_t n,
+                              const VSL_Parameter *param);
+
+void vsl_verify_encode_gain(const float *values, uint32_t *out, size_t n,
+                            const VSL_Parameter *param) {
+    for (size_t i = 0; i < n; i++)
+        out[i] = VSL_Final_Encode_To_Int(VSL_Encode_Gain(values[i], param), param);
+}
+
+void vsl_verify_encode_frequency(const float *hz, uint32_t *out, size_t n,
+                                 const VSL_Parameter *param) {
+    const float max_f = (float)param->max_encoded_int;
+    for (size_t i = 0; i < n; i++)
+        out[i] = (uint32_t)roundf(VSL_Decode_Frequency(hz[i], param) * max_f);
+}
+
+void vsl_verify_map_frequency(const float *positions, float *out, size_t n,
+                              const VSL_Parameter *param) {
+    for (size_t i = 0; i < n; i++)
+        out[i] = VSL_Map_Frequency(positions[i], param);
+}
+"""
+
+
+class _CParameter(ctypes.Structure):
+    """Espejo de VSL_Parameter (src/vsl_dsp_logic.h)."""
+    _fields_ = [("dsp_param_id", ctypes.c_uint32),
+                ("max_encoded_int", ctypes.c_uint32),
+                ("coeff_offset_A", ctypes.c_float),
+                ("coeff_C1", ctypes.c_float),
+                ("log_factor", ctypes.c_float),
+                ("curve_min_map", ctypes.c_float),
+                ("curve_max_map", ctypes.c_float),
+                ("freq_min_hz", ctypes.c_float),
+                ("freq_max_hz", ctypes.c_float)]
+
+
+class CReference:
+    """Implementación C compilada, con entradas y salidas por arrays."""
+
+    def __init__(self, lib: ctypes.CDLL, description: str):
+        self._lib = lib
+        self.description = description
+        for name in ("vsl_verify_encode_gain", "vsl_verify_encode_frequency",
+                     "vsl_verify_map_frequency"):
+            getattr(lib, name).restype = None
+
+    def _call(self, name: str, values, out_dtype, param: VSLParameter):
+        values = np.ascontiguousarray(values, dtype=np.float32)
+        out = np.empty(values.shape, dtype=out_dtype)
+        getattr(self._lib, name)(values.ctypes.data_as(ctypes.c_void_p),
+                                 out.ctypes.data_as(ctypes.c_void_p),
+                                 ctypes.c_size_t(values.size),
+                                 ctypes.byref(_CParameter(*param)))
+        return out
+
+    def encode_gain(self, values, param: VSLParameter) -> "np.ndarray":
+        return self._call("vsl_verify_encode_gain", values, np.uint32, param)
+
+    def encode_frequency(self, hz_values, param: VSLParameter) -> "np.ndarray":
+        return self._call("vsl_verify_encode_frequency", hz_values, np.uint32, param)
+
+    def map_frequency(self, positions, param: VSLParameter) -> "np.ndarray":
+        return self._call("vsl_verify_map_frequency", positions, np.float32, param)
+
+
+def load_c_reference(source_dir: str = C_SOURCE_DIR,
+                     compiler: Optional[str] = None) -> Tuple[Optional[CReference], str]:
+    """
+    Compila src/vsl_dsp_logic.c con el arnés y lo carga.
+
+    Returns:
+        (CReference, descripción) o (None, motivo por el que no hay referencia)
+    """
+    candidates = [compiler] if compiler else [os.environ.get("CC"), "cc", "gcc"]
+    compiler = next((c for c in candidates if c and shutil.which(c)), None)
+    if compiler is None:
+        return None, "compilador C no disponible"
+    if not os.path.exists(os.path.join(source_dir, "vsl_dsp_logic.c")):
+        return None, f"vsl_dsp_logic.c no encontrado en {source_dir}"
+
+    with tempfile.TemporaryDirectory(prefix="vsl_verify_") as tmp:
+        harness = os.path.join(tmp, "vsl_verify_harness.c")
+        library = os.path.join(tmp, "vsl_verify_harness.so")
+        with open(harness, "w") as f:
+            f.write(_C_HARNESS)
+        cmd = [compiler, "-std=c11", "-O2", "-shared", "-fPIC", f"-I{source_dir}",
+               harness, "-o", library, "-lm"]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            error = (result.stderr.strip().splitlines() or ["sin salida"])[0]
+            return None, f"compilación fallida: {error}"
+        # La biblioteca sigue mapeada tras borrar el directorio temporal
+        lib = ctypes.CDLL(library)
+    description = f"{os.path.basename(compiler)} + {os.path.relpath(source_dir)}/vsl_dsp_logic.c"
+    return CReference(lib, description), description
+
+
+# ============================================================================
+# COMPROBACIONES
+# ============================================================================
+
+def _user_range(kind: int, param: VSLParameter) -> Tuple[float, float]:
+    if kind == KIND_FREQUENCY:
+        return param.freq_min_hz, param.freq_max_hz
+    return 0.0, 1.0
+
+
+def _out_of_range_inputs(kind: int, param: VSLParameter) -> Tuple[List[float], List[float]]:
+    """Entradas por debajo y por encima del dominio de usuario."""
+    low, high = _user_range(kind, param)
+    span = high - low
+    below = [low - span * 1e-9, low - span, -1e9, -math.inf]
+    above = [high + span * 1e-9, high + span, 1e9, math.inf]
+    if kind == KIND_FREQUENCY:
+        below += [0.0, -1.0]
+    return below, above
+
+
+def _first(mask) -> str:
+    return f"primer fallo en índice {int(np.flatnonzero(mask)[0])}"
+
+
+def _check_decode_space(kind, param, decoded) -> List[VerifyCheck]:
+    low, high = _user_range(kind, param)
+    tol = 1e-9 * max(1.0, abs(high))
+    bad = ~np.isfinite(decoded) | (decoded < low - tol) | (decoded > high + tol)
+    checks = [VerifyCheck(
+        "decode.rango", not bad.any(),
+        f"{ENCODED_SPACE} enteros en [{decoded.min():.6g}, {decoded.max():.6g}]"
+        if not bad.any() else f"{int(bad.sum())} fuera de [{low}, {high}], {_first(bad)}")]
+
+    falling = np.diff(decoded) < 0
+    checks.append(VerifyCheck(
+        "decode.monotonia", not falling.any(),
+        "no decreciente" if not falling.any()
+        else f"{int(falling.sum())} descensos, {_first(falling)}"))
+
+    max_int = param.max_encoded_int
+    above = decoded[max_int + 1:]
+    saturated = bool(np.all(above == decoded[max_int]))
+    checks.append(VerifyCheck(
+        "decode.saturacion", saturated,
+        f"{above.size} enteros > max_encoded_int={max_int} → decode(max)"
+        if saturated else f"enteros > {max_int} no saturan"))
+    return checks
+
+
+def verify_curve(registry: VSLParamRegistry, param_id: int,
+                 grid_points: int = GRID_POINTS,
+                 c_ref: Optional[CReference] = None) -> Tuple[VerifyCheck, ...]:
+    """
+    Verifica exhaustivamente la curva de un parámetro registrado.
+
+    Raises:
+        KeyError: Si el param_id no está registrado
+    """
+    _require_numpy()
+    entry = registry.get(param_id)
+    if entry is None:
+        raise KeyError(f"Parámetro no registrado: 0x{param_id:04X}")
+    kind, param = entry.kind, entry.param
+    max_int = param.max_encoded_int
+    low, high = _user_range(kind, param)
+
+    def decode(ints):
+        return registry.decode_batch(np.full(len(ints), param_id), ints)
+
+    def encode(values):
+        values = np.asarray(values, dtype=np.float64)
+        return registry.encode_batch(np.full(len(values), param_id), values)
+
+    # 1. Los 65536 enteros del espacio codificado
+    ints = np.arange(ENCODED_SPACE)
+    decoded = decode(ints)
+    checks = _check_decode_space(kind, param, decoded)
+
+    # 2. int → usuario → int: exacto en [lo, hi], saturado fuera
+    lo_int, hi_int = (int(v) for v in encode([low, high]))
+    expected = np.clip(ints, lo_int, hi_int)
+    wrong = encode(decoded) != expected
+    checks.append(VerifyCheck(
+        "int.ida_y_vuelta", not wrong.any(),
+        f"exacto en [{lo_int}, {hi_int}], {ENCODED_SPACE - (hi_int - lo_int + 1)} saturan"
+        if not wrong.any() else f"{int(wrong.sum())} discrepancias, {_first(wrong)}"))
+
+    # 3. Rejilla densa de posiciones
+    positions = np.linspace(0.0, 1.0, grid_points)
+    if kind == KIND_FREQUENCY:
+        user = low * (high / low) ** positions
+    else:
+        user = positions
+    encoded = encode(user)
+
+    outside = (encoded < 0) | (encoded > max_int)
+    falling = np.diff(encoded) < 0
+    checks.append(VerifyCheck(
+        "encode.monotonia", not (falling.any() or outside.any()),
+        f"{grid_points} posiciones → [{encoded.min()}, {encoded.max()}], no decreciente"
+        if not (falling.any() or outside.any())
+        else f"{int(falling.sum())} descensos, {int(outside.sum())} fuera de [0, {max_int}]"))
+
+    # Error de ida y vuelta acotado por medio paso de cuantización local;
+    # en los extremos saturados el valor solo puede quedar al otro lado
+    back = decoded[encoded]
+    step_up = decoded[np.minimum(encoded + 1, max_int)] - back
+    step_down = back - decoded[np.maximum(encoded - 1, 0)]
+    bound = 0.5 * np.maximum(step_up, step_down) * (1.0 + ROUND_TRIP_SLACK) + 1e-12
+    if kind == KIND_FREQUENCY:
+        bound += user * np.abs(np.log(user)) * INV_LN2_BIAS
+    error = np.abs(back - user)
+    interior = (encoded > lo_int) & (encoded < hi_int)
+    bad = interior & (error > bound)
+    bad |= (encoded == hi_int) & (user < back - bound)
+    bad |= (encoded == lo_int) & (user > back + bound)
+    worst = float(np.max(error[interior] / (2.0 * bound[interior]))) if interior.any() else 0.0
+    checks.append(VerifyCheck(
+        "posicion.ida_y_vuelta", not bad.any(),
+        f"error máx {worst:.3f} pasos locales, "
+        f"{int(np.count_nonzero(~interior))} posiciones en los extremos"
+        if not bad.any() else f"{int(bad.sum())} fuera de medio paso, {_first(bad)}"))
+
+    # 4. Entradas fuera de dominio
+    below, above = _out_of_range_inputs(kind, param)
+    clamped = bool(np.all(encode(below) == lo_int) and np.all(encode(above) == hi_int))
+    checks.append(VerifyCheck(
+        "encode.recorte", clamped,
+        f"{len(below) + len(above)} entradas fuera de [{low}, {high}] → {lo_int} / {hi_int}"
+        if clamped else "alguna entrada fuera de dominio no se recorta al extremo"))
+
+    # 5. Escalar frente a batch
+    sample_ints = ints[::ENCODED_SPACE // (SCALAR_SAMPLES - 1)]
+    sample_user = user[::max(1, grid_points // SCALAR_SAMPLES)]
+    scalar_dec = np.array([registry.decode(param_id, int(i))[0] for i in sample_ints])
+    scalar_enc = np.array([registry.encode(param_id, float(u)) for u in sample_user])
+    agree = (np.allclose(scalar_dec, decoded[sample_ints], rtol=SCALAR_RTOL, atol=0.0)
+             and np.array_equal(scalar_enc, encode(sample_user)))
+    checks.append(VerifyCheck(
+        "escalar.batch", agree,
+        f"{len(sample_ints) + len(sample_user)} puntos idénticos"
+        if agree else "la ruta escalar difiere de la batch"))
+
+    # 6. Python frente a C (float32)
+    if c_ref is not None and kind in (KIND_GAIN, KIND_FREQUENCY):
+        checks.extend(_check_c_agreement(c_ref, kind, param, user, encode, decoded))
+    return tuple(checks)
+
+
+def _check_c_agreement(c_ref: CReference, kind, param, user, encode, decoded) -> List[VerifyCheck]:
+    # Mismas entradas en los dos lados: valores representables en float32
+    user32 = user.astype(np.float32)
+    py_ints = encode(user32.astype(np.float64))
+    if kind == KIND_GAIN:
+        c_ints = c_ref.encode_gain(user32, param)
+    else:
+        c_ints = c_ref.encode_frequency(user32, param)
+    delta = np.abs(py_ints - c_ints.astype(np.int64))
+    worst = int(delta.max())
+    checks = [VerifyCheck(
+        "c.encode", worst <= C_INT_TOLERANCE,
+        f"|Δ| máx {worst} LSB, {int(np.count_nonzero(delta))} de {len(delta)} difieren")]
+
+    if kind == KIND_FREQUENCY:
+        max_int = param.max_encoded_int
+        positions = np.arange(max_int + 1, dtype=np.float32) / np.float32(max_int)
+        c_hz = c_ref.map_frequency(positions, param).astype(np.float64)
+        rel = np.abs(c_hz - decoded[:max_int + 1]) / decoded[:max_int + 1]
+        worst_rel = float(rel.max())
+        checks.append(VerifyCheck(
+            "c.decode", worst_rel <= C_FREQ_RTOL,
+            f"error relativo máx {worst_rel:.2e} (tolerancia {C_FREQ_RTOL:.0e})"))
+    return checks
+
+
+def group_curves(registry: VSLParamRegistry) -> List[Tuple[int, List[Tuple[int, str]]]]:
+    """
+    Agrupa los parámetros registrados por curva (tipo + coeficientes).
+
+    Returns:
+        [(tipo, [(param_id, nombre), ...]), ...] en orden del primer param_id
+    """
+    groups: Dict[tuple, Tuple[int, List[Tuple[int, str]]]] = {}
+    for param_id, entry in registry.entries():
+        key = (entry.kind, entry.param[1:])
+        groups.setdefault(key, (entry.kind, []))[1].append((param_id, entry.name))
+    return list(groups.values())
+
+
+def verify_registry(registry: Optional[VSLParamRegistry] = None,
+                    grid_points: int = GRID_POINTS,
+                    c_ref: Optional[CReference] = None) -> List[CurveReport]:
+    """Verifica cada curva distinta del registro (por defecto el compartido)."""
+    registry = registry or get_param_registry()
+    reports = []
+    for kind, members in group_curves(registry):
+        param_ids = tuple(param_id for param_id, _ in members)
+        checks = verify_curve(registry, param_ids[0], grid_points, c_ref)
+        reports.append(CurveReport(kind, param_ids,
+                                   tuple(name for _, name in members), checks))
+    return reports
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def _print_report(report: CurveReport):
+    names = report.names
+    shown = ", ".join(names[:3]) + (f" … (+{len(names) - 3})" if len(names) > 3 else "")
+    print(f"\n  [{KIND_LABELS.get(report.kind, report.kind)}] "
+          f"{len(names)} parámetro(s): {shown}")
+    for check in report.checks:
+        mark = "✅" if check.passed else "❌"
+        print(f"    {mark} {check.name:<22} {check.detail}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Verificación exhaustiva de las curvas VSL-DSP")
+    parser.add_argument("--grid", type=int, default=GRID_POINTS,
+                        help="Posiciones de la rejilla densa por curva")
+    parser.add_argument("--no-c", action="store_true",
+                        help="No comparar con src/vsl_dsp_logic.c")
+    parser.add_argument("--require-c", action="store_true",
+                        help="Fallar si la referencia C no está disponible")
+    parser.add_argument("--cc", help="Compilador C (por defecto $CC, cc o gcc)")
+    args = parser.parse_args(argv)
+    if args.grid < 2:
+        parser.error("--grid debe ser >= 2")
+
+    t0 = time.perf_counter()
+    registry = get_param_registry()
+    c_ref, c_status = (None, "desactivada (--no-c)") if args.no_c else load_c_reference(compiler=args.cc)
+
+    curves = group_curves(registry)
+    print(f"🔬 Verificación exhaustiva VSL-DSP: {registry.count} parámetros, "
+          f"{len(curves)} curva(s), {ENCODED_SPACE} enteros + {args.grid} posiciones por curva")
+    print(f"  {'✅' if c_ref else '⚠️ '} Referencia C: {c_status}")
+
+    reports = verify_registry(registry, args.grid, c_ref)
+    for report in reports:
+        _print_report(report)
+
+    failed = [(report, check) for report in reports for check in report.checks
+              if not check.passed]
+    elapsed = time.perf_counter() - t0
+    if failed:
+        print(f"\n❌ {len(failed)} comprobación(es) fallida(s) en {elapsed:.2f} s")
+        return 1
+    if c_ref is None and args.require_c:
+        print(f"\n❌ Referencia C requerida y no disponible ({c_status})")
+        return 1
+    total = sum(len(report.checks) for report in reports)
+    print(f"\n✅ {total} comprobaciones superadas en {elapsed:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())